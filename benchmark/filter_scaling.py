@@ -0,0 +1,302 @@
+"""フィルター処理のDBインスタンス数、ログファイル数に対する処理時間のローカルベンチマーク
+
+RDS (DescribeDBClusters / DescribeDBLogFiles) と S3 (ListObjectsV2 / HeadObject) を
+一定の応答時間を持つスタブで代替し、スレッドプール版と asyncio 版のフィルター処理の処理時間を比較する。
+ログファイルの半数をアーカイブ済みとし、そのうち半数はアップロード後にログファイルが更新された
+（HeadObject で変更を確認する）ものとする。
+
+Example:
+    $ python -m benchmark.filter_scaling --instances 1,4,16,64 --log-files 24,96 \\
+        --api-latency-ms 50
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import boto3
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+from benchmark.stage_runner import FILTER_DIR, SHARED_DIR
+
+STUB_HANDLER_ID = "benchmark-filter-scaling-stub"
+PARAMS_CONTEXT_KEY = "benchmark_params"
+BUCKET = "benchmark-log-bucket"
+DB_CLUSTER_IDENTIFIER = "benchmark"
+REGION = "us-east-1"
+PAGE_SIZE = 100
+
+
+def _parse_counts(value: str) -> List[int]:
+    return [int(count) for count in value.split(",")]
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark filter latency against instance and log file count"
+    )
+    parser.add_argument(
+        "--instances",
+        type=_parse_counts,
+        default=[1, 4, 16, 64],
+        help="Comma separated DB instance counts",
+    )
+    parser.add_argument(
+        "--log-files",
+        type=_parse_counts,
+        default=[24, 96],
+        help="Comma separated log file counts per DB instance",
+    )
+    parser.add_argument(
+        "--api-latency-ms",
+        type=float,
+        default=50,
+        help="Latency of every stubbed RDS and S3 call (ms)",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, default=4, help="DB instances in parallel (thread)"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=32,
+        help="Concurrent API calls (async)",
+    )
+    parser.add_argument(
+        "--rds-api-rate-limit",
+        type=float,
+        default=1000,
+        help="RDS API rate limit (requests per second)",
+    )
+    parser.add_argument(
+        "--output", choices=["table", "json"], default="table", help="Output format"
+    )
+    return parser.parse_args(argv)
+
+
+class StubbedAwsApi:
+    """フィルター処理で呼び出すRDS、S3 APIの応答を合成データで返すスタブ"""
+
+    def __init__(self, instances: int, log_files: int, latency: float):
+        self.latency = latency
+        self.instances = [f"benchmark-instance-{i}" for i in range(instances)]
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.log_files = [
+            {
+                "LogFileName": (
+                    f"error/postgresql.log.{now - timedelta(hours=i):%Y-%m-%d-%H%M}"
+                ),
+                "LastWritten": int((now - timedelta(hours=i - 1)).timestamp() * 1000),
+                "Size": 10 * 1024**2,
+            }
+            for i in range(log_files)
+        ]
+        # アーカイブ済みのオブジェクトキーと最終更新時刻。フィルター処理の生成後に設定する
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.api_calls: Counter = Counter()
+
+    def archive(self, log_filter) -> None:
+        """ログファイルの半数をアーカイブ済みとし、そのうち半数はアップロード後に更新されたものとする"""
+        for db_instance in self.instances:
+            for i, log_file in enumerate(self.log_files):
+                if i % 2:
+                    continue
+                object_key = log_filter._generate_object_key(
+                    db_instance, log_file["LogFileName"]
+                )
+                last_written = datetime.fromtimestamp(
+                    log_file["LastWritten"] / 1000, timezone.utc
+                )
+                self.objects[object_key] = {
+                    "LastModified": last_written
+                    + timedelta(minutes=-5 if i % 4 == 0 else 5),
+                    "LastWritten": log_file["LastWritten"],
+                    "Size": log_file["Size"],
+                }
+
+    def describe_db_clusters(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "DBClusters": [
+                {
+                    "DBClusterIdentifier": params["DBClusterIdentifier"],
+                    "DBClusterMembers": [
+                        {"DBInstanceIdentifier": instance}
+                        for instance in self.instances
+                    ],
+                }
+            ]
+        }
+
+    def describe_db_log_files(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        threshold = params.get("FileLastWritten", 0)
+        files = [f for f in self.log_files if f["LastWritten"] >= threshold]
+        start = int(params.get("Marker") or 0)
+        response = {"DescribeDBLogFiles": files[start : start + PAGE_SIZE]}
+        if start + PAGE_SIZE < len(files):
+            response["Marker"] = str(start + PAGE_SIZE)
+        return response
+
+    def list_objects_v2(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        contents = [
+            {"Key": key, "LastModified": value["LastModified"], "Size": 0}
+            for key, value in sorted(self.objects.items())
+            if key.startswith(params["Prefix"])
+        ]
+        return {"Contents": contents, "KeyCount": len(contents), "IsTruncated": False}
+
+    def head_object(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        value = self.objects[params["Key"]]
+        return {
+            "LastModified": value["LastModified"],
+            "Metadata": {
+                "lastwritten": str(value["LastWritten"]),
+                "sourcesize": str(value["Size"]),
+            },
+        }
+
+    def attach(self, client) -> None:
+        """クライアントのAPI呼び出しをスタブの応答に置き換える
+
+        before-call ではシリアライズ済みのリクエストしか参照できないため、
+        before-parameter-build で呼び出し時の引数をコンテキストに保存する
+        """
+        service_name = client.meta.service_model.service_name
+
+        def save_params(params, context, **kwargs):
+            context[PARAMS_CONTEXT_KEY] = dict(params)
+
+        def stub(model, context, **kwargs):
+            operation = getattr(self, xform_name(model.name), None)
+            if operation is None:
+                return None
+            self.api_calls[f"{service_name}:{model.name}"] += 1
+            time.sleep(self.latency)
+            return AWSResponse(None, 200, {}, None), operation(
+                context[PARAMS_CONTEXT_KEY]
+            )
+
+        client.meta.events.register(
+            f"before-parameter-build.{service_name}",
+            save_params,
+            unique_id=f"{STUB_HANDLER_ID}-params",
+        )
+        # 操作名を含むイベントのハンドラー（レート制限）より後に呼ばれるよう、同じ階層の最後に登録する
+        client.meta.events.register_last(
+            f"before-call.{service_name}", stub, unique_id=STUB_HANDLER_ID
+        )
+
+
+def _run_filter(
+    args: argparse.Namespace, instances: int, log_files: int, async_enabled: bool
+) -> Dict[str, Any]:
+    """1つの条件でフィルター処理を実行し、処理時間とAPI呼び出し回数を返す"""
+    from db_cluster_postgresql_log_file_filter import (
+        DbClusterPostgreSqlLogFileFilter,
+        LogFileFilterConfig,
+    )
+    from async_db_cluster_postgresql_log_file_filter import (
+        AsyncDbClusterPostgreSqlLogFileFilter,
+    )
+    from rds_api_rate_limiter import RdsApiRateLimiter
+
+    client_config = Config(
+        max_pool_connections=max(args.max_workers, args.max_concurrency)
+    )
+    rds_client = boto3.client("rds", region_name=REGION, config=client_config)
+    s3_client = boto3.client("s3", region_name=REGION, config=client_config)
+    api = StubbedAwsApi(instances, log_files, args.api_latency_ms / 1000)
+
+    config = LogFileFilterConfig(
+        db_cluster_identifier=DB_CLUSTER_IDENTIFIER,
+        log_destination_bucket=BUCKET,
+        log_range_minutes=(log_files + 1) * 60,
+        max_workers=args.max_workers,
+        rds_api_rate_limit=args.rds_api_rate_limit,
+        rds_api_burst=max(1, int(args.rds_api_rate_limit)),
+        async_enabled=async_enabled,
+        max_concurrency=args.max_concurrency,
+    )
+    filter_class = (
+        AsyncDbClusterPostgreSqlLogFileFilter
+        if async_enabled
+        else DbClusterPostgreSqlLogFileFilter
+    )
+    log_filter = filter_class(
+        config,
+        rds_client=rds_client,
+        s3_client=s3_client,
+        rds_api_rate_limiter=RdsApiRateLimiter(
+            rate=config.rds_api_rate_limit, capacity=config.rds_api_burst
+        ),
+    )
+    api.attach(rds_client)
+    api.attach(s3_client)
+    api.archive(log_filter)
+
+    started = time.perf_counter()
+    pending = log_filter.filter_cluster_log_files()
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "pending_log_files": len(pending),
+        "api_calls": dict(api.api_calls),
+    }
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    header = (
+        f"{'instances':>10}{'log files':>11}{'api calls':>11}"
+        f"{'thread s':>11}{'async s':>10}{'speedup':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['instances']:>10}{result['log_files']:>11}"
+            f"{sum(result['thread']['api_calls'].values()):>11}"
+            f"{result['thread']['seconds']:>11.2f}{result['async']['seconds']:>10.2f}"
+            f"{result['thread']['seconds'] / result['async']['seconds']:>8.1f}x"
+        )
+
+
+def main(argv: List[str] = None) -> None:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    sys.path[:0] = [FILTER_DIR, SHARED_DIR]
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("POWERTOOLS_LOG_LEVEL", "WARNING")
+    os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+
+    results = []
+    for instances in args.instances:
+        for log_files in args.log_files:
+            thread_result = _run_filter(args, instances, log_files, False)
+            async_result = _run_filter(args, instances, log_files, True)
+            if thread_result["pending_log_files"] != async_result["pending_log_files"]:
+                raise RuntimeError(
+                    "Thread and async filters returned different log files"
+                )
+            results.append(
+                {
+                    "instances": instances,
+                    "log_files": log_files,
+                    "thread": thread_result,
+                    "async": async_result,
+                }
+            )
+
+    if args.output == "json":
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
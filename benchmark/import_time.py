@@ -0,0 +1,291 @@
+"""Lambda関数のハンドラーモジュールの読み込み時間（コールドスタートの初期化時間）の計測
+
+ハンドラーごとに新しいインタープリターで `python -X importtime` を実行し、
+ハンドラーモジュールの読み込み時間（累積）の最小値を予算と比較する。
+予算は、全てのハンドラーが読み込む boto3 と Powertools (X-Ray SDK を含む) のみの読み込み時間を
+同じ実行の中で基準値として計測し、その比率で表す。実行環境の速さの違いは基準値と同じ割合で
+ハンドラーの読み込み時間に現れるため、実行環境によらず同じ予算で比較できる。
+あわせて、機能が有効な場合のみ読み込むモジュールが起動時に読み込まれていないことを確認し、
+予算の超過または遅延読み込みの退行があれば終了コード1で終了する。
+
+Example:
+    $ python -m benchmark.import_time --runs 5
+    $ python -m benchmark.import_time --handlers uploader --budget-ratio uploader=1.2
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from typing import Any, Dict, List
+
+from benchmark.stage_runner import FILTER_DIR, SHARED_DIR, UPLOADER_DIR
+
+# ハンドラーごとの読み込み対象、基準値に対する読み込み時間の予算（比率）、起動時に読み込まないモジュール
+# 予算は基準値に対する比率の実測値 (2026-10-17, Python 3.11, `--runs 5` で 1.01〜1.08) に
+# 計測のばらつきを見込んだ余裕を持たせた値とする
+HANDLERS: Dict[str, Dict[str, Any]] = {
+    "filter": {
+        "directory": FILTER_DIR,
+        "module": "index",
+        "budget_ratio": 1.15,
+        "deferred_modules": [
+            "async_db_cluster_postgresql_log_file_filter",
+            "log_file_watermark_store",
+            "log_file_batcher",
+            "log_file_compactor",
+        ],
+    },
+    "backfill": {
+        "directory": FILTER_DIR,
+        "module": "backfill",
+        "budget_ratio": 1.15,
+        "deferred_modules": [
+            "async_db_cluster_postgresql_log_file_filter",
+            "log_file_watermark_store",
+            "log_file_compactor",
+        ],
+    },
+    "compaction": {
+        "directory": FILTER_DIR,
+        "module": "compaction",
+        "budget_ratio": 1.15,
+        "deferred_modules": [
+            "async_db_cluster_postgresql_log_file_filter",
+            "log_file_watermark_store",
+            "log_file_batcher",
+        ],
+    },
+    "uploader": {
+        "directory": UPLOADER_DIR,
+        "module": "index",
+        "budget_ratio": 1.15,
+        "deferred_modules": [
+            "pyarrow",
+            "zstandard",
+            "log_file_compressor",
+            "log_entry_router",
+            "log_record_parquet_writer",
+            "slow_query_aggregator",
+            "log_file_indexer",
+            "log_token_indexer",
+            "log_stream_processor",
+            "log_file_tailer",
+            "transfer_planner",
+        ],
+    },
+}
+# 読み込み後のモジュール一覧を標準出力に出力するスクリプト
+_IMPORT_SCRIPT = (
+    "import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+)
+# 基準値のモジュール。全てのハンドラーがモジュールレベルで行う読み込みと初期化のみを行う
+_BASELINE_MODULE = "import_time_baseline"
+_BASELINE_SOURCE = """\
+import boto3
+from aws_lambda_powertools import Logger, Tracer, Metrics
+
+logger = Logger()
+tracer = Tracer()
+metrics = Metrics()
+"""
+
+
+def _parse_budgets(value: str) -> Dict[str, float]:
+    budgets = {}
+    for item in value.split(","):
+        name, budget_ratio = item.split("=", 1)
+        budgets[name] = float(budget_ratio)
+    return budgets
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure handler import time and fail when it exceeds the budget"
+    )
+    parser.add_argument(
+        "--handlers",
+        type=lambda value: value.split(","),
+        default=list(HANDLERS),
+        help=f"Comma separated handlers ({','.join(HANDLERS)})",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Fresh interpreters per handler (the fastest run is compared)",
+    )
+    parser.add_argument(
+        "--budget-ratio",
+        type=_parse_budgets,
+        default={},
+        help="Override budgets relative to the baseline (e.g. filter=1.2,uploader=1.3)",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Top-level packages to report"
+    )
+    parser.add_argument(
+        "--output", choices=["table", "json"], default="table", help="Output format"
+    )
+    args = parser.parse_args(argv)
+
+    unknown = (set(args.handlers) | set(args.budget_ratio)) - set(HANDLERS)
+    if unknown:
+        parser.error(f"Unknown handlers: {', '.join(sorted(unknown))}")
+    return args
+
+
+def _parse_importtime(stderr: str, module: str) -> Dict[str, Any]:
+    """-X importtime の出力からモジュールの累積時間とパッケージごとの自己時間を集計
+
+    出力は `import time: <self us> | <cumulative us> | <インデント><モジュール名>` の形式で、
+    インデントのないモジュールがスクリプトから直接読み込まれたものとなる
+    """
+    cumulative_us = None
+    packages: Counter = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, line_cumulative_us, name = line[len("import time:") :].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+        if name.rstrip() == f" {module}":
+            cumulative_us = int(line_cumulative_us)
+
+    if cumulative_us is None:
+        raise RuntimeError(f"Import time of {module} was not reported")
+    return {"cumulative_us": cumulative_us, "packages": packages}
+
+
+def _measure_module(module: str, directory: str, runs: int) -> Dict[str, Any]:
+    """新しいインタープリターでモジュールを読み込み、最も速い回の計測値を返す"""
+    env = {
+        **os.environ,
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "POWERTOOLS_LOG_LEVEL": "WARNING",
+        "PYTHONDONTWRITEBYTECODE": "1",
+        # デプロイ時と同じく、共通のモジュールをLambdaレイヤーとして読み込む
+        "PYTHONPATH": SHARED_DIR,
+    }
+
+    fastest = None
+    for _ in range(runs):
+        completed = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                _IMPORT_SCRIPT.format(module=module),
+            ],
+            cwd=directory,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Failed to import {module}: {completed.stderr[-2000:]}")
+        measured = _parse_importtime(completed.stderr, module)
+        measured["modules"] = json.loads(completed.stdout.splitlines()[-1])
+        if fastest is None or measured["cumulative_us"] < fastest["cumulative_us"]:
+            fastest = measured
+    return fastest
+
+
+def _measure_baseline(runs: int) -> float:
+    """boto3 と Powertools のみを読み込むモジュールの読み込み時間（ミリ秒）"""
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, f"{_BASELINE_MODULE}.py"), "w") as f:
+            f.write(_BASELINE_SOURCE)
+        measured = _measure_module(_BASELINE_MODULE, directory, runs)
+    return measured["cumulative_us"] / 1000
+
+
+def _evaluate(
+    name: str,
+    measured: Dict[str, Any],
+    baseline_ms: float,
+    budget_ratio: float,
+    top: int,
+) -> Dict[str, Any]:
+    """計測値を予算、遅延読み込みの対象と比較"""
+    import_ms = measured["cumulative_us"] / 1000
+    loaded_deferred = [
+        module
+        for module in HANDLERS[name]["deferred_modules"]
+        if module in measured["modules"]
+    ]
+    return {
+        "handler": name,
+        "import_ms": round(import_ms, 1),
+        "baseline_ms": round(baseline_ms, 1),
+        "ratio": round(import_ms / baseline_ms, 3),
+        "budget_ratio": budget_ratio,
+        "loaded_deferred_modules": loaded_deferred,
+        "top_packages_ms": {
+            package: round(self_us / 1000, 1)
+            for package, self_us in measured["packages"].most_common(top)
+        },
+        "passed": import_ms <= baseline_ms * budget_ratio and not loaded_deferred,
+    }
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    header = (
+        f"{'handler':<10}{'import ms':>11}{'baseline ms':>13}{'ratio':>8}"
+        f"{'budget':>8}  {'result':<8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['handler']:<10}{result['import_ms']:>11.1f}"
+            f"{result['baseline_ms']:>13.1f}{result['ratio']:>8.2f}"
+            f"{result['budget_ratio']:>8.2f}"
+            f"  {'ok' if result['passed'] else 'FAILED':<8}"
+        )
+        if result["loaded_deferred_modules"]:
+            print(
+                "  loaded at startup: " + ", ".join(result["loaded_deferred_modules"])
+            )
+        print(
+            "  "
+            + ", ".join(
+                f"{package} {ms:.1f}"
+                for package, ms in result["top_packages_ms"].items()
+            )
+        )
+
+
+def main(argv: List[str] = None) -> None:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+
+    # 実行環境の速さを反映するため、基準値はハンドラーと同じ実行の中で計測する
+    baseline_ms = _measure_baseline(args.runs)
+    results = [
+        _evaluate(
+            name,
+            _measure_module(
+                HANDLERS[name]["module"], HANDLERS[name]["directory"], args.runs
+            ),
+            baseline_ms,
+            args.budget_ratio.get(name, HANDLERS[name]["budget_ratio"]),
+            args.top,
+        )
+        for name in args.handlers
+    ]
+
+    if args.output == "json":
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+    failed = [result["handler"] for result in results if not result["passed"]]
+    if failed:
+        sys.exit(f"Import time budget exceeded: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""ベンチマーク用のPostgreSQLログファイルの生成
+
+RDS/Aurora PostgreSQL の log_line_prefix (%t:%r:%u@%d:[%p]:) 形式で、
+指定した比率のエントリーを含むログファイルを生成する
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+DEFAULT_LINE_MIX = {
+    "statement": 0.55,
+    "duration": 0.2,
+    "error": 0.05,
+    "connection": 0.1,
+    "audit": 0.05,
+    "checkpoint": 0.05,
+}
+
+_TABLES = ["users", "orders", "items", "payments", "sessions", "events"]
+
+
+def parse_line_mix(value: str) -> Dict[str, float]:
+    """ "statement=0.6,duration=0.2" 形式の文字列からエントリーの比率を生成"""
+    line_mix = {}
+    for item in value.split(","):
+        kind, _, ratio = item.partition("=")
+        if kind.strip() not in DEFAULT_LINE_MIX:
+            raise ValueError(
+                f"Line kind must be one of {', '.join(DEFAULT_LINE_MIX)}: {kind}"
+            )
+        line_mix[kind.strip()] = float(ratio)
+    return line_mix
+
+
+def _statement(rng: random.Random) -> str:
+    table = rng.choice(_TABLES)
+    sql = rng.choice(
+        [
+            f"SELECT * FROM {table} WHERE id = {rng.randint(1, 10**6)}",
+            f"UPDATE {table} SET updated_at = now(), value = '{rng.getrandbits(64):x}' "
+            f"WHERE id IN ({', '.join(str(rng.randint(1, 10**6)) for _ in range(5))})",
+            f"INSERT INTO {table} (id, payload) VALUES ({rng.randint(1, 10**6)}, "
+            f"'{rng.getrandbits(128):x}')",
+        ]
+    )
+    # 一部のSQL文は複数行とする
+    if rng.random() < 0.1:
+        sql += f"\n\tJOIN {rng.choice(_TABLES)} USING (id)\n\tORDER BY id\n\tLIMIT 100"
+    return sql
+
+
+def _message(kind: str, rng: random.Random, pid: int) -> str:
+    if kind == "statement":
+        return f"LOG:  statement: {_statement(rng)}"
+    if kind == "duration":
+        return (
+            f"LOG:  duration: {rng.expovariate(1 / 200):.3f} ms  "
+            f"execute S_{rng.randint(1, 20)}: {_statement(rng)}"
+        )
+    if kind == "error":
+        return (
+            f'ERROR:  relation "{rng.choice(_TABLES)}_tmp" does not exist at character 15\n'
+            f"{{prefix}}STATEMENT:  {_statement(rng)}"
+        )
+    if kind == "connection":
+        return rng.choice(
+            [
+                f"LOG:  connection received: host=10.0.{pid % 256}.1 port={pid}",
+                "LOG:  connection authorized: user=app database=appdb "
+                "application_name=benchmark SSL enabled",
+                "LOG:  disconnection: session time: 0:00:01.234 user=app database=appdb",
+            ]
+        )
+    if kind == "audit":
+        return (
+            f"LOG:  AUDIT: SESSION,{rng.randint(1, 1000)},1,READ,SELECT,,,"
+            f"{_statement(rng)},<not logged>"
+        )
+    return "LOG:  checkpoint complete: wrote 123 buffers (0.1%); 0 WAL file(s) added"
+
+
+def generate_log_file(
+    path: str,
+    size: int,
+    line_mix: Dict[str, float] = DEFAULT_LINE_MIX,
+    start_time: datetime = datetime(2024, 1, 1),
+    seed: int = 0,
+) -> int:
+    """ログファイルの生成
+
+    エントリーの時刻は1時間の範囲で単調に増加させる
+
+    Args:
+        path: 出力ファイルパス
+        size: 出力するおおよそのバイト数
+        line_mix: エントリーの種類ごとの比率
+        start_time: 最初のエントリーの時刻
+        seed: 乱数のシード
+
+    Returns:
+        int: 出力したバイト数
+    """
+    rng = random.Random(seed)
+    kinds = list(line_mix)
+    weights = [line_mix[kind] for kind in kinds]
+    # 1エントリーあたり約150バイトとして時刻の増分を決める
+    step = timedelta(seconds=3600 / max(size // 150, 1))
+
+    written = 0
+    entry_time = start_time
+    with open(path, "w", buffering=8 * 1024 * 1024) as f:
+        while written < size:
+            lines = []
+            for kind in rng.choices(kinds, weights, k=1000):
+                pid = rng.randint(1000, 1100)
+                prefix = (
+                    f"{entry_time:%Y-%m-%d %H:%M:%S} UTC:10.0.{pid % 256}.1({pid}):"
+                    f"app@appdb:[{pid}]:"
+                )
+                lines.append(
+                    prefix + _message(kind, rng, pid).replace("{prefix}", prefix)
+                )
+                entry_time = min(entry_time + step, start_time + timedelta(hours=1))
+            chunk = "\n".join(lines) + "\n"
+            f.write(chunk)
+            written += len(chunk.encode())
+
+    return written
@@ -0,0 +1,155 @@
+"""RDS downloadCompleteLogFile エンドポイントのエミュレーター
+
+GET /v13/downloadCompleteLogFile/<instance>/<log file> に対して登録したファイルを返す。
+帯域、応答までの遅延、途中での切断、Range ヘッダーの無視を設定できる
+"""
+
+import os
+import time
+import socket
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DOWNLOAD_PATH_PREFIX = "/v13/downloadCompleteLogFile/"
+SEND_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class RdsDownloadEmulatorConfig:
+    """RdsDownloadEmulator の設定値を管理するデータクラス"""
+
+    bandwidth: int = 0  # bytes per second, 0 = unlimited
+    latency: float = 0.0  # seconds before the response headers
+    truncate_after: int = 0  # bytes sent before dropping the connection
+    truncate_count: int = 0  # number of responses to truncate
+    ignore_range: bool = False  # always answer 200 with the whole file
+
+
+class RdsDownloadEmulator:
+    """downloadCompleteLogFile のエミュレーター
+
+    Example:
+        >>> emulator = RdsDownloadEmulator(RdsDownloadEmulatorConfig(bandwidth=50 * 1024**2))
+        >>> emulator.add_log_file("db-instance-1", "postgresql.log.2024-01-01-0000", "/tmp/log")
+        >>> emulator.start()
+        >>> os.environ["AWS_ENDPOINT_URL_RDS"] = emulator.endpoint_url
+    """
+
+    def __init__(self, config: RdsDownloadEmulatorConfig, port: int = 0):
+        self.config = config
+        self.log_files: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.sent_bytes = 0
+        self.truncated_count = 0
+
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-Alive でコネクションを再利用できるようにする
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                emulator._handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_log_file(
+        self, db_instance_identifier: str, log_file_name: str, path: str
+    ) -> None:
+        """返却するログファイルの登録"""
+        self.log_files[f"{db_instance_identifier}/{log_file_name}"] = path
+
+    def reset_counters(self) -> Dict[str, int]:
+        """カウンターの取得とリセット"""
+        with self.lock:
+            counters = {
+                "download_requests": self.request_count,
+                "download_sent_bytes": self.sent_bytes,
+                "download_truncated": self.truncated_count,
+            }
+            self.request_count = self.sent_bytes = self.truncated_count = 0
+        return counters
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self.lock:
+            self.request_count += 1
+            truncate = self.truncated_count < self.config.truncate_count
+            if truncate:
+                self.truncated_count += 1
+
+        path = self.log_files.get(handler.path[len(DOWNLOAD_PATH_PREFIX) :])
+        if not handler.path.startswith(DOWNLOAD_PATH_PREFIX) or path is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        size = os.path.getsize(path)
+        offset = 0
+        range_header = handler.headers.get("Range")
+        if range_header and not self.config.ignore_range:
+            offset = min(int(range_header.split("=")[1].split("-")[0]), size)
+
+        if self.config.latency:
+            time.sleep(self.config.latency)
+
+        handler.send_response(206 if offset else 200)
+        handler.send_header("Content-Type", "text/plain")
+        handler.send_header("Content-Length", str(size - offset))
+        if offset:
+            handler.send_header("Content-Range", f"bytes {offset}-{size - 1}/{size}")
+        handler.end_headers()
+
+        limit = self.config.truncate_after if truncate else size
+        sent = 0
+        started = time.monotonic()
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while sent < limit:
+                    chunk = f.read(min(SEND_CHUNK_SIZE, limit - sent))
+                    if not chunk:
+                        break
+                    handler.wfile.write(chunk)
+                    sent += len(chunk)
+                    # 帯域を超えないように送信を待機
+                    if self.config.bandwidth:
+                        wait = sent / self.config.bandwidth - (
+                            time.monotonic() - started
+                        )
+                        if wait > 0:
+                            time.sleep(wait)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.lock:
+                self.sent_bytes += sent
+
+        if truncate:
+            # Content-Length に満たないまま切断する
+            handler.close_connection = True
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,334 @@
+"""ダウンロード、圧縮、アップロードのスループットのローカルベンチマーク
+
+S3は moto のサーバーモード、RDS の downloadCompleteLogFile はエミュレーターで代替し、
+AWSに接続せずにステージごとの処理時間、スループット、最大RSS、一時ディスク使用量、
+API呼び出し回数を計測する。ステージは最大RSSを分けて計測するため、それぞれ子プロセスで実行する。
+
+ステージ:
+    - download: RdsLogFileDownloader による一時ファイルへのダウンロード
+    - compress: LogFileCompressor によるローカルファイルの圧縮
+    - upload: RdsFileLogUploader による一時ファイルのアップロード
+    - pipeline_temp_file: 一時ファイルを経由したダウンロードからアップロードまで
+    - pipeline_stream: ストリーミングでのダウンロードからアップロードまで
+    - filter: クラスター全体のログファイルのフィルタリング
+
+Example:
+    $ uv run --with "moto[server]" --with zstandard \\
+        python -m benchmark.run_benchmark --size-mb 256 --bandwidth-mbps 100 \\
+        --truncate-after-mb 64 --truncate-count 1 --compression-codec zstd
+
+    トークンインデックスなど raw 以外のオブジェクトのサイズは --enable-token-index を指定して計測する
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List
+
+import boto3
+from moto.server import ThreadedMotoServer
+
+from benchmark.log_generator import DEFAULT_LINE_MIX, generate_log_file, parse_line_mix
+from benchmark.rds_download_emulator import (
+    RdsDownloadEmulator,
+    RdsDownloadEmulatorConfig,
+)
+
+STAGES = [
+    "download",
+    "compress",
+    "upload",
+    "pipeline_temp_file",
+    "pipeline_stream",
+    "filter",
+]
+# RDS の downloadCompleteLogFile を呼び出すステージ
+DOWNLOAD_STAGES = {"download", "pipeline_temp_file", "pipeline_stream"}
+BUCKET = "benchmark-log-bucket"
+REGION = "us-east-1"
+DB_INSTANCE_IDENTIFIER = "benchmark-instance-1"
+LOG_FILE_NAME = "error/postgresql.log.2024-01-01-0000"
+
+_COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark download, compress and upload throughput locally"
+    )
+    parser.add_argument("--size-mb", type=int, default=64, help="Log file size (MiB)")
+    parser.add_argument(
+        "--line-mix",
+        type=parse_line_mix,
+        default=DEFAULT_LINE_MIX,
+        help="Ratio of log entry kinds (e.g. statement=0.6,duration=0.3,error=0.1)",
+    )
+    parser.add_argument(
+        "--bandwidth-mbps",
+        type=float,
+        default=0,
+        help="Download bandwidth (Mbit/s, 0 = unlimited)",
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0, help="Download response latency (ms)"
+    )
+    parser.add_argument(
+        "--truncate-after-mb",
+        type=float,
+        default=0,
+        help="Drop the download connection after this many MiB",
+    )
+    parser.add_argument(
+        "--truncate-count",
+        type=int,
+        default=0,
+        help="Number of download responses to truncate",
+    )
+    parser.add_argument(
+        "--ignore-range",
+        action="store_true",
+        help="Ignore Range headers on resumed downloads",
+    )
+    parser.add_argument(
+        "--compression-codec",
+        choices=list(_COMPRESSION_EXTENSIONS),
+        default="gzip",
+        help="Compression codec for the upload stages",
+    )
+    parser.add_argument(
+        "--enable-token-index",
+        action="store_true",
+        help="Write the token index and report its size in the upload stages",
+    )
+    parser.add_argument(
+        "--token-index-false-positive-rate",
+        type=float,
+        default=None,
+        help="TOKEN_INDEX_FALSE_POSITIVE_RATE passed to the stages",
+    )
+    parser.add_argument(
+        "--token-index-max-block-bits",
+        type=int,
+        default=None,
+        help="TOKEN_INDEX_MAX_BLOCK_BITS passed to the stages",
+    )
+    parser.add_argument(
+        "--stages",
+        type=lambda value: value.split(","),
+        default=STAGES,
+        help=f"Comma separated stages to run ({','.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--filter-instances",
+        type=int,
+        default=4,
+        help="DB instances in the filter stage cluster",
+    )
+    parser.add_argument(
+        "--filter-log-files",
+        type=int,
+        default=72,
+        help="Log files per DB instance in the filter stage",
+    )
+    parser.add_argument(
+        "--rds-api-latency-ms",
+        type=float,
+        default=50,
+        help="Latency of the stubbed DescribeDBLogFiles (ms)",
+    )
+    parser.add_argument(
+        "--memory-mb",
+        type=int,
+        default=1024,
+        help="AWS_LAMBDA_FUNCTION_MEMORY_SIZE passed to the stages",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--output", choices=["table", "json"], default="table", help="Output format"
+    )
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    return args
+
+
+def _run_stage(
+    stage: str, spec: Dict[str, Any], env: Dict[str, str], work_dir: str
+) -> Dict[str, Any]:
+    """子プロセスで1ステージを実行"""
+    tmp_dir = os.path.join(work_dir, f"tmp-{stage}")
+    os.makedirs(tmp_dir)
+
+    try:
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmark.stage_runner"],
+            input=json.dumps({**spec, "stage": stage}),
+            env={**env, "TMPDIR": tmp_dir},
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            capture_output=True,
+            text=True,
+        )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Stage {stage} failed:\n{process.stderr}")
+
+    lines = process.stdout.strip().splitlines()
+    result = json.loads(lines[-1])
+    # Lambda関数が出力したEMFのメトリクス
+    result["emf_metrics"] = [
+        {
+            name: value
+            for name, value in record.items()
+            if name != "_aws" and name != "service"
+        }
+        for record in map(json.loads, filter(lambda line: '"_aws"' in line, lines))
+    ]
+    return result
+
+
+def _print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    header = (
+        f"{'stage':<20}{'seconds':>10}{'MB/s':>10}{'peak RSS MB':>14}"
+        f"{'peak tmp MB':>14}  api calls"
+    )
+    print(header)
+    print("-" * len(header))
+    for stage, result in results.items():
+        api_calls = ", ".join(
+            f"{name}={count}" for name, count in sorted(result["api_calls"].items())
+        )
+        print(
+            f"{stage:<20}{result['seconds']:>10.2f}{result['mb_per_s']:>10.1f}"
+            f"{result['peak_rss_mb']:>14.1f}{result['peak_temp_disk_mb']:>14.1f}"
+            f"  {api_calls}"
+        )
+
+    # raw 以外に出力したオブジェクトのサイズ (ログファイルのサイズに対する比率)
+    for stage, result in results.items():
+        if result.get("derived_object_bytes"):
+            sizes = ", ".join(
+                f"{segment}={size / 1024:.1f}KiB ({size / result['bytes'] * 100:.2f}%)"
+                for segment, size in sorted(result["derived_object_bytes"].items())
+            )
+            print(f"{stage:<20}{sizes}")
+
+
+def main(argv: List[str] = None) -> None:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+
+    # moto サーバーのアクセスログを出力しない
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    work_dir = tempfile.mkdtemp(prefix="log-archive-benchmark-")
+    moto_server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    emulator = RdsDownloadEmulator(
+        RdsDownloadEmulatorConfig(
+            bandwidth=int(args.bandwidth_mbps * 1000**2 / 8),
+            latency=args.latency_ms / 1000,
+            truncate_after=int(args.truncate_after_mb * 1024**2),
+            truncate_count=args.truncate_count,
+            ignore_range=args.ignore_range,
+        )
+    )
+
+    try:
+        log_path = os.path.join(work_dir, "postgresql.log")
+        size = generate_log_file(
+            log_path, args.size_mb * 1024**2, args.line_mix, seed=args.seed
+        )
+        emulator.add_log_file(DB_INSTANCE_IDENTIFIER, LOG_FILE_NAME, log_path)
+
+        moto_server.start()
+        emulator.start()
+        host, port = moto_server.get_host_and_port()
+        s3_endpoint_url = f"http://{host}:{port}"
+
+        env = {
+            **os.environ,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+            "AWS_DEFAULT_REGION": REGION,
+            "AWS_REGION": REGION,
+            "AWS_ENDPOINT_URL_S3": s3_endpoint_url,
+            "AWS_LAMBDA_FUNCTION_MEMORY_SIZE": str(args.memory_mb),
+            "POWERTOOLS_LOG_LEVEL": "WARNING",
+            "POWERTOOLS_METRICS_NAMESPACE": "Benchmark",
+            "POWERTOOLS_TRACE_DISABLED": "true",
+            "ENABLE_COMPRESSION": str(args.compression_codec != "none").lower(),
+            "ENABLE_STAGE_METRICS": "true",
+        }
+        if args.compression_codec != "none":
+            env["COMPRESSION_CODEC"] = args.compression_codec
+        if args.enable_token_index:
+            env["ENABLE_TOKEN_INDEX"] = "true"
+        if args.token_index_false_positive_rate is not None:
+            env["TOKEN_INDEX_FALSE_POSITIVE_RATE"] = str(
+                args.token_index_false_positive_rate
+            )
+        if args.token_index_max_block_bits is not None:
+            env["TOKEN_INDEX_MAX_BLOCK_BITS"] = str(args.token_index_max_block_bits)
+
+        boto3.client(
+            "s3",
+            endpoint_url=s3_endpoint_url,
+            region_name=REGION,
+            aws_access_key_id="benchmark",
+            aws_secret_access_key="benchmark",
+        ).create_bucket(Bucket=BUCKET)
+
+        spec = {
+            "bucket": BUCKET,
+            "db_instance_identifier": DB_INSTANCE_IDENTIFIER,
+            "log_file_name": LOG_FILE_NAME,
+            "log_path": log_path,
+            "size": size,
+            "extension": _COMPRESSION_EXTENSIONS[args.compression_codec],
+            "filter_instances": args.filter_instances,
+            "filter_log_files": args.filter_log_files,
+            "rds_api_latency": args.rds_api_latency_ms / 1000,
+        }
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for stage in [stage for stage in STAGES if stage in args.stages]:
+            stage_env = {**env, "AWS_ENDPOINT_URL_RDS": emulator.endpoint_url}
+            if stage == "upload":
+                # アップロード単体の計測のため圧縮しない
+                stage_env["ENABLE_COMPRESSION"] = "false"
+            if stage == "pipeline_stream":
+                stage_env["ENABLE_STREAMING"] = "true"
+
+            emulator.reset_counters()
+            stage_spec = {**spec}
+            if stage == "upload":
+                stage_spec["extension"] = ""
+            result = _run_stage(stage, stage_spec, stage_env, work_dir)
+            if stage in DOWNLOAD_STAGES:
+                counters = emulator.reset_counters()
+                result.update(counters)
+                result["api_calls"]["rds:downloadCompleteLogFile"] = counters[
+                    "download_requests"
+                ]
+            results[stage] = result
+
+        if args.output == "json":
+            print(json.dumps(results, indent=2))
+        else:
+            _print_table(results)
+
+    finally:
+        emulator.stop()
+        moto_server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
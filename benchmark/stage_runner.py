@@ -0,0 +1,334 @@
+"""ベンチマークの1ステージの実行
+
+run_benchmark.py から子プロセスとして起動し、標準入力で受け取った設定でステージを実行する。
+最大RSSをステージごとに計測するため、ステージごとにプロセスを分ける。
+結果は標準出力の最終行にJSONで出力する
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "lib", "src", "lambda")
+UPLOADER_DIR = os.path.join(LAMBDA_DIR, "rds_log_file_uploader")
+FILTER_DIR = os.path.join(LAMBDA_DIR, "db_cluster_postgresql_log_file_filter")
+# Lambda関数で共通のモジュール。デプロイ時はLambdaレイヤーとして追加される
+SHARED_DIR = os.path.join(LAMBDA_DIR, "shared", "python")
+RDS_STUB_HANDLER_ID = "benchmark-rds-stub"
+
+
+class TempDiskMonitor:
+    """一時ディレクトリの使用量の最大値を定期的に計測するクラス"""
+
+    def __init__(self, path: str, interval: float = 0.02):
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _usage(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._usage())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "TempDiskMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._usage())
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _count_api_calls(session, api_calls: Counter) -> None:
+    """セッションから作成する全クライアントのAPI呼び出し回数を記録
+
+    スタブが応答した呼び出しも数えるため after-call で記録する（リトライは含まない）
+    """
+
+    def count(model, **kwargs):
+        api_calls[f"{model.service_model.service_name}:{model.name}"] += 1
+
+    session.events.register("after-call", count)
+
+
+def _log_file_event(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "DbInstanceIdentifier": spec["db_instance_identifier"],
+        "LogFileName": spec["log_file_name"],
+        "LogDestinationBucket": spec["bucket"],
+        "LastWritten": 1704070800000,
+        "Size": spec["size"],
+        "ObjectKey": (
+            f"benchmark/{spec['db_instance_identifier']}/raw/2024/01/01/00/"
+            f"{spec['log_file_name']}{spec.get('extension', '')}"
+        ),
+    }
+
+
+def run_download(spec: Dict[str, Any], tmp_dir: str) -> Dict[str, Any]:
+    from rds_log_file_downloader import RdsLogFileDownloader, RdsLogDownLoaderConfig
+
+    downloader = RdsLogFileDownloader(
+        RdsLogDownLoaderConfig(spec["db_instance_identifier"], spec["log_file_name"])
+    )
+    output_path = os.path.join(tmp_dir, "download.log")
+    if not downloader.download_log_file(output_path, delay=0):
+        raise RuntimeError("Download failed")
+    return {
+        "bytes": os.path.getsize(output_path),
+        "refetched_bytes": downloader.refetched_size,
+    }
+
+
+def run_compress(spec: Dict[str, Any], tmp_dir: str) -> Dict[str, Any]:
+    from log_file_compressor import LogFileCompressor, LogFileCompressorConfig
+
+    compressor = LogFileCompressor(LogFileCompressorConfig.from_environ())
+    output_path = os.path.join(tmp_dir, "compressed")
+    with open(spec["log_path"], "rb") as f_in, open(output_path, "wb") as f_out:
+        for block in compressor.compress(iter(lambda: f_in.read(8 * 1024**2), b"")):
+            f_out.write(block)
+
+    return {
+        "bytes": spec["size"],
+        "compression_ratio": round(os.path.getsize(output_path) / spec["size"], 4),
+    }
+
+
+def run_upload(spec: Dict[str, Any], tmp_dir: str) -> Dict[str, Any]:
+    from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+
+    log_file = _log_file_event(spec)
+    file_path = os.path.join(tmp_dir, "upload.log")
+    shutil.copyfile(spec["log_path"], file_path)
+
+    uploader = RdsFileLogUploader(
+        RdsFileLogUploaderConfig(
+            db_instance_identifier=log_file["DbInstanceIdentifier"],
+            log_destination_bucket=log_file["LogDestinationBucket"],
+            last_written=log_file["LastWritten"],
+            object_key=log_file["ObjectKey"],
+        )
+    )
+    if not uploader.upload_log_file(file_path):
+        raise RuntimeError("Upload failed")
+    return {"bytes": spec["size"]}
+
+
+def run_pipeline(spec: Dict[str, Any], tmp_dir: str) -> Dict[str, Any]:
+    import index
+
+    index._process_log_file(_log_file_event(spec))
+    return {"bytes": spec["size"]}
+
+
+def _stub_rds_api(rds_client, spec: Dict[str, Any]) -> None:
+    """DBクラスター、ログファイル一覧のRDS APIを合成データで応答する"""
+    from botocore.awsrequest import AWSResponse
+
+    instances = [f"benchmark-instance-{i}" for i in range(spec["filter_instances"])]
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    log_files = [
+        {
+            "LogFileName": f"error/postgresql.log.{now - timedelta(hours=i):%Y-%m-%d-%H%M}",
+            "LastWritten": int((now - timedelta(hours=i - 1)).timestamp() * 1000),
+            "Size": 10 * 1024**2,
+        }
+        for i in range(spec["filter_log_files"])
+    ]
+    page_size = 100
+
+    # before-call の params はシリアライズ済みのリクエスト (Query プロトコル)
+    def describe_db_clusters(params):
+        return {
+            "DBClusters": [
+                {
+                    "DBClusterIdentifier": params["DBClusterIdentifier"],
+                    "DBClusterMembers": [
+                        {"DBInstanceIdentifier": instance} for instance in instances
+                    ],
+                }
+            ]
+        }
+
+    def describe_db_log_files(params):
+        time.sleep(spec["rds_api_latency"])
+        threshold = int(params.get("FileLastWritten", 0))
+        files = [f for f in log_files if f["LastWritten"] >= threshold]
+        start = int(params.get("Marker") or 0)
+        response = {"DescribeDBLogFiles": files[start : start + page_size]}
+        if start + page_size < len(files):
+            response["Marker"] = str(start + page_size)
+        return response
+
+    operations = {
+        "DescribeDBClusters": describe_db_clusters,
+        "DescribeDBLogFiles": describe_db_log_files,
+    }
+
+    def stub(model, params, **kwargs):
+        operation = operations.get(model.name)
+        if operation:
+            return AWSResponse(None, 200, {}, None), operation(params["body"])
+
+    # 操作名を含むイベントのハンドラーはレート制限より先に呼ばれるため、同じ階層の最後に登録する
+    rds_client.meta.events.unregister("before-call.rds", unique_id=RDS_STUB_HANDLER_ID)
+    rds_client.meta.events.register_last(
+        "before-call.rds", stub, unique_id=RDS_STUB_HANDLER_ID
+    )
+
+
+def _create_log_filter(spec: Dict[str, Any]):
+    from aws_clients import get_client
+    from db_cluster_postgresql_log_file_filter import (
+        DbClusterPostgreSqlLogFileFilter,
+        LogFileFilterConfig,
+    )
+
+    _stub_rds_api(get_client("rds"), spec)
+    return DbClusterPostgreSqlLogFileFilter(
+        LogFileFilterConfig(
+            db_cluster_identifier="benchmark",
+            log_destination_bucket=spec["bucket"],
+            log_range_minutes=spec["filter_log_files"] * 60,
+        )
+    )
+
+
+def prepare_filter(spec: Dict[str, Any]) -> None:
+    """ログファイルの半数をアーカイブ済みとしてS3に配置"""
+    from aws_clients import get_client
+
+    log_filter = _create_log_filter(spec)
+    s3_client = get_client("s3")
+    for db_instance in log_filter._get_db_instances():
+        for log_file in log_filter._get_log_file_info_list(db_instance)[::2]:
+            s3_client.put_object(
+                Bucket=spec["bucket"],
+                Key=log_filter._generate_object_key(
+                    db_instance, log_file["LogFileName"]
+                ),
+                Body=b"",
+            )
+
+
+def run_filter(spec: Dict[str, Any], tmp_dir: str) -> Dict[str, Any]:
+    log_files = _create_log_filter(spec).filter_cluster_log_files()
+    return {"bytes": 0, "log_files": len(log_files)}
+
+
+def _object_prefix(spec: Dict[str, Any]) -> str:
+    return f"benchmark/{spec['db_instance_identifier']}/"
+
+
+def prepare_upload(spec: Dict[str, Any]) -> None:
+    """前のステージが出力したオブジェクトを削除し、ステージごとに出力サイズを計測できるようにする"""
+    from aws_clients import get_client
+
+    s3_client = get_client("s3")
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=spec["bucket"], Prefix=_object_prefix(spec)):
+        objects = [{"Key": content["Key"]} for content in page.get("Contents", [])]
+        if objects:
+            s3_client.delete_objects(
+                Bucket=spec["bucket"], Delete={"Objects": objects, "Quiet": True}
+            )
+
+
+def _derived_object_sizes(spec: Dict[str, Any]) -> Dict[str, int]:
+    """raw 以外に出力したオブジェクト (トークンインデックス、チェックサムなど) のセグメントごとのサイズ"""
+    from aws_clients import get_client
+
+    prefix = _object_prefix(spec)
+    sizes: Counter = Counter()
+    paginator = get_client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=spec["bucket"], Prefix=prefix):
+        for content in page.get("Contents", []):
+            segment = content["Key"][len(prefix) :].split("/", 1)[0]
+            if segment != "raw":
+                sizes[segment] += content["Size"]
+    return dict(sizes)
+
+
+STAGES: Dict[str, Callable[[Dict[str, Any], str], Dict[str, Any]]] = {
+    "download": run_download,
+    "compress": run_compress,
+    "upload": run_upload,
+    "pipeline_temp_file": run_pipeline,
+    "pipeline_stream": run_pipeline,
+    "filter": run_filter,
+}
+# 計測対象外の事前準備
+PREPARES: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    "upload": prepare_upload,
+    "pipeline_temp_file": prepare_upload,
+    "pipeline_stream": prepare_upload,
+    "filter": prepare_filter,
+}
+
+
+def main() -> None:
+    spec = json.load(sys.stdin)
+    sys.path[:0] = [
+        FILTER_DIR if spec["stage"] == "filter" else UPLOADER_DIR,
+        SHARED_DIR,
+    ]
+
+    from aws_clients import get_session
+
+    api_calls: Counter = Counter()
+    _count_api_calls(get_session(), api_calls)
+
+    if spec["stage"] in PREPARES:
+        PREPARES[spec["stage"]](spec)
+        api_calls.clear()
+
+    tmp_dir = os.environ["TMPDIR"]
+    baseline_rss = _peak_rss_mb()
+
+    with TempDiskMonitor(tmp_dir) as monitor:
+        started = time.perf_counter()
+        result = STAGES[spec["stage"]](spec, tmp_dir)
+        seconds = time.perf_counter() - started
+
+    result.update(
+        {
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(result["bytes"] / 1024**2 / seconds, 2),
+            "baseline_rss_mb": round(baseline_rss, 1),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "peak_temp_disk_mb": round(monitor.peak / 1024**2, 1),
+            "api_calls": dict(api_calls),
+        }
+    )
+    if spec["stage"] in PREPARES and spec["stage"] != "filter":
+        result["derived_object_bytes"] = _derived_object_sizes(spec)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
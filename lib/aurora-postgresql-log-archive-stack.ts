@@ -40,6 +40,7 @@ export class AuroraPostgresqlLogArchiveStack extends cdk.Stack {
         ...props.logDestinationProperty,
         ...props.schedulerProperty,
         stateMachine: workflowConstruct.stateMachine,
+        compactionFunction: lambdaConstruct.dbClusterPostgreSqlLogFileCompaction,
       }
     );
   }
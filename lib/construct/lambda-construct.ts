@@ -12,10 +12,23 @@ export interface LambdaConstructProps
 export class LambdaConstruct extends BaseConstruct {
   readonly dbClusterPostgreSqlLogFileFilter: cdk.aws_lambda.IFunction;
   readonly rdsLogFileUploader: cdk.aws_lambda.IFunction;
+  readonly dbClusterPostgreSqlLogFileBackfill?: cdk.aws_lambda.IFunction;
+  readonly dbClusterPostgreSqlLogFileCompaction?: cdk.aws_lambda.IFunction;
 
   constructor(scope: Construct, id: string, props: LambdaConstructProps) {
     super(scope, id, props);
 
+    // zstd の圧縮には zstandard が必要だが、Lambdaのランタイムには含まれないためレイヤーで追加する
+    if (
+      props.enableCompression === "true" &&
+      props.compressionCodec === "zstd" &&
+      !props.uploaderLayerArns?.length
+    ) {
+      throw new Error(
+        'compressionCodec "zstd" requires a Lambda layer with the zstandard module in uploaderLayerArns'
+      );
+    }
+
     // IAM Policy
     const policy = new cdk.aws_iam.Policy(this, "Policy", {
       statements: [
@@ -40,7 +53,11 @@ export class LambdaConstruct extends BaseConstruct {
               cdk.Stack.of(this).account
             }:db:*`,
           ],
-          actions: ["rds:DescribeDBLogFiles", "rds:DownloadCompleteDBLogFile"],
+          actions: [
+            "rds:DescribeDBLogFiles",
+            "rds:DownloadCompleteDBLogFile",
+            "rds:DownloadDBLogFilePortion",
+          ],
         }),
         new cdk.aws_iam.PolicyStatement({
           effect: cdk.aws_iam.Effect.ALLOW,
@@ -48,7 +65,13 @@ export class LambdaConstruct extends BaseConstruct {
             `arn:aws:s3:::${props.bucketName}`,
             `arn:aws:s3:::${props.bucketName}/*`,
           ],
-          actions: ["s3:ListBucket", "s3:GetObject", "s3:PutObject"],
+          actions: [
+            "s3:ListBucket",
+            "s3:GetObject",
+            "s3:PutObject",
+            "s3:DeleteObject",
+            "s3:AbortMultipartUpload",
+          ],
         }),
       ],
     });
@@ -74,7 +97,37 @@ export class LambdaConstruct extends BaseConstruct {
         }:017000801446:layer:AWSLambdaPowertoolsPythonV3-python313-arm64:4`
       );
 
+    // 各Lambda関数で共通のモジュール (aws_clients, stage_metrics)
+    const sharedLayer = new cdk.aws_lambda.LayerVersion(this, "SharedLayer", {
+      code: cdk.aws_lambda.Code.fromAsset(
+        path.join(__dirname, "../src/lambda/shared")
+      ),
+      compatibleRuntimes: [cdk.aws_lambda.Runtime.PYTHON_3_13],
+      compatibleArchitectures: [cdk.aws_lambda.Architecture.ARM_64],
+    });
+
     // Lambda Function
+    // フィルター処理、バックフィル、コンパクションで共通の環境変数
+    const filterEnvironment = {
+      POWERTOOLS_LOG_LEVEL: props.powertoolsLogLevel || "INFO",
+      POWERTOOLS_SERVICE_NAME: "db-cluster-postgresql-log_file-filter",
+      POWERTOOLS_METRICS_NAMESPACE: "AuroraPostgreSqlLogArchive",
+      ENABLE_COMPRESSION: props.enableCompression || "false",
+      COMPRESSION_CODEC: props.compressionCodec || "gzip",
+      ENABLE_WATERMARK: props.enableWatermark || "false",
+      FILTER_MAX_WORKERS: String(props.filterMaxWorkers || 4),
+      ENABLE_ASYNC_FILTER: props.enableAsyncFilter || "false",
+      FILTER_MAX_CONCURRENCY: String(props.filterMaxConcurrency || 32),
+      RDS_API_RATE_LIMIT: String(props.rdsApiRateLimit || 10),
+      FILTER_MAX_CLUSTER_WORKERS: String(props.filterMaxClusterWorkers || 4),
+      UPLOAD_BATCH_TARGET_BYTES: String(
+        props.uploadBatchTargetSize?.toBytes() || 0
+      ),
+      ENABLE_STAGE_METRICS: props.enableStageMetrics || "false",
+      ENABLE_TAIL_MODE: props.enableTailMode || "false",
+      ENABLE_COMPACTION: props.enableCompaction || "false",
+    };
+
     const dbClusterPostgreSqlLogFileFilter = new cdk.aws_lambda.Function(
       this,
       "DbClusterPostgreSqlLogFileFilter",
@@ -89,23 +142,103 @@ export class LambdaConstruct extends BaseConstruct {
         ),
         role,
         architecture: cdk.aws_lambda.Architecture.ARM_64,
-        timeout: cdk.Duration.seconds(30),
+        timeout: props.filterTimeout || cdk.Duration.seconds(30),
         tracing: cdk.aws_lambda.Tracing.ACTIVE,
         logRetention: cdk.aws_logs.RetentionDays.ONE_YEAR,
         loggingFormat: cdk.aws_lambda.LoggingFormat.JSON,
         applicationLogLevelV2: props.functionApplicationLogLevel,
         systemLogLevelV2: props.functionSystemLogLevel,
-        layers: [lambdaPowertoolsLayer],
-        environment: {
-          POWERTOOLS_LOG_LEVEL: props.powertoolsLogLevel || "INFO",
-          POWERTOOLS_SERVICE_NAME: "db-cluster-postgresql-log_file-filter",
-          ENABLE_COMPRESSION: props.enableCompression || "false",
-        },
+        layers: [lambdaPowertoolsLayer, sharedLayer],
+        environment: filterEnvironment,
       }
     );
     role.node.tryRemoveChild("DefaultPolicy");
     this.dbClusterPostgreSqlLogFileFilter = dbClusterPostgreSqlLogFileFilter;
 
+    // 保持期間内の全てのログファイルを列挙し、Distributed Map のシャードの一覧を作成する
+    if (props.enableBackfill === "true") {
+      const dbClusterPostgreSqlLogFileBackfill = new cdk.aws_lambda.Function(
+        this,
+        "DbClusterPostgreSqlLogFileBackfill",
+        {
+          runtime: cdk.aws_lambda.Runtime.PYTHON_3_13,
+          handler: "backfill.lambda_handler",
+          code: cdk.aws_lambda.Code.fromAsset(
+            path.join(
+              __dirname,
+              "../src/lambda/db_cluster_postgresql_log_file_filter"
+            )
+          ),
+          role,
+          architecture: cdk.aws_lambda.Architecture.ARM_64,
+          timeout: props.backfillTimeout || cdk.Duration.minutes(5),
+          tracing: cdk.aws_lambda.Tracing.ACTIVE,
+          logRetention: cdk.aws_logs.RetentionDays.ONE_YEAR,
+          loggingFormat: cdk.aws_lambda.LoggingFormat.JSON,
+          applicationLogLevelV2: props.functionApplicationLogLevel,
+          systemLogLevelV2: props.functionSystemLogLevel,
+          layers: [lambdaPowertoolsLayer, sharedLayer],
+          environment: {
+            ...filterEnvironment,
+            POWERTOOLS_SERVICE_NAME: "db-cluster-postgresql-log_file-backfill",
+            ...(props.backfillShardTargetSize !== undefined
+              ? {
+                  BACKFILL_SHARD_TARGET_BYTES: String(
+                    props.backfillShardTargetSize.toBytes()
+                  ),
+                }
+              : {}),
+            BACKFILL_MAX_CONCURRENCY: String(props.backfillMaxConcurrency || 50),
+          },
+        }
+      );
+      role.node.tryRemoveChild("DefaultPolicy");
+      this.dbClusterPostgreSqlLogFileBackfill = dbClusterPostgreSqlLogFileBackfill;
+    }
+
+    // 前日以前の時間単位のログファイルを日単位のオブジェクトに結合する
+    if (props.enableCompaction === "true") {
+      const dbClusterPostgreSqlLogFileCompaction = new cdk.aws_lambda.Function(
+        this,
+        "DbClusterPostgreSqlLogFileCompaction",
+        {
+          runtime: cdk.aws_lambda.Runtime.PYTHON_3_13,
+          handler: "compaction.lambda_handler",
+          code: cdk.aws_lambda.Code.fromAsset(
+            path.join(
+              __dirname,
+              "../src/lambda/db_cluster_postgresql_log_file_filter"
+            )
+          ),
+          role,
+          architecture: cdk.aws_lambda.Architecture.ARM_64,
+          memorySize: 256,
+          timeout: props.compactionTimeout || cdk.Duration.minutes(15),
+          tracing: cdk.aws_lambda.Tracing.ACTIVE,
+          logRetention: cdk.aws_logs.RetentionDays.ONE_YEAR,
+          loggingFormat: cdk.aws_lambda.LoggingFormat.JSON,
+          applicationLogLevelV2: props.functionApplicationLogLevel,
+          systemLogLevelV2: props.functionSystemLogLevel,
+          layers: [lambdaPowertoolsLayer, sharedLayer],
+          environment: {
+            ...filterEnvironment,
+            POWERTOOLS_SERVICE_NAME: "db-cluster-postgresql-log_file-compaction",
+            ...(props.compactionMinAgeDays !== undefined
+              ? { COMPACTION_MIN_AGE_DAYS: String(props.compactionMinAgeDays) }
+              : {}),
+            ...(props.compactionLookbackDays !== undefined
+              ? {
+                  COMPACTION_LOOKBACK_DAYS: String(props.compactionLookbackDays),
+                }
+              : {}),
+          },
+        }
+      );
+      role.node.tryRemoveChild("DefaultPolicy");
+      this.dbClusterPostgreSqlLogFileCompaction =
+        dbClusterPostgreSqlLogFileCompaction;
+    }
+
     const rdsLogFileUploader = new cdk.aws_lambda.Function(
       this,
       "RdsLogFileUploader",
@@ -126,11 +259,72 @@ export class LambdaConstruct extends BaseConstruct {
         loggingFormat: cdk.aws_lambda.LoggingFormat.JSON,
         applicationLogLevelV2: props.functionApplicationLogLevel,
         systemLogLevelV2: props.functionSystemLogLevel,
-        layers: [lambdaPowertoolsLayer],
+        // zstandard、pyarrow などの任意のPythonモジュールはレイヤーで追加する
+        layers: [
+          lambdaPowertoolsLayer,
+          sharedLayer,
+          ...(props.uploaderLayerArns || []).map((layerArn, index) =>
+            cdk.aws_lambda.LayerVersion.fromLayerVersionArn(
+              this,
+              `uploaderLayer${index}`,
+              layerArn
+            )
+          ),
+        ],
         environment: {
           POWERTOOLS_LOG_LEVEL: props.powertoolsLogLevel || "INFO",
           POWERTOOLS_SERVICE_NAME: "rds-log-file-uploader",
+          POWERTOOLS_METRICS_NAMESPACE: "AuroraPostgreSqlLogArchive",
           ENABLE_COMPRESSION: props.enableCompression || "false",
+          COMPRESSION_CODEC: props.compressionCodec || "gzip",
+          ...(props.compressionLevel !== undefined
+            ? { COMPRESSION_LEVEL: String(props.compressionLevel) }
+            : {}),
+          ENABLE_STREAMING: props.enableStreaming || "false",
+          UPLOAD_BATCH_MAX_WORKERS: String(props.uploadBatchMaxWorkers || 4),
+          ENABLE_ADAPTIVE_CONCURRENCY: props.enableAdaptiveConcurrency || "false",
+          ...(props.adaptiveConcurrencyMinLimit !== undefined
+            ? {
+                ADAPTIVE_CONCURRENCY_MIN_LIMIT: String(
+                  props.adaptiveConcurrencyMinLimit
+                ),
+              }
+            : {}),
+          ...(props.adaptiveConcurrencyDecreaseFactor !== undefined
+            ? {
+                ADAPTIVE_CONCURRENCY_DECREASE_FACTOR: String(
+                  props.adaptiveConcurrencyDecreaseFactor
+                ),
+              }
+            : {}),
+          ENABLE_LOG_ROUTING: props.logRouting?.enableLogRouting
+            ? "true"
+            : "false",
+          ...(props.logRouting?.enableLogType?.length
+            ? { LOG_ROUTING_TYPES: props.logRouting.enableLogType.join(",") }
+            : {}),
+          ENABLE_PARQUET_OUTPUT: props.enableParquetOutput || "false",
+          ...(props.parquetRowGroupSize !== undefined
+            ? { PARQUET_ROW_GROUP_SIZE: String(props.parquetRowGroupSize) }
+            : {}),
+          ENABLE_SLOW_QUERY_SUMMARY: props.enableSlowQuerySummary || "false",
+          ...(props.slowQuerySummaryTopN !== undefined
+            ? { SLOW_QUERY_SUMMARY_TOP_N: String(props.slowQuerySummaryTopN) }
+            : {}),
+          ENABLE_LOG_INDEX: props.enableLogIndex || "false",
+          ENABLE_TOKEN_INDEX: props.enableTokenIndex || "false",
+          ...(props.tokenIndexFalsePositiveRate !== undefined
+            ? {
+                TOKEN_INDEX_FALSE_POSITIVE_RATE: String(
+                  props.tokenIndexFalsePositiveRate
+                ),
+              }
+            : {}),
+          ...(props.tokenIndexMaxBlockBits !== undefined
+            ? { TOKEN_INDEX_MAX_BLOCK_BITS: String(props.tokenIndexMaxBlockBits) }
+            : {}),
+          ENABLE_STAGE_METRICS: props.enableStageMetrics || "false",
+          ENABLE_TAIL_MODE: props.enableTailMode || "false",
         },
       }
     );
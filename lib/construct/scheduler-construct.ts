@@ -13,6 +13,7 @@ export interface SchedulerConstructProps
     LogDestinationProperty,
     BaseConstructProps {
   stateMachine: cdk.aws_stepfunctions.IStateMachine;
+  compactionFunction?: cdk.aws_lambda.IFunction;
 }
 
 export class SchedulerConstruct extends BaseConstruct {
@@ -30,6 +31,15 @@ export class SchedulerConstruct extends BaseConstruct {
               resources: [props.stateMachine.stateMachineArn],
               actions: ["states:StartExecution"],
             }),
+            ...(props.compactionFunction
+              ? [
+                  new cdk.aws_iam.PolicyStatement({
+                    effect: cdk.aws_iam.Effect.ALLOW,
+                    resources: [props.compactionFunction.functionArn],
+                    actions: ["lambda:InvokeFunction"],
+                  }),
+                ]
+              : []),
           ],
         }),
       },
@@ -53,6 +63,8 @@ export class SchedulerConstruct extends BaseConstruct {
         roleArn: role.roleArn,
         input: JSON.stringify({
           DbClusterIdentifier: props.dbClusterIdentifier,
+          DbClusterIdentifiers: props.dbClusterIdentifiers,
+          DbClusterTags: props.dbClusterTags,
           LogDestinationBucket: props.bucketName,
           LogRangeMinutes: props.logRangeMinutes,
         }),
@@ -64,5 +76,34 @@ export class SchedulerConstruct extends BaseConstruct {
       scheduleExpressionTimezone: "Asia/Tokyo",
       state: "ENABLED",
     });
+
+    // 前日以前のログファイルを結合するため、1日1回実行する
+    if (props.compactionFunction) {
+      new cdk.aws_scheduler.CfnSchedule(this, "Compaction", {
+        flexibleTimeWindow: {
+          mode: "FLEXIBLE",
+          maximumWindowInMinutes: 60,
+        },
+        groupName: scheduleGroup.ref,
+        scheduleExpression:
+          props.compactionScheduleExpression || "cron(0 12 * * ? *)",
+        target: {
+          arn: props.compactionFunction.functionArn,
+          roleArn: role.roleArn,
+          input: JSON.stringify({
+            DbClusterIdentifier: props.dbClusterIdentifier,
+            DbClusterIdentifiers: props.dbClusterIdentifiers,
+            DbClusterTags: props.dbClusterTags,
+            LogDestinationBucket: props.bucketName,
+          }),
+          retryPolicy: {
+            maximumEventAgeInSeconds: 3600,
+            maximumRetryAttempts: 2,
+          },
+        },
+        scheduleExpressionTimezone: "Asia/Tokyo",
+        state: "ENABLED",
+      });
+    }
   }
 }
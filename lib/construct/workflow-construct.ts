@@ -13,6 +13,7 @@ export interface WorkflowProps
 
 export class WorkflowConstruct extends BaseConstruct {
   readonly stateMachine: cdk.aws_stepfunctions.IStateMachine;
+  readonly backfillStateMachine?: cdk.aws_stepfunctions.IStateMachine;
   constructor(scope: Construct, id: string, props: WorkflowProps) {
     super(scope, id, props);
 
@@ -23,16 +24,9 @@ export class WorkflowConstruct extends BaseConstruct {
         {
           lambdaFunction:
             props.lambdaConstruct.dbClusterPostgreSqlLogFileFilter,
-          payload: cdk.aws_stepfunctions.TaskInput.fromObject({
-            DbClusterIdentifier: cdk.aws_stepfunctions.JsonPath.stringAt(
-              "$.DbClusterIdentifier"
-            ),
-            LogDestinationBucket: cdk.aws_stepfunctions.JsonPath.stringAt(
-              "$.LogDestinationBucket"
-            ),
-            LogRangeMinutes:
-              cdk.aws_stepfunctions.JsonPath.stringAt("$.LogRangeMinutes"),
-          }),
+          // DbClusterIdentifier / DbClusterIdentifiers / DbClusterTags のうち
+          // 指定されたものだけが入力に含まれるため、入力全体を渡す
+          payload: cdk.aws_stepfunctions.TaskInput.fromJsonPathAt("$"),
         }
       );
 
@@ -41,17 +35,8 @@ export class WorkflowConstruct extends BaseConstruct {
       "RdsLogFileUploader",
       {
         lambdaFunction: props.lambdaConstruct.rdsLogFileUploader,
-        payload: cdk.aws_stepfunctions.TaskInput.fromObject({
-          DbInstanceIdentifier: cdk.aws_stepfunctions.JsonPath.stringAt(
-            "$.DbInstanceIdentifier"
-          ),
-          LogDestinationBucket: cdk.aws_stepfunctions.JsonPath.stringAt(
-            "$.LogDestinationBucket"
-          ),
-          LastWritten: cdk.aws_stepfunctions.JsonPath.stringAt("$.LastWritten"),
-          LogFileName: cdk.aws_stepfunctions.JsonPath.stringAt("$.LogFileName"),
-          ObjectKey: cdk.aws_stepfunctions.JsonPath.stringAt("$.ObjectKey"),
-        }),
+        // 単一のログファイル、またはバッチ (LogFiles) のいずれかをそのまま渡す
+        payload: cdk.aws_stepfunctions.TaskInput.fromJsonPathAt("$"),
       }
     );
 
@@ -75,5 +60,93 @@ export class WorkflowConstruct extends BaseConstruct {
     );
 
     this.stateMachine = stateMachine;
+
+    if (!props.lambdaConstruct.dbClusterPostgreSqlLogFileBackfill) {
+      return;
+    }
+
+    // バックフィル: シャードの一覧をS3から読み込み、Distributed Map でアップローダーのバッチとして処理する
+    const dbClusterPostgreSqlLogFileBackfill =
+      new cdk.aws_stepfunctions_tasks.LambdaInvoke(
+        this,
+        "DbClusterPostgreSqlLogFileBackfill",
+        {
+          lambdaFunction:
+            props.lambdaConstruct.dbClusterPostgreSqlLogFileBackfill,
+          payload: cdk.aws_stepfunctions.TaskInput.fromJsonPathAt("$"),
+          resultSelector: {
+            "PlanObjectKey.$": "$.Payload.PlanObjectKey",
+            "ShardCount.$": "$.Payload.ShardCount",
+            "MaxConcurrency.$": "$.Payload.MaxConcurrency",
+            "LogFileCount.$": "$.Payload.LogFileCount",
+            "TotalSize.$": "$.Payload.TotalSize",
+          },
+          resultPath: "$.Plan",
+        }
+      );
+
+    const backfillRdsLogFileUploader =
+      new cdk.aws_stepfunctions_tasks.LambdaInvoke(
+        this,
+        "BackfillRdsLogFileUploader",
+        {
+          lambdaFunction: props.lambdaConstruct.rdsLogFileUploader,
+          // シャード (LogFiles, TotalSize) をバッチとして渡す
+          payload: cdk.aws_stepfunctions.TaskInput.fromJsonPathAt("$"),
+        }
+      );
+    // 多数のシャードを並列に処理するため、Lambdaのスロットリングや一時的な失敗は
+    // 間隔を空けて再試行する (同じオブジェクトキーへの上書きとなるため、シャード全体を再試行してよい)
+    backfillRdsLogFileUploader.addRetry({
+      errors: [
+        "Lambda.TooManyRequestsException",
+        "Lambda.ServiceException",
+        "Lambda.AWSLambdaException",
+        "Lambda.SdkClientException",
+        "States.TaskFailed",
+      ],
+      interval: cdk.Duration.seconds(5),
+      backoffRate: 2,
+      maxAttempts: 4,
+      maxDelay: cdk.Duration.minutes(2),
+      jitterStrategy: cdk.aws_stepfunctions.JitterType.FULL,
+    });
+
+    const distributedMap = new cdk.aws_stepfunctions.DistributedMap(
+      this,
+      "BackfillDistributedMap",
+      {
+        itemReader: new cdk.aws_stepfunctions.S3JsonItemReader({
+          bucket: cdk.aws_s3.Bucket.fromBucketName(
+            this,
+            "BackfillPlanBucket",
+            props.bucketName
+          ),
+          key: cdk.aws_stepfunctions.JsonPath.stringAt("$.Plan.PlanObjectKey"),
+        }),
+        // イベントの MaxConcurrency を反映するため、計画の並列数を参照する
+        // (未指定の場合は BACKFILL_MAX_CONCURRENCY = backfillMaxConcurrency)
+        maxConcurrencyPath: cdk.aws_stepfunctions.JsonPath.stringAt(
+          "$.Plan.MaxConcurrency"
+        ),
+        // 各シャードの結果はステートの入出力の上限を超えるため破棄する
+        resultPath: cdk.aws_stepfunctions.JsonPath.DISCARD,
+        // 再試行後も失敗したシャードが一部にとどまる場合は、残りのシャードの処理を継続する
+        toleratedFailurePercentage: props.backfillToleratedFailurePercentage ?? 5,
+      }
+    );
+
+    this.backfillStateMachine = new cdk.aws_stepfunctions.StateMachine(
+      this,
+      "BackfillStateMachine",
+      {
+        definitionBody: cdk.aws_stepfunctions.DefinitionBody.fromChainable(
+          dbClusterPostgreSqlLogFileBackfill.next(
+            distributedMap.itemProcessor(backfillRdsLogFileUploader)
+          )
+        ),
+        tracingEnabled: true,
+      }
+    );
   }
 }
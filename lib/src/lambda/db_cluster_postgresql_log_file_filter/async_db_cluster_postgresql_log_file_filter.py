@@ -0,0 +1,173 @@
+import asyncio
+import functools
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from aws_lambda_powertools import Logger, Tracer
+
+from db_cluster_postgresql_log_file_filter import (
+    DbClusterPostgreSqlLogFileFilter,
+    LogFile,
+)
+from stage_metrics import StageMetrics
+
+logger = Logger()
+tracer = Tracer()
+
+T = TypeVar("T")
+
+
+class AsyncDbClusterPostgreSqlLogFileFilter(DbClusterPostgreSqlLogFileFilter):
+    """asyncio で全DBインスタンスのAPI呼び出しをパイプライン化するログファイルフィルター処理クラス
+
+    DbClusterPostgreSqlLogFileFilter は max_workers 件のDBインスタンスを並列に処理し、
+    DBインスタンス内のS3オブジェクト一覧の取得、変更の確認は逐次行う。
+    このクラスは全DBインスタンスを同時に開始し、ログファイル一覧の取得、時間単位のプレフィックスごとの
+    オブジェクト一覧の取得、HeadObject による変更の確認を、それぞれ完了したものから次の処理に進める。
+    同時に実行するAPI呼び出しは全DBインスタンスで max_concurrency 件までとする。
+
+    boto3 のクライアントはスレッドセーフなため、API呼び出しは max_concurrency 件のスレッドプールで実行し、
+    RDS APIのレート制限、リトライ設定、ウォームスタート時のクライアントの再利用は同期版と共有する。
+    ステージごとの計測値は呼び出しごとに集計し、イベントループのスレッドでDBインスタンスの記録先に加算する
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _call(self, func: Callable[..., T], *args: Any) -> T:
+        """同期のAPI呼び出しを並列数の上限内でスレッドプールで実行"""
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(func, *args)
+            )
+
+    async def _list_archived_objects_async(
+        self, prefixes: List[str], stage_metrics: StageMetrics
+    ) -> Dict[str, int]:
+        """プレフィックスごとのS3オブジェクト一覧の並列取得"""
+
+        async def list_prefix(prefix: str) -> Dict[str, int]:
+            prefix_metrics = StageMetrics({}, enabled=False)
+            archived_objects = await self._call(
+                self._list_archived_objects, {prefix}, prefix_metrics
+            )
+            stage_metrics.merge(prefix_metrics)
+            return archived_objects
+
+        archived_objects: Dict[str, int] = {}
+        for result in await asyncio.gather(*map(list_prefix, sorted(prefixes))):
+            archived_objects.update(result)
+        return archived_objects
+
+    async def _is_archived_async(
+        self,
+        log_file: Dict[str, Any],
+        object_key: str,
+        archived_objects: Dict[str, int],
+        stage_metrics: StageMetrics,
+    ) -> bool:
+        """一覧のみで判定できない場合はHeadObjectをスレッドプールで実行して判定"""
+        last_modified = archived_objects.get(object_key)
+        if last_modified is None or last_modified >= log_file["LastWritten"]:
+            return self._is_archived(
+                log_file, object_key, archived_objects, stage_metrics
+            )
+
+        head_metrics = StageMetrics({}, enabled=False)
+        archived = await self._call(
+            self._is_archived, log_file, object_key, archived_objects, head_metrics
+        )
+        stage_metrics.merge(head_metrics)
+        return archived
+
+    @tracer.capture_method
+    async def filter_instance_log_files_async(self, db_instance: str) -> List[LogFile]:
+        """指定されたDBインスタンスのログファイルの処理
+
+        filter_instance_log_files と同じ処理を、S3オブジェクト一覧の取得と変更の確認を並列にして行う
+
+        Args:
+            db_instance (str): 処理対象のDBインスタンス識別子
+
+        Returns:
+            List[LogFile]: 処理対象となるログファイル情報のリスト
+
+        Raises:
+            ClientError: AWS APIの呼び出しに失敗した場合
+        """
+
+        self.logger.info("Processing instance logs", extra={"db_instance": db_instance})
+
+        log_files = await self._call(self._get_log_file_info_list, db_instance)
+        filtered_logs = self._filter_log_files(log_files)
+        candidate_logs = self._select_candidate_logs(db_instance, filtered_logs)
+
+        stage_metrics = self._get_instance_stage_metrics(db_instance)
+        archived_objects = await self._list_archived_objects_async(
+            self._archived_object_prefixes(candidate_logs), stage_metrics
+        )
+        compacted_metrics = StageMetrics({}, enabled=False)
+        archived_objects.update(
+            await self._call(
+                self._list_compacted_objects,
+                candidate_logs,
+                archived_objects,
+                compacted_metrics,
+            )
+        )
+        stage_metrics.merge(compacted_metrics)
+        archived_flags = await asyncio.gather(
+            *(
+                self._is_archived_async(
+                    log_file, object_key, archived_objects, stage_metrics
+                )
+                for log_file, object_key in candidate_logs
+            )
+        )
+        pending_candidates = [
+            candidate
+            for candidate, archived in zip(candidate_logs, archived_flags)
+            if not archived
+        ]
+
+        return self._complete_instance_log_files(
+            db_instance, log_files, filtered_logs, pending_candidates
+        )
+
+    async def _filter_db_instances_async(
+        self, db_instances: List[str]
+    ) -> List[LogFile]:
+        """全DBインスタンスの処理を同時に開始し、結果をDBインスタンスの順に連結"""
+
+        async def filter_instance(db_instance: str) -> List[LogFile]:
+            try:
+                return await self.filter_instance_log_files_async(db_instance)
+            except Exception as e:
+                self.logger.exception(
+                    "Failed to process instance logs",
+                    extra={"db_instance": db_instance},
+                    error=str(e),
+                )
+                raise
+
+        self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        results = await asyncio.gather(*map(filter_instance, db_instances))
+        return [log for logs in results for log in logs]
+
+    def _filter_db_instances(self, db_instances: List[str]) -> List[LogFile]:
+        """全DBインスタンスのログファイルの処理
+
+        イベントループは呼び出しごとに作成するため、複数のDBクラスターを別々のスレッドで並列に処理できる
+        """
+        # DBインスタンスごとの記録先はイベントループのスレッドで作成する
+        for db_instance in db_instances:
+            self._get_instance_stage_metrics(db_instance)
+
+        with ThreadPoolExecutor(max_workers=self.config.max_concurrency) as executor:
+            self._executor = executor
+            try:
+                return asyncio.run(self._filter_db_instances_async(db_instances))
+            finally:
+                self._executor = None
+                self._semaphore = None
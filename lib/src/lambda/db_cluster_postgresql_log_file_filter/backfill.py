@@ -0,0 +1,154 @@
+import sys
+import os
+import json
+import dataclasses
+from typing import Dict, Any, List
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+from db_cluster_postgresql_log_file_filter_constants import (
+    BACKFILL_MAX_CONCURRENCY,
+    BACKFILL_PLAN_OBJECT_KEY_FORMAT,
+    BACKFILL_SHARD_TARGET_BYTES,
+    UPLOAD_BATCH_MAX_FILES,
+)
+from multi_cluster_log_file_filter import (
+    MultiClusterLogFileFilter,
+    MultiClusterLogFileFilterConfig,
+)
+from log_file_batcher import LogFileBatcher, LogFileBatcherConfig
+from aws_clients import get_client
+from index import create_db_cluster_selector, create_multi_cluster_config
+
+logger = Logger()
+tracer = Tracer()
+
+
+def _create_backfill_config(
+    event: Dict[str, Any],
+) -> MultiClusterLogFileFilterConfig:
+    """保持されている全てのログファイルを対象とする設定値の生成
+
+    書き込み中のログファイルの追記分は定期実行で取得するため、バックフィルの対象外とする。
+    バッチへの詰め込みは全ログファイルの合計サイズから分割数を決めるため、フィルター処理では行わない
+    """
+    return dataclasses.replace(
+        create_multi_cluster_config(event),
+        backfill_enabled=True,
+        tail_mode_enabled=False,
+        upload_batch_target_bytes=0,
+    )
+
+
+def _plan_shards(
+    log_files: List[Dict[str, Any]], shard_target_bytes: int, max_concurrency: int
+) -> List[Dict[str, Any]]:
+    """ログファイルをDistributed Mapの1アイテムで処理するシャードに分割
+
+    全ログファイルの合計サイズが小さい場合は、並列数分のシャードに行き渡るよう
+    シャードあたりのサイズを小さくする
+
+    Returns:
+        List[Dict[str, Any]]: 合計サイズの降順に並べたシャード (LogFiles, TotalSize) のリスト
+    """
+    if not log_files:
+        return []
+
+    total_size = sum(log_file["Size"] for log_file in log_files)
+    target_bytes = max(1, min(shard_target_bytes, -(-total_size // max_concurrency)))
+    return LogFileBatcher(
+        LogFileBatcherConfig(
+            target_bytes=target_bytes,
+            max_files=int(
+                os.environ.get("UPLOAD_BATCH_MAX_FILES", UPLOAD_BATCH_MAX_FILES)
+            ),
+        )
+    ).pack(log_files)
+
+
+def _save_plan(bucket: str, plan_id: str, shards: List[Dict[str, Any]]) -> str:
+    """シャードの一覧をDistributed MapのItemReaderで読み込むJSON配列としてS3に保存
+
+    シャード数が多い場合はステートの入出力の上限 (256KB) を超えるため、S3を経由して渡す
+
+    Returns:
+        str: 保存したS3オブジェクトキー
+    """
+    object_key = BACKFILL_PLAN_OBJECT_KEY_FORMAT.format(plan_id=plan_id)
+    get_client("s3").put_object(
+        Bucket=bucket,
+        Key=object_key,
+        Body=json.dumps(shards).encode(),
+        ContentType="application/json",
+    )
+    return object_key
+
+
+@logger.inject_lambda_context()
+@tracer.capture_lambda_handler
+def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+    """バックフィルのLambda関数のハンドラー
+
+    保持期間内の全てのログファイルのうちアーカイブされていないものを列挙し、
+    サイズの降順に並べたシャードの一覧をS3に保存する。
+    ステートマシンはシャードの一覧をDistributed Mapで読み込み、アップローダーのバッチとして並列に処理する
+
+    Args:
+        event (Dict[str, Any]): Lambda関数のイベントデータ
+            定期実行のフィルター処理と同じキー (LogRangeMinutes は使用しない) に加え、
+            オプションキー：
+                - ShardTargetBytes (int): シャードあたりのログファイルの合計サイズの上限
+                    デフォルト: BACKFILL_SHARD_TARGET_BYTES
+                - MaxConcurrency (int): Distributed Mapの並列数。
+                    戻り値の MaxConcurrency をステートマシンが maxConcurrencyPath で参照する
+                    デフォルト: BACKFILL_MAX_CONCURRENCY
+        context (LambdaContext): Lambda実行コンテキスト
+
+    Returns:
+        Dict[str, Any]: バックフィルの計画
+            - PlanBucket (str): シャードの一覧を保存したS3バケット
+            - PlanObjectKey (str): シャードの一覧を保存したS3オブジェクトキー
+            - ShardCount (int): シャード数
+            - MaxConcurrency (int): Distributed Mapの並列数
+            - LogFileCount (int): アーカイブされていないログファイル数
+            - TotalSize (int): アーカイブされていないログファイルの合計サイズ（バイト）
+
+    Raises:
+        SystemExit: 予期しないエラーが発生した場合
+    """
+    try:
+        logger.debug("Processing event", extra={"event": event})
+        selector = create_db_cluster_selector(event)
+        config = _create_backfill_config(event)
+        shard_target_bytes = int(
+            event.get("ShardTargetBytes")
+            or os.environ.get(
+                "BACKFILL_SHARD_TARGET_BYTES", BACKFILL_SHARD_TARGET_BYTES
+            )
+        )
+        max_concurrency = int(
+            event.get("MaxConcurrency")
+            or os.environ.get("BACKFILL_MAX_CONCURRENCY", BACKFILL_MAX_CONCURRENCY)
+        )
+
+        # ウォーターマークは定期実行で管理するため、参照、更新しない
+        log_files = MultiClusterLogFileFilter(config).filter_log_files(selector)
+        shards = _plan_shards(log_files, shard_target_bytes, max_concurrency)
+        plan_object_key = _save_plan(
+            config.log_destination_bucket, context.aws_request_id, shards
+        )
+
+        result = {
+            "PlanBucket": config.log_destination_bucket,
+            "PlanObjectKey": plan_object_key,
+            "ShardCount": len(shards),
+            "MaxConcurrency": max_concurrency,
+            "LogFileCount": len(log_files),
+            "TotalSize": sum(shard["TotalSize"] for shard in shards),
+        }
+        logger.info("Backfill plan created", extra=result)
+        return result
+
+    except Exception as e:
+        logger.exception("Unexpected error", error=str(e))
+        sys.exit(1)
@@ -0,0 +1,64 @@
+import sys
+from typing import Dict, Any
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+from multi_cluster_log_file_filter import MultiClusterLogFileFilter
+from log_file_compactor import LogFileCompactor, LogFileCompactorConfig
+from index import create_db_cluster_selector, create_multi_cluster_config
+
+logger = Logger()
+tracer = Tracer()
+
+
+@logger.inject_lambda_context()
+@tracer.capture_lambda_handler
+def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+    """コンパクションのLambda関数のハンドラー
+
+    処理対象のDBクラスターの全DBインスタンスについて、日付が変わってから
+    COMPACTION_MIN_AGE_DAYS 日以上経過した日の時間単位のログファイルを、日単位のオブジェクトに結合する
+
+    Args:
+        event (Dict[str, Any]): Lambda関数のイベントデータ
+            定期実行のフィルター処理と同じキー (LogRangeMinutes は使用しない)
+        context (LambdaContext): Lambda実行コンテキスト
+
+    Returns:
+        Dict[str, Any]: コンパクションの結果
+            - CompactedObjectCount (int): 作成した日単位のオブジェクト数
+            - CompactedLogFileCount (int): 結合した時間単位のオブジェクト数
+            - DeletedObjectCount (int): 削除したオブジェクト数
+
+    Raises:
+        SystemExit: 予期しないエラーが発生した場合
+    """
+    try:
+        logger.debug("Processing event", extra={"event": event})
+        selector = create_db_cluster_selector(event)
+        config = create_multi_cluster_config(event)
+        compactor = LogFileCompactor(
+            LogFileCompactorConfig.from_environ(config.log_destination_bucket)
+        )
+
+        results = [
+            result
+            for db_cluster_identifier in MultiClusterLogFileFilter(
+                config
+            ).resolve_db_cluster_identifiers(selector)
+            for result in compactor.compact_cluster(db_cluster_identifier)
+        ]
+
+        summary = {
+            "CompactedObjectCount": len(results),
+            "CompactedLogFileCount": sum(
+                result["CompactedCount"] for result in results
+            ),
+            "DeletedObjectCount": sum(result["DeletedCount"] for result in results),
+        }
+        logger.info("Compaction completed", extra=summary)
+        return summary
+
+    except Exception as e:
+        logger.exception("Unexpected error", error=str(e))
+        sys.exit(1)
@@ -1,17 +1,27 @@
 import re
-from typing import List, Dict, Any, Optional
+import json
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Set, Tuple
 from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
-import boto3
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer
 
 from db_cluster_postgresql_log_file_filter_constants import (
+    COMPRESSION_EXTENSIONS,
     LOG_FILENAME_PATTERN,
+    ASYNC_MAX_CONCURRENCY,
     MAX_WORKERS,
+    RDS_API_RATE_LIMIT,
+    RDS_API_BURST,
 )
+from rds_api_rate_limiter import RdsApiRateLimiter
+from aws_clients import get_client
+from stage_metrics import StageMetrics
 
+# ウォーターマーク、コンパクションのモジュールは有効な場合のみ読み込む
+if TYPE_CHECKING:
+    from log_file_watermark_store import LogFileWatermarkStore
 
 logger = Logger()
 tracer = Tracer()
@@ -26,6 +36,9 @@ class LogFile:
     last_written: int
     log_file_name: str
     object_key: str
+    size: int = 0
+    # 書き込み中のログファイルの追記分のみを取得する場合True
+    tail: bool = False
 
     def __post_init__(self) -> None:
         """初期化後のバリデーション"""
@@ -39,6 +52,8 @@ class LogFile:
             raise ValueError("LogFileName is required")
         if not self.object_key:
             raise ValueError("ObjectKey is required")
+        if self.size < 0:
+            raise ValueError("Size must be greater than or equal to 0")
 
     def to_dict(self) -> Dict[str, Any]:
         """辞書型に変換"""
@@ -48,6 +63,8 @@ class LogFile:
             "LastWritten": self.last_written,
             "LogFileName": self.log_file_name,
             "ObjectKey": self.object_key,
+            "Size": self.size,
+            **({"Tail": True} if self.tail else {}),
         }
 
 
@@ -59,6 +76,17 @@ class LogFileFilterConfig:
     log_destination_bucket: str
     log_range_minutes: int
     compression_enabled: bool = False
+    compression_codec: str = "gzip"
+    max_workers: int = MAX_WORKERS
+    rds_api_rate_limit: float = RDS_API_RATE_LIMIT
+    rds_api_burst: int = RDS_API_BURST
+    tail_mode_enabled: bool = False
+    async_enabled: bool = False
+    max_concurrency: int = ASYNC_MAX_CONCURRENCY
+    # 保持されている全てのログファイルを対象とする場合True
+    backfill_enabled: bool = False
+    # 日単位に結合されたオブジェクトのマニフェストもアーカイブ済みとして参照する場合True
+    compaction_enabled: bool = False
 
     def __post_init__(self) -> None:
         """初期化後のバリデーション"""
@@ -68,16 +96,74 @@ class LogFileFilterConfig:
             raise ValueError("LogDestinationBucket is required")
         if self.log_range_minutes <= 0:
             raise ValueError("LogRangeMinutes must be greater than 0")
+        if self.compression_codec not in COMPRESSION_EXTENSIONS:
+            raise ValueError(
+                f"CompressionCodec must be one of {', '.join(COMPRESSION_EXTENSIONS)}"
+            )
+        if self.max_workers <= 0:
+            raise ValueError("MaxWorkers must be greater than 0")
+        if self.rds_api_rate_limit <= 0:
+            raise ValueError("RdsApiRateLimit must be greater than 0")
+        if self.max_concurrency <= 0:
+            raise ValueError("MaxConcurrency must be greater than 0")
 
 
 class DbClusterPostgreSqlLogFileFilter:
     """DBクラスターログファイルフィルター処理クラス"""
 
-    def __init__(self, config: LogFileFilterConfig):
+    def __init__(
+        self,
+        config: LogFileFilterConfig,
+        watermark_store: Optional["LogFileWatermarkStore"] = None,
+        rds_client=None,
+        s3_client=None,
+        rds_api_rate_limiter: Optional[RdsApiRateLimiter] = None,
+    ):
+        """
+        Args:
+            config (LogFileFilterConfig): 設定値
+            watermark_store (Optional[LogFileWatermarkStore]): ウォーターマークの保存先
+            rds_client: 複数クラスターで共有するRDSクライアント。未指定の場合は生成
+            s3_client: 複数クラスターで共有するS3クライアント。未指定の場合は生成
+            rds_api_rate_limiter (Optional[RdsApiRateLimiter]): 複数クラスターで共有するレート制限。
+                未指定の場合は設定値から生成
+        """
         self.config = config
         self.logger = logger
-        self.rds_client = boto3.client("rds")
-        self.s3_client = boto3.client("s3")
+        self.rds_client = rds_client or get_client("rds")
+        self.s3_client = s3_client or get_client("s3")
+        self.rds_api_rate_limiter = rds_api_rate_limiter or RdsApiRateLimiter(
+            rate=config.rds_api_rate_limit, capacity=config.rds_api_burst
+        )
+        self.rds_api_rate_limiter.attach(self.rds_client)
+        self.watermark_store = watermark_store
+        self.watermarks: Dict[str, int] = {}
+        self.new_watermarks: Dict[str, int] = {}
+        # API呼び出しの回数と処理時間は DBクラスター、DBインスタンスごとに記録する
+        self.stage_metrics = StageMetrics.from_environ(
+            {"DbClusterIdentifier": config.db_cluster_identifier}
+        )
+        self.instance_stage_metrics: Dict[str, StageMetrics] = {}
+
+    def _get_instance_stage_metrics(self, db_instance: str) -> StageMetrics:
+        """DBインスタンスごとの計測値の記録先の取得
+
+        DBインスタンスごとの処理は1つのスレッドで行うため、スレッド間で共有されない
+        """
+        if db_instance not in self.instance_stage_metrics:
+            self.instance_stage_metrics[db_instance] = StageMetrics.from_environ(
+                {
+                    "DbClusterIdentifier": self.config.db_cluster_identifier,
+                    "DbInstanceIdentifier": db_instance,
+                }
+            )
+        return self.instance_stage_metrics[db_instance]
+
+    def _flush_stage_metrics(self) -> None:
+        """DBクラスター、DBインスタンスごとの計測値をEMFで出力"""
+        self.stage_metrics.flush()
+        for stage_metrics in self.instance_stage_metrics.values():
+            stage_metrics.flush()
 
     @tracer.capture_method
     def _get_db_instances(self) -> List[str]:
@@ -96,9 +182,11 @@ class DbClusterPostgreSqlLogFileFilter:
                 extra={"cluster_id": self.config.db_cluster_identifier},
             )
 
-            response = self.rds_client.describe_db_clusters(
-                DBClusterIdentifier=self.config.db_cluster_identifier
-            )
+            with self.stage_metrics.measure("DescribeDBClusters"):
+                self.stage_metrics.add_count("DescribeDBClustersCalls")
+                response = self.rds_client.describe_db_clusters(
+                    DBClusterIdentifier=self.config.db_cluster_identifier
+                )
 
             if not response["DBClusters"]:
                 self.logger.error(
@@ -136,6 +224,8 @@ class DbClusterPostgreSqlLogFileFilter:
     def _get_log_file_info_list(self, db_instance: str) -> List[Dict[str, Any]]:
         """指定されたDBインスタンスのログファイル一覧の取得
 
+        Markerによるページネーションで全ページを取得する
+
         Args:
             db_instance (str): DBインスタンス識別子
 
@@ -150,22 +240,29 @@ class DbClusterPostgreSqlLogFileFilter:
             ClientError: AWS APIの呼び出しに失敗した場合
         """
 
+        stage_metrics = self._get_instance_stage_metrics(db_instance)
         try:
+            paginator = self.rds_client.get_paginator("describe_db_log_files")
+
             # 現在時刻から指定分前までの時間範囲を計算
-            response = self.rds_client.describe_db_log_files(
+            pages = paginator.paginate(
                 DBInstanceIdentifier=db_instance,
                 FilenameContains="postgresql.log",
-                FileLastWritten=self._calculate_time_threshold(),
+                FileLastWritten=self._calculate_time_threshold(db_instance),
             )
-
-            log_files = [
-                {
-                    **log_file,
-                    "DbInstanceIdentifier": db_instance,
-                    "LogDestinationBucket": self.config.log_destination_bucket,
-                }
-                for log_file in response["DescribeDBLogFiles"]
-            ]
+            log_files = []
+            for page in stage_metrics.measure_iterator(
+                "DescribeDBLogFiles", pages, count_bytes=False
+            ):
+                stage_metrics.add_count("DescribeDBLogFilesCalls")
+                log_files.extend(
+                    {
+                        **log_file,
+                        "DbInstanceIdentifier": db_instance,
+                        "LogDestinationBucket": self.config.log_destination_bucket,
+                    }
+                    for log_file in page["DescribeDBLogFiles"]
+                )
 
             self.logger.info(
                 "Retrieved log files",
@@ -181,55 +278,289 @@ class DbClusterPostgreSqlLogFileFilter:
             )
             raise
 
-    def _calculate_time_threshold(self) -> int:
-        """時間範囲の閾値を計算"""
+    def _calculate_time_threshold(self, db_instance: str) -> int:
+        """時間範囲の閾値を計算
+
+        ウォーターマークが記録されている場合は、ウォーターマークとLogRangeMinutesによる閾値の
+        新しい方を使用し、アーカイブ済みのログファイルを取得対象から除外する。
+        バックフィルの場合は保持されている全てのログファイルを対象とする
+
+        Args:
+            db_instance (str): DBインスタンス識別子
+
+        Returns:
+            int: 閾値のUNIXタイムスタンプ（ミリ秒）
+        """
+        if self.config.backfill_enabled:
+            return 0
+
         current_time = datetime.now()
-        return int(
+        range_threshold = int(
             (
                 current_time - timedelta(minutes=self.config.log_range_minutes)
             ).timestamp()
             * 1000
         )
+        return max(range_threshold, self.watermarks.get(db_instance, 0))
+
+    def _calculate_watermark(
+        self,
+        db_instance: str,
+        filtered_logs: List[Dict[str, Any]],
+        pending_logs: List[Dict[str, Any]],
+    ) -> Optional[int]:
+        """DBインスタンスの新しいウォーターマークを計算
+
+        未アーカイブのログファイルがある場合は、その中で最も古い最終更新時刻の直前、
+        全てアーカイブ済みの場合は、フィルタリング後のログファイルの最新の最終更新時刻とする
+
+        Args:
+            db_instance (str): DBインスタンス識別子
+            filtered_logs (List[Dict[str, Any]]): フィルタリング後のログファイルリスト
+            pending_logs (List[Dict[str, Any]]): 未アーカイブのログファイルリスト
+
+        Returns:
+            Optional[int]: 新しいウォーターマーク。更新しない場合はNone
+        """
+        if pending_logs:
+            watermark = min(log["LastWritten"] for log in pending_logs) - 1
+        elif filtered_logs:
+            watermark = max(log["LastWritten"] for log in filtered_logs)
+        else:
+            return None
+
+        if watermark <= self.watermarks.get(db_instance, 0):
+            return None
+        return watermark
 
     @tracer.capture_method
-    def _check_object_exists(self, object_key: str) -> bool:
-        """S3バケット内の指定されたオブジェクトの存在確認
+    def _list_archived_objects(
+        self, prefixes: Set[str], stage_metrics: Optional[StageMetrics] = None
+    ) -> Dict[str, int]:
+        """S3バケット内のアーカイブ済みオブジェクト一覧の取得
+
+        オブジェクトごとにHeadObjectを呼び出す代わりに、
+        時間単位のプレフィックスごとにListObjectsV2でまとめて取得する
 
         Args:
-            object_key (str): 確認するS3オブジェクトのキー
+            prefixes (Set[str]): 一覧を取得するS3オブジェクトキーのプレフィックス
+                (<cluster>/<instance>/raw/YYYY/MM/DD/HH/)
+            stage_metrics (Optional[StageMetrics]): API呼び出しの記録先。
+                未指定の場合はDBクラスターの記録先
 
         Returns:
-            bool: オブジェクトが存在する場合はTrue、存在しない場合はFalse
+            Dict[str, int]: プレフィックス配下に存在するS3オブジェクトキーと、
+                最終更新のUNIXタイムスタンプ（ミリ秒）
 
         Raises:
-            ClientError: S3 APIの呼び出しに失敗した場合（404エラーを除く）
+            ClientError: S3 APIの呼び出しに失敗した場合
         """
 
-        try:
-            self.logger.debug(
-                "Checking object existence",
-                extra={
-                    "bucket": self.config.log_destination_bucket,
-                    "object_key": object_key,
-                },
-            )
-            self.s3_client.head_object(
-                Bucket=self.config.log_destination_bucket, Key=object_key
+        stage_metrics = stage_metrics or self.stage_metrics
+        archived_objects: Dict[str, int] = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+
+        for prefix in sorted(prefixes):
+            try:
+                self.logger.debug(
+                    "Listing archived objects",
+                    extra={
+                        "bucket": self.config.log_destination_bucket,
+                        "prefix": prefix,
+                    },
+                )
+                for page in stage_metrics.measure_iterator(
+                    "ListObjectsV2",
+                    paginator.paginate(
+                        Bucket=self.config.log_destination_bucket, Prefix=prefix
+                    ),
+                    count_bytes=False,
+                ):
+                    stage_metrics.add_count("ListObjectsV2Calls")
+                    archived_objects.update(
+                        (
+                            content["Key"],
+                            int(content["LastModified"].timestamp() * 1000),
+                        )
+                        for content in page.get("Contents", [])
+                    )
+
+            except ClientError as e:
+                self.logger.exception(
+                    "Failed to list archived objects",
+                    extra={
+                        "bucket": self.config.log_destination_bucket,
+                        "prefix": prefix,
+                    },
+                    error=str(e),
+                )
+                raise
+
+        self.logger.debug(
+            "Listed archived objects",
+            extra={
+                "prefix_count": len(prefixes),
+                "archived_object_count": len(archived_objects),
+            },
+        )
+        return archived_objects
+
+    @tracer.capture_method
+    def _list_compacted_objects(
+        self,
+        candidate_logs: List[Tuple[Dict[str, Any], str]],
+        archived_objects: Dict[str, int],
+        stage_metrics: Optional[StageMetrics] = None,
+    ) -> Dict[str, int]:
+        """日単位に結合されたアーカイブ済みオブジェクト一覧の取得
+
+        結合後に削除された時間単位のオブジェクトは一覧に含まれないため、
+        前日以前のログファイルのうち一覧にないものは、その日のマニフェストのメンバーで判定する。
+        メンバーの最終更新時刻には結合元のログファイルの最終更新時刻を記録するため、
+        結合後にログファイルが更新された場合は _is_archived で変更として検出される
+
+        Args:
+            candidate_logs (List[Tuple[Dict[str, Any], str]]): ログファイル情報とS3オブジェクトキー
+            archived_objects (Dict[str, int]): _list_archived_objects の結果
+            stage_metrics (Optional[StageMetrics]): API呼び出しの記録先。
+                未指定の場合はDBクラスターの記録先
+
+        Returns:
+            Dict[str, int]: 結合済みの時間単位のS3オブジェクトキーと、
+                結合元のログファイルの最終更新のUNIXタイムスタンプ（ミリ秒）
+        """
+        if not self.config.compaction_enabled:
+            return {}
+
+        from log_file_compactor import get_manifest_object_key, get_object_day
+
+        stage_metrics = stage_metrics or self.stage_metrics
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        manifest_keys = {
+            get_manifest_object_key(object_key)
+            for _, object_key in candidate_logs
+            if object_key not in archived_objects
+            and (get_object_day(object_key) or today) < today
+        }
+
+        compacted_objects: Dict[str, int] = {}
+        for manifest_key in sorted(manifest_keys):
+            try:
+                stage_metrics.add_count("GetManifestCalls")
+                with stage_metrics.measure("GetManifest"):
+                    response = self.s3_client.get_object(
+                        Bucket=self.config.log_destination_bucket, Key=manifest_key
+                    )
+                    manifest = json.loads(response["Body"].read())
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    continue
+                self.logger.exception(
+                    "Failed to get compaction manifest",
+                    extra={
+                        "bucket": self.config.log_destination_bucket,
+                        "manifest_key": manifest_key,
+                    },
+                    error=str(e),
+                )
+                raise
+
+            compacted_objects.update(
+                (
+                    member["SourceObjectKey"],
+                    member["LastWritten"] or member["LastModified"],
+                )
+                for member in manifest["Members"]
             )
+
+        self.logger.debug(
+            "Listed compacted objects",
+            extra={
+                "manifest_count": len(manifest_keys),
+                "compacted_object_count": len(compacted_objects),
+            },
+        )
+        return compacted_objects
+
+    def _is_archived(
+        self,
+        log_file: Dict[str, Any],
+        object_key: str,
+        archived_objects: Dict[str, int],
+        stage_metrics: StageMetrics,
+    ) -> bool:
+        """ログファイルが変更されずにアーカイブ済みかどうかの判定
+
+        ログファイルの最終更新後にアップロードされたオブジェクトは一覧のみで判定する。
+        アップロード後にログファイルが更新された場合のみHeadObjectを呼び出し、
+        メタデータのログファイルの最終更新時刻、サイズと一致するかを確認する
+
+        Args:
+            log_file (Dict[str, Any]): DescribeDBLogFiles のログファイル情報
+            object_key (str): S3オブジェクトキー
+            archived_objects (Dict[str, int]): _list_archived_objects の結果
+            stage_metrics (StageMetrics): API呼び出しの記録先
+
+        Returns:
+            bool: アーカイブ済みのオブジェクトが同一のログファイルの場合True
+        """
+        last_modified = archived_objects.get(object_key)
+        if last_modified is None:
+            return False
+        if last_modified >= log_file["LastWritten"]:
             return True
 
+        try:
+            stage_metrics.add_count("HeadObjectCalls")
+            response = self.s3_client.head_object(
+                Bucket=self.config.log_destination_bucket, Key=object_key
+            )
         except ClientError as e:
-            if e.response["Error"]["Code"] == "404":
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
                 return False
-            self.logger.exception(
-                "Failed to check object existence",
+            raise
+
+        # S3のメタデータのキーは小文字で返される
+        metadata = response.get("Metadata", {})
+        unchanged = metadata.get("lastwritten") == str(log_file["LastWritten"]) and (
+            "sourcesize" not in metadata
+            or metadata["sourcesize"] == str(log_file.get("Size", 0))
+        )
+        if not unchanged:
+            stage_metrics.add_count("ChangedLogFiles")
+            self.logger.info(
+                "Archived log file has changed",
                 extra={
-                    "bucket": self.config.log_destination_bucket,
                     "object_key": object_key,
+                    "last_written": log_file["LastWritten"],
+                    "size": log_file.get("Size", 0),
+                    "archived_last_written": metadata.get("lastwritten"),
+                    "archived_size": metadata.get("sourcesize"),
                 },
-                error=str(e),
             )
-            raise
+        return unchanged
+
+    @staticmethod
+    def _select_valid_log_files(
+        log_files: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """ファイル名が LOG_FILENAME_PATTERN にマッチするログファイルの抽出"""
+        pattern = re.compile(LOG_FILENAME_PATTERN)
+        return [log for log in log_files if pattern.search(log["LogFileName"])]
+
+    def _select_active_log_files(
+        self, log_files: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """書き込み中のログファイルの抽出
+
+        _filter_log_files で除外される、最終更新時刻が最新のログファイルを返す
+        """
+        valid_logs = self._select_valid_log_files(log_files)
+        if not valid_logs:
+            return []
+
+        latest_written = max(log["LastWritten"] for log in valid_logs)
+        return [log for log in valid_logs if log["LastWritten"] == latest_written]
 
     @tracer.capture_method
     def _filter_log_files(
@@ -251,10 +582,8 @@ class DbClusterPostgreSqlLogFileFilter:
         if not log_files:
             return []
 
-        pattern = re.compile(LOG_FILENAME_PATTERN)
-
         # LOG_FILENAME_PATTERN にマッチするログファイルのみ抽出
-        valid_logs = [log for log in log_files if pattern.search(log["LogFileName"])]
+        valid_logs = self._select_valid_log_files(log_files)
 
         self.logger.debug(
             "Filtered valid log files",
@@ -313,9 +642,11 @@ class DbClusterPostgreSqlLogFileFilter:
                 f"postgresql.log.{date_part}"
             )
 
-            # 圧縮が有効な場合は.gzを付与
+            # 圧縮が有効な場合は圧縮形式に応じた拡張子 (.gz / .zst) を付与
             object_key = (
-                f"{base_key}.gz" if self.config.compression_enabled else base_key
+                f"{base_key}{COMPRESSION_EXTENSIONS[self.config.compression_codec]}"
+                if self.config.compression_enabled
+                else base_key
             )
 
             self.logger.debug(
@@ -325,6 +656,7 @@ class DbClusterPostgreSqlLogFileFilter:
                     "log_filename": log_filename,
                     "object_key": object_key,
                     "compression_enabled": self.config.compression_enabled,
+                    "compression_codec": self.config.compression_codec,
                 },
             )
             return object_key
@@ -337,6 +669,106 @@ class DbClusterPostgreSqlLogFileFilter:
             )
             return None
 
+    def _select_candidate_logs(
+        self, db_instance: str, filtered_logs: List[Dict[str, Any]]
+    ) -> List[Tuple[Dict[str, Any], str]]:
+        """フィルタリング後のログファイルとS3オブジェクトキーの組の生成
+
+        オブジェクトキーを生成できないログファイルは除外する
+        """
+        candidate_logs = []
+        for log_file in filtered_logs:
+            object_key = self._generate_object_key(db_instance, log_file["LogFileName"])
+
+            if not object_key:
+                continue
+
+            candidate_logs.append((log_file, object_key))
+        return candidate_logs
+
+    def _archived_object_prefixes(
+        self, candidate_logs: List[Tuple[Dict[str, Any], str]]
+    ) -> Set[str]:
+        """S3オブジェクト一覧を取得するプレフィックスの集合
+
+        通常はオブジェクトキーの親プレフィックス (.../raw/YYYY/MM/DD/HH/) とする。
+        バックフィルの場合は保持期間の全ての時間を対象とするため、
+        DBインスタンスの raw のプレフィックス (<cluster>/<instance>/raw/) 全体を一括で取得する
+        """
+        if self.config.backfill_enabled:
+            return {
+                object_key.split("/raw/", 1)[0] + "/raw/"
+                for _, object_key in candidate_logs
+            }
+        return {object_key.rsplit("/", 1)[0] + "/" for _, object_key in candidate_logs}
+
+    def _complete_instance_log_files(
+        self,
+        db_instance: str,
+        log_files: List[Dict[str, Any]],
+        filtered_logs: List[Dict[str, Any]],
+        pending_candidates: List[Tuple[Dict[str, Any], str]],
+    ) -> List[LogFile]:
+        """未アーカイブのログファイルからの結果のLogFileオブジェクト生成とウォーターマークの計算
+
+        Args:
+            db_instance (str): DBインスタンス識別子
+            log_files (List[Dict[str, Any]]): DescribeDBLogFiles のログファイル一覧
+            filtered_logs (List[Dict[str, Any]]): フィルタリング後のログファイルリスト
+            pending_candidates (List[Tuple[Dict[str, Any], str]]):
+                未アーカイブのログファイルとS3オブジェクトキーの組
+
+        Returns:
+            List[LogFile]: 処理対象となるログファイル情報のリスト
+        """
+        pending_logs = [log_file for log_file, _ in pending_candidates]
+        result_logs = [
+            LogFile(
+                db_instance_identifier=log_file["DbInstanceIdentifier"],
+                last_written=log_file["LastWritten"],
+                log_file_name=log_file["LogFileName"],
+                log_destination_bucket=log_file["LogDestinationBucket"],
+                object_key=object_key,
+                size=log_file.get("Size", 0),
+            )
+            for log_file, object_key in pending_candidates
+        ]
+
+        self._get_instance_stage_metrics(db_instance).add_count(
+            "PendingLogFiles", len(result_logs)
+        )
+
+        # 書き込み中のログファイルは追記分のみを取得する
+        # ローテーション後の全体のアーカイブが完了するまでウォーターマークは進めない
+        if self.config.tail_mode_enabled:
+            for log_file in self._select_active_log_files(log_files):
+                object_key = self._generate_object_key(
+                    db_instance, log_file["LogFileName"]
+                )
+                if not object_key:
+                    continue
+                result_logs.append(
+                    LogFile(
+                        db_instance_identifier=log_file["DbInstanceIdentifier"],
+                        last_written=log_file["LastWritten"],
+                        log_file_name=log_file["LogFileName"],
+                        log_destination_bucket=log_file["LogDestinationBucket"],
+                        object_key=object_key,
+                        size=log_file.get("Size", 0),
+                        tail=True,
+                    )
+                )
+
+        watermark = self._calculate_watermark(db_instance, filtered_logs, pending_logs)
+        if watermark is not None:
+            self.new_watermarks[db_instance] = watermark
+
+        self.logger.info(
+            "Completed instance log processing",
+            extra={"db_instance": db_instance, "processed_logs": len(result_logs)},
+        )
+        return result_logs
+
     @tracer.capture_method
     def filter_instance_log_files(self, db_instance: str) -> List[LogFile]:
         """指定されたDBインスタンスのログファイルの処理
@@ -345,6 +777,9 @@ class DbClusterPostgreSqlLogFileFilter:
         1. ログファイル一覧の取得
         2. フィルタリング
         3. S3オブジェクトの存在確認
+            対象期間の時間単位のプレフィックスごとにS3オブジェクト一覧を取得し、その集合で確認
+            日単位に結合済みのログファイルはマニフェストのメンバーで確認
+            アップロード後にログファイルが更新された場合は、メタデータと比較して変更を検出
         4. 結果のLogFileオブジェクト生成
 
         Args:
@@ -361,30 +796,66 @@ class DbClusterPostgreSqlLogFileFilter:
 
         log_files = self._get_log_file_info_list(db_instance)
         filtered_logs = self._filter_log_files(log_files)
-        result_logs = []
+        candidate_logs = self._select_candidate_logs(db_instance, filtered_logs)
 
-        for log_file in filtered_logs:
-            object_key = self._generate_object_key(db_instance, log_file["LogFileName"])
+        stage_metrics = self._get_instance_stage_metrics(db_instance)
+        archived_objects = self._list_archived_objects(
+            self._archived_object_prefixes(candidate_logs), stage_metrics
+        )
+        archived_objects.update(
+            self._list_compacted_objects(
+                candidate_logs, archived_objects, stage_metrics
+            )
+        )
+        pending_candidates = [
+            (log_file, object_key)
+            for log_file, object_key in candidate_logs
+            if not self._is_archived(
+                log_file, object_key, archived_objects, stage_metrics
+            )
+        ]
 
-            if not object_key:
-                continue
+        return self._complete_instance_log_files(
+            db_instance, log_files, filtered_logs, pending_candidates
+        )
 
-            if not self._check_object_exists(object_key):
-                result_logs.append(
-                    LogFile(
-                        db_instance_identifier=log_file["DbInstanceIdentifier"],
-                        last_written=log_file["LastWritten"],
-                        log_file_name=log_file["LogFileName"],
-                        log_destination_bucket=log_file["LogDestinationBucket"],
-                        object_key=object_key,
-                    )
-                )
+    def _filter_db_instances(self, db_instances: List[str]) -> List[LogFile]:
+        """全DBインスタンスのログファイルの処理
 
-        self.logger.info(
-            "Completed instance log processing",
-            extra={"db_instance": db_instance, "processed_logs": len(result_logs)},
-        )
-        return result_logs
+        DBインスタンス単位で max_workers 件ずつ並列に処理する
+
+        Args:
+            db_instances (List[str]): DBインスタンス識別子のリスト
+
+        Returns:
+            List[LogFile]: 処理対象となるログファイル情報のリスト
+        """
+        all_logs = []
+
+        # ThreadPoolExecutorで並行処理を実行
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            # 各DBインスタンスに対して並行でログ処理を実行
+            future_to_instance = {
+                executor.submit(
+                    self.filter_instance_log_files, db_instance
+                ): db_instance
+                for db_instance in db_instances
+            }
+
+            # 完了したタスクの結果を収集
+            for future in future_to_instance:
+                instance = future_to_instance[future]
+                try:
+                    logs = future.result()
+                    all_logs.extend(logs)
+                except Exception as e:
+                    self.logger.exception(
+                        "Failed to process instance logs",
+                        extra={"db_instance": instance},
+                        error=str(e),
+                    )
+                    raise
+        return all_logs
 
     @tracer.capture_method
     def filter_cluster_log_files(self) -> List[Dict[str, Any]]:
@@ -399,12 +870,16 @@ class DbClusterPostgreSqlLogFileFilter:
                     - LastWritten (int): 最終更新のUNIXタイムスタンプ
                     - LogFileName (str): ログファイル名
                     - ObjectKey (str): アップロード先のS3オブジェクトキー
+                    - Size (int): ファイルサイズ（バイト）
 
         Raises:
             Exception: 処理中に発生した任意の例外
         """
 
         try:
+            if self.watermark_store:
+                self.watermarks = self.watermark_store.load()
+
             db_instances = self._get_db_instances()
 
             self.logger.info(
@@ -415,37 +890,23 @@ class DbClusterPostgreSqlLogFileFilter:
                 },
             )
 
-            all_logs = []
+            all_logs = self._filter_db_instances(db_instances)
 
-            # ThreadPoolExecutorで並行処理を実行
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                # 各DBインスタンスに対して並行でログ処理を実行
-                future_to_instance = {
-                    executor.submit(
-                        self.filter_instance_log_files, db_instance
-                    ): db_instance
-                    for db_instance in db_instances
-                }
-
-                # 完了したタスクの結果を収集
-                for future in future_to_instance:
-                    instance = future_to_instance[future]
-                    try:
-                        logs = future.result()
-                        all_logs.extend(logs)
-                    except Exception as e:
-                        self.logger.exception(
-                            "Failed to process instance logs",
-                            extra={"db_instance": instance},
-                            error=str(e),
-                        )
-                        raise
+            if self.watermark_store and self.new_watermarks:
+                self.watermark_store.save({**self.watermarks, **self.new_watermarks})
 
             self.logger.info(
-                "Completed log processing", extra={"total_logs_count": len(all_logs)}
+                "Completed log processing",
+                extra={
+                    "total_logs_count": len(all_logs),
+                    "watermarks": self.new_watermarks,
+                },
             )
             return [log.to_dict() for log in all_logs]
 
         except Exception as e:
             self.logger.exception("Error in process", error=str(e))
             raise
+
+        finally:
+            self._flush_stage_metrics()
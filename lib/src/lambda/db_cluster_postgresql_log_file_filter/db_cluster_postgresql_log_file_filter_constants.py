@@ -1,3 +1,30 @@
 LOG_FILENAME_PATTERN = r"postgresql\.log\.\d{4}-\d{2}-\d{2}-\d{4}$"
 MAX_WORKERS = 4
+ASYNC_MAX_CONCURRENCY = 32  # concurrent API calls per cluster in the async engine
 DEFAULT_LOG_RANGE_MINUTES = 180
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+WATERMARK_OBJECT_KEY_FORMAT = "_state/{db_cluster_identifier}/watermarks.json"
+RDS_API_RATE_LIMIT = 10  # requests per second
+RDS_API_BURST = 10
+MAX_CLUSTER_WORKERS = 4
+AURORA_POSTGRESQL_ENGINE = "aurora-postgresql"
+UPLOAD_BATCH_MAX_FILES = 50
+RATE_LIMITER_HANDLER_ID = "rds-api-rate-limiter"
+BACKFILL_SHARD_TARGET_BYTES = (
+    1024 * 1024 * 1024
+)  # 1GB of log files per Distributed Map item
+BACKFILL_MAX_CONCURRENCY = 50
+BACKFILL_PLAN_OBJECT_KEY_FORMAT = "_state/backfill/{plan_id}.json"
+COMPACTION_MIN_AGE_DAYS = 1  # compact days that ended at least this many days ago (UTC)
+COMPACTION_LOOKBACK_DAYS = 7  # longer than the RDS log file retention period
+COMPACTION_PART_SIZE = 8 * 1024 * 1024
+COMPACTION_MAX_WORKERS = 4
+COMPACTED_OBJECT_NAME_FORMAT = "postgresql.log.{day}.compacted-{generation}"
+MANIFEST_OBJECT_KEY_SEGMENT = "/manifest/"
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+S3_DELETE_OBJECTS_MAX_KEYS = 1000
+CHECKSUM_OBJECT_KEY_SEGMENT = (
+    "/checksums/"  # written by the uploader for each raw object
+)
+CHECKSUM_EXTENSION = ".json"
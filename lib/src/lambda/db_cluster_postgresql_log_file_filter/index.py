@@ -1,20 +1,103 @@
 import sys
 import os
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
-from db_cluster_postgresql_log_file_filter_constants import DEFAULT_LOG_RANGE_MINUTES
-from db_cluster_postgresql_log_file_filter import (
-    DbClusterPostgreSqlLogFileFilter,
-    LogFileFilterConfig,
-    LogFile,
+from db_cluster_postgresql_log_file_filter_constants import (
+    ASYNC_MAX_CONCURRENCY,
+    DEFAULT_LOG_RANGE_MINUTES,
+    MAX_CLUSTER_WORKERS,
+    MAX_WORKERS,
+    RDS_API_RATE_LIMIT,
+    RDS_API_BURST,
+    UPLOAD_BATCH_MAX_FILES,
 )
+from db_cluster_postgresql_log_file_filter import LogFileFilterConfig
+from multi_cluster_log_file_filter import (
+    DbClusterSelector,
+    MultiClusterLogFileFilter,
+    MultiClusterLogFileFilterConfig,
+)
+
+# ウォーターマークのモジュールは有効な場合のみ読み込む
+if TYPE_CHECKING:
+    from log_file_watermark_store import LogFileWatermarkStore
 
 logger = Logger()
 tracer = Tracer()
 
 
+def _create_watermark_store(
+    config: LogFileFilterConfig,
+) -> Optional["LogFileWatermarkStore"]:
+    """ウォーターマークの保存先の生成
+
+    ENABLE_WATERMARK が true の場合のみ有効とする。
+    WATERMARK_STATE_PATH が指定されている場合はローカルのJSONファイル、
+    それ以外はログファイルの出力先S3バケットに保存する
+    """
+    if os.environ.get("ENABLE_WATERMARK", "false").lower() != "true":
+        return None
+
+    from log_file_watermark_store import (
+        S3LogFileWatermarkStore,
+        LocalLogFileWatermarkStore,
+    )
+
+    state_path = os.environ.get("WATERMARK_STATE_PATH")
+    if state_path:
+        return LocalLogFileWatermarkStore(state_path)
+
+    return S3LogFileWatermarkStore(
+        bucket=config.log_destination_bucket,
+        db_cluster_identifier=config.db_cluster_identifier,
+    )
+
+
+def create_db_cluster_selector(event: Dict[str, Any]) -> DbClusterSelector:
+    """イベントの DbClusterIdentifier / DbClusterIdentifiers / DbClusterTags から選択条件を生成"""
+    return DbClusterSelector(
+        db_cluster_identifiers=(
+            [event["DbClusterIdentifier"]] if event.get("DbClusterIdentifier") else []
+        )
+        + list(event.get("DbClusterIdentifiers") or []),
+        tags=event.get("DbClusterTags") or {},
+    )
+
+
+def create_multi_cluster_config(
+    event: Dict[str, Any],
+) -> MultiClusterLogFileFilterConfig:
+    """イベントと環境変数から設定値を生成"""
+    return MultiClusterLogFileFilterConfig(
+        log_destination_bucket=event.get("LogDestinationBucket"),
+        log_range_minutes=event.get("LogRangeMinutes", DEFAULT_LOG_RANGE_MINUTES),
+        compression_enabled=os.environ.get("ENABLE_COMPRESSION", "false").lower()
+        == "true",
+        compression_codec=os.environ.get("COMPRESSION_CODEC", "gzip").lower(),
+        max_workers=int(os.environ.get("FILTER_MAX_WORKERS", MAX_WORKERS)),
+        rds_api_rate_limit=float(
+            os.environ.get("RDS_API_RATE_LIMIT", RDS_API_RATE_LIMIT)
+        ),
+        rds_api_burst=int(os.environ.get("RDS_API_BURST", RDS_API_BURST)),
+        max_cluster_workers=int(
+            os.environ.get("FILTER_MAX_CLUSTER_WORKERS", MAX_CLUSTER_WORKERS)
+        ),
+        upload_batch_target_bytes=int(os.environ.get("UPLOAD_BATCH_TARGET_BYTES", 0)),
+        upload_batch_max_files=int(
+            os.environ.get("UPLOAD_BATCH_MAX_FILES", UPLOAD_BATCH_MAX_FILES)
+        ),
+        tail_mode_enabled=os.environ.get("ENABLE_TAIL_MODE", "false").lower() == "true",
+        async_enabled=os.environ.get("ENABLE_ASYNC_FILTER", "false").lower() == "true",
+        compaction_enabled=os.environ.get("ENABLE_COMPACTION", "false").lower()
+        == "true",
+        max_concurrency=int(
+            os.environ.get("FILTER_MAX_CONCURRENCY", ASYNC_MAX_CONCURRENCY)
+        ),
+    )
+
+
 @logger.inject_lambda_context()
 @tracer.capture_lambda_handler
 def lambda_handler(
@@ -25,8 +108,11 @@ def lambda_handler(
     Args:
         event (Dict[str, Any]): Lambda関数のイベントデータ
             必須キー
-                - DbClusterIdentifier (str): Aurora DBクラスター識別子
                 - LogDestinationBucket (str): ログファイルの出力先S3バケット名
+            処理対象のDBクラスターの指定（いずれか1つ以上が必須）
+                - DbClusterIdentifier (str): Aurora DBクラスター識別子
+                - DbClusterIdentifiers (List[str]): Aurora DBクラスター識別子のリスト
+                - DbClusterTags (Dict[str, str]): 全てのタグが一致するAurora DBクラスターを対象とする
             オプションキー：
                 - LogRangeMinutes (int): 現在時刻からさかのぼって取得するログの期間（分）
                     デフォルト: 180 (3時間)
@@ -34,24 +120,20 @@ def lambda_handler(
 
     Returns:
         List[Dict[str, Any]]: 処理対象となるログファイル情報のリスト
+            UPLOAD_BATCH_TARGET_BYTES が指定されている場合はバッチ (LogFiles, TotalSize) のリスト
 
     Raises:
         SystemExit: 予期しないエラーが発生した場合
     """
     try:
         logger.debug("Processing event", extra={"event": event})
-        config = LogFileFilterConfig(
-            db_cluster_identifier=event.get("DbClusterIdentifier"),
-            log_destination_bucket=event.get("LogDestinationBucket"),
-            log_range_minutes=event.get("LogRangeMinutes", DEFAULT_LOG_RANGE_MINUTES),
-            compression_enabled=os.environ.get("ENABLE_COMPRESSION", "false").lower()
-            == "true",
-        )
+        selector = create_db_cluster_selector(event)
+        config = create_multi_cluster_config(event)
 
-        db_cluster_postgresql_log_file_filter = DbClusterPostgreSqlLogFileFilter(config)
-        result: LogFile = (
-            db_cluster_postgresql_log_file_filter.filter_cluster_log_files()
+        multi_cluster_log_file_filter = MultiClusterLogFileFilter(
+            config, watermark_store_factory=_create_watermark_store
         )
+        result = multi_cluster_log_file_filter.filter_log_files(selector)
 
         logger.info(
             "Lambda execution completed",
@@ -0,0 +1,76 @@
+from typing import List, Dict, Any
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from db_cluster_postgresql_log_file_filter_constants import (
+    UPLOAD_BATCH_MAX_FILES,
+)
+
+
+logger = Logger()
+
+
+@dataclass(frozen=True)
+class LogFileBatcherConfig:
+    """LogFileBatcher の設定値を管理するデータクラス"""
+
+    target_bytes: int
+    max_files: int = UPLOAD_BATCH_MAX_FILES
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.target_bytes <= 0:
+            raise ValueError("TargetBytes must be greater than 0")
+        if self.max_files <= 0:
+            raise ValueError("MaxFiles must be greater than 0")
+
+
+class LogFileBatcher:
+    """ログファイル情報をファイルサイズに応じてバッチにまとめるクラス
+
+    サイズの小さいログファイルを1回のアップローダー呼び出しでまとめて処理するため、
+    First Fit Decreasing によりバッチあたりの合計サイズが target_bytes 以下となるようにまとめる。
+    target_bytes を超えるログファイルは単独のバッチとする
+    """
+
+    def __init__(self, config: LogFileBatcherConfig):
+        self.config = config
+
+    def pack(self, log_files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """ログファイル情報のバッチへの詰め込み
+
+        Args:
+            log_files (List[Dict[str, Any]]): LogFile.to_dict() 形式のログファイル情報のリスト
+
+        Returns:
+            List[Dict[str, Any]]: 合計サイズの降順に並べたバッチのリスト
+                各辞書には以下のキーが含まれる
+                    - LogFiles (List[Dict[str, Any]]): バッチに含まれるログファイル情報
+                    - TotalSize (int): バッチに含まれるログファイルの合計サイズ（バイト）
+        """
+
+        batches: List[Dict[str, Any]] = []
+
+        for log_file in sorted(log_files, key=lambda x: x["Size"], reverse=True):
+            for batch in batches:
+                if (
+                    batch["TotalSize"] + log_file["Size"] <= self.config.target_bytes
+                    and len(batch["LogFiles"]) < self.config.max_files
+                ):
+                    batch["LogFiles"].append(log_file)
+                    batch["TotalSize"] += log_file["Size"]
+                    break
+            else:
+                batches.append({"LogFiles": [log_file], "TotalSize": log_file["Size"]})
+
+        batches.sort(key=lambda x: x["TotalSize"], reverse=True)
+
+        logger.info(
+            "Packed log files into batches",
+            extra={
+                "log_file_count": len(log_files),
+                "batch_count": len(batches),
+                "target_bytes": self.config.target_bytes,
+            },
+        )
+        return batches
@@ -0,0 +1,695 @@
+import os
+import re
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger, Tracer
+
+from db_cluster_postgresql_log_file_filter_constants import (
+    CHECKSUM_EXTENSION,
+    CHECKSUM_OBJECT_KEY_SEGMENT,
+    COMPACTED_OBJECT_NAME_FORMAT,
+    COMPACTION_LOOKBACK_DAYS,
+    COMPACTION_MAX_WORKERS,
+    COMPACTION_MIN_AGE_DAYS,
+    COMPACTION_PART_SIZE,
+    MANIFEST_OBJECT_KEY_SEGMENT,
+    S3_DELETE_OBJECTS_MAX_KEYS,
+    S3_MAX_PART_SIZE,
+    S3_MIN_PART_SIZE,
+)
+from aws_clients import get_client
+
+logger = Logger()
+tracer = Tracer()
+
+# <cluster>/<instance>/raw/YYYY/MM/DD/HH/postgresql.log.YYYY-MM-DD-HHMM[.gz|.zst]
+_HOURLY_OBJECT_KEY_PATTERN = re.compile(
+    r"^(?P<instance_prefix>.+)/raw/(?P<day_path>\d{4}/\d{2}/\d{2})/\d{2}/"
+    r"postgresql\.log\.(?P<day>\d{4}-\d{2}-\d{2})-\d{4}(?P<extension>\.gz|\.zst)?$"
+)
+# <cluster>/<instance>/raw/YYYY/MM/DD/postgresql.log.YYYY-MM-DD.compacted-N[.gz|.zst]
+_COMPACTED_OBJECT_KEY_PATTERN = re.compile(
+    r"^.+/raw/\d{4}/\d{2}/\d{2}/postgresql\.log\.\d{4}-\d{2}-\d{2}"
+    r"\.compacted-\d+(?P<extension>\.gz|\.zst)?$"
+)
+_COMPRESSION_CODECS = {".gz": "gzip", ".zst": "zstd"}
+
+
+def is_precondition_failed(error: ClientError) -> bool:
+    """If-Match などの条件に一致しなかったエラーかどうか（HEADはステータスコードのみ返される）"""
+    return error.response["Error"]["Code"] in ("PreconditionFailed", "412")
+
+
+def get_manifest_object_key(object_key: str) -> Optional[str]:
+    """raw の時間単位のオブジェクトキーから、そのログファイルを結合した日単位のマニフェストのキーを生成
+
+    Example:
+        >>> get_manifest_object_key(
+        ...     "cluster-name/db-instance-1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz"
+        ... )
+        "cluster-name/db-instance-1/manifest/2024/01/01/postgresql.log.2024-01-01.gz.json"
+
+    Returns:
+        Optional[str]: マニフェストのオブジェクトキー。時間単位のオブジェクトキーでない場合はNone
+    """
+    match = _HOURLY_OBJECT_KEY_PATTERN.match(object_key)
+    if not match:
+        return None
+    return (
+        f"{match.group('instance_prefix')}{MANIFEST_OBJECT_KEY_SEGMENT}"
+        f"{match.group('day_path')}/postgresql.log.{match.group('day')}"
+        f"{match.group('extension') or ''}.json"
+    )
+
+
+def get_checksum_object_key(object_key: str) -> Optional[str]:
+    """raw の時間単位のオブジェクトキーから、アップロード時に記録したチェックサムのオブジェクトキーを生成
+
+    Example:
+        >>> get_checksum_object_key(
+        ...     "cluster-name/db-instance-1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz"
+        ... )
+        "cluster-name/db-instance-1/checksums/2024/01/01/00/postgresql.log.2024-01-01-0000.json"
+
+    Returns:
+        Optional[str]: チェックサムのオブジェクトキー。時間単位のオブジェクトキーでない場合はNone
+    """
+    match = _HOURLY_OBJECT_KEY_PATTERN.match(object_key)
+    if not match:
+        return None
+    path = object_key[match.end("instance_prefix") + len("/raw/") :]
+    extension = match.group("extension") or ""
+    return (
+        f"{match.group('instance_prefix')}{CHECKSUM_OBJECT_KEY_SEGMENT}"
+        f"{path[: len(path) - len(extension)]}{CHECKSUM_EXTENSION}"
+    )
+
+
+def get_object_day(object_key: str) -> Optional[str]:
+    """raw の時間単位のオブジェクトキーに含まれるログファイルの日付 (YYYY-MM-DD)"""
+    match = _HOURLY_OBJECT_KEY_PATTERN.match(object_key)
+    return match.group("day") if match else None
+
+
+@dataclass(frozen=True)
+class LogFileCompactorConfig:
+    """LogFileCompactor の設定値を管理するデータクラス"""
+
+    log_destination_bucket: str
+    # 日付が変わってから結合するまでの日数（UTC）
+    min_age_days: int = COMPACTION_MIN_AGE_DAYS
+    # 結合の対象とする過去の日数。再アップロードされたログファイルを取り込むため、
+    # RDSのログファイルの保持期間以上とする
+    lookback_days: int = COMPACTION_LOOKBACK_DAYS
+    part_size: int = COMPACTION_PART_SIZE
+    max_workers: int = COMPACTION_MAX_WORKERS
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if not self.log_destination_bucket:
+            raise ValueError("LogDestinationBucket is required")
+        # 書き込み中の日のログファイルは結合しない
+        if self.min_age_days <= 0:
+            raise ValueError("MinAgeDays must be greater than 0")
+        if self.lookback_days < self.min_age_days:
+            raise ValueError("LookbackDays must be greater than or equal to MinAgeDays")
+        if not S3_MIN_PART_SIZE <= self.part_size <= S3_MAX_PART_SIZE:
+            raise ValueError(
+                f"PartSize must be between {S3_MIN_PART_SIZE} and {S3_MAX_PART_SIZE}"
+            )
+        if self.max_workers <= 0:
+            raise ValueError("MaxWorkers must be greater than 0")
+
+    @classmethod
+    def from_environ(cls, log_destination_bucket: str) -> "LogFileCompactorConfig":
+        """環境変数から設定値を生成
+
+        - COMPACTION_MIN_AGE_DAYS: 日付が変わってから結合するまでの日数
+        - COMPACTION_LOOKBACK_DAYS: 結合の対象とする過去の日数
+        - COMPACTION_MAX_WORKERS: 並列に結合するDBインスタンスの日数
+        """
+        return cls(
+            log_destination_bucket=log_destination_bucket,
+            min_age_days=int(
+                os.environ.get("COMPACTION_MIN_AGE_DAYS", COMPACTION_MIN_AGE_DAYS)
+            ),
+            lookback_days=int(
+                os.environ.get("COMPACTION_LOOKBACK_DAYS", COMPACTION_LOOKBACK_DAYS)
+            ),
+            max_workers=int(
+                os.environ.get("COMPACTION_MAX_WORKERS", COMPACTION_MAX_WORKERS)
+            ),
+        )
+
+
+class LogFileCompactor:
+    """DBインスタンスの1日分の時間単位のログファイルを1つのオブジェクトに結合するクラス
+
+    GZIPメンバー / zstdフレームは連結しても有効な圧縮データのため、展開せずにバイト列のまま連結する。
+    5MB以上の範囲は UploadPartCopy でS3内でコピーし、それ未満の範囲は Range 指定のGETで
+    part_size までバッファリングしてアップロードする。
+
+    結合したオブジェクト (raw/YYYY/MM/DD/postgresql.log.YYYY-MM-DD.compacted-N.gz) の
+    各ログファイルの位置はマニフェスト (manifest/YYYY/MM/DD/postgresql.log.YYYY-MM-DD.gz.json)
+    に記録し、マニフェストの保存後に結合元のオブジェクトを削除する。
+    結合後に再アップロードされたログファイルは次回の結合で取り込み、結合済みの同じログファイルを置き換える。
+    結合のたびに世代番号の異なるオブジェクトに出力するため、途中で失敗した場合も
+    マニフェストが参照するオブジェクトは変更されない。
+    結合元の読み込みは一覧取得時のETagを条件とし、一覧取得後に再アップロードされた場合は
+    その日の結合を中止する（マニフェストの更新、結合元の削除を行わない）
+    """
+
+    def __init__(self, config: LogFileCompactorConfig, s3_client=None):
+        self.config = config
+        self.s3_client = s3_client or get_client("s3", config.max_workers)
+        self.logger = logger
+
+    def target_days(self, now: Optional[datetime] = None) -> List[date]:
+        """結合の対象とする日付の一覧（古い順）"""
+        today = (now or datetime.now(timezone.utc)).date()
+        return [
+            today - timedelta(days=days)
+            for days in range(
+                self.config.lookback_days, self.config.min_age_days - 1, -1
+            )
+        ]
+
+    def list_db_instances(self, db_cluster_identifier: str) -> List[str]:
+        """アーカイブされているDBインスタンスの一覧
+
+        削除済みのDBインスタンスのログファイルも結合するため、RDSではなくS3のプレフィックスから取得する
+        """
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        prefix = f"{db_cluster_identifier}/"
+        return [
+            common_prefix["Prefix"][len(prefix) :].rstrip("/")
+            for page in paginator.paginate(
+                Bucket=self.config.log_destination_bucket,
+                Prefix=prefix,
+                Delimiter="/",
+            )
+            for common_prefix in page.get("CommonPrefixes", [])
+        ]
+
+    def _list_day_objects(
+        self, day_prefix: str
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, List[str]]]:
+        """日単位のプレフィックス配下のオブジェクトを拡張子ごとに分類
+
+        Returns:
+            Tuple: 拡張子ごとの時間単位のオブジェクト (ListObjectsV2 の Contents) と、
+                拡張子ごとの結合済みオブジェクトのキー
+        """
+        hourly_objects: Dict[str, List[Dict[str, Any]]] = {}
+        compacted_keys: Dict[str, List[str]] = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=self.config.log_destination_bucket, Prefix=day_prefix
+        ):
+            for content in page.get("Contents", []):
+                hourly = _HOURLY_OBJECT_KEY_PATTERN.match(content["Key"])
+                if hourly:
+                    hourly_objects.setdefault(
+                        hourly.group("extension") or "", []
+                    ).append(content)
+                    continue
+                compacted = _COMPACTED_OBJECT_KEY_PATTERN.match(content["Key"])
+                if compacted:
+                    compacted_keys.setdefault(
+                        compacted.group("extension") or "", []
+                    ).append(content["Key"])
+        return hourly_objects, compacted_keys
+
+    def load_manifest(self, manifest_key: str) -> Optional[Dict[str, Any]]:
+        """マニフェストの読み込み。存在しない場合はNone"""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.config.log_destination_bucket, Key=manifest_key
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def load_source_checksum(
+        self, object_key: str, last_written: Optional[int]
+    ) -> Optional[str]:
+        """アップロード時に記録した圧縮前のログファイルのSHA-256
+
+        以前のアップロードのチェックサムを使用しないよう、LastWritten が一致する場合のみ返す
+
+        Returns:
+            Optional[str]: SHA-256。チェックサムのオブジェクトが存在しない場合などはNone
+        """
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.config.log_destination_bucket,
+                Key=get_checksum_object_key(object_key),
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        checksum = json.loads(response["Body"].read())
+        if checksum.get("LastWritten") != last_written:
+            return None
+        return checksum.get("SourceSha256")
+
+    def _create_member(self, content: Dict[str, Any]) -> Dict[str, Any]:
+        """時間単位のオブジェクトのメタデータ、チェックサムからマニフェストのメンバーを生成"""
+        response = self.s3_client.head_object(
+            Bucket=self.config.log_destination_bucket,
+            Key=content["Key"],
+            IfMatch=content["ETag"],
+        )
+        # S3のメタデータのキーは小文字で返される
+        metadata = response.get("Metadata", {})
+        last_written = (
+            int(metadata["lastwritten"]) if "lastwritten" in metadata else None
+        )
+        return {
+            "SourceObjectKey": content["Key"],
+            "SourceETag": content["ETag"],
+            "Length": content["Size"],
+            "LastModified": int(content["LastModified"].timestamp() * 1000),
+            "LastWritten": last_written,
+            "SourceSize": (
+                int(metadata["sourcesize"]) if "sourcesize" in metadata else None
+            ),
+            "SourceSha256": self.load_source_checksum(content["Key"], last_written),
+            "ContentType": response.get("ContentType"),
+            "ContentEncoding": response.get("ContentEncoding"),
+        }
+
+    @staticmethod
+    def _coalesce_ranges(
+        ranges: List[Tuple[str, str, int, int]],
+    ) -> List[Tuple[str, str, int, int]]:
+        """同じオブジェクトの連続する範囲を1つにまとめる"""
+        coalesced: List[Tuple[str, str, int, int]] = []
+        for object_key, etag, offset, length in ranges:
+            if length == 0:
+                continue
+            if coalesced:
+                last_key, last_etag, last_offset, last_length = coalesced[-1]
+                if (
+                    last_key == object_key
+                    and last_etag == etag
+                    and last_offset + last_length == offset
+                ):
+                    coalesced[-1] = (
+                        last_key,
+                        last_etag,
+                        last_offset,
+                        last_length + length,
+                    )
+                    continue
+            coalesced.append((object_key, etag, offset, length))
+        return coalesced
+
+    def _read_range(
+        self, object_key: str, etag: str, offset: int, length: int
+    ) -> bytes:
+        response = self.s3_client.get_object(
+            Bucket=self.config.log_destination_bucket,
+            Key=object_key,
+            IfMatch=etag,
+            Range=f"bytes={offset}-{offset + length - 1}",
+        )
+        return response["Body"].read()
+
+    def _write_compacted_object(
+        self,
+        object_key: str,
+        ranges: List[Tuple[str, str, int, int]],
+        extra_args: Dict[str, str],
+    ) -> str:
+        """範囲 (オブジェクトキー, ETag, 開始位置, 長さ) を順に連結したオブジェクトの作成
+
+        Returns:
+            str: 作成したオブジェクトのETag
+
+        Raises:
+            ClientError: 結合元のETagが一致しない場合 (PreconditionFailed)。
+                マルチパートアップロードは中止される
+        """
+        ranges = self._coalesce_ranges(ranges)
+        bucket = self.config.log_destination_bucket
+
+        # 1パートに収まる場合は PutObject とする
+        if sum(length for _, _, _, length in ranges) <= self.config.part_size:
+            response = self.s3_client.put_object(
+                Bucket=bucket,
+                Key=object_key,
+                Body=b"".join(self._read_range(*source) for source in ranges),
+                **extra_args,
+            )
+            return response["ETag"]
+
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=bucket, Key=object_key, **extra_args
+        )["UploadId"]
+        parts: List[Dict[str, Any]] = []
+        buffer = bytearray()
+
+        def upload_buffer() -> None:
+            response = self.s3_client.upload_part(
+                Bucket=bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=bytes(buffer),
+            )
+            parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+            buffer.clear()
+
+        try:
+            for source_key, etag, offset, length in ranges:
+                position, end = offset, offset + length
+                while position < end:
+                    remaining = end - position
+                    # 最後以外のパートは5MB以上とするため、バッファが空の場合のみコピーする
+                    if not buffer and remaining >= S3_MIN_PART_SIZE:
+                        size = min(remaining, S3_MAX_PART_SIZE)
+                        response = self.s3_client.upload_part_copy(
+                            Bucket=bucket,
+                            Key=object_key,
+                            UploadId=upload_id,
+                            PartNumber=len(parts) + 1,
+                            CopySource={"Bucket": bucket, "Key": source_key},
+                            CopySourceIfMatch=etag,
+                            CopySourceRange=f"bytes={position}-{position + size - 1}",
+                        )
+                        parts.append(
+                            {
+                                "PartNumber": len(parts) + 1,
+                                "ETag": response["CopyPartResult"]["ETag"],
+                            }
+                        )
+                        position += size
+                        continue
+
+                    size = min(remaining, self.config.part_size - len(buffer))
+                    buffer += self._read_range(source_key, etag, position, size)
+                    position += size
+                    if len(buffer) >= self.config.part_size:
+                        upload_buffer()
+
+            if buffer:
+                upload_buffer()
+
+            response = self.s3_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            return response["ETag"]
+
+        except Exception:
+            self.s3_client.abort_multipart_upload(
+                Bucket=bucket, Key=object_key, UploadId=upload_id
+            )
+            raise
+
+    def _delete_objects(self, object_keys: List[str]) -> None:
+        for i in range(0, len(object_keys), S3_DELETE_OBJECTS_MAX_KEYS):
+            response = self.s3_client.delete_objects(
+                Bucket=self.config.log_destination_bucket,
+                Delete={
+                    "Objects": [
+                        {"Key": object_key}
+                        for object_key in object_keys[
+                            i : i + S3_DELETE_OBJECTS_MAX_KEYS
+                        ]
+                    ],
+                    "Quiet": True,
+                },
+            )
+            if response.get("Errors"):
+                raise RuntimeError(
+                    f"Failed to delete compacted objects: {response['Errors']}"
+                )
+
+    @staticmethod
+    def _is_unchanged(
+        compacted_member: Optional[Dict[str, Any]], member: Dict[str, Any]
+    ) -> bool:
+        """再アップロードされたログファイルが結合済みのメンバーと同じ内容かどうか
+
+        LastWritten のみ更新された場合などは、SHA-256とサイズが一致する
+        """
+        return (
+            compacted_member is not None
+            and member["SourceSha256"] is not None
+            and compacted_member.get("SourceSha256") == member["SourceSha256"]
+            and compacted_member.get("SourceSize") == member["SourceSize"]
+        )
+
+    def _put_manifest(self, manifest_key: str, manifest: Dict[str, Any]) -> None:
+        self.s3_client.put_object(
+            Bucket=self.config.log_destination_bucket,
+            Key=manifest_key,
+            Body=json.dumps(manifest).encode(),
+            ContentType="application/json",
+        )
+
+    def _log_source_changed(self, manifest_key: str, error: ClientError) -> None:
+        self.logger.warning(
+            "Source object changed during compaction, skipping the day",
+            extra={"manifest_object_key": manifest_key, "error": str(error)},
+        )
+
+    def _compact_objects(
+        self,
+        hourly_objects: List[Dict[str, Any]],
+        compacted_keys: List[str],
+    ) -> Optional[Dict[str, Any]]:
+        """同じ拡張子の時間単位のオブジェクトを結合済みのオブジェクトに取り込む"""
+        manifest_key = get_manifest_object_key(hourly_objects[0]["Key"])
+        manifest = self.load_manifest(manifest_key)
+        members = {
+            member["SourceObjectKey"]: member
+            for member in (manifest["Members"] if manifest else [])
+        }
+
+        # 前回の結合後に削除できなかった結合元は削除のみ行う
+        duplicate_keys = [
+            content["Key"]
+            for content in hourly_objects
+            if members.get(content["Key"], {}).get("SourceETag") == content["ETag"]
+        ]
+        try:
+            new_members = [
+                self._create_member(content)
+                for content in hourly_objects
+                if content["Key"] not in duplicate_keys
+            ]
+        except ClientError as e:
+            if not is_precondition_failed(e):
+                raise
+            self._log_source_changed(manifest_key, e)
+            return None
+
+        # 結合済みのメンバーと同じ内容で再アップロードされた結合元は、結合し直さずに LastWritten のみ更新する
+        unchanged_members = [
+            member
+            for member in new_members
+            if self._is_unchanged(members.get(member["SourceObjectKey"]), member)
+        ]
+        for member in unchanged_members:
+            members[member["SourceObjectKey"]]["LastWritten"] = member["LastWritten"]
+        new_members = [
+            member for member in new_members if member not in unchanged_members
+        ]
+        if not new_members:
+            if unchanged_members:
+                self._put_manifest(manifest_key, manifest)
+                self.logger.info(
+                    "Skipped compaction of unchanged log files",
+                    extra={
+                        "manifest_object_key": manifest_key,
+                        "unchanged_object_keys": [
+                            member["SourceObjectKey"] for member in unchanged_members
+                        ],
+                    },
+                )
+            self._delete_objects(
+                duplicate_keys
+                + [member["SourceObjectKey"] for member in unchanged_members]
+            )
+            return None
+
+        # 結合済みのメンバーは前回の結合済みオブジェクトの範囲、新しいメンバーは時間単位のオブジェクト全体
+        for member in new_members:
+            members.pop(member["SourceObjectKey"], None)
+        sources = [
+            (
+                member,
+                (
+                    manifest["ObjectKey"],
+                    manifest["ETag"],
+                    member["Offset"],
+                    member["Length"],
+                ),
+            )
+            for member in members.values()
+        ] + [
+            (
+                member,
+                (member["SourceObjectKey"], member["SourceETag"], 0, member["Length"]),
+            )
+            for member in new_members
+        ]
+        # ログファイル名（開始日時）の順に並べる
+        sources.sort(key=lambda source: source[0]["SourceObjectKey"].rsplit("/", 1)[1])
+
+        generation = manifest["Generation"] + 1 if manifest else 1
+        extension = (
+            _HOURLY_OBJECT_KEY_PATTERN.match(hourly_objects[0]["Key"]).group(
+                "extension"
+            )
+            or ""
+        )
+        day_prefix = hourly_objects[0]["Key"].rsplit("/", 2)[0]
+        object_key = (
+            f"{day_prefix}/"
+            + COMPACTED_OBJECT_NAME_FORMAT.format(
+                day=get_object_day(hourly_objects[0]["Key"]), generation=generation
+            )
+            + extension
+        )
+        content_type = new_members[0]["ContentType"] or (
+            manifest.get("ContentType") if manifest else None
+        )
+        content_encoding = new_members[0]["ContentEncoding"] or (
+            manifest.get("ContentEncoding") if manifest else None
+        )
+
+        try:
+            etag = self._write_compacted_object(
+                object_key,
+                [source for _, source in sources],
+                {
+                    **({"ContentType": content_type} if content_type else {}),
+                    **(
+                        {"ContentEncoding": content_encoding}
+                        if content_encoding
+                        else {}
+                    ),
+                },
+            )
+        except ClientError as e:
+            if not is_precondition_failed(e):
+                raise
+            # 結合元は削除せず、次回の結合で再アップロード後のオブジェクトを取り込む
+            self._log_source_changed(manifest_key, e)
+            return None
+
+        offset = 0
+        manifest_members = []
+        for member, _ in sources:
+            manifest_members.append(
+                {
+                    key: value
+                    for key, value in member.items()
+                    if key not in ("ContentType", "ContentEncoding")
+                }
+                | {"Offset": offset}
+            )
+            offset += member["Length"]
+
+        new_manifest = {
+            "ObjectKey": object_key,
+            "ETag": etag,
+            "Generation": generation,
+            "CompressionCodec": _COMPRESSION_CODECS.get(extension),
+            "ContentType": content_type,
+            "ContentEncoding": content_encoding,
+            "Size": offset,
+            "CompactedAt": int(datetime.now(timezone.utc).timestamp() * 1000),
+            "Members": manifest_members,
+        }
+        self._put_manifest(manifest_key, new_manifest)
+
+        # マニフェストが参照しない結合元、以前の世代の結合済みオブジェクトを削除する
+        deleted_keys = [content["Key"] for content in hourly_objects] + [
+            key for key in compacted_keys if key != object_key
+        ]
+        self._delete_objects(deleted_keys)
+
+        result = {
+            "ObjectKey": object_key,
+            "ManifestObjectKey": manifest_key,
+            "Generation": generation,
+            "MemberCount": len(manifest_members),
+            "CompactedCount": len(new_members),
+            "DeletedCount": len(deleted_keys),
+            "Size": offset,
+        }
+        self.logger.info("Compacted log files", extra=result)
+        return result
+
+    @tracer.capture_method
+    def compact_day(
+        self, db_cluster_identifier: str, db_instance: str, day: date
+    ) -> List[Dict[str, Any]]:
+        """DBインスタンスの1日分の時間単位のオブジェクトを拡張子ごとに結合
+
+        Returns:
+            List[Dict[str, Any]]: 結合したオブジェクトごとの結果
+        """
+        day_prefix = f"{db_cluster_identifier}/{db_instance}/raw/{day:%Y/%m/%d}/"
+        hourly_objects, compacted_keys = self._list_day_objects(day_prefix)
+
+        results = []
+        for extension, contents in sorted(hourly_objects.items()):
+            result = self._compact_objects(contents, compacted_keys.get(extension, []))
+            if result:
+                results.append(result)
+        return results
+
+    @tracer.capture_method
+    def compact_cluster(
+        self, db_cluster_identifier: str, now: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """DBクラスターの全DBインスタンスの対象日のログファイルを結合
+
+        DBインスタンスと日付の組ごとに max_workers 件ずつ並列に処理する
+
+        Returns:
+            List[Dict[str, Any]]: 結合したオブジェクトごとの結果
+        """
+        targets = [
+            (db_instance, day)
+            for db_instance in self.list_db_instances(db_cluster_identifier)
+            for day in self.target_days(now)
+        ]
+
+        def compact(target: Tuple[str, date]) -> List[Dict[str, Any]]:
+            db_instance, day = target
+            try:
+                return self.compact_day(db_cluster_identifier, db_instance, day)
+            except Exception as e:
+                self.logger.exception(
+                    "Failed to compact log files",
+                    extra={
+                        "db_cluster_identifier": db_cluster_identifier,
+                        "db_instance": db_instance,
+                        "day": day.isoformat(),
+                    },
+                    error=str(e),
+                )
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            return [
+                result
+                for results in executor.map(compact, targets)
+                for result in results
+            ]
@@ -0,0 +1,111 @@
+import os
+import json
+from abc import ABC, abstractmethod
+from typing import Dict
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+from db_cluster_postgresql_log_file_filter_constants import WATERMARK_OBJECT_KEY_FORMAT
+from aws_clients import get_client
+
+
+logger = Logger()
+
+
+class LogFileWatermarkStore(ABC):
+    """DBインスタンスごとのアーカイブ済みログファイルの最終更新時刻（ウォーターマーク）を管理する基底クラス
+
+    ウォーターマークは、その時刻以前に最終更新されたログファイルが全てアーカイブ済みであることを表す
+    UNIXタイムスタンプ（ミリ秒）
+    """
+
+    @abstractmethod
+    def load(self) -> Dict[str, int]:
+        """ウォーターマークの読み込み
+
+        Returns:
+            Dict[str, int]: DBインスタンス識別子をキーとしたウォーターマーク
+        """
+
+    @abstractmethod
+    def save(self, watermarks: Dict[str, int]) -> None:
+        """ウォーターマークの保存
+
+        Args:
+            watermarks (Dict[str, int]): DBインスタンス識別子をキーとしたウォーターマーク
+        """
+
+
+class S3LogFileWatermarkStore(LogFileWatermarkStore):
+    """ウォーターマークをS3上のJSONオブジェクトで管理するクラス"""
+
+    def __init__(self, bucket: str, db_cluster_identifier: str, s3_client=None):
+        self.bucket = bucket
+        self.object_key = WATERMARK_OBJECT_KEY_FORMAT.format(
+            db_cluster_identifier=db_cluster_identifier
+        )
+        self.s3_client = s3_client or get_client("s3")
+
+    def load(self) -> Dict[str, int]:
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=self.object_key
+            )
+            watermarks = json.loads(response["Body"].read())
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                logger.info(
+                    "Watermark state not found",
+                    extra={"bucket": self.bucket, "object_key": self.object_key},
+                )
+                return {}
+            raise
+
+        logger.debug(
+            "Loaded watermark state",
+            extra={
+                "bucket": self.bucket,
+                "object_key": self.object_key,
+                "watermarks": watermarks,
+            },
+        )
+        return {instance: int(value) for instance, value in watermarks.items()}
+
+    def save(self, watermarks: Dict[str, int]) -> None:
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.object_key,
+            Body=json.dumps(watermarks, sort_keys=True).encode(),
+            ContentType="application/json",
+        )
+
+        logger.debug(
+            "Saved watermark state",
+            extra={
+                "bucket": self.bucket,
+                "object_key": self.object_key,
+                "watermarks": watermarks,
+            },
+        )
+
+
+class LocalLogFileWatermarkStore(LogFileWatermarkStore):
+    """ウォーターマークをローカルのJSONファイルで管理するクラス
+
+    ローカルでの動作確認用
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def load(self) -> Dict[str, int]:
+        if not os.path.exists(self.file_path):
+            return {}
+
+        with open(self.file_path, "r") as f:
+            return {instance: int(value) for instance, value in json.load(f).items()}
+
+    def save(self, watermarks: Dict[str, int]) -> None:
+        with open(self.file_path, "w") as f:
+            json.dump(watermarks, f, sort_keys=True)
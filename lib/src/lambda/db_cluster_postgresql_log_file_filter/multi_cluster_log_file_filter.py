@@ -0,0 +1,326 @@
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Callable
+from itertools import chain, zip_longest
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger, Tracer
+
+from db_cluster_postgresql_log_file_filter_constants import (
+    ASYNC_MAX_CONCURRENCY,
+    AURORA_POSTGRESQL_ENGINE,
+    COMPRESSION_EXTENSIONS,
+    MAX_CLUSTER_WORKERS,
+    MAX_WORKERS,
+    RDS_API_RATE_LIMIT,
+    RDS_API_BURST,
+    UPLOAD_BATCH_MAX_FILES,
+)
+from db_cluster_postgresql_log_file_filter import (
+    DbClusterPostgreSqlLogFileFilter,
+    LogFileFilterConfig,
+)
+from rds_api_rate_limiter import RdsApiRateLimiter
+from aws_clients import get_client
+from aws_clients_constants import DEFAULT_MAX_POOL_CONNECTIONS
+
+# ウォーターマークのモジュールは有効な場合のみ読み込む
+if TYPE_CHECKING:
+    from log_file_watermark_store import LogFileWatermarkStore
+
+logger = Logger()
+tracer = Tracer()
+
+
+@dataclass(frozen=True)
+class DbClusterSelector:
+    """処理対象のDBクラスターの選択条件を管理するデータクラス
+
+    db_cluster_identifiers と tags の両方を指定した場合は、いずれかに該当するDBクラスターを対象とする
+    """
+
+    db_cluster_identifiers: List[str] = field(default_factory=list)
+    tags: Dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if not self.db_cluster_identifiers and not self.tags:
+            raise ValueError(
+                "DbClusterIdentifier, DbClusterIdentifiers or DbClusterTags is required"
+            )
+
+
+@dataclass(frozen=True)
+class MultiClusterLogFileFilterConfig:
+    """MultiClusterLogFileFilter の設定値を管理するデータクラス
+
+    DBクラスター識別子以外の LogFileFilterConfig の設定値と、DBクラスターの並列処理数を持つ
+    """
+
+    log_destination_bucket: str
+    log_range_minutes: int
+    compression_enabled: bool = False
+    compression_codec: str = "gzip"
+    max_workers: int = MAX_WORKERS
+    rds_api_rate_limit: float = RDS_API_RATE_LIMIT
+    rds_api_burst: int = RDS_API_BURST
+    max_cluster_workers: int = MAX_CLUSTER_WORKERS
+    upload_batch_target_bytes: int = 0
+    upload_batch_max_files: int = UPLOAD_BATCH_MAX_FILES
+    tail_mode_enabled: bool = False
+    async_enabled: bool = False
+    max_concurrency: int = ASYNC_MAX_CONCURRENCY
+    backfill_enabled: bool = False
+    compaction_enabled: bool = False
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if not self.log_destination_bucket:
+            raise ValueError("LogDestinationBucket is required")
+        if self.log_range_minutes <= 0:
+            raise ValueError("LogRangeMinutes must be greater than 0")
+        if self.compression_codec not in COMPRESSION_EXTENSIONS:
+            raise ValueError(
+                f"CompressionCodec must be one of {', '.join(COMPRESSION_EXTENSIONS)}"
+            )
+        if self.max_workers <= 0:
+            raise ValueError("MaxWorkers must be greater than 0")
+        if self.max_cluster_workers <= 0:
+            raise ValueError("MaxClusterWorkers must be greater than 0")
+        if self.max_concurrency <= 0:
+            raise ValueError("MaxConcurrency must be greater than 0")
+        if self.upload_batch_target_bytes < 0:
+            raise ValueError(
+                "UploadBatchTargetBytes must be greater than or equal to 0"
+            )
+
+    def to_cluster_config(self, db_cluster_identifier: str) -> LogFileFilterConfig:
+        """DBクラスターごとの設定値を生成
+
+        Args:
+            db_cluster_identifier (str): DBクラスター識別子
+
+        Returns:
+            LogFileFilterConfig: DBクラスターごとの設定値
+        """
+        return LogFileFilterConfig(
+            db_cluster_identifier=db_cluster_identifier,
+            **{
+                config_field.name: getattr(self, config_field.name)
+                for config_field in fields(LogFileFilterConfig)
+                if config_field.name != "db_cluster_identifier"
+            },
+        )
+
+
+class MultiClusterLogFileFilter:
+    """複数のDBクラスターのログファイルフィルター処理クラス
+
+    1回の呼び出しで複数のDBクラスターを並列で処理する。
+    boto3クライアントとRDS APIのレート制限は全DBクラスターで共有する
+    """
+
+    def __init__(
+        self,
+        config: MultiClusterLogFileFilterConfig,
+        watermark_store_factory: Optional[
+            Callable[[LogFileFilterConfig], Optional["LogFileWatermarkStore"]]
+        ] = None,
+    ):
+        """
+        Args:
+            config (MultiClusterLogFileFilterConfig): 設定値
+            watermark_store_factory: DBクラスターごとのウォーターマークの保存先を生成する関数
+        """
+        self.config = config
+        self.watermark_store_factory = watermark_store_factory
+        self.logger = logger
+
+        # 全DBクラスター、全DBインスタンスの並列処理数分のHTTPコネクションを確保
+        # 非同期の場合はDBクラスターごとのAPI呼び出しの並列数分とする
+        # クライアントはウォームスタート時に再利用する
+        max_pool_connections = max(
+            DEFAULT_MAX_POOL_CONNECTIONS,
+            config.max_cluster_workers
+            * (config.max_concurrency if config.async_enabled else config.max_workers),
+        )
+        self.rds_client = get_client("rds", max_pool_connections)
+        self.s3_client = get_client("s3", max_pool_connections)
+        self.rds_api_rate_limiter = RdsApiRateLimiter(
+            rate=config.rds_api_rate_limit, capacity=config.rds_api_burst
+        )
+        self.rds_api_rate_limiter.attach(self.rds_client)
+
+    @tracer.capture_method
+    def resolve_db_cluster_identifiers(self, selector: DbClusterSelector) -> List[str]:
+        """選択条件に該当するDBクラスター識別子一覧を取得
+
+        タグが指定されている場合は、Aurora PostgreSQLのDBクラスターをページネーションで全件取得し、
+        全てのタグが一致するDBクラスターを抽出する
+
+        Args:
+            selector (DbClusterSelector): DBクラスターの選択条件
+
+        Returns:
+            List[str]: DBクラスター識別子のリスト（重複なし）
+
+        Raises:
+            ClientError: AWS APIの呼び出しに失敗した場合
+        """
+
+        db_cluster_identifiers = list(selector.db_cluster_identifiers)
+
+        if selector.tags:
+            try:
+                paginator = self.rds_client.get_paginator("describe_db_clusters")
+                for page in paginator.paginate(
+                    Filters=[{"Name": "engine", "Values": [AURORA_POSTGRESQL_ENGINE]}]
+                ):
+                    for db_cluster in page["DBClusters"]:
+                        tags = {
+                            tag["Key"]: tag["Value"]
+                            for tag in db_cluster.get("TagList", [])
+                        }
+                        if all(
+                            tags.get(key) == value
+                            for key, value in selector.tags.items()
+                        ):
+                            db_cluster_identifiers.append(
+                                db_cluster["DBClusterIdentifier"]
+                            )
+
+            except ClientError as e:
+                self.logger.exception(
+                    "Failed to resolve DB clusters by tags",
+                    extra={"tags": selector.tags},
+                    error=str(e),
+                )
+                raise
+
+        # 指定順を保持したまま重複を除外
+        db_cluster_identifiers = list(dict.fromkeys(db_cluster_identifiers))
+
+        self.logger.info(
+            "Resolved DB clusters",
+            extra={
+                "db_cluster_identifiers": db_cluster_identifiers,
+                "cluster_count": len(db_cluster_identifiers),
+            },
+        )
+        return db_cluster_identifiers
+
+    def _create_cluster_filter(
+        self, db_cluster_identifier: str
+    ) -> DbClusterPostgreSqlLogFileFilter:
+        """DBクラスターごとのフィルター処理クラスの生成"""
+        config = self.config.to_cluster_config(db_cluster_identifier)
+        filter_class = DbClusterPostgreSqlLogFileFilter
+        if config.async_enabled:
+            # asyncio 版は有効な場合のみ読み込む
+            from async_db_cluster_postgresql_log_file_filter import (
+                AsyncDbClusterPostgreSqlLogFileFilter,
+            )
+
+            filter_class = AsyncDbClusterPostgreSqlLogFileFilter
+        return filter_class(
+            config,
+            watermark_store=(
+                self.watermark_store_factory(config)
+                if self.watermark_store_factory
+                else None
+            ),
+            rds_client=self.rds_client,
+            s3_client=self.s3_client,
+            rds_api_rate_limiter=self.rds_api_rate_limiter,
+        )
+
+    @staticmethod
+    def _merge_log_files(
+        log_files_list: List[List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """DBクラスターごとのログファイル情報を1つのリストにマージ
+
+        DBインスタンスごとに交互に並べ、後続のMapで同一DBインスタンスへのダウンロードが
+        集中しないようにする。DBインスタンス内ではサイズの大きいログファイルから並べ、
+        処理時間の長いものから開始されるようにする
+        """
+        log_files_by_instance: Dict[str, List[Dict[str, Any]]] = {}
+        for log_file in chain.from_iterable(log_files_list):
+            log_files_by_instance.setdefault(
+                log_file["DbInstanceIdentifier"], []
+            ).append(log_file)
+
+        for log_files in log_files_by_instance.values():
+            log_files.sort(key=lambda x: x["Size"], reverse=True)
+
+        return [
+            log_file
+            for log_files in zip_longest(*log_files_by_instance.values())
+            for log_file in log_files
+            if log_file is not None
+        ]
+
+    @tracer.capture_method
+    def filter_log_files(self, selector: DbClusterSelector) -> List[Dict[str, Any]]:
+        """複数のDBクラスター全体のログファイルの処理
+
+        Args:
+            selector (DbClusterSelector): DBクラスターの選択条件
+
+        Returns:
+            List[Dict[str, Any]]: 処理対象となるログファイル情報の辞書のリスト
+                upload_batch_target_bytes が指定されている場合は、
+                LogFileBatcher.pack() によりバッチにまとめたリスト
+
+        Raises:
+            Exception: 処理中に発生した任意の例外
+        """
+
+        db_cluster_identifiers = self.resolve_db_cluster_identifiers(selector)
+        cluster_filters = [
+            self._create_cluster_filter(db_cluster_identifier)
+            for db_cluster_identifier in db_cluster_identifiers
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=self.config.max_cluster_workers
+        ) as executor:
+            future_to_cluster = {
+                executor.submit(cluster_filter.filter_cluster_log_files): (
+                    cluster_filter.config.db_cluster_identifier
+                )
+                for cluster_filter in cluster_filters
+            }
+
+            log_files_list = []
+            for future in future_to_cluster:
+                db_cluster_identifier = future_to_cluster[future]
+                try:
+                    log_files_list.append(future.result())
+                except Exception as e:
+                    self.logger.exception(
+                        "Failed to process cluster logs",
+                        extra={"cluster_id": db_cluster_identifier},
+                        error=str(e),
+                    )
+                    raise
+
+        log_files = self._merge_log_files(log_files_list)
+
+        self.logger.info(
+            "Completed multi cluster log processing",
+            extra={
+                "cluster_count": len(db_cluster_identifiers),
+                "total_logs_count": len(log_files),
+            },
+        )
+
+        if self.config.upload_batch_target_bytes:
+            from log_file_batcher import LogFileBatcher, LogFileBatcherConfig
+
+            return LogFileBatcher(
+                LogFileBatcherConfig(
+                    target_bytes=self.config.upload_batch_target_bytes,
+                    max_files=self.config.upload_batch_max_files,
+                )
+            ).pack(log_files)
+        return log_files
@@ -0,0 +1,78 @@
+import time
+import threading
+from aws_lambda_powertools import Logger
+
+from db_cluster_postgresql_log_file_filter_constants import RATE_LIMITER_HANDLER_ID
+
+
+logger = Logger()
+
+
+class RdsApiRateLimiter:
+    """トークンバケット方式でAPI呼び出しのレートを制限するクラス
+
+    rate 件/秒でトークンを補充し、最大 capacity 件までのバーストを許容する。
+    複数スレッド、複数クライアントから共有して利用する
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0:
+            raise ValueError("Rate must be greater than 0")
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than 0")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取得し、取得できるまで待機
+
+        Returns:
+            float: 待機した時間（秒）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+
+            # トークンを前借りし、不足分が補充されるまでの時間だけ待機する
+            self._tokens -= 1
+            wait_seconds = max(0.0, -self._tokens / self.rate)
+
+        if wait_seconds:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    def attach(self, rds_client) -> None:
+        """RDSクライアントのAPI呼び出し（ページネーションの各ページを含む）ごとにトークンを取得するよう登録
+
+        ウォームスタート時に再利用されるクライアントに登録済みのレート制限がある場合は置き換える
+
+        Args:
+            rds_client: boto3のRDSクライアント
+        """
+        rds_client.meta.events.unregister(
+            "before-call.rds", unique_id=RATE_LIMITER_HANDLER_ID
+        )
+        rds_client.meta.events.register(
+            "before-call.rds",
+            self._on_before_call,
+            unique_id=RATE_LIMITER_HANDLER_ID,
+        )
+
+    def _on_before_call(self, model=None, **kwargs) -> None:
+        """RDS API呼び出し前のレート制限"""
+        wait_seconds = self.acquire()
+        if wait_seconds:
+            logger.debug(
+                "Throttled RDS API call",
+                extra={
+                    "operation": model.name if model else None,
+                    "wait_seconds": wait_seconds,
+                },
+            )
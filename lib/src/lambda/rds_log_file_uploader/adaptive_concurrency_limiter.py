@@ -0,0 +1,186 @@
+import os
+import time
+import threading
+from typing import Dict, NamedTuple, Optional
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    ADAPTIVE_CONCURRENCY_DECREASE_FACTOR,
+    ADAPTIVE_CONCURRENCY_MIN_LIMIT,
+    THROTTLE_ERROR_CODES,
+    THROTTLE_STATUS_CODES,
+    UPLOAD_BATCH_MAX_WORKERS,
+)
+
+logger = Logger()
+
+# 処理結果。エラー、中断は上限を変更しない
+SUCCEEDED = "succeeded"
+THROTTLED = "throttled"
+FAILED = "failed"
+
+# ウォームスタート時に学習した上限を引き継ぐため、モジュールレベルで保持する
+_lock = threading.Lock()
+_limiters: Dict[str, "AdaptiveConcurrencyLimiter"] = {}
+
+
+def is_throttle_response(status: int, body: bytes) -> bool:
+    """スロットリングによるエラーレスポンスかどうかの判定
+
+    HTTP 429 / 503 と、エラーコードが ThrottlingException などのレスポンスをスロットリングとする
+    """
+    return status in THROTTLE_STATUS_CODES or any(
+        code in body for code in THROTTLE_ERROR_CODES
+    )
+
+
+@dataclass(frozen=True)
+class AdaptiveConcurrencyConfig:
+    """AdaptiveConcurrencyLimiter の設定値を管理するデータクラス"""
+
+    max_limit: int = UPLOAD_BATCH_MAX_WORKERS
+    min_limit: int = ADAPTIVE_CONCURRENCY_MIN_LIMIT
+    # スロットリング時に上限に乗じる係数
+    decrease_factor: float = ADAPTIVE_CONCURRENCY_DECREASE_FACTOR
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.min_limit <= 0:
+            raise ValueError("MinLimit must be greater than 0")
+        if self.max_limit < self.min_limit:
+            raise ValueError("MaxLimit must be greater than or equal to MinLimit")
+        if not 0 < self.decrease_factor < 1:
+            raise ValueError("DecreaseFactor must be between 0 and 1")
+
+    @classmethod
+    def from_environ(cls) -> Optional["AdaptiveConcurrencyConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_ADAPTIVE_CONCURRENCY: DBインスタンスごとのダウンロードの並列数の自動調整の有効化
+        - UPLOAD_BATCH_MAX_WORKERS: 並列数の上限
+        - ADAPTIVE_CONCURRENCY_MIN_LIMIT: 並列数の下限
+        - ADAPTIVE_CONCURRENCY_DECREASE_FACTOR: スロットリング時に上限に乗じる係数
+
+        Returns:
+            Optional[AdaptiveConcurrencyConfig]: 自動調整が無効な場合はNone
+        """
+        if os.environ.get("ENABLE_ADAPTIVE_CONCURRENCY", "false").lower() != "true":
+            return None
+
+        return cls(
+            max_limit=int(
+                os.environ.get("UPLOAD_BATCH_MAX_WORKERS", UPLOAD_BATCH_MAX_WORKERS)
+            ),
+            min_limit=int(
+                os.environ.get(
+                    "ADAPTIVE_CONCURRENCY_MIN_LIMIT", ADAPTIVE_CONCURRENCY_MIN_LIMIT
+                )
+            ),
+            decrease_factor=float(
+                os.environ.get(
+                    "ADAPTIVE_CONCURRENCY_DECREASE_FACTOR",
+                    ADAPTIVE_CONCURRENCY_DECREASE_FACTOR,
+                )
+            ),
+        )
+
+
+class ConcurrencySlot(NamedTuple):
+    """取得した実行枠。取得時点の上限の世代を保持する"""
+
+    generation: int
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD (Additive Increase / Multiplicative Decrease) で並列数の上限を調整するクラス
+
+    成功するたびに上限を 1 / 上限 ずつ増やし（上限数の成功で1増える）、
+    スロットリングされた場合は上限に decrease_factor を乗じる。
+    上限を下げる前に開始した処理のスロットリングは同じ混雑によるものとみなし、続けて下げない。
+    上限は小数で保持し、同時に実行できる数はその整数部とする
+    """
+
+    def __init__(self, config: AdaptiveConcurrencyConfig, name: str):
+        """
+        Args:
+            config (AdaptiveConcurrencyConfig): 設定値
+            name (str): 対象の名前（DBインスタンス識別子）
+        """
+        self.config = config
+        self.name = name
+        self.limit = float(config.max_limit)
+        self.in_flight = 0
+        self.generation = 0
+        self.counts: Dict[str, float] = {
+            "Acquired": 0,
+            "Succeeded": 0,
+            "Throttled": 0,
+            "Decreases": 0,
+            "WaitDuration": 0.0,
+        }
+        self._condition = threading.Condition()
+
+    def acquire(self) -> ConcurrencySlot:
+        """実行枠の取得。上限に達している場合は空くまで待機する"""
+        started = time.perf_counter()
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self.counts["Acquired"] += 1
+            self.counts["WaitDuration"] += time.perf_counter() - started
+            return ConcurrencySlot(self.generation)
+
+    def release(self, slot: ConcurrencySlot, outcome: str) -> None:
+        """実行枠の返却と、処理結果による上限の調整
+
+        Args:
+            slot (ConcurrencySlot): acquire で取得した実行枠
+            outcome (str): SUCCEEDED / THROTTLED / FAILED
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == SUCCEEDED:
+                self.counts["Succeeded"] += 1
+                self.limit = min(
+                    float(self.config.max_limit), self.limit + 1 / self.limit
+                )
+            elif outcome == THROTTLED:
+                self.counts["Throttled"] += 1
+                if slot.generation == self.generation:
+                    self.limit = max(
+                        float(self.config.min_limit),
+                        self.limit * self.config.decrease_factor,
+                    )
+                    self.generation += 1
+                    self.counts["Decreases"] += 1
+                    logger.info(
+                        "Decreased download concurrency",
+                        extra={"db_instance": self.name, "limit": self.limit},
+                    )
+            self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, float]:
+        """現在の上限、実行中の数と、累計のカウンター"""
+        with self._condition:
+            return {
+                "ConcurrencyLimit": round(self.limit, 3),
+                "InFlight": self.in_flight,
+                **self.counts,
+            }
+
+
+def get_concurrency_limiter(
+    name: str, config: AdaptiveConcurrencyConfig
+) -> AdaptiveConcurrencyLimiter:
+    """名前（DBインスタンス識別子）ごとの AdaptiveConcurrencyLimiter の取得
+
+    同じ実行環境のスレッド間、ウォームスタート後の呼び出しで共有する。
+    設定値が変わった場合は作り直す
+    """
+    with _lock:
+        limiter = _limiters.get(name)
+        if limiter is None or limiter.config != config:
+            limiter = _limiters[name] = AdaptiveConcurrencyLimiter(config, name)
+        return limiter
@@ -1,64 +1,341 @@
 import sys
 import os
 import tempfile
-from typing import Dict, Any
-from aws_lambda_powertools import Logger, Tracer
+from typing import TYPE_CHECKING, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from aws_lambda_powertools import Logger, Tracer, Metrics
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from rds_log_file_downloader import RdsLogFileDownloader, RdsLogDownLoaderConfig
 from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+from rds_log_file_uploader_constants import UPLOAD_BATCH_MAX_WORKERS
+from stage_metrics import StageMetrics
+from adaptive_concurrency_limiter import (
+    AdaptiveConcurrencyConfig,
+    get_concurrency_limiter,
+)
+
+# テイルモード、転送計画のモジュールは使用する場合のみ読み込む
+if TYPE_CHECKING:
+    from log_file_tailer import LogFileTailer
 
 logger = Logger()
 tracer = Tracer()
+metrics = Metrics()
 
 
-@logger.inject_lambda_context
-@tracer.capture_lambda_handler
-def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
-    """Lambda関数のハンドラー"""
+def _process_with_temp_file(
+    downloader: RdsLogFileDownloader,
+    uploader: RdsFileLogUploader,
+    stage_metrics: StageMetrics,
+) -> None:
+    """一時ファイルを経由してログファイルをダウンロード、アップロード"""
+
+    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+        temp_path = temp_file.name
+
     try:
-        logger.debug("Processing event", extra={"event": event})
+        with stage_metrics.measure("Download"):
+            downloaded = downloader.download_log_file(temp_path)
+        if not downloaded:
+            raise Exception("Failed to download log file")
+        stage_metrics.add_bytes("Download", os.path.getsize(temp_path))
+
+        if not uploader.upload_log_file(
+            temp_path,
+        ):
+            raise Exception("Failed to upload log file")
+
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _process_with_stream(
+    downloader: RdsLogFileDownloader,
+    uploader: RdsFileLogUploader,
+    stage_metrics: StageMetrics,
+) -> None:
+    """一時ファイルを経由せずにログファイルをストリーミングでアップロード"""
+
+    chunks = stage_metrics.measure_iterator(
+        "Download", downloader.iter_log_file_chunks()
+    )
+    if not uploader.upload_log_stream(chunks):
+        raise Exception("Failed to upload log file")
+
+
+def _process_with_tail_parts(
+    tailer: "LogFileTailer",
+    state: Dict[str, Any],
+    uploader: RdsFileLogUploader,
+    stage_metrics: StageMetrics,
+    log_file: Dict[str, Any],
+) -> bool:
+    """ローテーション前に保存した追記分のパートオブジェクトを連結してアップロード
+
+    残りの追記分をパートオブジェクトとして保存した後、全てのパートオブジェクトを読み込んで
+    raw のオブジェクトとしてアップロードする
 
-        rds_log_file_downloader_config = RdsLogDownLoaderConfig(
-            db_instance_identifier=event["DbInstanceIdentifier"],
-            log_file_name=event["LogFileName"],
+    Args:
+        state (Dict[str, Any]): LogFileTailer.load_state() で読み込んだ保存済みの状態
+
+    Returns:
+        bool: サイズが一致せずログファイル全体の取得が必要な場合False
+    """
+
+    with stage_metrics.measure("Download"):
+        state = tailer.archive_increment(state)
+
+    if log_file.get("Size") and state["Size"] != log_file["Size"]:
+        logger.warning(
+            "Appended log data size does not match log file size, "
+            "downloading whole log file",
+            extra={
+                "log_file": log_file["LogFileName"],
+                "size": log_file["Size"],
+                "appended_size": state["Size"],
+            },
         )
+        return False
+
+    chunks = stage_metrics.measure_iterator(
+        "Download",
+        tailer.iter_part_chunks(state, uploader.transfer_plan.chunk_size),
+    )
+    if not uploader.upload_log_stream(chunks):
+        raise Exception("Failed to upload log file")
+
+    stage_metrics.add_count("TailPartsCompacted", state["PartCount"])
+    return True
+
+
+def _process_log_file(
+    log_file: Dict[str, Any], parallel_files: int = 1
+) -> Dict[str, Any]:
+    """1つのログファイルのダウンロード、アップロード
 
-        rds_log_file_uploader_config = RdsFileLogUploaderConfig(
-            db_instance_identifier=event["DbInstanceIdentifier"],
-            log_destination_bucket=event["LogDestinationBucket"],
-            last_written=event["LastWritten"],
-            object_key=event["ObjectKey"],
+    Tail が指定された書き込み中のログファイルは、追記分のみをパートオブジェクトとして保存する。
+    ローテーション後は保存済みのパートオブジェクトがあれば連結してアップロードし、
+    ログファイル全体の再ダウンロードを行わない
+
+    Args:
+        log_file (Dict[str, Any]): LogFile.to_dict() 形式のログファイル情報
+        parallel_files (int): バッチで並列に処理するログファイル数。転送用のメモリを等分する
+
+    Returns:
+        Dict[str, Any]: 処理結果
+    """
+
+    tailer = None
+    if os.environ.get("ENABLE_TAIL_MODE", "false").lower() == "true":
+        from log_file_tailer import LogFileTailer, LogFileTailConfig
+
+        tailer = LogFileTailer(
+            LogFileTailConfig.from_environ(),
+            db_instance_identifier=log_file["DbInstanceIdentifier"],
+            log_file_name=log_file["LogFileName"],
+            bucket=log_file["LogDestinationBucket"],
+            object_key=log_file["ObjectKey"],
         )
 
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_path = temp_file.name
+    if log_file.get("Tail"):
+        if tailer is None:
+            raise ValueError("ENABLE_TAIL_MODE must be true to archive appended data")
+        state = tailer.archive_increment()
+        return {
+            "db_instance": log_file["DbInstanceIdentifier"],
+            "log_file": log_file["LogFileName"],
+            "object_key": log_file["ObjectKey"],
+            "last_written": log_file["LastWritten"],
+            "tail_size": state["Size"],
+        }
+
+    # ログファイルのサイズ、メモリサイズ、vCPU数からチャンクサイズ、パートサイズ、並列数を決める
+    from transfer_planner import TransferPlanner, TransferPlannerConfig
+
+    transfer_plan = TransferPlanner(TransferPlannerConfig.from_environ()).plan(
+        log_file.get("Size", 0), parallel_files
+    )
+
+    rds_log_file_downloader_config = RdsLogDownLoaderConfig(
+        db_instance_identifier=log_file["DbInstanceIdentifier"],
+        log_file_name=log_file["LogFileName"],
+        chunk_size=transfer_plan.chunk_size,
+    )
 
-        try:
-            downloader = RdsLogFileDownloader(rds_log_file_downloader_config)
-            if not downloader.download_log_file(temp_path):
-                raise Exception("Failed to download log file")
+    rds_log_file_uploader_config = RdsFileLogUploaderConfig(
+        db_instance_identifier=log_file["DbInstanceIdentifier"],
+        log_destination_bucket=log_file["LogDestinationBucket"],
+        last_written=log_file["LastWritten"],
+        object_key=log_file["ObjectKey"],
+        size=log_file.get("Size", 0),
+    )
 
-            uploader = RdsFileLogUploader(rds_log_file_uploader_config)
-            if not uploader.upload_log_file(
-                temp_path,
-            ):
-                raise Exception("Failed to upload log file")
+    # ObjectKey は <cluster>/<instance>/raw/... の形式
+    stage_metrics = StageMetrics.from_environ(
+        {
+            "DbClusterIdentifier": log_file["ObjectKey"].split("/", 1)[0],
+            "DbInstanceIdentifier": log_file["DbInstanceIdentifier"],
+        }
+    )
+    # DBインスタンスごとのダウンロードの並列数は、バッチ内のスレッド間とウォームスタート後の呼び出しで共有する
+    concurrency_config = AdaptiveConcurrencyConfig.from_environ()
+    concurrency_limiter = (
+        get_concurrency_limiter(log_file["DbInstanceIdentifier"], concurrency_config)
+        if concurrency_config
+        else None
+    )
+    downloader = RdsLogFileDownloader(
+        rds_log_file_downloader_config, concurrency_limiter=concurrency_limiter
+    )
+    uploader = RdsFileLogUploader(
+        rds_log_file_uploader_config, stage_metrics, transfer_plan
+    )
+
+    try:
+        # 追記分を保存していないログファイルは、パートオブジェクトの一覧取得と削除を行わない
+        tail_state = tailer.load_state() if tailer else None
+        used_tail_parts = tail_state is not None and _process_with_tail_parts(
+            tailer, tail_state, uploader, stage_metrics, log_file
+        )
+        if used_tail_parts:
+            pass
+        # ストリーミングが有効な場合は一時ファイルを使用しない
+        elif os.environ.get("ENABLE_STREAMING", "false").lower() == "true":
+            _process_with_stream(downloader, uploader, stage_metrics)
+        else:
+            _process_with_temp_file(downloader, uploader, stage_metrics)
+
+        # raw のアップロード後に追記分のパートオブジェクトを削除する
+        # (サイズが一致せずログファイル全体を取得した場合も、保存済みの追記分は不要になる)
+        if used_tail_parts or tail_state is not None:
+            tailer.cleanup()
+    finally:
+        # 失敗した場合もどのステージで時間がかかったかを確認できるよう出力する
+        stage_metrics.add_count("DownloadRetries", downloader.retry_count)
+        stage_metrics.add_count("DownloadThrottles", downloader.throttle_count)
+        if concurrency_limiter:
+            stage_metrics.set_value(
+                "DownloadConcurrencyLimit", concurrency_limiter.limit
+            )
+        stage_metrics.flush()
+
+    return {
+        "db_instance": log_file["DbInstanceIdentifier"],
+        "log_file": log_file["LogFileName"],
+        "object_key": log_file["ObjectKey"],
+        "last_written": log_file["LastWritten"],
+    }
+
+
+def _process_log_file_batch(log_files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """バッチにまとめられた複数のログファイルを並列でダウンロード、アップロード
+
+    一部のログファイルの処理に失敗した場合も残りのログファイルの処理を継続し、
+    全ての処理の完了後に例外を送出する。
+    ENABLE_ADAPTIVE_CONCURRENCY が有効な場合、同じDBインスタンスのダウンロードの並列数は
+    スロットリングに応じて UPLOAD_BATCH_MAX_WORKERS 以下に自動調整される
+
+    Args:
+        log_files (List[Dict[str, Any]]): LogFile.to_dict() 形式のログファイル情報のリスト
+
+    Returns:
+        List[Dict[str, Any]]: ログファイルごとの処理結果
+
+    Raises:
+        Exception: 1つ以上のログファイルの処理に失敗した場合
+    """
+
+    max_workers = int(
+        os.environ.get("UPLOAD_BATCH_MAX_WORKERS", UPLOAD_BATCH_MAX_WORKERS)
+    )
+    results = []
+    failed_log_files = []
+    parallel_files = min(max_workers, len(log_files))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_log_file = {
+            executor.submit(_process_log_file, log_file, parallel_files): log_file
+            for log_file in log_files
+        }
+
+        for future in as_completed(future_to_log_file):
+            log_file = future_to_log_file[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.exception(
+                    "Failed to process log file in batch",
+                    extra={
+                        "db_instance": log_file["DbInstanceIdentifier"],
+                        "log_file": log_file["LogFileName"],
+                    },
+                    error=str(e),
+                )
+                failed_log_files.append(log_file["ObjectKey"])
+
+    concurrency_config = AdaptiveConcurrencyConfig.from_environ()
+    if concurrency_config:
+        for db_instance_identifier in sorted(
+            {log_file["DbInstanceIdentifier"] for log_file in log_files}
+        ):
+            logger.info(
+                "Download concurrency",
+                extra={
+                    "db_instance": db_instance_identifier,
+                    **get_concurrency_limiter(
+                        db_instance_identifier, concurrency_config
+                    ).snapshot(),
+                },
+            )
+
+    if failed_log_files:
+        raise Exception(
+            f"Failed to process {len(failed_log_files)} of {len(log_files)} log files"
+        )
+    return results
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+@metrics.log_metrics
+def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict[str, Any]:
+    """Lambda関数のハンドラー
+
+    Args:
+        event (Dict[str, Any]): Lambda関数のイベントデータ
+            LogFile.to_dict() 形式のログファイル情報、
+            またはバッチ (LogFiles: LogFile.to_dict() 形式のログファイル情報のリスト)
+        context (LambdaContext): Lambda実行コンテキスト
+
+    Returns:
+        Dict[str, Any]: 処理結果
+
+    Raises:
+        SystemExit: 予期しないエラーが発生した場合
+    """
+    try:
+        logger.debug("Processing event", extra={"event": event})
 
+        if "LogFiles" in event:
+            results = _process_log_file_batch(event["LogFiles"])
             return {
                 "statusCode": 200,
                 "body": {
-                    "message": "Successfully processed log file",
-                    "db_instance": event["DbInstanceIdentifier"],
-                    "log_file": event["LogFileName"],
-                    "object_key": event["ObjectKey"],
-                    "last_written": event["LastWritten"],
+                    "message": "Successfully processed log file batch",
+                    "log_file_count": len(results),
+                    "log_files": results,
                 },
             }
 
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        return {
+            "statusCode": 200,
+            "body": {
+                "message": "Successfully processed log file",
+                **_process_log_file(event),
+            },
+        }
 
     except Exception as e:
         logger.exception("Unexpected error", error=str(e))
@@ -0,0 +1,242 @@
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    ATTACHED_SEVERITIES,
+    AUDIT_MESSAGE_PREFIX,
+    COMPRESSION_BLOCK_SIZE,
+    CONNECTION_MESSAGE_PREFIXES,
+    ERROR_SEVERITIES,
+    DERIVED_OBJECT_MAX_INFLIGHT_PARTS,
+    DERIVED_OBJECT_PART_SIZE,
+    LOG_TYPES,
+    SLOW_QUERY_MESSAGE_PREFIX,
+)
+from s3_stream_uploader import S3StreamUploader
+from log_file_compressor import LogFileCompressor
+from log_stream_processor import LogLineStage, build_derived_object_key
+
+logger = Logger()
+
+
+@dataclass(frozen=True)
+class LogEntryRouterConfig:
+    """LogEntryRouter の設定値を管理するデータクラス"""
+
+    log_types: Tuple[str, ...] = LOG_TYPES
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if not self.log_types:
+            raise ValueError("LogTypes is required")
+        for log_type in self.log_types:
+            if log_type not in LOG_TYPES:
+                raise ValueError(f"LogType must be one of {', '.join(LOG_TYPES)}")
+
+    @classmethod
+    def from_environ(cls) -> Optional["LogEntryRouterConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_LOG_ROUTING: ログ種別ごとの振り分けの有効化
+        - LOG_ROUTING_TYPES: 振り分けるログ種別（カンマ区切り）。未指定の場合は全種別
+
+        Returns:
+            Optional[LogEntryRouterConfig]: 振り分けが無効な場合はNone
+        """
+        if os.environ.get("ENABLE_LOG_ROUTING", "false").lower() != "true":
+            return None
+
+        log_types = os.environ.get("LOG_ROUTING_TYPES")
+        if not log_types:
+            return cls()
+        return cls(
+            log_types=tuple(
+                log_type.strip() for log_type in log_types.split(",") if log_type
+            )
+        )
+
+
+class _LogTypeWriter:
+    """1つのログ種別のデータをS3にストリーミングでアップロードするクラス
+
+    圧縮が有効な場合はブロックサイズ単位で圧縮してから送信する。
+    S3オブジェクトは最初の書き込み時に作成し、該当するエントリーがない場合は作成しない
+    """
+
+    def __init__(
+        self,
+        s3_client: Any,
+        bucket: str,
+        key: str,
+        extra_args: Dict[str, Any],
+        compressor: Optional[LogFileCompressor],
+    ):
+        self.key = key
+        self.compressor = compressor
+        self.block_size = (
+            compressor.config.block_size if compressor else COMPRESSION_BLOCK_SIZE
+        )
+        self._buffer = bytearray()
+        self._stream_uploader = S3StreamUploader(
+            s3_client=s3_client,
+            bucket=bucket,
+            key=key,
+            extra_args=extra_args,
+            part_size=DERIVED_OBJECT_PART_SIZE,
+            max_inflight_parts=DERIVED_OBJECT_MAX_INFLIGHT_PARTS,
+        )
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= self.block_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        block = bytes(self._buffer)
+        self._buffer.clear()
+        self._stream_uploader.write(
+            self.compressor.compress_block(block) if self.compressor else block
+        )
+
+    def complete(self) -> int:
+        self._flush()
+        return self._stream_uploader.complete()
+
+    def abort(self) -> None:
+        self._stream_uploader.abort()
+
+
+class LogEntryRouter(LogLineStage):
+    """PostgreSQLログをエントリー単位でログ種別ごとに振り分けるクラス
+
+    log_line_prefix で始まる行をエントリーの先頭とし、続く行（複数行のSQL文など）は
+    同じエントリーとして扱う。各エントリーを以下のログ種別に分類し、
+    raw と同じ <cluster>/<instance>/ 配下の種別ごとのオブジェクトキーに書き込む。
+
+    - error: ERROR / FATAL / PANIC
+    - slow_query: log_min_duration_statement による "duration:" で始まるLOG
+    - audit: pgaudit による "AUDIT:" で始まるLOG
+    - connection: 接続、認証、切断のLOG
+
+    DETAIL / HINT / STATEMENT などの付随するエントリーは直前のエントリーと同じ種別とする。
+    保持するデータは種別ごとの送信バッファのみとする
+    """
+
+    name = "log_routing"
+
+    def __init__(
+        self,
+        config: LogEntryRouterConfig,
+        s3_client: Any,
+        bucket: str,
+        object_key: str,
+        extra_args: Dict[str, Any],
+        compressor: Optional[LogFileCompressor] = None,
+    ):
+        """
+        Args:
+            config (LogEntryRouterConfig): 設定値
+            s3_client: S3クライアント
+            bucket (str): アップロード先のS3バケット
+            object_key (str): 振り分け前のログファイルのオブジェクトキー (.../raw/...)
+            extra_args (Dict[str, Any]): オブジェクト作成時の追加引数
+            compressor (Optional[LogFileCompressor]): 圧縮が有効な場合の圧縮処理クラス
+        """
+        self.config = config
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.object_key = object_key
+        self.extra_args = extra_args
+        self.compressor = compressor
+
+        self._writers: Dict[str, _LogTypeWriter] = {}
+        self._current_log_type: Optional[str] = None
+        self.entry_counts: Dict[str, int] = {
+            log_type: 0 for log_type in config.log_types
+        }
+
+    def _build_object_key(self, log_type: str) -> str:
+        """ログ種別ごとのオブジェクトキーの生成
+
+        Example:
+            >>> _build_object_key("error")
+            "cluster-name/db-instance-1/error/2024/01/01/00/postgresql.log.2024-01-01-0000"
+        """
+        return build_derived_object_key(self.object_key, log_type)
+
+    def _get_writer(self, log_type: str) -> _LogTypeWriter:
+        if log_type not in self._writers:
+            self._writers[log_type] = _LogTypeWriter(
+                s3_client=self.s3_client,
+                bucket=self.bucket,
+                key=self._build_object_key(log_type),
+                extra_args={
+                    **self.extra_args,
+                    "Metadata": {
+                        **self.extra_args.get("Metadata", {}),
+                        "LogType": log_type,
+                    },
+                },
+                compressor=self.compressor,
+            )
+        return self._writers[log_type]
+
+    @staticmethod
+    def _classify(severity: bytes, message: bytes) -> Optional[str]:
+        """エントリーのログ種別の判定"""
+        if severity in ERROR_SEVERITIES:
+            return "error"
+        if severity != b"LOG":
+            return None
+        if message.startswith(SLOW_QUERY_MESSAGE_PREFIX):
+            return "slow_query"
+        if message.startswith(AUDIT_MESSAGE_PREFIX):
+            return "audit"
+        if message.startswith(CONNECTION_MESSAGE_PREFIXES):
+            return "connection"
+        return None
+
+    def process_line(self, line: bytes, match: Optional[re.Match]) -> None:
+        if match:
+            severity = match.group("severity")
+            if severity not in ATTACHED_SEVERITIES:
+                log_type = self._classify(severity, line[match.end() :])
+                self._current_log_type = (
+                    log_type if log_type in self.entry_counts else None
+                )
+                if self._current_log_type:
+                    self.entry_counts[self._current_log_type] += 1
+
+        if self._current_log_type:
+            self._get_writer(self._current_log_type).write(line)
+
+    def close(self) -> Dict[str, str]:
+        """全てのログ種別のアップロードを完了
+
+        Returns:
+            Dict[str, str]: ログ種別をキーとした作成したオブジェクトキー
+        """
+        object_keys = {}
+        for log_type, writer in self._writers.items():
+            writer.complete()
+            object_keys[log_type] = writer.key
+
+        logger.info(
+            "Routed log entries by log type",
+            extra={
+                "object_key": self.object_key,
+                "entry_counts": self.entry_counts,
+                "routed_object_keys": object_keys,
+            },
+        )
+        return object_keys
+
+    def abort(self) -> None:
+        """全てのログ種別のアップロードを中止"""
+        for writer in self._writers.values():
+            writer.abort()
@@ -0,0 +1,133 @@
+import os
+import gzip
+import importlib.util
+from typing import Iterable, Iterator, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from rds_log_file_uploader_constants import (
+    COMPRESSION_BLOCK_SIZE,
+    COMPRESSION_CODECS,
+    GZIP_COMPRESS_LEVEL,
+)
+
+
+@dataclass(frozen=True)
+class LogFileCompressorConfig:
+    """LogFileCompressor の設定値を管理するデータクラス"""
+
+    codec: str = "gzip"
+    level: int = GZIP_COMPRESS_LEVEL
+    block_size: int = COMPRESSION_BLOCK_SIZE
+    max_workers: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.codec not in COMPRESSION_CODECS:
+            raise ValueError(
+                f"CompressionCodec must be one of {', '.join(COMPRESSION_CODECS)}"
+            )
+        if self.codec == "zstd" and importlib.util.find_spec("zstandard") is None:
+            raise ValueError(
+                "COMPRESSION_CODEC=zstd requires the zstandard module, which is not "
+                "included in the Lambda runtime. Add a layer with zstandard to "
+                "uploaderLayerArns or use COMPRESSION_CODEC=gzip"
+            )
+        if self.block_size <= 0:
+            raise ValueError("BlockSize must be greater than 0")
+
+    @property
+    def extension(self) -> str:
+        """圧縮形式に対応するファイル拡張子"""
+        return COMPRESSION_CODECS[self.codec]["extension"]
+
+    @property
+    def content_type(self) -> str:
+        """圧縮形式に対応するContent-Type"""
+        return COMPRESSION_CODECS[self.codec]["content_type"]
+
+    @property
+    def content_encoding(self) -> str:
+        """圧縮形式に対応するContent-Encoding"""
+        return COMPRESSION_CODECS[self.codec]["content_encoding"]
+
+    @classmethod
+    def from_environ(cls) -> "LogFileCompressorConfig":
+        """環境変数から設定値を生成
+
+        - COMPRESSION_CODEC: 圧縮形式 (gzip / zstd)
+        - COMPRESSION_LEVEL: 圧縮レベル
+        """
+        codec = os.environ.get("COMPRESSION_CODEC", "gzip").lower()
+        level = os.environ.get("COMPRESSION_LEVEL")
+        default_level = COMPRESSION_CODECS.get(codec, {}).get(
+            "default_level", GZIP_COMPRESS_LEVEL
+        )
+        return cls(codec=codec, level=int(level) if level else default_level)
+
+
+class LogFileCompressor:
+    """データを固定サイズのブロックに分割し、並列で圧縮するクラス
+
+    ブロックごとに独立したGZIPメンバー（zstdの場合はフレーム）として圧縮し、
+    入力順に連結して出力する。連結したGZIPメンバーは単一の .gz ファイルとして展開できる。
+    zlib、zstandard は圧縮中にGILを解放するため、スレッドで並列化する。
+    """
+
+    def __init__(self, config: LogFileCompressorConfig):
+        self.config = config
+        self.max_workers = config.max_workers or os.cpu_count() or 1
+
+    def compress_block(self, block: bytes) -> bytes:
+        """1ブロックの圧縮"""
+        if self.config.codec == "zstd":
+            # zstd を使用する場合に初めて読み込む
+            import zstandard
+
+            return zstandard.ZstdCompressor(level=self.config.level).compress(block)
+
+        # mtime=0 で同一入力から同一の出力となるようにする
+        return gzip.compress(block, compresslevel=self.config.level, mtime=0)
+
+    def _iter_blocks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """入力データをブロックサイズ単位に分割
+
+        入力が空の場合も有効な圧縮データとなるよう、空のブロックを1つ返す
+        """
+        buffer = bytearray()
+        block_count = 0
+        for chunk in chunks:
+            buffer += chunk
+            while len(buffer) >= self.config.block_size:
+                yield bytes(buffer[: self.config.block_size])
+                del buffer[: self.config.block_size]
+                block_count += 1
+
+        if buffer or block_count == 0:
+            yield bytes(buffer)
+
+    def compress(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        データを並列で圧縮
+
+        同時に圧縮中のブロック数はワーカー数の2倍までに制限し、メモリ使用量を抑える
+
+        Args:
+            chunks: 圧縮対象のデータチャンクのイテレーター
+
+        Yields:
+            bytes: 入力順に並んだ圧縮済みブロック
+        """
+
+        max_pending = self.max_workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for block in self._iter_blocks(chunks):
+                pending.append(executor.submit(self.compress_block, block))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
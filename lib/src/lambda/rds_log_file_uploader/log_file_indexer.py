@@ -0,0 +1,197 @@
+import os
+import re
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    LOG_INDEX_BLOCK_SIZE,
+    LOG_INDEX_EXTENSION,
+    LOG_INDEX_OBJECT_KEY_SEGMENT,
+    LOG_INDEX_VERSION,
+)
+from log_stream_processor import LogLineStage, build_derived_object_key
+
+logger = Logger()
+
+
+@dataclass(frozen=True)
+class LogFileIndexConfig:
+    """LogFileIndexer の設定値を管理するデータクラス
+
+    block_size は圧縮しない場合のインデックスの粒度。
+    圧縮する場合は圧縮ブロックの境界に合わせるため、LogFileCompressor のブロックサイズを使用する
+    """
+
+    block_size: int = LOG_INDEX_BLOCK_SIZE
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.block_size <= 0:
+            raise ValueError("BlockSize must be greater than 0")
+
+    @classmethod
+    def from_environ(cls) -> Optional["LogFileIndexConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_LOG_INDEX: 時刻とバイト位置のインデックス出力の有効化
+        - LOG_INDEX_BLOCK_SIZE: 圧縮しない場合のインデックスの粒度（バイト）
+
+        Returns:
+            Optional[LogFileIndexConfig]: インデックス出力が無効な場合はNone
+        """
+        if os.environ.get("ENABLE_LOG_INDEX", "false").lower() != "true":
+            return None
+
+        block_size = os.environ.get("LOG_INDEX_BLOCK_SIZE")
+        return cls(block_size=int(block_size) if block_size else LOG_INDEX_BLOCK_SIZE)
+
+
+class LogFileIndexer(LogLineStage):
+    """アーカイブしたログファイルの時刻とバイト位置のインデックスを作成するクラス
+
+    ログファイルを block_size ごとのブロックに分け、ブロックごとに
+    S3オブジェクト上のバイト位置と、ブロック内で開始するエントリーの最初と最後の時刻を記録する。
+    圧縮する場合のブロックは LogFileCompressor の圧縮ブロック（GZIPメンバー / zstdフレーム）と一致し、
+    各ブロックを Range 指定で取得して単独で展開できる。
+
+    インデックスは raw と同じ <cluster>/<instance>/ 配下の index/ にJSONで出力する
+    """
+
+    name = "log_file_index"
+
+    def __init__(
+        self,
+        block_size: int,
+        s3_client: Any,
+        bucket: str,
+        object_key: str,
+        metadata: Dict[str, str],
+        compression_codec: Optional[str] = None,
+    ):
+        """
+        Args:
+            block_size (int): ブロックサイズ（圧縮前のバイト数）
+            s3_client: S3クライアント
+            bucket (str): アップロード先のS3バケット
+            object_key (str): raw のログファイルのオブジェクトキー
+            metadata (Dict[str, str]): raw のログファイルのメタデータ
+            compression_codec (Optional[str]): 圧縮する場合の圧縮形式
+        """
+        self.block_size = block_size
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.source_object_key = object_key
+        self.object_key = build_derived_object_key(
+            object_key, LOG_INDEX_OBJECT_KEY_SEGMENT, LOG_INDEX_EXTENSION
+        )
+        self.metadata = metadata
+        self.compression_codec = compression_codec
+
+        self._raw_size = 0
+        self._segments: List[Dict[str, Any]] = []
+        self._stored_lengths: List[int] = []
+
+    def _get_segment(self, index: int) -> Dict[str, Any]:
+        while len(self._segments) <= index:
+            self._segments.append(
+                {"FirstTime": None, "LastTime": None, "LineAligned": False}
+            )
+        return self._segments[index]
+
+    def process_line(self, line: bytes, match: Optional[re.Match]) -> None:
+        offset = self._raw_size
+        self._raw_size += len(line)
+
+        index = offset // self.block_size
+        segment = self._get_segment(index)
+        if offset == index * self.block_size:
+            segment["LineAligned"] = True
+        # 複数のブロックにまたがる行
+        self._get_segment((self._raw_size - 1) // self.block_size)
+
+        if match:
+            log_time = match.group("log_time")[:19].decode()
+            if segment["FirstTime"] is None:
+                segment["FirstTime"] = log_time
+            segment["LastTime"] = log_time
+
+    def observe_stored_blocks(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        for block in blocks:
+            self._stored_lengths.append(len(block))
+            yield block
+
+    def build_index(self) -> Dict[str, Any]:
+        """インデックスの生成
+
+        エントリーの開始を含まないブロック（長いSQL文の途中など）は、直前のブロックの最後の時刻とする
+
+        Returns:
+            Dict[str, Any]: インデックス
+                Blocks の各要素には以下のキーが含まれる
+                    - Offset / Length: S3オブジェクト上のバイト位置と長さ
+                    - RawOffset / RawLength: 展開後のバイト位置と長さ
+                    - FirstTime / LastTime: ブロック内で開始するエントリーの最初と最後の時刻
+                    - LineAligned: ブロックの先頭が行の先頭と一致する場合True
+        """
+        compressed = bool(self._stored_lengths) and self._raw_size > 0
+        if compressed and len(self._stored_lengths) != len(self._segments):
+            raise ValueError(
+                f"Compressed block count {len(self._stored_lengths)} does not match "
+                f"index block count {len(self._segments)}"
+            )
+
+        blocks = []
+        offset = 0
+        last_time = None
+        for index, segment in enumerate(self._segments):
+            raw_offset = index * self.block_size
+            raw_length = min(self.block_size, self._raw_size - raw_offset)
+            length = self._stored_lengths[index] if compressed else raw_length
+            first_time = segment["FirstTime"] or last_time
+            last_time = segment["LastTime"] or first_time
+
+            blocks.append(
+                {
+                    "Offset": offset,
+                    "Length": length,
+                    "RawOffset": raw_offset,
+                    "RawLength": raw_length,
+                    "FirstTime": first_time,
+                    "LastTime": last_time,
+                    "LineAligned": segment["LineAligned"],
+                }
+            )
+            offset += length
+
+        return {
+            "Version": LOG_INDEX_VERSION,
+            "SourceObjectKey": self.source_object_key,
+            "CompressionCodec": self.compression_codec if compressed else None,
+            "BlockSize": self.block_size,
+            "RawSize": self._raw_size,
+            "Size": offset,
+            "Blocks": blocks,
+        }
+
+    def close(self) -> Dict[str, Any]:
+        index = self.build_index()
+
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.object_key,
+            Body=json.dumps(index).encode(),
+            ContentType="application/json",
+            Metadata=self.metadata,
+        )
+
+        logger.info(
+            "Successfully uploaded log file index",
+            extra={
+                "object_key": self.object_key,
+                "block_count": len(index["Blocks"]),
+                "compression_codec": index["CompressionCodec"],
+            },
+        )
+        return {"object_key": self.object_key, "block_count": len(index["Blocks"])}
@@ -0,0 +1,230 @@
+import os
+import json
+from typing import Any, Dict, Iterator, Optional, Tuple
+from dataclasses import dataclass
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    DOWNLOAD_CHUNK_SIZE,
+    TAIL_MAX_PART_SIZE,
+    TAIL_OBJECT_KEY_SEGMENT,
+    TAIL_PART_EXTENSION,
+    TAIL_STATE_FILE_NAME,
+)
+from log_stream_processor import build_derived_object_key
+from aws_clients import get_client
+from aws_clients_constants import HTTP_MAX_POOL_CONNECTIONS
+
+logger = Logger()
+
+
+@dataclass(frozen=True)
+class LogFileTailConfig:
+    """LogFileTailer の設定値を管理するデータクラス"""
+
+    max_part_size: int = TAIL_MAX_PART_SIZE
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.max_part_size <= 0:
+            raise ValueError("MaxPartSize must be greater than 0")
+
+    @classmethod
+    def from_environ(cls) -> Optional["LogFileTailConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_TAIL_MODE: 書き込み中のログファイルの追記分のアーカイブの有効化
+        - TAIL_MAX_PART_SIZE: 1つのパートオブジェクトの最大サイズ（バイト）
+
+        Returns:
+            Optional[LogFileTailConfig]: 追記分のアーカイブが無効な場合はNone
+        """
+        if os.environ.get("ENABLE_TAIL_MODE", "false").lower() != "true":
+            return None
+
+        max_part_size = os.environ.get("TAIL_MAX_PART_SIZE")
+        return cls(
+            max_part_size=int(max_part_size) if max_part_size else TAIL_MAX_PART_SIZE
+        )
+
+
+class LogFileTailer:
+    """書き込み中のログファイルの追記分をパートオブジェクトとしてアーカイブするクラス
+
+    DownloadDBLogFilePortion のマーカーで前回の続きから追記分のみを取得し、
+    <cluster>/<instance>/tail/YYYY/MM/DD/HH/<log file>/ 配下に連番のパートオブジェクトとして保存する。
+    マーカー、パート数、取得済みのバイト数は同じプレフィックスの状態オブジェクトに保存し、次回の実行に引き継ぐ。
+
+    ローテーション後は残りの追記分を取得したうえで、パートオブジェクトを連結して raw のオブジェクトを作成し、
+    ログファイル全体の再ダウンロードを不要にする。
+    パートオブジェクトの保存後、状態オブジェクトの保存前に失敗した場合は、
+    次回の実行で同じパート番号のオブジェクトを上書きする
+    """
+
+    def __init__(
+        self,
+        config: LogFileTailConfig,
+        db_instance_identifier: str,
+        log_file_name: str,
+        bucket: str,
+        object_key: str,
+        rds_client: Any = None,
+        s3_client: Any = None,
+    ):
+        """
+        Args:
+            config (LogFileTailConfig): 設定値
+            db_instance_identifier (str): DBインスタンス識別子
+            log_file_name (str): ログファイル名
+            bucket (str): アップロード先のS3バケット
+            object_key (str): ローテーション後の raw のオブジェクトキー
+            rds_client: RDSクライアント。未指定の場合は共有のクライアントを使用
+            s3_client: S3クライアント。未指定の場合は共有のクライアントを使用
+        """
+        self.config = config
+        self.db_instance_identifier = db_instance_identifier
+        self.log_file_name = log_file_name
+        self.bucket = bucket
+        self.prefix = (
+            build_derived_object_key(object_key, TAIL_OBJECT_KEY_SEGMENT, "") + "/"
+        )
+        self.state_key = f"{self.prefix}{TAIL_STATE_FILE_NAME}"
+        self.rds_client = rds_client or get_client("rds", HTTP_MAX_POOL_CONNECTIONS)
+        self.s3_client = s3_client or get_client("s3", HTTP_MAX_POOL_CONNECTIONS)
+
+    def _part_key(self, part_number: int) -> str:
+        return f"{self.prefix}part-{part_number:06d}{TAIL_PART_EXTENSION}"
+
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        """状態オブジェクトの読み込み
+
+        Returns:
+            Optional[Dict[str, Any]]: 追記分を取得していない場合はNone
+                - Marker (str): 次回の DownloadDBLogFilePortion のマーカー
+                - PartCount (int): 保存済みのパートオブジェクト数
+                - Size (int): 保存済みのバイト数
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.state_key)
+            return json.loads(response["Body"].read())
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.state_key,
+            Body=json.dumps(state).encode(),
+            ContentType="application/json",
+        )
+
+    def _iter_portions(self, marker: str) -> Iterator[Tuple[bytes, str]]:
+        """マーカーの位置から末尾までの追記分の取得
+
+        Yields:
+            Tuple[bytes, str]: 追記分のデータと、その直後の位置を示すマーカー
+        """
+        while True:
+            response = self.rds_client.download_db_log_file_portion(
+                DBInstanceIdentifier=self.db_instance_identifier,
+                LogFileName=self.log_file_name,
+                Marker=marker,
+            )
+            marker = response.get("Marker", marker)
+            data = (response.get("LogFileData") or "").encode()
+            if data:
+                yield data, marker
+            if not response.get("AdditionalDataPending"):
+                return
+
+    def archive_increment(
+        self, state: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """前回の続きから末尾までの追記分をパートオブジェクトとして保存
+
+        パートオブジェクトを保存するたびに状態オブジェクトを更新する
+
+        Args:
+            state: 読み込み済みの状態。未指定の場合は状態オブジェクトから読み込む
+
+        Returns:
+            Dict[str, Any]: 更新後の状態
+        """
+        state = state or self.load_state() or {"Marker": "0", "PartCount": 0, "Size": 0}
+        appended_size = 0
+        buffer = bytearray()
+        marker = state["Marker"]
+
+        def save_part() -> None:
+            nonlocal appended_size
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self._part_key(state["PartCount"] + 1),
+                Body=bytes(buffer),
+                ContentType="text/plain",
+            )
+            state.update(
+                {
+                    "Marker": marker,
+                    "PartCount": state["PartCount"] + 1,
+                    "Size": state["Size"] + len(buffer),
+                }
+            )
+            self._save_state(state)
+            appended_size += len(buffer)
+            buffer.clear()
+
+        for data, marker in self._iter_portions(state["Marker"]):
+            buffer += data
+            if len(buffer) >= self.config.max_part_size:
+                save_part()
+
+        if buffer:
+            save_part()
+        elif marker != state["Marker"]:
+            state["Marker"] = marker
+            self._save_state(state)
+
+        logger.info(
+            "Archived appended log data",
+            extra={
+                "db_instance_identifier": self.db_instance_identifier,
+                "log_file_name": self.log_file_name,
+                "appended_size": appended_size,
+                "size": state["Size"],
+                "part_count": state["PartCount"],
+            },
+        )
+        return state
+
+    def iter_part_chunks(
+        self, state: Dict[str, Any], chunk_size: int = DOWNLOAD_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """保存済みのパートオブジェクトを順に読み込み、ログファイル全体のデータを返す"""
+        for part_number in range(1, state["PartCount"] + 1):
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=self._part_key(part_number)
+            )
+            yield from response["Body"].iter_chunks(chunk_size)
+
+    def cleanup(self) -> None:
+        """パートオブジェクトと状態オブジェクトの削除"""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        deleted_count = 0
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            objects = [{"Key": content["Key"]} for content in page.get("Contents", [])]
+            if not objects:
+                continue
+            self.s3_client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True}
+            )
+            deleted_count += len(objects)
+
+        logger.debug(
+            "Deleted tail objects",
+            extra={"prefix": self.prefix, "deleted_count": deleted_count},
+        )
@@ -0,0 +1,254 @@
+import os
+import re
+import functools
+import importlib.util
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    APPLICATION_NAME_MESSAGE_PATTERN,
+    CONNECTION_MESSAGE_PREFIXES,
+    DERIVED_OBJECT_MAX_INFLIGHT_PARTS,
+    DERIVED_OBJECT_PART_SIZE,
+    DURATION_MESSAGE_PATTERN,
+    PARQUET_COMPRESSION,
+    PARQUET_EXTENSION,
+    PARQUET_ROW_GROUP_SIZE,
+    PARSED_OBJECT_KEY_SEGMENT,
+    SQL_STATE_MESSAGE_PATTERN,
+)
+from s3_stream_uploader import S3StreamUploader
+from log_stream_processor import LogEntryStage, build_derived_object_key
+
+logger = Logger()
+
+_duration_pattern = re.compile(DURATION_MESSAGE_PATTERN)
+_sql_state_pattern = re.compile(SQL_STATE_MESSAGE_PATTERN)
+_application_name_pattern = re.compile(APPLICATION_NAME_MESSAGE_PATTERN)
+
+
+@dataclass(frozen=True)
+class ParquetOutputConfig:
+    """LogRecordParquetWriter の設定値を管理するデータクラス"""
+
+    row_group_size: int = PARQUET_ROW_GROUP_SIZE
+    compression: str = PARQUET_COMPRESSION
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("pyarrow module is required for parquet output")
+        if self.row_group_size <= 0:
+            raise ValueError("RowGroupSize must be greater than 0")
+
+    @classmethod
+    def from_environ(cls) -> Optional["ParquetOutputConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_PARQUET_OUTPUT: Parquet形式の出力の有効化
+        - PARQUET_ROW_GROUP_SIZE: 1行グループあたりのレコード数
+
+        Returns:
+            Optional[ParquetOutputConfig]: Parquet形式の出力が無効な場合はNone
+        """
+        if os.environ.get("ENABLE_PARQUET_OUTPUT", "false").lower() != "true":
+            return None
+
+        row_group_size = os.environ.get("PARQUET_ROW_GROUP_SIZE")
+        return cls(
+            row_group_size=(
+                int(row_group_size) if row_group_size else PARQUET_ROW_GROUP_SIZE
+            )
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def _build_schema():
+    """出力するParquetファイルのスキーマ
+
+    pyarrow は読み込みに時間がかかるため、Parquet形式の出力が有効な場合に初めて読み込む
+    """
+    import pyarrow
+
+    return pyarrow.schema(
+        [
+            ("log_time", pyarrow.timestamp("ms")),
+            ("log_timezone", pyarrow.string()),
+            ("remote_host", pyarrow.string()),
+            ("user_name", pyarrow.string()),
+            ("database_name", pyarrow.string()),
+            ("application_name", pyarrow.string()),
+            ("process_id", pyarrow.int32()),
+            ("severity", pyarrow.string()),
+            ("sql_state", pyarrow.string()),
+            ("duration_ms", pyarrow.float64()),
+            ("message", pyarrow.string()),
+        ]
+    )
+
+
+class _S3StreamFile:
+    """pyarrow から書き込み先のファイルとして扱うための S3StreamUploader のラッパー"""
+
+    def __init__(self, stream_uploader: S3StreamUploader):
+        self.stream_uploader = stream_uploader
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.stream_uploader.write(bytes(data))
+        return len(data)
+
+    def tell(self) -> int:
+        return self.stream_uploader.bytes_written
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class LogRecordParquetWriter(LogEntryStage):
+    """ログエントリーを列に分解し、Parquet形式でS3にアップロードするクラス
+
+    raw と同じ <cluster>/<instance>/ 配下の parsed/YYYY/MM/DD/HH/ に出力する。
+    レコードは row_group_size 件ごとに行グループとして書き出し、
+    メモリ上に保持するレコード数を制限する。
+
+    log_line_prefix (%t:%r:%u@%d:[%p]:) に含まれない application_name は
+    接続時のログから取得し、同じプロセスIDの以降のエントリーに付与する。
+    sql_state は log_error_verbosity = verbose の場合のみ取得できる
+    """
+
+    name = "parquet_output"
+
+    def __init__(
+        self,
+        config: ParquetOutputConfig,
+        s3_client: Any,
+        bucket: str,
+        object_key: str,
+        metadata: Dict[str, str],
+    ):
+        """
+        Args:
+            config (ParquetOutputConfig): 設定値
+            s3_client: S3クライアント
+            bucket (str): アップロード先のS3バケット
+            object_key (str): raw のログファイルのオブジェクトキー
+            metadata (Dict[str, str]): raw のログファイルのメタデータ
+        """
+        super().__init__()
+        self.config = config
+        self.schema = _build_schema()
+        self.object_key = build_derived_object_key(
+            object_key, PARSED_OBJECT_KEY_SEGMENT, PARQUET_EXTENSION
+        )
+        self._stream_uploader = S3StreamUploader(
+            s3_client=s3_client,
+            bucket=bucket,
+            key=self.object_key,
+            extra_args={
+                "Metadata": metadata,
+                "ContentType": "application/vnd.apache.parquet",
+            },
+            part_size=DERIVED_OBJECT_PART_SIZE,
+            max_inflight_parts=DERIVED_OBJECT_MAX_INFLIGHT_PARTS,
+        )
+        import pyarrow.parquet
+
+        self._writer = pyarrow.parquet.ParquetWriter(
+            _S3StreamFile(self._stream_uploader),
+            self.schema,
+            compression=config.compression,
+        )
+        self._columns: Dict[str, List[Any]] = {name: [] for name in self.schema.names}
+        self._application_names: Dict[int, str] = {}
+        self.record_count = 0
+
+    @staticmethod
+    def _to_str(value: bytes) -> Optional[str]:
+        return value.decode(errors="replace") if value else None
+
+    def process_entry(self, match: re.Match, message: bytes) -> None:
+        pid = int(match.group("pid"))
+        severity = match.group("severity").decode()
+
+        # 接続時に application_name を記録し、切断時に破棄する
+        if message.startswith(CONNECTION_MESSAGE_PREFIXES):
+            if message.startswith(b"disconnection:"):
+                self._application_names.pop(pid, None)
+            else:
+                application_name = _application_name_pattern.search(message)
+                if application_name:
+                    self._application_names[pid] = application_name.group(
+                        "application_name"
+                    ).decode(errors="replace")
+
+        duration = _duration_pattern.match(message) if severity == "LOG" else None
+        sql_state = _sql_state_pattern.match(message) if severity != "LOG" else None
+
+        columns = self._columns
+        columns["log_time"].append(
+            datetime.fromisoformat(match.group("log_time").decode())
+        )
+        columns["log_timezone"].append(self._to_str(match.group("log_timezone")))
+        columns["remote_host"].append(self._to_str(match.group("remote")))
+        columns["user_name"].append(self._to_str(match.group("user")))
+        columns["database_name"].append(self._to_str(match.group("database")))
+        columns["application_name"].append(self._application_names.get(pid))
+        columns["process_id"].append(pid)
+        columns["severity"].append(severity)
+        columns["sql_state"].append(
+            sql_state.group("sql_state").decode() if sql_state else None
+        )
+        columns["duration_ms"].append(
+            float(duration.group("duration")) if duration else None
+        )
+        columns["message"].append(message.rstrip(b"\r\n").decode(errors="replace"))
+
+        if len(columns["log_time"]) >= self.config.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        """保持しているレコードを1つの行グループとして書き出し"""
+        import pyarrow
+
+        row_count = len(self._columns["log_time"])
+        if not row_count:
+            return
+
+        self._writer.write_batch(
+            pyarrow.record_batch(
+                [
+                    pyarrow.array(self._columns[field.name], type=field.type)
+                    for field in self.schema
+                ],
+                schema=self.schema,
+            ),
+            row_group_size=row_count,
+        )
+        self.record_count += row_count
+        for values in self._columns.values():
+            values.clear()
+
+    def close(self) -> Dict[str, Any]:
+        super().close()
+        self._write_row_group()
+        self._writer.close()
+        size = self._stream_uploader.complete()
+
+        logger.info(
+            "Successfully uploaded parsed log records",
+            extra={
+                "object_key": self.object_key,
+                "record_count": self.record_count,
+                "size": size,
+            },
+        )
+        return {"object_key": self.object_key, "record_count": self.record_count}
+
+    def abort(self) -> None:
+        self._stream_uploader.abort()
@@ -0,0 +1,199 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    COMPRESSION_CODECS,
+    LOG_ENTRY_PATTERN,
+    RAW_OBJECT_KEY_SEGMENT,
+)
+
+logger = Logger()
+
+log_entry_pattern = re.compile(LOG_ENTRY_PATTERN)
+
+
+def build_derived_object_key(
+    object_key: str, segment: str, extension: Optional[str] = None
+) -> str:
+    """raw のオブジェクトキーから同じ <cluster>/<instance>/ 配下の派生オブジェクトキーを生成
+
+    Args:
+        object_key: raw のオブジェクトキー
+        segment: raw に代わるプレフィックス
+        extension: 指定した場合は圧縮形式の拡張子を除いて付与する拡張子
+
+    Raises:
+        ValueError: オブジェクトキーに /raw/ が含まれない場合
+
+    Example:
+        >>> build_derived_object_key(
+        ...     "cluster-name/db-instance-1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz",
+        ...     "parsed",
+        ...     ".parquet",
+        ... )
+        "cluster-name/db-instance-1/parsed/2024/01/01/00/postgresql.log.2024-01-01-0000.parquet"
+    """
+    if RAW_OBJECT_KEY_SEGMENT not in object_key:
+        raise ValueError(
+            f"ObjectKey must contain {RAW_OBJECT_KEY_SEGMENT}: {object_key}"
+        )
+
+    derived_key = object_key.replace(RAW_OBJECT_KEY_SEGMENT, f"/{segment}/", 1)
+    if extension is None:
+        return derived_key
+
+    for codec in COMPRESSION_CODECS.values():
+        if derived_key.endswith(codec["extension"]):
+            derived_key = derived_key[: -len(codec["extension"])]
+            break
+    return f"{derived_key}{extension}"
+
+
+class LogLineStage(ABC):
+    """LogStreamProcessor から1行ずつデータを受け取る処理の基底クラス"""
+
+    name = "stage"
+
+    @abstractmethod
+    def process_line(self, line: bytes, match: Optional[re.Match]) -> None:
+        """1行の処理
+
+        Args:
+            line: 改行を含む1行のデータ
+            match: log_line_prefix に一致した場合はエントリーの先頭行のマッチ結果。
+                継続行（複数行のSQL文など）の場合はNone
+        """
+
+    def observe_stored_blocks(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        """圧縮済みブロックを参照しながらそのまま返す
+
+        圧縮が有効な場合に、S3に保存するデータのブロック境界が必要な処理で使用する
+        """
+        return iter(blocks)
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """全ての行の処理後に結果を確定
+
+        Returns:
+            Optional[Dict[str, Any]]: 処理結果
+        """
+        return None
+
+    def abort(self) -> None:
+        """処理の中止"""
+
+
+class LogEntryStage(LogLineStage):
+    """継続行をまとめたエントリー単位で処理する基底クラス
+
+    保持するデータは処理中の1エントリー分のみとする
+    """
+
+    def __init__(self):
+        self._entry_match: Optional[re.Match] = None
+        self._entry_lines: List[bytes] = []
+
+    @abstractmethod
+    def process_entry(self, match: re.Match, message: bytes) -> None:
+        """1エントリーの処理
+
+        Args:
+            match: エントリーの先頭行の log_line_prefix のマッチ結果
+            message: log_line_prefix と重大度を除いた、継続行を含むメッセージ
+        """
+
+    def _flush_entry(self) -> None:
+        if self._entry_match is not None:
+            self.process_entry(self._entry_match, b"".join(self._entry_lines))
+        self._entry_match = None
+        self._entry_lines = []
+
+    def process_line(self, line: bytes, match: Optional[re.Match]) -> None:
+        if match:
+            self._flush_entry()
+            self._entry_match = match
+            self._entry_lines.append(line[match.end() :])
+        elif self._entry_match is not None:
+            self._entry_lines.append(line)
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        self._flush_entry()
+        return None
+
+
+class LogStreamProcessor:
+    """ログファイルのデータを1回の走査で複数の処理に渡すクラス
+
+    データチャンクを行に分割し、log_line_prefix の判定を1回だけ行った上で各処理に渡す。
+    保持するデータは行の途中のデータのみとする
+    """
+
+    def __init__(self, stages: List[LogLineStage]):
+        self.stages = stages
+        self._pending = bytearray()
+
+    def _process_line(self, line: bytes) -> None:
+        match = log_entry_pattern.match(line)
+        for stage in self.stages:
+            stage.process_line(line, match)
+
+    def write(self, chunk: bytes) -> None:
+        """データを書き込み、改行までの行を処理
+
+        Args:
+            chunk: ログファイルのデータチャンク
+        """
+        self._pending += chunk
+        start = 0
+        while True:
+            end = self._pending.find(b"\n", start)
+            if end < 0:
+                break
+            self._process_line(bytes(self._pending[start : end + 1]))
+            start = end + 1
+        del self._pending[:start]
+
+    def tap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """データチャンクを処理しながらそのまま返す
+
+        raw のアップロードと同じ走査で処理するために使用する
+        """
+        for chunk in chunks:
+            self.write(chunk)
+            yield chunk
+
+    def observe_stored_blocks(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        """圧縮済みブロックを各処理に参照させながらそのまま返す"""
+        for stage in self.stages:
+            blocks = stage.observe_stored_blocks(blocks)
+        return iter(blocks)
+
+    def close(self) -> Dict[str, Any]:
+        """末尾の改行のない行を処理し、全ての処理の結果を確定
+
+        Returns:
+            Dict[str, Any]: 処理名をキーとした処理結果
+        """
+        if self._pending:
+            self._process_line(bytes(self._pending))
+            self._pending.clear()
+
+        results = {}
+        for stage in self.stages:
+            result = stage.close()
+            if result is not None:
+                results[stage.name] = result
+        return results
+
+    def abort(self) -> None:
+        """全ての処理の中止"""
+        for stage in self.stages:
+            try:
+                stage.abort()
+            except Exception as e:
+                logger.warning(
+                    "Failed to abort log stream stage",
+                    extra={"stage": stage.name, "error": str(e)},
+                )
@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import math
+import base64
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    LOG_INDEX_BLOCK_SIZE,
+    TOKENIZE_BATCH_SIZE,
+    TOKEN_INDEX_EXTENSION,
+    TOKEN_INDEX_FALSE_POSITIVE_RATE,
+    TOKEN_INDEX_HASH_FUNCTION,
+    TOKEN_INDEX_MAX_BLOCK_BITS,
+    TOKEN_INDEX_OBJECT_KEY_SEGMENT,
+    TOKEN_INDEX_VERSION,
+    TOKEN_MAX_LENGTH,
+    TOKEN_MIN_LENGTH,
+    TOKEN_PATTERN,
+)
+from log_stream_processor import LogLineStage, build_derived_object_key
+
+logger = Logger()
+
+token_pattern = re.compile(TOKEN_PATTERN)
+
+
+def tokenize(data: bytes) -> Set[bytes]:
+    """英数字とアンダースコアの連続を小文字のトークンとして抽出
+
+    TOKEN_MIN_LENGTH 未満のトークンは除外し、TOKEN_MAX_LENGTH を超えるトークンは切り詰める
+    """
+    return {
+        token[:TOKEN_MAX_LENGTH]
+        for token in set(token_pattern.findall(data.lower()))
+        if len(token) >= TOKEN_MIN_LENGTH
+    }
+
+
+def build_bloom_filter(
+    tokens: Set[bytes],
+    false_positive_rate: float,
+    max_bit_count: Optional[int] = None,
+) -> Dict[str, Any]:
+    """トークンの集合から Bloom filter を生成
+
+    ビット数 m = -n ln(p) / (ln 2)^2、ハッシュ関数の数 k = (m / n) ln 2 とし、
+    BLAKE2b (128bit) の前半、後半の64bitを h1, h2 として (h1 + i * h2) mod m の k 箇所のビットを立てる。
+    n はブロックのトークンの種類数とし、ブロックごとに必要なビット数のみを使用する
+
+    Args:
+        tokens (Set[bytes]): ブロックのトークン
+        false_positive_rate (float): 目標とする偽陽性率
+        max_bit_count (Optional[int]): ビット数の上限。上限に達した場合の偽陽性率は目標を上回る
+
+    Returns:
+        Dict[str, Any]: BitCount, HashCount, Base64でエンコードしたビット列 Bits と、
+            ビット数から見積もった偽陽性率 FalsePositiveRate
+    """
+    if not tokens:
+        return {"BitCount": 0, "HashCount": 0, "Bits": "", "FalsePositiveRate": 0.0}
+
+    bit_count = max(
+        8,
+        math.ceil(-len(tokens) * math.log(false_positive_rate) / math.log(2) ** 2),
+    )
+    if max_bit_count:
+        bit_count = min(bit_count, max_bit_count)
+    hash_count = max(1, round(bit_count / len(tokens) * math.log(2)))
+    bits = bytearray((bit_count + 7) // 8)
+    for token in tokens:
+        digest = hashlib.blake2b(token, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(hash_count):
+            position = (h1 + i * h2) % bit_count
+            bits[position >> 3] |= 1 << (position & 7)
+
+    return {
+        "BitCount": bit_count,
+        "HashCount": hash_count,
+        "Bits": base64.b64encode(bits).decode(),
+        "FalsePositiveRate": round(
+            (1 - math.exp(-hash_count * len(tokens) / bit_count)) ** hash_count, 6
+        ),
+    }
+
+
+@dataclass(frozen=True)
+class LogTokenIndexConfig:
+    """LogTokenIndexer の設定値を管理するデータクラス
+
+    block_size は圧縮しない場合のブロックの粒度。
+    圧縮する場合は圧縮ブロックの境界に合わせるため、LogFileCompressor のブロックサイズを使用する
+    """
+
+    false_positive_rate: float = TOKEN_INDEX_FALSE_POSITIVE_RATE
+    max_block_bits: int = TOKEN_INDEX_MAX_BLOCK_BITS
+    block_size: int = LOG_INDEX_BLOCK_SIZE
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if not 0 < self.false_positive_rate < 1:
+            raise ValueError("FalsePositiveRate must be between 0 and 1")
+        if self.max_block_bits < 8:
+            raise ValueError("MaxBlockBits must be at least 8")
+        if self.block_size <= 0:
+            raise ValueError("BlockSize must be greater than 0")
+
+    @classmethod
+    def from_environ(cls) -> Optional["LogTokenIndexConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_TOKEN_INDEX: ブロックごとのトークンの Bloom filter の出力の有効化
+        - TOKEN_INDEX_FALSE_POSITIVE_RATE: Bloom filter の偽陽性率
+        - TOKEN_INDEX_MAX_BLOCK_BITS: 1ブロックの Bloom filter のビット数の上限
+        - LOG_INDEX_BLOCK_SIZE: 圧縮しない場合のブロックの粒度（バイト）
+
+        Returns:
+            Optional[LogTokenIndexConfig]: トークンインデックスの出力が無効な場合はNone
+        """
+        if os.environ.get("ENABLE_TOKEN_INDEX", "false").lower() != "true":
+            return None
+
+        block_size = os.environ.get("LOG_INDEX_BLOCK_SIZE")
+        max_block_bits = os.environ.get("TOKEN_INDEX_MAX_BLOCK_BITS")
+        return cls(
+            false_positive_rate=float(
+                os.environ.get(
+                    "TOKEN_INDEX_FALSE_POSITIVE_RATE", TOKEN_INDEX_FALSE_POSITIVE_RATE
+                )
+            ),
+            max_block_bits=(
+                int(max_block_bits) if max_block_bits else TOKEN_INDEX_MAX_BLOCK_BITS
+            ),
+            block_size=int(block_size) if block_size else LOG_INDEX_BLOCK_SIZE,
+        )
+
+
+class LogTokenIndexer(LogLineStage):
+    """アーカイブしたログファイルのブロックごとのトークンの Bloom filter を作成するクラス
+
+    ログファイルを block_size ごとのブロックに分け、ブロック内で開始する行のトークンの Bloom filter を
+    S3オブジェクト上のバイト位置とともに記録する。
+    圧縮する場合のブロックは LogFileCompressor の圧縮ブロックと一致し、
+    検索時は候補のブロックのみを Range 指定で取得して単独で展開できる。
+
+    エントリーの先頭行は log_line_prefix のうちユーザー名、データベース名と、重大度以降のメッセージを対象とし、
+    時刻、プロセスIDなどエントリーごとに異なる値は Bloom filter を大きくするため対象外とする。
+    保持するトークンは処理中の1ブロック分のみとする
+
+    トークンインデックスは raw と同じ <cluster>/<instance>/ 配下の tokens/ にJSONで出力する
+    """
+
+    name = "log_token_index"
+
+    def __init__(
+        self,
+        config: LogTokenIndexConfig,
+        s3_client: Any,
+        bucket: str,
+        object_key: str,
+        metadata: Dict[str, str],
+        compression_codec: Optional[str] = None,
+    ):
+        """
+        Args:
+            config (LogTokenIndexConfig): 設定値。block_size は圧縮ブロックのサイズに合わせる
+            s3_client: S3クライアント
+            bucket (str): アップロード先のS3バケット
+            object_key (str): raw のログファイルのオブジェクトキー
+            metadata (Dict[str, str]): raw のログファイルのメタデータ
+            compression_codec (Optional[str]): 圧縮する場合の圧縮形式
+        """
+        self.config = config
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.source_object_key = object_key
+        self.object_key = build_derived_object_key(
+            object_key, TOKEN_INDEX_OBJECT_KEY_SEGMENT, TOKEN_INDEX_EXTENSION
+        )
+        self.metadata = metadata
+        self.compression_codec = compression_codec
+
+        self._raw_size = 0
+        # 処理中のブロックのトークンと、ブロックの先頭が行の先頭と一致するか
+        # 行ごとの抽出は呼び出しの負荷が大きいため、TOKENIZE_BATCH_SIZE までまとめて抽出する
+        self._tokens: Set[bytes] = set()
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._line_aligned = True
+        self._block_end = config.block_size
+        self._segments: List[Dict[str, Any]] = []
+        self._stored_lengths: List[int] = []
+
+    def _tokenize_pending(self) -> None:
+        if self._pending:
+            self._tokens |= tokenize(b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def _flush_segments(self, index: int) -> None:
+        """index より前のブロックの Bloom filter を確定"""
+        while len(self._segments) < index:
+            self._tokenize_pending()
+            self._segments.append(
+                {
+                    "LineAligned": self._line_aligned,
+                    "TokenCount": len(self._tokens),
+                    **build_bloom_filter(
+                        self._tokens,
+                        self.config.false_positive_rate,
+                        self.config.max_block_bits,
+                    ),
+                }
+            )
+            self._tokens = set()
+            self._line_aligned = False
+        self._block_end = (len(self._segments) + 1) * self.config.block_size
+
+    def process_line(self, line: bytes, match: Optional[re.Match]) -> None:
+        offset = self._raw_size
+        self._raw_size += len(line)
+
+        if offset >= self._block_end:
+            index = offset // self.config.block_size
+            self._flush_segments(index)
+            self._line_aligned = offset == index * self.config.block_size
+
+        if match:
+            self._pending += (
+                line[match.start("user") : match.end("database")],
+                b"\n",
+                line[match.start("severity") :],
+            )
+        else:
+            self._pending.append(line)
+        self._pending_size += len(line)
+        if self._pending_size >= TOKENIZE_BATCH_SIZE:
+            self._tokenize_pending()
+
+        # 複数のブロックにまたがる行のトークンは行が開始するブロックに含める
+        if self._raw_size > self._block_end:
+            self._flush_segments((self._raw_size - 1) // self.config.block_size)
+
+    def observe_stored_blocks(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        for block in blocks:
+            self._stored_lengths.append(len(block))
+            yield block
+
+    def build_index(self) -> Dict[str, Any]:
+        """トークンインデックスの生成
+
+        Returns:
+            Dict[str, Any]: トークンインデックス
+                Blocks の各要素には以下のキーが含まれる
+                    - Offset / Length: S3オブジェクト上のバイト位置と長さ
+                    - RawOffset / RawLength: 展開後のバイト位置と長さ
+                    - LineAligned: ブロックの先頭が行の先頭と一致する場合True
+                    - TokenCount: ブロック内で開始する行のトークンの種類数
+                    - BitCount / HashCount / Bits: Bloom filter
+                    - FalsePositiveRate: ビット数から見積もった偽陽性率
+        """
+        if self._raw_size:
+            self._flush_segments((self._raw_size - 1) // self.config.block_size + 1)
+
+        compressed = bool(self._stored_lengths) and self._raw_size > 0
+        if compressed and len(self._stored_lengths) != len(self._segments):
+            raise ValueError(
+                f"Compressed block count {len(self._stored_lengths)} does not match "
+                f"token index block count {len(self._segments)}"
+            )
+
+        blocks = []
+        offset = 0
+        for index, segment in enumerate(self._segments):
+            raw_offset = index * self.config.block_size
+            raw_length = min(self.config.block_size, self._raw_size - raw_offset)
+            length = self._stored_lengths[index] if compressed else raw_length
+            blocks.append(
+                {
+                    "Offset": offset,
+                    "Length": length,
+                    "RawOffset": raw_offset,
+                    "RawLength": raw_length,
+                    **segment,
+                }
+            )
+            offset += length
+
+        return {
+            "Version": TOKEN_INDEX_VERSION,
+            "SourceObjectKey": self.source_object_key,
+            "CompressionCodec": self.compression_codec if compressed else None,
+            "BlockSize": self.config.block_size,
+            "RawSize": self._raw_size,
+            "Size": offset,
+            "HashFunction": TOKEN_INDEX_HASH_FUNCTION,
+            "TokenMinLength": TOKEN_MIN_LENGTH,
+            "TokenMaxLength": TOKEN_MAX_LENGTH,
+            "Blocks": blocks,
+        }
+
+    def close(self) -> Dict[str, Any]:
+        index = self.build_index()
+        body = json.dumps(index).encode()
+
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.object_key,
+            Body=body,
+            ContentType="application/json",
+            Metadata=self.metadata,
+        )
+
+        capped_block_count = sum(
+            block["BitCount"] == self.config.max_block_bits for block in index["Blocks"]
+        )
+        if capped_block_count:
+            logger.warning(
+                "Token index blocks reached the Bloom filter size limit",
+                extra={
+                    "object_key": self.object_key,
+                    "capped_block_count": capped_block_count,
+                    "max_block_bits": self.config.max_block_bits,
+                    "max_false_positive_rate": max(
+                        block["FalsePositiveRate"] for block in index["Blocks"]
+                    ),
+                },
+            )
+
+        logger.info(
+            "Successfully uploaded log token index",
+            extra={
+                "object_key": self.object_key,
+                "block_count": len(index["Blocks"]),
+                "token_count": sum(block["TokenCount"] for block in index["Blocks"]),
+                "index_size": len(body),
+                "raw_size": self._raw_size,
+            },
+        )
+        return {
+            "object_key": self.object_key,
+            "block_count": len(index["Blocks"]),
+            "index_size": len(body),
+        }
@@ -1,22 +1,39 @@
 import os
 import time
-import urllib.request
-import urllib.error
+import random
+from urllib.parse import urlsplit
 from http.client import IncompleteRead
+from typing import Dict, Iterator, Optional
 from dataclasses import dataclass
-import boto3
 from botocore.awsrequest import AWSRequest
 import botocore.auth as auth
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Tracer, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
 
 from rds_log_file_uploader_constants import (
     DEFAULT_RETRIES,
     DEFAULT_RETRY_DELAY,
+    MAX_RETRY_DELAY,
+    THROTTLE_RETRIES,
     DOWNLOAD_CHUNK_SIZE,
 )
+from aws_clients import get_session, get_http_pool
+from adaptive_concurrency_limiter import (
+    FAILED,
+    SUCCEEDED,
+    THROTTLED,
+    AdaptiveConcurrencyLimiter,
+    ConcurrencySlot,
+    is_throttle_response,
+)
 
 logger = Logger()
 tracer = Tracer()
+metrics = Metrics()
+
+
+class RdsLogDownloadThrottledError(IOError):
+    """ダウンロードがスロットリングされた場合の例外"""
 
 
 @dataclass(frozen=True)
@@ -25,6 +42,8 @@ class RdsLogDownLoaderConfig:
 
     db_instance_identifier: str
     log_file_name: str
+    # レスポンスの読み込み単位。TransferPlan.chunk_size を指定する
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE
 
     def __post_init__(self) -> None:
         """初期化後のバリデーション"""
@@ -32,35 +51,93 @@ class RdsLogDownLoaderConfig:
             raise ValueError("DbInstanceIdentifier is required")
         if not self.log_file_name:
             raise ValueError("LogFileName is required")
+        if self.chunk_size <= 0:
+            raise ValueError("ChunkSize must be greater than 0")
 
 
 class RdsLogFileDownloader:
     """RDSログをダウンロードするクラス"""
 
-    def __init__(self, config: RdsLogDownLoaderConfig, region: str = None):
+    def __init__(
+        self,
+        config: RdsLogDownLoaderConfig,
+        region: str = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
         self.config = config
-        self.session = boto3.Session(region_name=region)
-        self.region = self.session.region_name or os.environ.get("AWS_REGION")
+        # DBインスタンスごとのダウンロードの並列数を制御する場合に指定する
+        self.concurrency_limiter = concurrency_limiter
+        # セッション、認証情報、HTTPコネクションはウォームスタート時に再利用する
+        self.session = get_session()
+        self.region = region or self.session.region_name or os.environ.get("AWS_REGION")
 
         self.credentials = self.session.get_credentials()
-        self.remote_host = f"rds.{self.region}.amazonaws.com"
+        # AWS_ENDPOINT_URL_RDS が指定されている場合はエンドポイントを置き換える（ローカルでの検証用）
+        self.endpoint_url = os.environ.get(
+            "AWS_ENDPOINT_URL_RDS", f"https://rds.{self.region}.amazonaws.com"
+        ).rstrip("/")
+        self.remote_host = urlsplit(self.endpoint_url).netloc
+        self.http_pool = get_http_pool()
 
-    def _get_signed_request(self, url: str) -> urllib.request.Request:
-        """署名付きリクエストを作成"""
-        sigv4auth = auth.SigV4Auth(self.credentials, "rds", self.region)
+        # 再開時に再取得したバイト数
+        self.refetched_size = 0
+        # ダウンロードをやり直した回数
+        self.retry_count = 0
+        # スロットリングされた回数
+        self.throttle_count = 0
+
+    def _get_signed_headers(self, url: str, offset: int = 0) -> Dict[str, str]:
+        """署名付きリクエストのヘッダーを作成
+
+        有効期限が近づいた認証情報はget_frozen_credentials()で更新される
+
+        Args:
+            url: リクエストURL
+            offset: 取得を開始するバイト位置。0より大きい場合はRangeヘッダーを付与
+        """
+        credentials = self.credentials.get_frozen_credentials()
+        sigv4auth = auth.SigV4Auth(credentials, "rds", self.region)
         awsreq = AWSRequest(method="GET", url=url)
         sigv4auth.add_auth(awsreq)
 
-        return urllib.request.Request(
-            url=url,
-            headers={
-                "Authorization": awsreq.headers["Authorization"],
-                "Host": self.remote_host,
-                "X-Amz-Date": awsreq.context["timestamp"],
-                "X-Amz-Security-Token": self.credentials.token,
-            },
+        headers = {
+            "Authorization": awsreq.headers["Authorization"],
+            "Host": self.remote_host,
+            "X-Amz-Date": awsreq.context["timestamp"],
+        }
+        if credentials.token:
+            headers["X-Amz-Security-Token"] = credentials.token
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+
+        return headers
+
+    def _acquire_slot(self) -> Optional[ConcurrencySlot]:
+        """concurrency_limiter を指定した場合の実行枠の取得"""
+        if self.concurrency_limiter is None:
+            return None
+        return self.concurrency_limiter.acquire()
+
+    def _get_download_url(self) -> str:
+        """ログファイルのダウンロードURLを生成"""
+        return (
+            f"{self.endpoint_url}/v13/downloadCompleteLogFile/"
+            f"{self.config.db_instance_identifier}/{self.config.log_file_name}"
         )
 
+    @staticmethod
+    def _get_backoff_delay(attempt: int, delay: int) -> float:
+        """Full Jitter による指数バックオフの待機時間を計算
+
+        Args:
+            attempt: 試行回数（0始まり）
+            delay: 基準となるリトライ間隔（秒）
+
+        Returns:
+            float: 待機時間（秒）
+        """
+        return random.uniform(0, min(MAX_RETRY_DELAY, delay * (2**attempt)))
+
     @tracer.capture_method
     def download_log_file(
         self,
@@ -71,17 +148,17 @@ class RdsLogFileDownloader:
         """
         RDSログファイルをダウンロード
 
+        リトライ時は書き込み済みのデータを保持したまま、続きのデータから再開する
+
         Args:
             output_path: 出力ファイルパス
             retries: リトライ回数
-            delay: リトライ間隔（秒）
+            delay: リトライ間隔の基準値（秒）
 
         Returns:
             bool: ダウンロード成功時True
         """
 
-        base_url = f"https://{self.remote_host}/v13/downloadCompleteLogFile/{self.config.db_instance_identifier}/"
-
         logger.info(
             "Starting log file download",
             extra={
@@ -91,50 +168,218 @@ class RdsLogFileDownloader:
             },
         )
 
-        for attempt in range(retries):
-            try:
-                url = base_url + self.config.log_file_name
-                req = self._get_signed_request(url)
-
-                with (
-                    urllib.request.urlopen(req) as response,
-                    open(output_path, "wb") as out_file,
-                ):
-                    while True:
-                        chunk = response.read(DOWNLOAD_CHUNK_SIZE)
-                        if not chunk:
-                            break
-                        out_file.write(chunk)
-
-                # ファイルサイズに関係なくダウンロード成功とみなす
-                logger.info(
-                    "Successfully downloaded log file",
-                    extra={
-                        "db_instance_identifier": self.config.db_instance_identifier,
-                        "log_file_name": self.config.log_file_name,
-                        "size": os.path.getsize(output_path),
-                    },
-                )
-                return True
-
-            except IncompleteRead as e:
-                logger.warning(
-                    "Incomplete read error",
-                    extra={"attempt": attempt + 1, "retries": retries, "error": str(e)},
-                )
-            except Exception as e:
-                logger.error(
-                    "Download error",
-                    extra={"attempt": attempt + 1, "retries": retries, "error": str(e)},
-                )
-
-            time.sleep(delay)
+        try:
+            with open(output_path, "wb") as out_file:
+                for chunk in self.iter_log_file_chunks(retries, delay):
+                    out_file.write(chunk)
+
+        except Exception as e:
+            logger.error(
+                "Failed to download log file",
+                extra={
+                    "db_instance_identifier": self.config.db_instance_identifier,
+                    "log_file_name": self.config.log_file_name,
+                    "error": str(e),
+                },
+            )
+            return False
+
+        # ファイルサイズに関係なくダウンロード成功とみなす
+        logger.info(
+            "Successfully downloaded log file",
+            extra={
+                "db_instance_identifier": self.config.db_instance_identifier,
+                "log_file_name": self.config.log_file_name,
+                "size": os.path.getsize(output_path),
+                "refetched_size": self.refetched_size,
+            },
+        )
+        return True
+
+    def iter_log_file_chunks(
+        self,
+        retries: int = DEFAULT_RETRIES,
+        delay: int = DEFAULT_RETRY_DELAY,
+        throttle_retries: int = THROTTLE_RETRIES,
+    ) -> Iterator[bytes]:
+        """
+        RDSログファイルをチャンク単位で逐次取得
+
+        ローカルファイルを経由せずにダウンロードしたデータを返す。
+        リトライ時はRangeヘッダーで取得済みのバイト位置からの再開を要求し、
+        部分取得に対応していないレスポンスの場合は取得済みのバイト数分を読み飛ばす。
+        リトライ間隔は Full Jitter による指数バックオフとする。
+        スロットリング (HTTP 429 / 503, ThrottlingException など) は通常のエラーと区別し、
+        throttle_retries 回まで別に数えてリトライする。
+        concurrency_limiter を指定した場合は、リクエストごとに実行枠を取得して結果を通知する
+
+        Args:
+            retries: リトライ回数
+            delay: リトライ間隔の基準値（秒）
+            throttle_retries: スロットリング時のリトライ回数
+
+        Yields:
+            bytes: ログファイルのデータチャンク
+
+        Raises:
+            IOError: 全てのリトライでダウンロードに失敗した場合
+        """
+
+        logger.info(
+            "Starting log file streaming download",
+            extra={
+                "db_instance_identifier": self.config.db_instance_identifier,
+                "log_file_name": self.config.log_file_name,
+            },
+        )
+
+        delivered_size = 0
+        last_error: Optional[Exception] = None
+        # 通常のエラーとスロットリングの回数
+        attempt = 0
+        throttle_attempt = 0
+
+        try:
+            while True:
+                slot = self._acquire_slot()
+                outcome = FAILED
+                try:
+                    url = self._get_download_url()
+                    response = self.http_pool.request(
+                        "GET",
+                        url,
+                        headers=self._get_signed_headers(url, offset=delivered_size),
+                        preload_content=False,
+                        enforce_content_length=True,
+                    )
+
+                    try:
+                        if response.status not in (200, 206):
+                            body = response.read(1024)
+                            error = f"HTTP Error {response.status}: {body.decode(errors='replace')}"
+                            if is_throttle_response(response.status, body):
+                                raise RdsLogDownloadThrottledError(error)
+                            raise IOError(error)
+
+                        # 206 Partial Content 以外は先頭から返されるため、取得済みの分を読み飛ばす
+                        skip_size = delivered_size if response.status != 206 else 0
+                        if delivered_size:
+                            logger.info(
+                                "Resuming log file download",
+                                extra={
+                                    "attempt": attempt + throttle_attempt + 1,
+                                    "offset": delivered_size,
+                                    "status": response.status,
+                                },
+                            )
+
+                        while True:
+                            chunk = response.read(self.config.chunk_size)
+                            if not chunk:
+                                break
+                            if skip_size:
+                                skipped = min(skip_size, len(chunk))
+                                chunk = chunk[skipped:]
+                                skip_size -= skipped
+                                self.refetched_size += skipped
+                                if not chunk:
+                                    continue
+                            delivered_size += len(chunk)
+                            yield chunk
+
+                        # Content-Length に満たないまま接続が切断された場合
+                        if response.length_remaining:
+                            raise IncompleteRead(b"", response.length_remaining)
+
+                    except BaseException:
+                        # 読み残しのあるコネクションは再利用せずに破棄
+                        response.close()
+                        raise
+
+                    finally:
+                        response.release_conn()
+
+                    outcome = SUCCEEDED
+                    logger.info(
+                        "Successfully streamed log file",
+                        extra={
+                            "db_instance_identifier": self.config.db_instance_identifier,
+                            "log_file_name": self.config.log_file_name,
+                            "size": delivered_size,
+                            "refetched_size": self.refetched_size,
+                        },
+                    )
+                    return
+
+                except RdsLogDownloadThrottledError as e:
+                    outcome = THROTTLED
+                    last_error = e
+                    throttle_attempt += 1
+                    self.throttle_count += 1
+                    logger.warning(
+                        "Download throttled",
+                        extra={
+                            "attempt": throttle_attempt,
+                            "retries": throttle_retries,
+                            "offset": delivered_size,
+                            "error": str(e),
+                        },
+                    )
+                    if throttle_attempt >= throttle_retries:
+                        break
+                    backoff_delay = self._get_backoff_delay(throttle_attempt - 1, delay)
+
+                except IncompleteRead as e:
+                    last_error = e
+                    attempt += 1
+                    logger.warning(
+                        "Incomplete read error",
+                        extra={
+                            "attempt": attempt,
+                            "retries": retries,
+                            "offset": delivered_size,
+                            "error": str(e),
+                        },
+                    )
+                    if attempt >= retries:
+                        break
+                    backoff_delay = self._get_backoff_delay(attempt - 1, delay)
+
+                except Exception as e:
+                    last_error = e
+                    attempt += 1
+                    logger.error(
+                        "Download error",
+                        extra={
+                            "attempt": attempt,
+                            "retries": retries,
+                            "offset": delivered_size,
+                            "error": str(e),
+                        },
+                    )
+                    if attempt >= retries:
+                        break
+                    backoff_delay = self._get_backoff_delay(attempt - 1, delay)
+
+                finally:
+                    # 待機中は実行枠を保持しない
+                    if slot is not None:
+                        self.concurrency_limiter.release(slot, outcome)
+
+                self.retry_count += 1
+                time.sleep(backoff_delay)
+
+        finally:
+            metrics.add_metric(
+                name="RefetchedBytes", unit=MetricUnit.Bytes, value=self.refetched_size
+            )
 
         logger.error(
-            "Failed to download log file after all retries",
+            "Failed to stream log file after all retries",
             extra={
                 "db_instance_identifier": self.config.db_instance_identifier,
                 "log_file_name": self.config.log_file_name,
+                "throttle_count": self.throttle_count,
             },
         )
-        return False
+        raise IOError("Failed to download log file") from last_error
@@ -1,19 +1,35 @@
 import os
-import gzip
-from dataclasses import dataclass
-import boto3
+import json
+import hashlib
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+from dataclasses import dataclass, replace
+from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer
 
 from rds_log_file_uploader_constants import (
-    MULTIPART_THRESHOLD,
-    MULTIPART_CHUNKSIZE,
-    MAX_CONCURRENCY,
+    CHECKSUM_EXTENSION,
+    CHECKSUM_OBJECT_KEY_SEGMENT,
+    S3_CHECKSUM_ALGORITHM,
 )
+from s3_stream_uploader import S3StreamUploader
+from stage_metrics import StageMetrics
+from aws_clients import get_client
+from aws_clients_constants import HTTP_MAX_POOL_CONNECTIONS
+
+# 圧縮、raw と同じ走査で行う処理、転送計画のモジュールは使用する場合のみ読み込む
+if TYPE_CHECKING:
+    from log_stream_processor import LogLineStage, LogStreamProcessor
+    from transfer_planner import TransferPlan
 
 logger = Logger()
 tracer = Tracer()
 
 
+def _is_enabled(name: str) -> bool:
+    """機能を有効化する環境変数 (ENABLE_*) の判定"""
+    return os.environ.get(name, "false").lower() == "true"
+
+
 @dataclass(frozen=True)
 class RdsFileLogUploaderConfig:
     """RdsFileLogUploader 設定値を管理するデータクラス"""
@@ -22,6 +38,8 @@ class RdsFileLogUploaderConfig:
     log_destination_bucket: str
     last_written: int
     object_key: str
+    # DescribeDBLogFiles のファイルサイズ。0の場合は検証しない
+    size: int = 0
 
     def __post_init__(self) -> None:
         """初期化後のバリデーション"""
@@ -33,25 +51,129 @@ class RdsFileLogUploaderConfig:
             raise ValueError("LastWritten is required")
         if not self.object_key:
             raise ValueError("ObjectKey is required")
+        if self.size < 0:
+            raise ValueError("Size must be greater than or equal to 0")
 
 
 class RdsFileLogUploader:
     """RDSログをS3にアップロードするクラス"""
 
-    def __init__(self, config: RdsFileLogUploaderConfig):
+    def __init__(
+        self,
+        config: RdsFileLogUploaderConfig,
+        stage_metrics: Optional[StageMetrics] = None,
+        transfer_plan: Optional["TransferPlan"] = None,
+    ):
+        """
+        Args:
+            config (RdsFileLogUploaderConfig): 設定値
+            stage_metrics (Optional[StageMetrics]): 圧縮、アップロードなどの処理時間の記録先
+            transfer_plan (Optional[TransferPlan]): チャンクサイズ、パートサイズ、並列数。
+                未指定の場合はログファイルのサイズとLambda関数のメモリサイズから決める
+        """
         self.config = config
-        self.s3_client = boto3.client("s3")
-        self.compression_enabled = (
-            os.environ.get("ENABLE_COMPRESSION", "false").lower() == "true"
-        )
+        self.stage_metrics = stage_metrics or StageMetrics({}, enabled=False)
+        if transfer_plan is None:
+            from transfer_planner import TransferPlanner, TransferPlannerConfig
+
+            transfer_plan = TransferPlanner(TransferPlannerConfig.from_environ()).plan(
+                config.size
+            )
+        self.transfer_plan = transfer_plan
+        # ウォームスタート時はS3クライアントとHTTPコネクションを再利用する
+        self.s3_client = get_client("s3", HTTP_MAX_POOL_CONNECTIONS)
+        self.compression_enabled = _is_enabled("ENABLE_COMPRESSION")
+        self.compressor = None
+        if self.compression_enabled:
+            from log_file_compressor import LogFileCompressor, LogFileCompressorConfig
+
+            self.compressor = LogFileCompressor(LogFileCompressorConfig.from_environ())
+
+        # 無効な処理のモジュールは読み込まない
+        self.router_config = None
+        if _is_enabled("ENABLE_LOG_ROUTING"):
+            from log_entry_router import LogEntryRouterConfig
+
+            self.router_config = LogEntryRouterConfig.from_environ()
+        self.parquet_config = None
+        if _is_enabled("ENABLE_PARQUET_OUTPUT"):
+            from log_record_parquet_writer import ParquetOutputConfig
+
+            self.parquet_config = ParquetOutputConfig.from_environ()
+        self.slow_query_config = None
+        if _is_enabled("ENABLE_SLOW_QUERY_SUMMARY"):
+            from slow_query_aggregator import SlowQueryAggregatorConfig
+
+            self.slow_query_config = SlowQueryAggregatorConfig.from_environ()
+        self.index_config = None
+        if _is_enabled("ENABLE_LOG_INDEX"):
+            from log_file_indexer import LogFileIndexConfig
+
+            self.index_config = LogFileIndexConfig.from_environ()
+        self.token_index_config = None
+        if _is_enabled("ENABLE_TOKEN_INDEX"):
+            from log_token_indexer import LogTokenIndexConfig
+
+            self.token_index_config = LogTokenIndexConfig.from_environ()
+        # 圧縮前のログファイルのSHA-256。最初にデータを走査した時点で確定する
+        self.source_checksum: Optional[str] = None
+
+    @property
+    def content_type(self) -> str:
+        """アップロードするオブジェクトのContent-Type"""
+        if self.compressor:
+            return self.compressor.config.content_type
+        return "text/plain"
+
+    @property
+    def content_encoding(self) -> str:
+        """アップロードするオブジェクトのContent-Encoding"""
+        if self.compressor:
+            return self.compressor.config.content_encoding
+        return "identity"
+
+    def _hash_chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """データを返しながら圧縮前のログファイルのSHA-256を計算
+
+        全てのデータを返し終えた場合のみ source_checksum を設定する
+        """
+        hasher = hashlib.sha256()
+        for chunk in chunks:
+            hasher.update(chunk)
+            yield chunk
+        self.source_checksum = hasher.hexdigest()
+
+    def _hash_file(self, file_path: str) -> None:
+        """圧縮、raw 以外の処理でデータを走査しない場合のSHA-256の計算"""
+        with open(file_path, "rb") as f:
+            for _ in self._hash_chunks(
+                iter(lambda: f.read(self.transfer_plan.chunk_size), b"")
+            ):
+                pass
+
+    def _verify_source_size(self, size: int) -> None:
+        """取得したデータのサイズとログファイルのサイズの比較
+
+        途中で途切れたデータを raw としてアップロードし、アーカイブ済みとみなされることを防ぐ
+
+        Raises:
+            ValueError: サイズが一致しない場合
+        """
+        if self.config.size and size != self.config.size:
+            raise ValueError(
+                f"Downloaded size {size} does not match log file size {self.config.size}"
+            )
 
     @tracer.capture_method
-    def _compress_file(self, file_path: str) -> bool:
+    def _compress_file(
+        self, file_path: str, processor: Optional["LogStreamProcessor"] = None
+    ) -> bool:
         """
-        ファイルをGZIP圧縮
+        ファイルをブロック単位で並列圧縮
 
         Args:
             file_path: 圧縮対象のファイルパス
+            processor: 指定した場合は圧縮と同じ走査で行う処理
 
         Returns:
             bool: 圧縮成功時True
@@ -69,10 +191,7 @@ class RdsFileLogUploader:
                 )
                 return True
 
-            # Lambda関数のメモリサイズの1/8をチャンクサイズとして使用（バイト単位）
-            chunk_size = (
-                int(os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")) * 1024 * 1024
-            ) // 8
+            chunk_size = self.transfer_plan.chunk_size
 
             logger.debug(
                 "Compressing file with chunks",
@@ -80,17 +199,23 @@ class RdsFileLogUploader:
                     "file_path": file_path,
                     "original_size": original_size,
                     "chunk_size": chunk_size,
+                    "codec": self.compressor.config.codec,
+                    "block_size": self.compressor.config.block_size,
+                    "max_workers": self.compressor.max_workers,
                 },
             )
 
-            # チャンク単位で圧縮
-            with open(file_path, "rb") as f_in:
-                with gzip.open(temp_path, "wb", compresslevel=6) as f_out:
-                    while True:
-                        chunk = f_in.read(chunk_size)
-                        if not chunk:
-                            break
-                        f_out.write(chunk)
+            # チャンク単位で読み込み、ブロック単位で並列圧縮
+            with open(file_path, "rb") as f_in, open(temp_path, "wb") as f_out:
+                chunks = self._hash_chunks(iter(lambda: f_in.read(chunk_size), b""))
+                if processor:
+                    chunks = processor.tap(chunks)
+                blocks = self.compressor.compress(chunks)
+                if processor:
+                    blocks = processor.observe_stored_blocks(blocks)
+
+                for block in blocks:
+                    f_out.write(block)
 
             # 圧縮したファイルで元のファイルを置き換え
             os.replace(temp_path, file_path)
@@ -124,11 +249,166 @@ class RdsFileLogUploader:
                         extra={"temp_path": temp_path, "error": str(e)},
                     )
 
+    def _build_metadata(self) -> Dict[str, str]:
+        """S3オブジェクトのメタデータを生成
+
+        フィルター処理で変更されたログファイルを検出するため、ログファイルのサイズを含める。
+        マルチパートアップロードのメタデータは開始時に確定するため、SHA-256 はチェックサムのオブジェクトに記録する
+        """
+        return {
+            "LastWritten": str(self.config.last_written),
+            "DbInstanceIdentifier": self.config.db_instance_identifier,
+            "Compressed": str(self.compression_enabled).lower(),
+            **(
+                {"CompressionCodec": self.compressor.config.codec}
+                if self.compressor
+                else {}
+            ),
+            **({"SourceSize": str(self.config.size)} if self.config.size else {}),
+        }
+
+    def _create_processor(
+        self, metadata: Dict[str, str]
+    ) -> Optional["LogStreamProcessor"]:
+        """raw と同じ走査で行う処理の生成
+
+        ログ種別ごとの振り分け、Parquet形式の出力、スロークエリの集計、インデックスの出力、
+        トークンインデックスの出力のうち有効なものを行う
+
+        Returns:
+            Optional[LogStreamProcessor]: 有効な処理がない場合はNone
+        """
+        stages: List["LogLineStage"] = []
+
+        if self.router_config:
+            from log_entry_router import LogEntryRouter
+
+            stages.append(
+                LogEntryRouter(
+                    self.router_config,
+                    s3_client=self.s3_client,
+                    bucket=self.config.log_destination_bucket,
+                    object_key=self.config.object_key,
+                    extra_args={
+                        "Metadata": metadata,
+                        "ContentType": self.content_type,
+                        "ContentEncoding": self.content_encoding,
+                    },
+                    compressor=self.compressor,
+                )
+            )
+        if self.parquet_config:
+            from log_record_parquet_writer import LogRecordParquetWriter
+
+            stages.append(
+                LogRecordParquetWriter(
+                    self.parquet_config,
+                    s3_client=self.s3_client,
+                    bucket=self.config.log_destination_bucket,
+                    object_key=self.config.object_key,
+                    metadata=metadata,
+                )
+            )
+
+        if self.slow_query_config:
+            from slow_query_aggregator import SlowQueryAggregator
+
+            stages.append(
+                SlowQueryAggregator(
+                    self.slow_query_config,
+                    s3_client=self.s3_client,
+                    bucket=self.config.log_destination_bucket,
+                    object_key=self.config.object_key,
+                    metadata=metadata,
+                )
+            )
+
+        if self.index_config:
+            from log_file_indexer import LogFileIndexer
+
+            stages.append(
+                LogFileIndexer(
+                    # 圧縮する場合は圧縮ブロックの境界に合わせる
+                    block_size=(
+                        self.compressor.config.block_size
+                        if self.compressor
+                        else self.index_config.block_size
+                    ),
+                    s3_client=self.s3_client,
+                    bucket=self.config.log_destination_bucket,
+                    object_key=self.config.object_key,
+                    metadata=metadata,
+                    compression_codec=(
+                        self.compressor.config.codec if self.compressor else None
+                    ),
+                )
+            )
+
+        if self.token_index_config:
+            from log_token_indexer import LogTokenIndexer
+
+            stages.append(
+                LogTokenIndexer(
+                    # 圧縮する場合は圧縮ブロックの境界に合わせる
+                    (
+                        replace(
+                            self.token_index_config,
+                            block_size=self.compressor.config.block_size,
+                        )
+                        if self.compressor
+                        else self.token_index_config
+                    ),
+                    s3_client=self.s3_client,
+                    bucket=self.config.log_destination_bucket,
+                    object_key=self.config.object_key,
+                    metadata=metadata,
+                    compression_codec=(
+                        self.compressor.config.codec if self.compressor else None
+                    ),
+                )
+            )
+
+        if not stages:
+            return None
+
+        from log_stream_processor import LogStreamProcessor
+
+        return LogStreamProcessor(stages)
+
+    @tracer.capture_method
+    def _process_file(
+        self, file_path: str, processor: "LogStreamProcessor", read_file: bool = True
+    ) -> None:
+        """
+        圧縮前のログファイルを1回走査し、raw 以外のオブジェクトをS3にアップロード
+
+        Args:
+            file_path: 処理対象のファイルパス
+            processor: raw と同じ走査で行う処理
+            read_file: 圧縮と同じ走査で処理済みの場合はFalse
+        """
+
+        try:
+            if read_file:
+                with open(file_path, "rb") as f:
+                    for chunk in self._hash_chunks(
+                        iter(lambda: f.read(self.transfer_plan.chunk_size), b"")
+                    ):
+                        processor.write(chunk)
+            processor.close()
+
+        except Exception:
+            processor.abort()
+            raise
+
     @tracer.capture_method
     def upload_log_file(self, file_path: str) -> bool:
         """
         ログファイルをS3にアップロード
 
+        圧縮しない場合は upload_log_stream() と同じ経路でアップロードし、
+        raw 以外の処理、チェックサムの計算、アップロードをファイルの1回の読み込みで行う
+
         Args:
             file_path: アップロードするファイルのパス
 
@@ -136,41 +416,85 @@ class RdsFileLogUploader:
             bool: アップロード成功時True
         """
 
+        if not self.compression_enabled:
+            try:
+                with open(file_path, "rb") as f:
+                    return self.upload_log_stream(
+                        iter(lambda: f.read(self.transfer_plan.chunk_size), b"")
+                    )
+            except OSError as e:
+                logger.exception(
+                    "Failed to upload log file to S3",
+                    extra={
+                        "file_path": file_path,
+                        "log_destination_bucket": self.config.log_destination_bucket,
+                        "object_key": self.config.object_key,
+                        "error": str(e),
+                    },
+                )
+                return False
+
         try:
             content_type = "text/plain"
+            original_size = os.path.getsize(file_path)
+            self._verify_source_size(original_size)
+            self.source_checksum = None
+
+            # raw と同じ走査で行う処理は、圧縮が有効な場合は圧縮と同じ走査で行う
+            processor = self._create_processor(self._build_metadata())
+            processed = False
 
             # 圧縮が有効な場合のみ圧縮処理を実行
             if self.compression_enabled:
-                if self._compress_file(file_path):
-                    content_type = "application/gzip"
+                with self.stage_metrics.measure("Compress"):
+                    compressed = self._compress_file(file_path, processor)
+                if compressed:
+                    self.stage_metrics.add_bytes("Compress", original_size)
+                    if original_size:
+                        self.stage_metrics.set_value(
+                            "CompressionRatio",
+                            os.path.getsize(file_path) / original_size,
+                        )
+                    content_type = self.content_type
+                    processed = True
                 else:
                     logger.warning("Compression failed, uploading uncompressed file")
+                    # 途中まで処理した結果は破棄し、圧縮前のファイルから処理し直す
+                    self.source_checksum = None
+                    if processor:
+                        processor.abort()
+                        processor = self._create_processor(self._build_metadata())
+
+            # raw のアップロードより前に確定し、失敗した場合は raw もアップロードしない
+            if processor:
+                with self.stage_metrics.measure("Process"):
+                    self._process_file(file_path, processor, read_file=not processed)
+
+            # 圧縮、raw 以外の処理のいずれも行わない場合はチェックサムのみ計算
+            if self.source_checksum is None:
+                self._hash_file(file_path)
 
             # メタデータの設定
-            metadata = {
-                "LastWritten": str(self.config.last_written),
-                "DbInstanceIdentifier": self.config.db_instance_identifier,
-                "Compressed": str(self.compression_enabled).lower(),
-            }
+            metadata = self._build_metadata()
 
-            self.s3_client.upload_file(
-                Filename=file_path,
-                Bucket=self.config.log_destination_bucket,
-                Key=self.config.object_key,
-                ExtraArgs={
-                    "Metadata": metadata,
-                    "ContentType": content_type,
-                    "ContentEncoding": (
-                        "gzip" if self.compression_enabled else "identity"
-                    ),
-                },
-                Config=boto3.s3.transfer.TransferConfig(
-                    multipart_threshold=MULTIPART_THRESHOLD,
-                    max_concurrency=MAX_CONCURRENCY,
-                    multipart_chunksize=MULTIPART_CHUNKSIZE,
-                    use_threads=True,
-                ),
-            )
+            with self.stage_metrics.measure("Upload"):
+                self.s3_client.upload_file(
+                    Filename=file_path,
+                    Bucket=self.config.log_destination_bucket,
+                    Key=self.config.object_key,
+                    ExtraArgs={
+                        "Metadata": metadata,
+                        "ContentType": content_type,
+                        "ContentEncoding": self.content_encoding,
+                        "ChecksumAlgorithm": S3_CHECKSUM_ALGORITHM,
+                    },
+                    Config=self.transfer_plan.to_transfer_config(),
+                )
+                self._put_checksum_object(
+                    original_size=original_size,
+                    uploaded_size=os.path.getsize(file_path),
+                )
+            self.stage_metrics.add_bytes("Upload", os.path.getsize(file_path))
 
             logger.info(
                 "Successfully uploaded log file to S3",
@@ -196,3 +520,167 @@ class RdsFileLogUploader:
                 },
             )
             return False
+
+    def _read_object_checksum(self) -> Optional[str]:
+        """アップロードした raw のオブジェクトのチェックサムをS3から取得
+
+        マルチパートアップロードの場合はパートごとのチェックサムの合成値 (<base64>-<パート数>) となる
+        """
+        response = self.s3_client.head_object(
+            Bucket=self.config.log_destination_bucket,
+            Key=self.config.object_key,
+            ChecksumMode="ENABLED",
+        )
+        return response.get(f"Checksum{S3_CHECKSUM_ALGORITHM}")
+
+    def _put_checksum_object(
+        self,
+        original_size: int,
+        uploaded_size: int,
+        object_checksum: Optional[str] = None,
+    ) -> None:
+        """圧縮前のログファイルのSHA-256とS3のチェックサムを記録するオブジェクトのアップロード
+
+        <cluster>/<instance>/checksums/YYYY/MM/DD/HH/postgresql.log.YYYY-MM-DD-HHMM.json に、
+        ログファイルの LastWritten、サイズとともに保存する。
+        raw の確定後に行うため、失敗した場合は raw を残したまま処理を継続する
+
+        Args:
+            original_size: 圧縮前のログファイルのサイズ
+            uploaded_size: raw のオブジェクトのサイズ
+            object_checksum: 確定時のレスポンスに含まれる raw のチェックサム。未指定の場合はS3から取得する
+        """
+        from log_stream_processor import build_derived_object_key
+
+        checksum_key = build_derived_object_key(
+            self.config.object_key, CHECKSUM_OBJECT_KEY_SEGMENT, CHECKSUM_EXTENSION
+        )
+        try:
+            checksum = {
+                "SourceObjectKey": self.config.object_key,
+                "LastWritten": self.config.last_written,
+                "SourceSize": original_size,
+                "SourceSha256": self.source_checksum,
+                "ObjectSize": uploaded_size,
+                f"Checksum{S3_CHECKSUM_ALGORITHM}": (
+                    object_checksum or self._read_object_checksum()
+                ),
+            }
+            self.s3_client.put_object(
+                Bucket=self.config.log_destination_bucket,
+                Key=checksum_key,
+                Body=json.dumps(checksum).encode(),
+                ContentType="application/json",
+            )
+        except ClientError as e:
+            logger.warning(
+                "Failed to upload checksum object",
+                extra={"object_key": checksum_key, "error": str(e)},
+            )
+
+    @tracer.capture_method
+    def upload_log_stream(self, chunks: Iterable[bytes]) -> bool:
+        """
+        ログファイルをストリーミングでS3にアップロード
+
+        ダウンロードしたデータをローカルファイルに書き出さず、圧縮が有効な場合はブロック単位で並列圧縮しながら
+        マルチパートアップロードのパートとしてS3に送信する
+
+        Args:
+            chunks: ログファイルのデータチャンクのイテレーター
+
+        Returns:
+            bool: アップロード成功時True
+        """
+
+        metadata = self._build_metadata()
+        stream_uploader = S3StreamUploader(
+            s3_client=self.s3_client,
+            bucket=self.config.log_destination_bucket,
+            key=self.config.object_key,
+            extra_args={
+                "Metadata": metadata,
+                "ContentType": self.content_type,
+                "ContentEncoding": self.content_encoding,
+            },
+            part_size=self.transfer_plan.part_size,
+            max_inflight_parts=self.transfer_plan.max_inflight_parts,
+            checksum_algorithm=S3_CHECKSUM_ALGORITHM,
+        )
+        processor = self._create_processor(metadata)
+        original_size = 0
+
+        def count_original_size(chunks: Iterable[bytes]) -> Iterator[bytes]:
+            nonlocal original_size
+            for chunk in self._hash_chunks(chunks):
+                original_size += len(chunk)
+                yield chunk
+
+        self.source_checksum = None
+        try:
+            # ジェネレーターを連結するため、ステージごとの処理時間は要素の取得にかかった時間で記録する
+            blocks = count_original_size(chunks)
+            # raw 以外のオブジェクトの出力は raw のアップロードと同じ走査で行う
+            if processor:
+                blocks = self.stage_metrics.measure_iterator(
+                    "Process", processor.tap(blocks), count_bytes=False
+                )
+            if self.compressor:
+                blocks = self.compressor.compress(blocks)
+                if processor:
+                    blocks = processor.observe_stored_blocks(blocks)
+                blocks = self.stage_metrics.measure_iterator(
+                    "Compress", blocks, count_bytes=False
+                )
+
+            with self.stage_metrics.measure("Upload"):
+                for block in blocks:
+                    stream_uploader.write(block)
+            self._verify_source_size(original_size)
+
+            # raw の確定後はアーカイブ済みとみなされるため、他のオブジェクトを先に確定する
+            if processor:
+                with self.stage_metrics.measure("Process"):
+                    processor.close()
+            with self.stage_metrics.measure("Upload"):
+                uploaded_size = stream_uploader.complete()
+                self._put_checksum_object(
+                    original_size=original_size,
+                    uploaded_size=uploaded_size,
+                    object_checksum=stream_uploader.checksum,
+                )
+
+            self.stage_metrics.add_bytes("Upload", uploaded_size)
+            if self.compressor:
+                self.stage_metrics.add_bytes("Compress", original_size)
+                if original_size:
+                    self.stage_metrics.set_value(
+                        "CompressionRatio", uploaded_size / original_size
+                    )
+
+            logger.info(
+                "Successfully uploaded log stream to S3",
+                extra={
+                    "log_destination_bucket": self.config.log_destination_bucket,
+                    "object_key": self.config.object_key,
+                    "original_size": original_size,
+                    "size": uploaded_size,
+                    "compressed": self.compression_enabled,
+                    "metadata": metadata,
+                },
+            )
+            return True
+
+        except Exception as e:
+            stream_uploader.abort()
+            if processor:
+                processor.abort()
+            logger.exception(
+                "Failed to upload log stream to S3",
+                extra={
+                    "log_destination_bucket": self.config.log_destination_bucket,
+                    "object_key": self.config.object_key,
+                    "error": str(e),
+                },
+            )
+            return False
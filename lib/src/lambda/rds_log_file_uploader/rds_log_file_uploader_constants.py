@@ -1,6 +1,108 @@
 DEFAULT_RETRIES = 3
 DEFAULT_RETRY_DELAY = 5
-DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB for download chunks
-MULTIPART_THRESHOLD = 64 * 1024 * 1024  # 64MB
-MULTIPART_CHUNKSIZE = 64 * 1024 * 1024  # 64MB
-MAX_CONCURRENCY = 10
+MAX_RETRY_DELAY = 60
+# スロットリング時のリトライ回数。通常のエラーのリトライ回数とは別に数える
+THROTTLE_RETRIES = 8
+THROTTLE_STATUS_CODES = (429, 503)
+THROTTLE_ERROR_CODES = (
+    b"Throttling",  # Throttling, ThrottlingException
+    b"RequestLimitExceeded",
+    b"TooManyRequestsException",
+    b"SlowDown",
+)
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB for download chunks without a transfer plan
+MAX_CONCURRENCY = 16  # upper bound of concurrent part uploads per log file
+DEFAULT_MEMORY_SIZE = 1024  # MB, when AWS_LAMBDA_FUNCTION_MEMORY_SIZE is not set
+TRANSFER_MEMORY_FRACTION = 0.25  # share of function memory for transfer buffers
+TRANSFER_CONCURRENCY_PER_CPU = 4
+TRANSFER_MIN_CHUNK_SIZE = 1 * 1024 * 1024  # 1MB
+TRANSFER_MAX_CHUNK_SIZE = 64 * 1024 * 1024  # 64MB
+TRANSFER_MAX_PART_SIZE = 256 * 1024 * 1024  # 256MB
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # 5MB, minimum size of every part but the last
+S3_MAX_PART_SIZE = 5 * 1024 * 1024 * 1024  # 5GB
+S3_MAX_PARTS = 10_000
+GZIP_COMPRESS_LEVEL = 6
+COMPRESSION_BLOCK_SIZE = 4 * 1024 * 1024  # 4MB per independently compressed block
+COMPRESSION_CODECS = {
+    "gzip": {
+        "extension": ".gz",
+        "content_type": "application/gzip",
+        "content_encoding": "gzip",
+        "default_level": GZIP_COMPRESS_LEVEL,
+    },
+    "zstd": {
+        "extension": ".zst",
+        "content_type": "application/zstd",
+        "content_encoding": "zstd",
+        "default_level": 3,
+    },
+}
+UPLOAD_BATCH_MAX_WORKERS = 4
+ADAPTIVE_CONCURRENCY_MIN_LIMIT = 1
+ADAPTIVE_CONCURRENCY_DECREASE_FACTOR = 0.5
+LOG_TYPES = ("error", "slow_query", "audit", "connection")
+# RDS/Aurora PostgreSQL の log_line_prefix (%t:%r:%u@%d:[%p]:) と、続く重大度
+LOG_ENTRY_PATTERN = (
+    rb"^(?P<log_time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?) (?P<log_timezone>[^:]*):"
+    rb"(?P<remote>\[local\]|[^@]*?\(\d+\)|):(?P<user>[^@]*)@(?P<database>.*?):"
+    rb"\[(?P<pid>\d+)\]:(?P<severity>[A-Z0-9]+):\s*"
+)
+ERROR_SEVERITIES = (b"ERROR", b"FATAL", b"PANIC")
+# 直前のエントリーに付随して出力される重大度
+ATTACHED_SEVERITIES = (
+    b"DETAIL",
+    b"HINT",
+    b"CONTEXT",
+    b"STATEMENT",
+    b"QUERY",
+    b"LOCATION",
+)
+SLOW_QUERY_MESSAGE_PREFIX = b"duration:"
+AUDIT_MESSAGE_PREFIX = b"AUDIT:"
+CONNECTION_MESSAGE_PREFIXES = (
+    b"connection received",
+    b"connection authorized",
+    b"connection authenticated",
+    b"disconnection:",
+)
+RAW_OBJECT_KEY_SEGMENT = "/raw/"
+DERIVED_OBJECT_PART_SIZE = 8 * 1024 * 1024  # 8MB per part for objects derived from raw
+DERIVED_OBJECT_MAX_INFLIGHT_PARTS = 2
+PARSED_OBJECT_KEY_SEGMENT = "parsed"
+PARQUET_EXTENSION = ".parquet"
+PARQUET_COMPRESSION = "zstd"
+PARQUET_ROW_GROUP_SIZE = 100_000  # rows buffered in memory per row group
+DURATION_MESSAGE_PATTERN = rb"^duration: (?P<duration>\d+(?:\.\d+)?) ms"
+SQL_STATE_MESSAGE_PATTERN = rb"^(?P<sql_state>[0-9A-Z]{5}):\s"
+APPLICATION_NAME_MESSAGE_PATTERN = rb"application_name=(?P<application_name>\S+)"
+SLOW_QUERY_STATEMENT_PATTERN = (
+    rb"^duration: (?P<duration>\d+(?:\.\d+)?) ms\s+"
+    rb"(?:statement|execute [^:]*): (?P<statement>.*)"
+)
+SLOW_QUERY_SUMMARY_OBJECT_KEY_SEGMENT = "slow_query_summary"
+SLOW_QUERY_SUMMARY_EXTENSION = ".json"
+SLOW_QUERY_SUMMARY_TOP_N = 100
+SLOW_QUERY_MAX_FINGERPRINTS = 10_000  # fingerprints kept in memory per log file
+SLOW_QUERY_HISTOGRAM_GROWTH = 1.05  # bucket width for p50/p95 (5% relative error)
+SLOW_QUERY_MAX_QUERY_LENGTH = 2048
+LOG_INDEX_OBJECT_KEY_SEGMENT = "index"
+LOG_INDEX_EXTENSION = ".json"
+LOG_INDEX_VERSION = 1
+LOG_INDEX_BLOCK_SIZE = 4 * 1024 * 1024  # 4MB per index entry for uncompressed objects
+TAIL_OBJECT_KEY_SEGMENT = "tail"
+TAIL_STATE_FILE_NAME = "state.json"
+TAIL_PART_EXTENSION = ".log"
+TAIL_MAX_PART_SIZE = 16 * 1024 * 1024  # 16MB per part object of appended log data
+TOKEN_INDEX_OBJECT_KEY_SEGMENT = "tokens"
+TOKEN_INDEX_EXTENSION = ".json"
+TOKEN_INDEX_VERSION = 1
+TOKEN_INDEX_FALSE_POSITIVE_RATE = 0.01
+TOKEN_INDEX_MAX_BLOCK_BITS = 1024 * 1024  # caps one block's Bloom filter at 128KiB
+TOKEN_INDEX_HASH_FUNCTION = "blake2b-128"  # double hashing with the two 64-bit halves
+TOKEN_PATTERN = rb"[0-9a-z_]+"  # applied to lower-cased data
+TOKEN_MIN_LENGTH = 2
+TOKEN_MAX_LENGTH = 64  # longer tokens are truncated
+TOKENIZE_BATCH_SIZE = 1024 * 1024  # lines buffered before extracting tokens at once
+S3_CHECKSUM_ALGORITHM = "SHA256"  # verified by S3 per part and stored with the object
+CHECKSUM_OBJECT_KEY_SEGMENT = "checksums"
+CHECKSUM_EXTENSION = ".json"
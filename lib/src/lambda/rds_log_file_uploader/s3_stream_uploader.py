@@ -0,0 +1,217 @@
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+class S3StreamUploader:
+    """データを逐次S3マルチパートアップロードのパートとして送信するクラス
+
+    書き込まれたデータはパートサイズに達するまでメモリ上にバッファリングし、
+    パートサイズに達した時点でアップロードする。
+    同時にアップロード中のパート数を制限することで、メモリ使用量を
+    part_size * (max_inflight_parts + 1) 程度に抑える。
+    checksum_algorithm を指定した場合は各パートのチェックサムをS3で検証し、
+    確定したオブジェクトのチェックサム（マルチパートの場合はパートごとのチェックサムの合成値）を
+    checksum に設定する。
+    """
+
+    def __init__(
+        self,
+        s3_client: Any,
+        bucket: str,
+        key: str,
+        extra_args: Dict[str, Any],
+        part_size: int,
+        max_inflight_parts: int,
+        checksum_algorithm: Optional[str] = None,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.extra_args = extra_args
+        self.part_size = part_size
+        self.max_inflight_parts = max_inflight_parts
+        self.checksum_algorithm = checksum_algorithm
+
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._parts: List[Tuple[int, Future]] = []
+        self.bytes_written = 0
+        self.checksum: Optional[str] = None
+
+    @property
+    def _checksum_args(self) -> Dict[str, str]:
+        if not self.checksum_algorithm:
+            return {}
+        return {"ChecksumAlgorithm": self.checksum_algorithm}
+
+    @property
+    def _checksum_key(self) -> str:
+        """レスポンスのチェックサムのキー (ChecksumSHA256 など)"""
+        return f"Checksum{self.checksum_algorithm}"
+
+    @property
+    def part_count(self) -> int:
+        """アップロードしたパート数。PutObjectで1回でアップロードした場合は0"""
+        return len(self._parts)
+
+    def write(self, data: bytes) -> None:
+        """データを書き込み、パートサイズに達した分をアップロード
+
+        Args:
+            data: 書き込むデータ
+        """
+
+        if not data:
+            return
+
+        self._buffer += data
+        self.bytes_written += len(data)
+
+        while len(self._buffer) >= self.part_size:
+            body = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            self._submit_part(body)
+
+    def _submit_part(self, body: bytes) -> None:
+        """パートのアップロードをスレッドプールに登録"""
+
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                **self.extra_args,
+                **self._checksum_args,
+            )
+            self._upload_id = response["UploadId"]
+            self._executor = ThreadPoolExecutor(max_workers=self.max_inflight_parts)
+
+            logger.debug(
+                "Started multipart upload",
+                extra={
+                    "bucket": self.bucket,
+                    "object_key": self.key,
+                    "upload_id": self._upload_id,
+                    "part_size": self.part_size,
+                },
+            )
+
+        # アップロード中のパート数が上限に達している場合は完了を待機
+        pending = [future for _, future in self._parts if not future.done()]
+        if len(pending) >= self.max_inflight_parts:
+            wait(pending, return_when=FIRST_COMPLETED)
+
+        # 失敗したパートがあれば早期に例外を送出
+        for _, future in self._parts:
+            if future.done():
+                future.result()
+
+        part_number = len(self._parts) + 1
+        self._parts.append(
+            (
+                part_number,
+                self._executor.submit(self._upload_part, part_number, body),
+            )
+        )
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict[str, str]:
+        """パートのアップロード
+
+        Returns:
+            Dict[str, str]: CompleteMultipartUpload に指定するパートのETagとチェックサム
+        """
+
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body,
+            **self._checksum_args,
+        )
+        part = {"ETag": response["ETag"]}
+        if self.checksum_algorithm:
+            part[self._checksum_key] = response[self._checksum_key]
+        return part
+
+    def complete(self) -> int:
+        """残りのデータをアップロードし、オブジェクトを確定
+
+        データ量がパートサイズ未満の場合はマルチパートアップロードを行わず、
+        PutObjectで1回でアップロードする
+
+        Returns:
+            int: アップロードしたバイト数
+        """
+
+        if self._upload_id is None:
+            response = self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                **self.extra_args,
+                **self._checksum_args,
+            )
+            if self.checksum_algorithm:
+                self.checksum = response.get(self._checksum_key)
+            self._buffer.clear()
+            return self.bytes_written
+
+        if self._buffer:
+            self._submit_part(bytes(self._buffer))
+            self._buffer.clear()
+
+        try:
+            parts = [
+                {"PartNumber": part_number, **future.result()}
+                for part_number, future in self._parts
+            ]
+            response = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            if self.checksum_algorithm:
+                self.checksum = response.get(self._checksum_key)
+        finally:
+            self._executor.shutdown(wait=True)
+
+        logger.debug(
+            "Completed multipart upload",
+            extra={
+                "bucket": self.bucket,
+                "object_key": self.key,
+                "part_count": len(self._parts),
+                "size": self.bytes_written,
+            },
+        )
+        return self.bytes_written
+
+    def abort(self) -> None:
+        """マルチパートアップロードの中止"""
+
+        self._buffer.clear()
+        if self._upload_id is None:
+            return
+
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+        except Exception as e:
+            logger.warning(
+                "Failed to abort multipart upload",
+                extra={
+                    "bucket": self.bucket,
+                    "object_key": self.key,
+                    "upload_id": self._upload_id,
+                    "error": str(e),
+                },
+            )
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import math
+import hashlib
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    SLOW_QUERY_HISTOGRAM_GROWTH,
+    SLOW_QUERY_MAX_FINGERPRINTS,
+    SLOW_QUERY_MAX_QUERY_LENGTH,
+    SLOW_QUERY_STATEMENT_PATTERN,
+    SLOW_QUERY_SUMMARY_EXTENSION,
+    SLOW_QUERY_SUMMARY_OBJECT_KEY_SEGMENT,
+    SLOW_QUERY_SUMMARY_TOP_N,
+)
+from log_stream_processor import LogEntryStage, build_derived_object_key
+
+logger = Logger()
+
+_slow_query_pattern = re.compile(SLOW_QUERY_STATEMENT_PATTERN, re.DOTALL)
+
+# フィンガープリント生成時の正規化（適用順に意味がある）
+_normalize_patterns = [
+    (re.compile(r"/\*.*?\*/", re.DOTALL), " "),
+    (re.compile(r"--[^\n]*"), " "),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\$\d+"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?(?:e[-+]?\d+)?\b"), "?"),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?)"),
+]
+
+OTHER_FINGERPRINT = "other"
+
+
+def normalize_statement(statement: str) -> str:
+    """SQL文からリテラルとコメントを除去し、フィンガープリント用に正規化
+
+    Example:
+        >>> normalize_statement("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'foo'")
+        "select * from t where id in (?) and name = ?"
+    """
+    normalized = statement.lower()
+    for pattern, replacement in _normalize_patterns:
+        normalized = pattern.sub(replacement, normalized)
+    return normalized.strip().rstrip(";").strip()
+
+
+@dataclass(frozen=True)
+class SlowQueryAggregatorConfig:
+    """SlowQueryAggregator の設定値を管理するデータクラス"""
+
+    top_n: int = SLOW_QUERY_SUMMARY_TOP_N
+    max_fingerprints: int = SLOW_QUERY_MAX_FINGERPRINTS
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.top_n <= 0:
+            raise ValueError("TopN must be greater than 0")
+        if self.max_fingerprints <= 0:
+            raise ValueError("MaxFingerprints must be greater than 0")
+
+    @classmethod
+    def from_environ(cls) -> Optional["SlowQueryAggregatorConfig"]:
+        """環境変数から設定値を生成
+
+        - ENABLE_SLOW_QUERY_SUMMARY: スロークエリ集計の有効化
+        - SLOW_QUERY_SUMMARY_TOP_N: 集計結果に出力するフィンガープリント数
+
+        Returns:
+            Optional[SlowQueryAggregatorConfig]: スロークエリ集計が無効な場合はNone
+        """
+        if os.environ.get("ENABLE_SLOW_QUERY_SUMMARY", "false").lower() != "true":
+            return None
+
+        top_n = os.environ.get("SLOW_QUERY_SUMMARY_TOP_N")
+        return cls(top_n=int(top_n) if top_n else SLOW_QUERY_SUMMARY_TOP_N)
+
+
+class _DurationStats:
+    """1つのフィンガープリントの実行時間の統計
+
+    パーセンタイルは対数スケールのヒストグラムから求め、
+    保持するデータ量を実行回数に依存しないようにする
+    """
+
+    _log_growth = math.log(SLOW_QUERY_HISTOGRAM_GROWTH)
+
+    def __init__(self, query: str):
+        self.query = query
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        bucket = math.floor(math.log(max(duration_ms, 0.001)) / self._log_growth)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """ヒストグラムからパーセンタイルを推定（バケットの上限値、最大値を超えない）"""
+        threshold = q * self.count
+        cumulative = 0
+        for bucket in sorted(self.buckets):
+            cumulative += self.buckets[bucket]
+            if cumulative >= threshold:
+                return min(SLOW_QUERY_HISTOGRAM_GROWTH ** (bucket + 1), self.max_ms)
+        return self.max_ms
+
+    def to_dict(self, fingerprint: str) -> Dict[str, Any]:
+        return {
+            "Fingerprint": fingerprint,
+            "Query": self.query,
+            "Count": self.count,
+            "TotalMs": round(self.total_ms, 3),
+            "MeanMs": round(self.total_ms / self.count, 3),
+            "P50Ms": round(self.percentile(0.5), 3),
+            "P95Ms": round(self.percentile(0.95), 3),
+            "MaxMs": round(self.max_ms, 3),
+        }
+
+
+class SlowQueryAggregator(LogEntryStage):
+    """log_min_duration_statement によるスロークエリをフィンガープリント単位で集計するクラス
+
+    "duration: ... ms  statement: ..." (拡張クエリプロトコルの場合は execute) のエントリーから
+    リテラルを除去したSQL文をフィンガープリントとして、実行回数、合計、p50、p95、最大の実行時間を集計し、
+    raw と同じ <cluster>/<instance>/ 配下の slow_query_summary/ にJSONで出力する。
+
+    保持するフィンガープリント数は max_fingerprints までとし、超過分は "other" にまとめる
+    """
+
+    name = "slow_query_summary"
+
+    def __init__(
+        self,
+        config: SlowQueryAggregatorConfig,
+        s3_client: Any,
+        bucket: str,
+        object_key: str,
+        metadata: Dict[str, str],
+    ):
+        """
+        Args:
+            config (SlowQueryAggregatorConfig): 設定値
+            s3_client: S3クライアント
+            bucket (str): アップロード先のS3バケット
+            object_key (str): raw のログファイルのオブジェクトキー
+            metadata (Dict[str, str]): raw のログファイルのメタデータ
+        """
+        super().__init__()
+        self.config = config
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.source_object_key = object_key
+        self.object_key = build_derived_object_key(
+            object_key,
+            SLOW_QUERY_SUMMARY_OBJECT_KEY_SEGMENT,
+            SLOW_QUERY_SUMMARY_EXTENSION,
+        )
+        self.metadata = metadata
+        self._stats: Dict[str, _DurationStats] = {}
+        self.overflow_count = 0
+
+    def process_entry(self, match: re.Match, message: bytes) -> None:
+        if match.group("severity") != b"LOG":
+            return
+
+        slow_query = _slow_query_pattern.match(message)
+        if not slow_query:
+            return
+
+        query = normalize_statement(
+            slow_query.group("statement").decode(errors="replace")
+        )
+        fingerprint = hashlib.md5(query.encode()).hexdigest()[:16]
+
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            if len(self._stats) >= self.config.max_fingerprints:
+                # 上限を超えたフィンガープリントは1つにまとめる
+                self.overflow_count += 1
+                fingerprint = OTHER_FINGERPRINT
+                stats = self._stats.get(fingerprint)
+            if stats is None:
+                stats = _DurationStats(
+                    query[:SLOW_QUERY_MAX_QUERY_LENGTH]
+                    if fingerprint != OTHER_FINGERPRINT
+                    else ""
+                )
+                self._stats[fingerprint] = stats
+
+        stats.add(float(slow_query.group("duration")))
+
+    def summarize(self) -> Dict[str, Any]:
+        """集計結果の生成
+
+        Returns:
+            Dict[str, Any]: 合計実行時間の降順に並べた上位 top_n 件のフィンガープリントを含む集計結果
+        """
+        fingerprints: List[Dict[str, Any]] = sorted(
+            (stats.to_dict(fingerprint) for fingerprint, stats in self._stats.items()),
+            key=lambda x: x["TotalMs"],
+            reverse=True,
+        )
+        return {
+            "DbInstanceIdentifier": self.metadata.get("DbInstanceIdentifier"),
+            "LastWritten": self.metadata.get("LastWritten"),
+            "SourceObjectKey": self.source_object_key,
+            "TotalCount": sum(stats.count for stats in self._stats.values()),
+            "TotalMs": round(sum(stats.total_ms for stats in self._stats.values()), 3),
+            "FingerprintCount": len(self._stats),
+            "OverflowCount": self.overflow_count,
+            "Fingerprints": fingerprints[: self.config.top_n],
+        }
+
+    def close(self) -> Dict[str, Any]:
+        super().close()
+        summary = self.summarize()
+
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.object_key,
+            Body=json.dumps(summary, ensure_ascii=False).encode(),
+            ContentType="application/json",
+            Metadata=self.metadata,
+        )
+
+        logger.info(
+            "Successfully uploaded slow query summary",
+            extra={
+                "object_key": self.object_key,
+                "total_count": summary["TotalCount"],
+                "fingerprint_count": summary["FingerprintCount"],
+            },
+        )
+        return {
+            "object_key": self.object_key,
+            "fingerprint_count": summary["FingerprintCount"],
+        }
@@ -0,0 +1,169 @@
+import os
+from dataclasses import asdict, dataclass
+from boto3.s3.transfer import TransferConfig
+from aws_lambda_powertools import Logger
+
+from rds_log_file_uploader_constants import (
+    DEFAULT_MEMORY_SIZE,
+    MAX_CONCURRENCY,
+    S3_MAX_PART_SIZE,
+    S3_MAX_PARTS,
+    S3_MIN_PART_SIZE,
+    TRANSFER_CONCURRENCY_PER_CPU,
+    TRANSFER_MAX_CHUNK_SIZE,
+    TRANSFER_MAX_PART_SIZE,
+    TRANSFER_MEMORY_FRACTION,
+    TRANSFER_MIN_CHUNK_SIZE,
+)
+
+logger = Logger()
+
+MB = 1024 * 1024
+
+
+def _round_down(value: int, unit: int) -> int:
+    return value // unit * unit
+
+
+def _round_up(value: int, unit: int) -> int:
+    return -(-value // unit) * unit
+
+
+@dataclass(frozen=True)
+class TransferPlannerConfig:
+    """TransferPlanner の設定値を管理するデータクラス"""
+
+    memory_size: int  # bytes
+    cpu_count: int
+
+    def __post_init__(self) -> None:
+        """初期化後のバリデーション"""
+        if self.memory_size <= 0:
+            raise ValueError("MemorySize must be greater than 0")
+        if self.cpu_count <= 0:
+            raise ValueError("CpuCount must be greater than 0")
+
+    @classmethod
+    def from_environ(cls) -> "TransferPlannerConfig":
+        """環境変数、実行環境から設定値を生成
+
+        - AWS_LAMBDA_FUNCTION_MEMORY_SIZE: Lambda関数のメモリサイズ（MB）
+        - vCPU数はプロセスが使用できるCPU数
+        """
+        memory_size = os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+        if hasattr(os, "sched_getaffinity"):
+            cpu_count = len(os.sched_getaffinity(0))
+        else:
+            cpu_count = os.cpu_count() or 1
+        return cls(
+            memory_size=int(memory_size or DEFAULT_MEMORY_SIZE) * MB,
+            cpu_count=cpu_count,
+        )
+
+
+@dataclass(frozen=True)
+class TransferPlan:
+    """1つのログファイルの転送に使用するサイズと並列数"""
+
+    chunk_size: int  # ダウンロード、圧縮、ファイルの読み込み単位
+    part_size: int  # マルチパートアップロードのパートサイズ
+    max_concurrency: int  # 同時にアップロードするパート数
+
+    @property
+    def multipart_threshold(self) -> int:
+        """マルチパートアップロードを行うサイズ。1パートに収まる場合は PutObject とする"""
+        return self.part_size
+
+    @property
+    def max_inflight_parts(self) -> int:
+        """ストリーミングで送信中のパート数。バッファリング中のパートを合わせて max_concurrency とする"""
+        return max(1, self.max_concurrency - 1)
+
+    def to_transfer_config(self) -> TransferConfig:
+        """upload_file に指定する TransferConfig"""
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            max_concurrency=self.max_concurrency,
+            multipart_chunksize=self.part_size,
+            use_threads=True,
+        )
+
+
+class TransferPlanner:
+    """ログファイルのサイズ、メモリサイズ、vCPU数からチャンクサイズ、パートサイズ、並列数を決めるクラス
+
+    メモリサイズの TRANSFER_MEMORY_FRACTION を転送用のバッファに割り当て、
+    バッチで並列に処理するログファイル数で等分する。
+    並列数はvCPU数に比例させ、パートサイズ x 並列数がバッファに収まるようにパートサイズを決める。
+    パートサイズはS3のパート数の上限 (10,000) に収まる値を下限とし、
+    下限のパートサイズがバッファに収まらない場合は並列数を減らす
+
+    Example:
+        >>> planner = TransferPlanner(TransferPlannerConfig.from_environ())
+        >>> plan = planner.plan(size=log_file["Size"])
+        >>> s3_client.upload_file(..., Config=plan.to_transfer_config())
+    """
+
+    def __init__(self, config: TransferPlannerConfig):
+        self.config = config
+
+    def plan(self, size: int = 0, parallel_files: int = 1) -> TransferPlan:
+        """
+        Args:
+            size (int): 圧縮前のログファイルのサイズ。0の場合はサイズによる制約を考慮しない
+            parallel_files (int): 同じLambda関数内で並列に処理するログファイル数
+
+        Returns:
+            TransferPlan: 転送に使用するサイズと並列数
+        """
+        budget = max(
+            int(self.config.memory_size * TRANSFER_MEMORY_FRACTION)
+            // max(parallel_files, 1),
+            S3_MIN_PART_SIZE,
+        )
+        # 圧縮後のサイズは元のサイズ以下のため、元のサイズでパート数の上限を判定する
+        min_part_size = min(
+            max(S3_MIN_PART_SIZE, _round_up(-(-size // S3_MAX_PARTS), MB)),
+            S3_MAX_PART_SIZE,
+        )
+
+        max_concurrency = min(
+            MAX_CONCURRENCY,
+            max(2, self.config.cpu_count * TRANSFER_CONCURRENCY_PER_CPU),
+        )
+        part_size = min(TRANSFER_MAX_PART_SIZE, budget // max_concurrency)
+        if size:
+            # 小さいログファイルは全ての並列処理にパートが行き渡るサイズとする
+            part_size = min(part_size, -(-size // max_concurrency))
+        part_size = max(min_part_size, _round_down(part_size, MB))
+        max_concurrency = max(1, min(max_concurrency, budget // part_size))
+
+        chunk_size = min(
+            part_size,
+            max(
+                TRANSFER_MIN_CHUNK_SIZE,
+                min(TRANSFER_MAX_CHUNK_SIZE, _round_down(budget // 8, MB)),
+            ),
+        )
+
+        plan = TransferPlan(
+            chunk_size=chunk_size,
+            part_size=part_size,
+            max_concurrency=max_concurrency,
+        )
+        extra = {
+            "size": size,
+            "memory_size": self.config.memory_size,
+            "cpu_count": self.config.cpu_count,
+            "parallel_files": parallel_files,
+            "memory_budget": budget,
+            **asdict(plan),
+        }
+        if part_size > budget:
+            logger.warning(
+                "Part size required by the part count limit exceeds memory budget",
+                extra=extra,
+            )
+        else:
+            logger.info("Planned transfer sizes", extra=extra)
+        return plan
@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+import boto3
+import urllib3
+from botocore.config import Config
+
+from aws_clients_constants import (
+    DEFAULT_MAX_POOL_CONNECTIONS,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_POOL_CONNECTIONS,
+    HTTP_MAX_REDIRECTS,
+)
+
+# ウォームスタート時に再利用するため、モジュールレベルで保持する
+_lock = threading.Lock()
+_session: Optional[boto3.Session] = None
+_clients: Dict[Tuple[str, int], Any] = {}
+_http_pool: Optional[urllib3.PoolManager] = None
+
+
+def get_session() -> boto3.Session:
+    """boto3セッションの取得
+
+    認証情報はセッション内でキャッシュされ、有効期限が近づいた場合のみ更新される
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.Session()
+        return _session
+
+
+def get_client(
+    service_name: str, max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS
+) -> Any:
+    """boto3クライアントの取得
+
+    Args:
+        service_name: サービス名
+        max_pool_connections: HTTPコネクションプールの最大コネクション数
+
+    Returns:
+        Any: boto3クライアント
+    """
+    session = get_session()
+    key = (service_name, max_pool_connections)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = session.client(
+                service_name,
+                config=Config(
+                    max_pool_connections=max_pool_connections,
+                    retries={"mode": "standard"},
+                ),
+            )
+        return _clients[key]
+
+
+def get_http_pool() -> urllib3.PoolManager:
+    """Keep-AliveでHTTPコネクションを再利用するコネクションプールの取得
+
+    再試行は呼び出し元で取得済みの位置から再開するため、urllib3 ではリダイレクトのみ追従する。
+    リダイレクト先のホストが異なる場合、Authorization ヘッダーは送信しない
+    """
+    global _http_pool
+    with _lock:
+        if _http_pool is None:
+            _http_pool = urllib3.PoolManager(
+                maxsize=HTTP_MAX_POOL_CONNECTIONS,
+                block=False,
+                # total=0 ではリダイレクトも1回目で上限に達するため、種類ごとの回数で指定する
+                retries=urllib3.Retry(
+                    total=None,
+                    connect=0,
+                    read=0,
+                    status=0,
+                    other=0,
+                    redirect=HTTP_MAX_REDIRECTS,
+                ),
+                timeout=urllib3.Timeout(
+                    connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT
+                ),
+            )
+        return _http_pool
@@ -0,0 +1,7 @@
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+HTTP_CONNECT_TIMEOUT = 10  # seconds
+HTTP_READ_TIMEOUT = 60  # seconds
+HTTP_MAX_POOL_CONNECTIONS = 50
+HTTP_MAX_REDIRECTS = (
+    3  # downloads may be redirected; other retries are handled by the caller
+)
@@ -0,0 +1,189 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit
+
+logger = Logger()
+
+T = TypeVar("T")
+
+
+class StageMetrics:
+    """処理のステージごとの処理時間、バイト数、回数を集計し、EMFで出力するクラス
+
+    バッチ処理では複数のログファイル（DBインスタンス）を並列で処理するため、
+    関数全体で共有する Metrics ではなく、ディメンションごとに EphemeralMetrics で出力する。
+
+    ステージの処理時間は入れ子になったステージの処理時間を除いた時間とする。
+    ストリーミングのようにジェネレーターを連結した処理でも、ダウンロード、圧縮、アップロードの
+    それぞれの待ち時間を分けて記録できる。
+    入れ子の管理のため、1つのインスタンスを複数のスレッドで共有しない
+
+    Example:
+        >>> stage_metrics = StageMetrics({"DbInstanceIdentifier": "db-instance-1"})
+        >>> with stage_metrics.measure("Upload"):
+        ...     for chunk in stage_metrics.measure_iterator("Download", chunks):
+        ...         upload(chunk)
+        >>> stage_metrics.flush()
+    """
+
+    def __init__(
+        self,
+        dimensions: Dict[str, str],
+        enabled: bool = True,
+        namespace: Optional[str] = None,
+    ):
+        """
+        Args:
+            dimensions (Dict[str, str]): メトリクスのディメンション
+            enabled (bool): Falseの場合は集計のみ行い、EMFを出力しない
+            namespace (Optional[str]): 未指定の場合は POWERTOOLS_METRICS_NAMESPACE
+        """
+        self.dimensions = dimensions
+        self.enabled = enabled
+        self.namespace = namespace
+        self.durations: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+        self.counts: Dict[str, float] = {}
+        self.values: Dict[str, float] = {}
+        # 計測中のステージごとの入れ子のステージの処理時間
+        self._nested_durations: List[float] = []
+
+    @classmethod
+    def from_environ(cls, dimensions: Dict[str, str]) -> "StageMetrics":
+        """環境変数から生成
+
+        - ENABLE_STAGE_METRICS: ステージごとのメトリクスのEMF出力の有効化
+        """
+        return cls(
+            dimensions,
+            enabled=os.environ.get("ENABLE_STAGE_METRICS", "false").lower() == "true",
+        )
+
+    def _record(self, stage: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        nested = self._nested_durations.pop()
+        self.durations[stage] = self.durations.get(stage, 0.0) + elapsed - nested
+        if self._nested_durations:
+            self._nested_durations[-1] += elapsed
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """ブロック内の処理時間をステージの処理時間として記録"""
+        self._nested_durations.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(stage, started)
+
+    def measure_iterator(
+        self, stage: str, iterable: Iterable[T], count_bytes: bool = True
+    ) -> Iterator[T]:
+        """要素の取得にかかった時間をステージの処理時間として記録
+
+        Args:
+            stage (str): ステージ名
+            iterable (Iterable[T]): 計測対象のイテラブル
+            count_bytes (bool): 要素の長さをステージのバイト数として記録する場合True
+        """
+        iterator = iter(iterable)
+        while True:
+            self._nested_durations.append(0.0)
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._record(stage, started)
+
+            if count_bytes:
+                self.add_bytes(stage, len(item))
+            yield item
+
+    def add_bytes(self, stage: str, size: int) -> None:
+        """ステージで処理したバイト数の加算"""
+        self.sizes[stage] = self.sizes.get(stage, 0) + size
+
+    def add_count(self, name: str, value: float = 1) -> None:
+        """回数の加算"""
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def set_value(self, name: str, value: float) -> None:
+        """単位のない値（圧縮率など）の設定"""
+        self.values[name] = value
+
+    def merge(self, other: "StageMetrics") -> None:
+        """別のインスタンスで集計した値の加算
+
+        並列に実行する処理ごとに集計し、1つのスレッドでまとめる場合に使用する
+        """
+        for stage, duration in other.durations.items():
+            self.durations[stage] = self.durations.get(stage, 0.0) + duration
+        for stage, size in other.sizes.items():
+            self.add_bytes(stage, size)
+        for name, value in other.counts.items():
+            self.add_count(name, value)
+        self.values.update(other.values)
+
+    def to_dict(self) -> Dict[str, float]:
+        """メトリクス名と値の辞書
+
+        ステージごとに <Stage>Duration (秒)、<Stage>Bytes、<Stage>Throughput (MB/s) を含む
+        """
+        metrics: Dict[str, float] = {}
+        for stage, duration in self.durations.items():
+            metrics[f"{stage}Duration"] = round(duration, 6)
+            size = self.sizes.get(stage)
+            if size is not None:
+                metrics[f"{stage}Bytes"] = size
+                if duration > 0:
+                    metrics[f"{stage}Throughput"] = round(size / 1024**2 / duration, 3)
+        metrics.update(self.counts)
+        metrics.update(self.values)
+        return metrics
+
+    def _unit(self, name: str) -> MetricUnit:
+        if name in self.counts:
+            return MetricUnit.Count
+        if name in self.values:
+            return MetricUnit.NoUnit
+        if name.endswith("Duration"):
+            return MetricUnit.Seconds
+        if name.endswith("Throughput"):
+            return MetricUnit.MegabytesPerSecond
+        return MetricUnit.Bytes
+
+    def flush(self) -> Dict[str, float]:
+        """メトリクスをEMFで標準出力に出力
+
+        Returns:
+            Dict[str, float]: 出力したメトリクス名と値
+        """
+        metrics = self.to_dict()
+        if not self.enabled or not metrics:
+            return metrics
+
+        try:
+            emf = EphemeralMetrics(
+                metric_set={},
+                dimension_set={},
+                metadata_set={},
+                namespace=self.namespace,
+            )
+            for name, value in self.dimensions.items():
+                emf.add_dimension(name=name, value=value)
+            for name, value in metrics.items():
+                emf.add_metric(name=name, unit=self._unit(name), value=value)
+            emf.flush_metrics()
+
+        except Exception as e:
+            # メトリクスの出力の失敗で処理を失敗させない
+            logger.warning(
+                "Failed to flush stage metrics",
+                extra={"dimensions": self.dimensions, "error": str(e)},
+            )
+        return metrics
@@ -1,7 +1,9 @@
 import * as cdk from "aws-cdk-lib";
 
 export interface TargetDbClusterProperty {
-  dbClusterIdentifier: string;
+  dbClusterIdentifier?: string;
+  dbClusterIdentifiers?: string[];
+  dbClusterTags?: Record<string, string>;
   logRangeMinutes: number;
 }
 
@@ -12,7 +14,7 @@ export interface LogDestinationProperty {
 
 export interface LogRouting {
   enableLogRouting?: boolean;
-  enableLogType?: ("error " | "slow_query" | "audit" | "connection")[];
+  enableLogType?: ("error" | "slow_query" | "audit" | "connection")[];
 }
 
 export interface LambdaProperty {
@@ -23,10 +25,47 @@ export interface LambdaProperty {
   uploaderTimeout?: cdk.Duration;
   uploaderEphemeralStorageSize?: cdk.Size;
   enableCompression?: "true" | "false";
+  compressionCodec?: "gzip" | "zstd";
+  compressionLevel?: number;
+  enableStreaming?: "true" | "false";
+  enableWatermark?: "true" | "false";
+  filterMaxWorkers?: number;
+  enableAsyncFilter?: "true" | "false";
+  filterMaxConcurrency?: number;
+  rdsApiRateLimit?: number;
+  filterMaxClusterWorkers?: number;
+  filterTimeout?: cdk.Duration;
+  uploadBatchTargetSize?: cdk.Size;
+  uploadBatchMaxWorkers?: number;
+  enableAdaptiveConcurrency?: "true" | "false";
+  adaptiveConcurrencyMinLimit?: number;
+  adaptiveConcurrencyDecreaseFactor?: number;
+  logRouting?: LogRouting;
+  enableParquetOutput?: "true" | "false";
+  parquetRowGroupSize?: number;
+  enableSlowQuerySummary?: "true" | "false";
+  slowQuerySummaryTopN?: number;
+  enableLogIndex?: "true" | "false";
+  enableTokenIndex?: "true" | "false";
+  tokenIndexFalsePositiveRate?: number;
+  tokenIndexMaxBlockBits?: number;
+  enableStageMetrics?: "true" | "false";
+  enableTailMode?: "true" | "false";
+  enableBackfill?: "true" | "false";
+  backfillTimeout?: cdk.Duration;
+  backfillShardTargetSize?: cdk.Size;
+  backfillMaxConcurrency?: number;
+  backfillToleratedFailurePercentage?: number;
+  enableCompaction?: "true" | "false";
+  compactionTimeout?: cdk.Duration;
+  compactionMinAgeDays?: number;
+  compactionLookbackDays?: number;
+  uploaderLayerArns?: string[];
 }
 
 export interface SchedulerProperty {
   scheduleExpression: string;
+  compactionScheduleExpression?: string;
 }
 
 export interface AuroraPostgreSqlLogArchiveProperty {
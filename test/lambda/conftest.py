@@ -0,0 +1,83 @@
+"""Lambda関数のテストの共通設定
+
+Lambda関数はディレクトリごとにデプロイされ、モジュールを平坦に読み込む。
+Lambda関数の間で同じ名前のモジュール (index など) があるため、
+テストモジュールを読み込む直前に、テストのディレクトリ名に対応するLambda関数のディレクトリを
+sys.path の先頭に移し、もう一方のLambda関数の読み込み済みのモジュールを取り除く。
+Lambdaレイヤーとして追加する共通のモジュール (shared/python) は常に読み込めるようにする。
+あわせて、ダミーの認証情報と、ローカルで無効にする Powertools の設定を行う
+"""
+
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+os.environ.update(
+    {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_SESSION_TOKEN": "testing",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "POWERTOOLS_TRACE_DISABLED": "true",
+        "POWERTOOLS_METRICS_NAMESPACE": "Test",
+        "POWERTOOLS_LOG_LEVEL": "WARNING",
+    }
+)
+
+LAMBDA_ROOT = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "lib", "src", "lambda")
+)
+# テストのディレクトリ名と読み込むLambda関数のディレクトリ
+LAMBDA_DIRECTORIES = {
+    name: os.path.join(LAMBDA_ROOT, name)
+    for name in ("db_cluster_postgresql_log_file_filter", "rds_log_file_uploader")
+}
+SHARED_DIR = os.path.join(LAMBDA_ROOT, "shared", "python")
+sys.path.insert(0, SHARED_DIR)
+# s3_client で作成するS3バケット
+BUCKET = "log-archive"
+
+
+def _use_lambda_directory(lambda_dir: str) -> None:
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if (
+            path.startswith(LAMBDA_ROOT)
+            and not path.startswith(lambda_dir)
+            and not path.startswith(SHARED_DIR)
+        ):
+            del sys.modules[name]
+    if lambda_dir in sys.path:
+        sys.path.remove(lambda_dir)
+    sys.path.insert(0, lambda_dir)
+
+
+class LambdaTestModule(pytest.Module):
+    """テストモジュールを読み込む直前にLambda関数のディレクトリを切り替える"""
+
+    lambda_dir = ""
+
+    def collect(self):
+        _use_lambda_directory(self.lambda_dir)
+        return super().collect()
+
+
+def pytest_pycollect_makemodule(module_path, parent):
+    lambda_dir = LAMBDA_DIRECTORIES.get(module_path.parent.name)
+    if lambda_dir is None:
+        return None
+    module = LambdaTestModule.from_parent(parent, path=module_path)
+    module.lambda_dir = lambda_dir
+    return module
+
+
+@pytest.fixture
+def s3_client():
+    """BUCKET を作成済みの moto のS3クライアント"""
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
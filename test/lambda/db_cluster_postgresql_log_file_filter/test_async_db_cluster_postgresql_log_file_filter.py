@@ -0,0 +1,77 @@
+import pytest
+
+from async_db_cluster_postgresql_log_file_filter import (
+    AsyncDbClusterPostgreSqlLogFileFilter,
+)
+from db_cluster_postgresql_log_file_filter import LogFileFilterConfig
+from test_db_cluster_postgresql_log_file_filter import (
+    BUCKET,
+    MINUTE,
+    NOW,
+    create_filter,
+    create_rds_client,
+    log_file,
+    put_archived_object,
+    record_calls,
+)
+
+
+def create_log_files(s3_client) -> dict:
+    """DBインスタンスごとに、アーカイブ済み、更新後に再アップロードが必要なもの、未アーカイブのものを混在させる"""
+    log_files = {}
+    for number in range(1, 4):
+        db_instance = f"i{number}"
+        log_files[db_instance] = [log_file(hour) for hour in range(12)]
+        for hour, log in enumerate(log_files[db_instance]):
+            if hour % 4 == 0:
+                put_archived_object(s3_client, db_instance, hour)
+            elif hour % 4 in (1, 2):
+                # アップロード後に最終更新時刻が更新された場合は HeadObject で確認する
+                log["LastWritten"] = NOW + hour * MINUTE
+                put_archived_object(
+                    s3_client,
+                    db_instance,
+                    hour,
+                    Metadata={
+                        "lastwritten": str(log["LastWritten"]),
+                        # hour % 4 == 2 はアップロード後にサイズが変わっている
+                        "sourcesize": str(log["Size"] + hour % 4 - 1),
+                    },
+                )
+    return log_files
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4, 32])
+def test_async_filter_matches_sync_filter(s3_client, max_concurrency):
+    log_files = create_log_files(s3_client)
+    head_calls = record_calls(s3_client, "HeadObject")
+
+    expected = create_filter(
+        create_rds_client(**log_files), s3_client
+    ).filter_cluster_log_files()
+    sync_head_count = len(head_calls)
+    head_calls.clear()
+
+    actual = AsyncDbClusterPostgreSqlLogFileFilter(
+        LogFileFilterConfig(
+            "c1",
+            BUCKET,
+            24 * 60,
+            async_enabled=True,
+            max_concurrency=max_concurrency,
+        ),
+        rds_client=create_rds_client(**log_files),
+        s3_client=s3_client,
+    ).filter_cluster_log_files()
+
+    assert actual == expected
+    assert {
+        (log["DbInstanceIdentifier"], log["LogFileName"][-4:]) for log in expected
+    } == {
+        (f"i{number}", f"{hour:02d}00")
+        for number in range(1, 4)
+        # 最終更新時刻が最新のログファイル (10時) は書き込み中のため対象外とする
+        for hour in (2, 3, 6, 7, 11)
+    }
+    # 書き込み中の10時を除き、最終更新時刻が更新された 1, 2, 5, 6, 9時のみ HeadObject で確認する
+    assert len(head_calls) == sync_head_count == 3 * 5
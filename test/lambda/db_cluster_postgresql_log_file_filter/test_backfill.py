@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+import backfill
+
+MB = 1024 * 1024
+
+
+def log_files(*sizes: int) -> list:
+    return [
+        {"LogFileName": f"error/postgresql.log.2026-10-15-{i:02d}00", "Size": size}
+        for i, size in enumerate(sizes)
+    ]
+
+
+def shard_sizes(shards: list) -> list:
+    return [[log_file["Size"] for log_file in shard["LogFiles"]] for shard in shards]
+
+
+def test_plan_shards_empty():
+    assert backfill._plan_shards([], 100 * MB, 10) == []
+
+
+def test_plan_shards_spreads_small_total_over_concurrency():
+    # 合計 100MB は ShardTargetBytes に満たないため、並列数 10 に行き渡るよう 10MB ずつに分ける
+    shards = backfill._plan_shards(log_files(*[MB] * 100), 1024 * MB, 10)
+    assert len(shards) == 10
+    assert all(shard["TotalSize"] == 10 * MB for shard in shards)
+
+
+def test_plan_shards_keeps_every_log_file_once():
+    files = log_files(*[(i * 37 % 11 + 1) * MB for i in range(50)])
+    shards = backfill._plan_shards(files, 16 * MB, 4)
+
+    planned = [log_file for shard in shards for log_file in shard["LogFiles"]]
+    assert sorted(f["LogFileName"] for f in planned) == sorted(
+        f["LogFileName"] for f in files
+    )
+    assert all(shard["TotalSize"] <= 16 * MB for shard in shards)
+    assert [shard["TotalSize"] for shard in shards] == sorted(
+        (shard["TotalSize"] for shard in shards), reverse=True
+    )
+
+
+def test_plan_shards_limits_files_per_shard(monkeypatch):
+    monkeypatch.setenv("UPLOAD_BATCH_MAX_FILES", "3")
+    shards = backfill._plan_shards(log_files(*[1] * 10), 1024 * MB, 1)
+    assert [len(shard["LogFiles"]) for shard in shards] == [3, 3, 3, 1]
+
+
+def test_lambda_handler_saves_plan(monkeypatch, s3_client):
+    files = log_files(3 * MB, 2 * MB, 1 * MB)
+    monkeypatch.setattr(
+        backfill.MultiClusterLogFileFilter,
+        "filter_log_files",
+        lambda self, selector: files,
+    )
+    context = SimpleNamespace(
+        function_name="backfill",
+        memory_limit_in_mb=128,
+        invoked_function_arn="arn:aws:lambda:us-east-1:123456789012:function:backfill",
+        aws_request_id="request-1",
+    )
+
+    result = backfill.lambda_handler(
+        {
+            "DbClusterIdentifier": "c1",
+            "LogDestinationBucket": "log-archive",
+            "ShardTargetBytes": 4 * MB,
+            "MaxConcurrency": 3,
+        },
+        context,
+    )
+    plan = json.loads(
+        s3_client.get_object(Bucket="log-archive", Key=result["PlanObjectKey"])[
+            "Body"
+        ].read()
+    )
+
+    # ステートマシンは MaxConcurrency を Distributed Map の並列数として参照する
+    assert result == {
+        "PlanBucket": "log-archive",
+        "PlanObjectKey": result["PlanObjectKey"],
+        "ShardCount": 3,
+        "MaxConcurrency": 3,
+        "LogFileCount": 3,
+        "TotalSize": 6 * MB,
+    }
+    assert "request-1" in result["PlanObjectKey"]
+    assert shard_sizes(plan) == [[3 * MB], [2 * MB], [1 * MB]]
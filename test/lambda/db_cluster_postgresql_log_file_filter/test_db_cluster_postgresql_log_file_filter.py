@@ -0,0 +1,288 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from db_cluster_postgresql_log_file_filter import (
+    DbClusterPostgreSqlLogFileFilter,
+    LogFileFilterConfig,
+)
+
+BUCKET = "log-archive"
+NOW = int(time.time() * 1000)
+MINUTE = 60 * 1000
+
+
+class FakeEvents:
+    def register(self, event_name, handler, unique_id=None):
+        pass
+
+    def unregister(self, event_name, unique_id=None):
+        pass
+
+
+class FakePaginator:
+    def __init__(self, rds_client, operation_name: str):
+        self.rds_client = rds_client
+        self.operation_name = operation_name
+
+    def paginate(self, **kwargs):
+        if self.operation_name == "describe_db_clusters":
+            yield self.rds_client.describe_db_clusters(**kwargs)
+            return
+
+        log_files = self.rds_client.describe_db_log_files(**kwargs)[
+            "DescribeDBLogFiles"
+        ]
+        page_size = self.rds_client.page_size
+        for offset in range(0, max(len(log_files), 1), page_size):
+            self.rds_client.pages += 1
+            yield {"DescribeDBLogFiles": log_files[offset : offset + page_size]}
+
+
+class FakeRdsClient:
+    """DBクラスター、DBインスタンスのログファイルを返すRDSクライアント
+
+    moto の DescribeDBLogFiles はログファイル名と最終更新時刻を指定できないため、
+    フィルター処理が使用する操作のみを実装する
+    """
+
+    def __init__(self, clusters: dict, log_files: dict, page_size: int = 100):
+        # DBクラスター識別子をキーとした DBClusterMembers と TagList
+        self.clusters = clusters
+        # DBインスタンス識別子をキーとしたログファイル情報
+        self.log_files = log_files
+        self.page_size = page_size
+        self.pages = 0
+        self.log_file_requests = []
+        self.meta = SimpleNamespace(events=FakeEvents())
+
+    def describe_db_clusters(self, DBClusterIdentifier=None, Filters=None):
+        return {
+            "DBClusters": [
+                {
+                    "DBClusterIdentifier": db_cluster_identifier,
+                    "DBClusterMembers": [
+                        {"DBInstanceIdentifier": db_instance}
+                        for db_instance in cluster["Members"]
+                    ],
+                    "TagList": [
+                        {"Key": key, "Value": value}
+                        for key, value in cluster.get("Tags", {}).items()
+                    ],
+                }
+                for db_cluster_identifier, cluster in self.clusters.items()
+                if DBClusterIdentifier in (None, db_cluster_identifier)
+            ]
+        }
+
+    def describe_db_log_files(
+        self, DBInstanceIdentifier, FilenameContains, FileLastWritten
+    ):
+        self.log_file_requests.append((DBInstanceIdentifier, FileLastWritten))
+        return {
+            "DescribeDBLogFiles": [
+                log_file
+                for log_file in self.log_files.get(DBInstanceIdentifier, [])
+                if FilenameContains in log_file["LogFileName"]
+                and log_file["LastWritten"] >= FileLastWritten
+            ]
+        }
+
+    def get_paginator(self, operation_name: str) -> FakePaginator:
+        return FakePaginator(self, operation_name)
+
+
+def log_file(hour: int, size: int = 100) -> dict:
+    """2026-10-15 の hour 時のログファイル。hour が大きいほど最終更新時刻が新しい"""
+    return {
+        "LogFileName": f"error/postgresql.log.2026-10-15-{hour:02d}00",
+        "LastWritten": NOW - (24 - hour) * MINUTE,
+        "Size": size,
+    }
+
+
+def object_key(db_instance: str, hour: int) -> str:
+    return f"c1/{db_instance}/raw/2026/10/15/{hour:02d}/postgresql.log.2026-10-15-{hour:02d}00"
+
+
+def put_archived_object(s3_client, db_instance: str, hour: int, **kwargs) -> None:
+    s3_client.put_object(
+        Bucket=BUCKET, Key=object_key(db_instance, hour), Body=b"log", **kwargs
+    )
+
+
+def create_rds_client(**log_files) -> FakeRdsClient:
+    return FakeRdsClient({"c1": {"Members": list(log_files)}}, log_files)
+
+
+def create_filter(
+    rds_client, s3_client, watermark_store=None, **kwargs
+) -> DbClusterPostgreSqlLogFileFilter:
+    return DbClusterPostgreSqlLogFileFilter(
+        LogFileFilterConfig("c1", BUCKET, 24 * 60, **kwargs),
+        watermark_store=watermark_store,
+        rds_client=rds_client,
+        s3_client=s3_client,
+    )
+
+
+def record_calls(s3_client, operation_name: str) -> list:
+    """S3 API の呼び出しパラメーターを記録"""
+    calls = []
+    s3_client.meta.events.register(
+        f"provide-client-params.s3.{operation_name}",
+        lambda params, **kwargs: calls.append(params),
+    )
+    return calls
+
+
+def test_filter_cluster_log_files_skips_archived(s3_client):
+    rds_client = create_rds_client(
+        i1=[log_file(hour) for hour in range(4)], i2=[log_file(0), log_file(1)]
+    )
+    put_archived_object(s3_client, "i1", 0)
+    put_archived_object(s3_client, "i1", 1)
+
+    result = create_filter(rds_client, s3_client).filter_cluster_log_files()
+
+    # 最終更新時刻が最新のログファイルは書き込み中のため対象外とする
+    assert sorted(
+        (log["DbInstanceIdentifier"], log["ObjectKey"]) for log in result
+    ) == [("i1", object_key("i1", 2)), ("i2", object_key("i2", 0))]
+    assert result[0]["LogDestinationBucket"] == BUCKET
+
+
+def test_archived_objects_are_listed_per_hour_prefix(s3_client):
+    rds_client = create_rds_client(i1=[log_file(hour) for hour in range(4)])
+    for hour in range(3):
+        put_archived_object(s3_client, "i1", hour)
+    list_calls = record_calls(s3_client, "ListObjectsV2")
+    head_calls = record_calls(s3_client, "HeadObject")
+
+    assert create_filter(rds_client, s3_client).filter_cluster_log_files() == []
+    # オブジェクトごとの HeadObject の代わりに時間単位のプレフィックスごとに一覧を取得する
+    assert sorted(call["Prefix"] for call in list_calls) == [
+        f"c1/i1/raw/2026/10/15/{hour:02d}/" for hour in range(3)
+    ]
+    assert head_calls == []
+
+
+def test_object_key_has_compression_extension(s3_client):
+    rds_client = create_rds_client(i1=[log_file(0), log_file(1)])
+    put_archived_object(s3_client, "i1", 0)
+
+    result = create_filter(
+        rds_client, s3_client, compression_enabled=True, compression_codec="zstd"
+    ).filter_cluster_log_files()
+
+    # 圧縮しない場合のオブジェクトはアーカイブ済みとみなさない
+    assert [log["ObjectKey"] for log in result] == [object_key("i1", 0) + ".zst"]
+
+
+@pytest.mark.parametrize(
+    "metadata, expected",
+    [
+        # アップロード後の更新が最終更新時刻のみの場合は同一のログファイルとみなす
+        ({"lastwritten": "2000", "sourcesize": "100"}, True),
+        # サイズを記録していないオブジェクトは最終更新時刻のみで判定する
+        ({"lastwritten": "2000"}, True),
+        ({"lastwritten": "1000", "sourcesize": "100"}, False),
+        ({"lastwritten": "2000", "sourcesize": "99"}, False),
+        ({}, False),
+    ],
+)
+def test_is_archived_checks_metadata_when_modified_before_last_written(
+    s3_client, metadata, expected
+):
+    put_archived_object(s3_client, "i1", 0, Metadata=metadata)
+    cluster_filter = create_filter(create_rds_client(i1=[]), s3_client)
+    stage_metrics = cluster_filter._get_instance_stage_metrics("i1")
+    head_calls = record_calls(s3_client, "HeadObject")
+
+    archived = cluster_filter._is_archived(
+        {"LastWritten": 2000, "Size": 100},
+        object_key("i1", 0),
+        # オブジェクトの最終更新時刻がログファイルの最終更新時刻より前
+        {object_key("i1", 0): 1500},
+        stage_metrics,
+    )
+    assert archived is expected
+    assert len(head_calls) == 1
+    assert stage_metrics.counts.get("ChangedLogFiles", 0) == (0 if expected else 1)
+
+
+def test_is_archived_without_head_object(s3_client):
+    cluster_filter = create_filter(create_rds_client(i1=[]), s3_client)
+    stage_metrics = cluster_filter._get_instance_stage_metrics("i1")
+    head_calls = record_calls(s3_client, "HeadObject")
+    log = {"LastWritten": 2000, "Size": 100}
+    key = object_key("i1", 0)
+
+    assert not cluster_filter._is_archived(log, key, {}, stage_metrics)
+    assert cluster_filter._is_archived(log, key, {key: 2000}, stage_metrics)
+    # 一覧の取得後に削除された場合
+    assert not cluster_filter._is_archived(log, key, {key: 1500}, stage_metrics)
+    assert len(head_calls) == 1
+
+
+def test_changed_log_file_is_uploaded_again(s3_client):
+    rds_client = create_rds_client(i1=[log_file(0, size=200), log_file(1)])
+    put_archived_object(
+        s3_client,
+        "i1",
+        0,
+        Metadata={
+            "lastwritten": str(log_file(0)["LastWritten"] - 1),
+            "sourcesize": "100",
+        },
+    )
+    # アップロード後にログファイルが更新された場合
+    rds_client.log_files["i1"][0]["LastWritten"] = NOW + MINUTE
+    rds_client.log_files["i1"][1]["LastWritten"] = NOW + 2 * MINUTE
+
+    result = create_filter(rds_client, s3_client).filter_cluster_log_files()
+    assert [log["ObjectKey"] for log in result] == [object_key("i1", 0)]
+
+
+def test_watermark_narrows_log_file_listing(s3_client):
+    from log_file_watermark_store import S3LogFileWatermarkStore
+
+    log_files = [log_file(hour) for hour in range(4)]
+    rds_client = create_rds_client(i1=log_files)
+    store = S3LogFileWatermarkStore(BUCKET, "c1", s3_client)
+    put_archived_object(s3_client, "i1", 0)
+
+    result = create_filter(
+        rds_client, s3_client, watermark_store=store
+    ).filter_cluster_log_files()
+    assert [log["LogFileName"] for log in result] == [
+        log_files[1]["LogFileName"],
+        log_files[2]["LogFileName"],
+    ]
+    # 未アーカイブのログファイルのうち最も古い最終更新時刻の直前まで進める
+    assert store.load() == {"i1": log_files[1]["LastWritten"] - 1}
+
+    for hour in (1, 2):
+        put_archived_object(s3_client, "i1", hour)
+    rds_client.log_file_requests.clear()
+    result = create_filter(
+        rds_client, s3_client, watermark_store=store
+    ).filter_cluster_log_files()
+    assert result == []
+    # ウォーターマークより前に最終更新されたログファイルは取得しない
+    assert rds_client.log_file_requests == [("i1", log_files[1]["LastWritten"] - 1)]
+    assert store.load() == {"i1": log_files[2]["LastWritten"]}
+
+
+def test_log_files_are_listed_across_pages(s3_client):
+    log_files = [log_file(hour) for hour in range(7)]
+    rds_client = create_rds_client(i1=log_files)
+    rds_client.page_size = 2
+
+    result = create_filter(rds_client, s3_client).filter_cluster_log_files()
+    # 全てのページのログファイルを対象とする
+    assert rds_client.pages == 4
+    assert [log["LogFileName"] for log in result] == [
+        log["LogFileName"] for log in log_files[:-1]
+    ]
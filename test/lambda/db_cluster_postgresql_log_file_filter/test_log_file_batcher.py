@@ -0,0 +1,36 @@
+import pytest
+
+from log_file_batcher import LogFileBatcher, LogFileBatcherConfig
+
+
+def log_files(*sizes: int) -> list:
+    return [
+        {"LogFileName": f"error/postgresql.log.2026-10-15-{i:02d}00", "Size": size}
+        for i, size in enumerate(sizes)
+    ]
+
+
+def batch_sizes(batches: list) -> list:
+    return [[log_file["Size"] for log_file in batch["LogFiles"]] for batch in batches]
+
+
+def test_batcher_packs_first_fit_decreasing():
+    batches = LogFileBatcher(LogFileBatcherConfig(target_bytes=10)).pack(
+        log_files(2, 7, 5, 3, 12, 1)
+    )
+    # 大きい順に最初に収まるバッチへ入れ、target_bytes を超えるログファイルは単独とする
+    assert batch_sizes(batches) == [[12], [7, 3], [5, 2, 1]]
+    assert [batch["TotalSize"] for batch in batches] == [12, 10, 8]
+
+
+def test_batcher_limits_files_per_batch():
+    batches = LogFileBatcher(LogFileBatcherConfig(target_bytes=100, max_files=2)).pack(
+        log_files(1, 1, 1, 1, 1)
+    )
+    assert [len(batch["LogFiles"]) for batch in batches] == [2, 2, 1]
+
+
+@pytest.mark.parametrize("target_bytes, max_files", [(0, 1), (1, 0)])
+def test_batcher_config_validation(target_bytes, max_files):
+    with pytest.raises(ValueError):
+        LogFileBatcherConfig(target_bytes, max_files)
@@ -0,0 +1,380 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import zlib
+from datetime import date, datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+from log_file_compactor import (
+    LogFileCompactor,
+    LogFileCompactorConfig,
+    get_checksum_object_key,
+)
+
+# 読み込みツールは結合後のマニフェストから時間単位のログファイルの位置を解決する
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "tools"))
+from archived_log_reader import ArchivedLogReader  # noqa: E402
+
+BUCKET = "log-archive"
+NOW = datetime(2026, 10, 17, 3, tzinfo=timezone.utc)
+DAY = date(2026, 10, 15)
+MANIFEST_KEY = "c1/i1/manifest/2026/10/15/postgresql.log.2026-10-15.gz.json"
+
+
+def hourly_key(hour: int, extension: str = ".gz") -> str:
+    return (
+        f"c1/i1/raw/{DAY:%Y/%m/%d}/{hour:02d}/"
+        f"postgresql.log.{DAY:%Y-%m-%d}-{hour:02d}00{extension}"
+    )
+
+
+def gunzip_members(data: bytes) -> bytes:
+    """連結したGZIPメンバーを全て展開"""
+    output = b""
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        output += decompressor.decompress(data)
+        data = decompressor.unused_data
+    return output
+
+
+def put_hourly_object(s3_client, hour: int, text: bytes) -> None:
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=hourly_key(hour),
+        Body=gzip.compress(text),
+        ContentEncoding="gzip",
+        Metadata={"lastwritten": str(1000 + hour), "sourcesize": str(len(text))},
+    )
+
+
+def load_manifest(s3_client) -> dict:
+    return json.loads(
+        s3_client.get_object(Bucket=BUCKET, Key=MANIFEST_KEY)["Body"].read()
+    )
+
+
+def list_keys(s3_client, prefix: str = "c1/") -> list:
+    response = s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return [content["Key"] for content in response.get("Contents", [])]
+
+
+def test_target_days():
+    compactor = LogFileCompactor(
+        LogFileCompactorConfig(BUCKET, min_age_days=1, lookback_days=3)
+    )
+    assert compactor.target_days(NOW) == [
+        date(2026, 10, 14),
+        date(2026, 10, 15),
+        date(2026, 10, 16),
+    ]
+
+
+def test_compact_day_round_trips_members(s3_client):
+    texts = {hour: f"line {hour}\n".encode() * 100 for hour in range(24)}
+    for hour, text in texts.items():
+        put_hourly_object(s3_client, hour, text)
+
+    results = LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client).compact_day(
+        "c1", "i1", DAY
+    )
+
+    assert [result["Generation"] for result in results] == [1]
+    manifest = load_manifest(s3_client)
+    assert manifest["ObjectKey"].endswith("postgresql.log.2026-10-15.compacted-1.gz")
+    assert manifest["CompressionCodec"] == "gzip"
+    assert manifest["ContentEncoding"] == "gzip"
+    assert [member["SourceObjectKey"] for member in manifest["Members"]] == [
+        hourly_key(hour) for hour in range(24)
+    ]
+
+    body = s3_client.get_object(Bucket=BUCKET, Key=manifest["ObjectKey"])["Body"].read()
+    assert len(body) == manifest["Size"]
+    assert gunzip_members(body) == b"".join(texts[hour] for hour in range(24))
+    for hour, member in enumerate(manifest["Members"]):
+        data = body[member["Offset"] : member["Offset"] + member["Length"]]
+        assert gzip.decompress(data) == texts[hour]
+        assert member["LastWritten"] == 1000 + hour
+        assert member["SourceSize"] == len(texts[hour])
+
+    # 結合元はマニフェストの保存後に削除される
+    assert list_keys(s3_client) == [MANIFEST_KEY, manifest["ObjectKey"]]
+
+
+def test_compact_day_copies_large_members(s3_client):
+    """5MB以上の結合元は UploadPartCopy で取り込まれる"""
+    texts = {
+        0: b"small\n" * 10,
+        1: os.urandom(6 * 1024 * 1024),
+        2: b"tail\n" * 10,
+    }
+    for hour, text in texts.items():
+        put_hourly_object(s3_client, hour, text)
+
+    LogFileCompactor(
+        LogFileCompactorConfig(BUCKET, part_size=5 * 1024 * 1024), s3_client
+    ).compact_day("c1", "i1", DAY)
+
+    manifest = load_manifest(s3_client)
+    body = s3_client.get_object(Bucket=BUCKET, Key=manifest["ObjectKey"])["Body"].read()
+    assert gunzip_members(body) == b"".join(texts.values())
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def test_recompaction_bumps_generation(s3_client):
+    texts = {hour: f"line {hour}\n".encode() * 100 for hour in range(3)}
+    for hour, text in texts.items():
+        put_hourly_object(s3_client, hour, text)
+    compactor = LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client)
+    compactor.compact_day("c1", "i1", DAY)
+    first = load_manifest(s3_client)
+
+    # 結合後に再アップロードされたログファイルは、結合済みの同じログファイルを置き換える
+    texts[1] = b"re-uploaded\n"
+    put_hourly_object(s3_client, 1, texts[1])
+    results = compactor.compact_day("c1", "i1", DAY)
+
+    second = load_manifest(s3_client)
+    assert [result["Generation"] for result in results] == [2]
+    assert results[0]["CompactedCount"] == 1
+    assert second["ObjectKey"].endswith("compacted-2.gz")
+    assert [member["SourceObjectKey"] for member in second["Members"]] == [
+        hourly_key(hour) for hour in range(3)
+    ]
+    body = s3_client.get_object(Bucket=BUCKET, Key=second["ObjectKey"])["Body"].read()
+    assert gunzip_members(body) == b"".join(texts[hour] for hour in range(3))
+    # 以前の世代の結合済みオブジェクトは削除される
+    assert list_keys(s3_client) == [MANIFEST_KEY, second["ObjectKey"]]
+    assert first["ObjectKey"] != second["ObjectKey"]
+
+    # 取り込むログファイルがない場合は新しい世代を作らない
+    assert compactor.compact_day("c1", "i1", DAY) == []
+    assert load_manifest(s3_client)["Generation"] == 2
+
+
+def test_source_changed_before_read_skips_day(s3_client, monkeypatch):
+    """一覧取得後に再アップロードされた場合は、マニフェストの保存、結合元の削除を行わない"""
+    for hour in range(3):
+        put_hourly_object(s3_client, hour, f"line {hour}\n".encode())
+    compactor = LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client)
+
+    list_day_objects = compactor._list_day_objects
+
+    def list_then_reupload(day_prefix):
+        listed = list_day_objects(day_prefix)
+        put_hourly_object(s3_client, 1, b"re-uploaded\n")
+        return listed
+
+    monkeypatch.setattr(compactor, "_list_day_objects", list_then_reupload)
+
+    assert compactor.compact_day("c1", "i1", DAY) == []
+    assert list_keys(s3_client) == [hourly_key(hour) for hour in range(3)]
+
+    # 次回の結合で再アップロード後のオブジェクトを取り込む
+    monkeypatch.undo()
+    compactor.compact_day("c1", "i1", DAY)
+    body = s3_client.get_object(
+        Bucket=BUCKET, Key=load_manifest(s3_client)["ObjectKey"]
+    )["Body"].read()
+    assert gunzip_members(body) == b"line 0\nre-uploaded\nline 2\n"
+
+
+def test_source_changed_during_copy_aborts_upload(s3_client, monkeypatch):
+    """UploadPartCopy の時点で結合元が変わっている場合は、マルチパートアップロードを中止する"""
+    texts = {0: os.urandom(6 * 1024 * 1024), 1: b"small\n"}
+    for hour, text in texts.items():
+        put_hourly_object(s3_client, hour, text)
+    compactor = LogFileCompactor(
+        LogFileCompactorConfig(BUCKET, part_size=5 * 1024 * 1024), s3_client
+    )
+
+    # moto は CopySourceIfMatch を評価しないため、S3と同じエラーを返す
+    upload_part_copy = s3_client.upload_part_copy
+    copied_keys = []
+
+    def upload_part_copy_if_match(**kwargs):
+        source = kwargs["CopySource"]
+        copied_keys.append(source["Key"])
+        put_hourly_object(s3_client, 0, b"re-uploaded\n")
+        head = s3_client.head_object(Bucket=source["Bucket"], Key=source["Key"])
+        if head["ETag"] != kwargs["CopySourceIfMatch"]:
+            raise ClientError(
+                {"Error": {"Code": "PreconditionFailed", "Message": "changed"}},
+                "UploadPartCopy",
+            )
+        return upload_part_copy(**kwargs)
+
+    monkeypatch.setattr(s3_client, "upload_part_copy", upload_part_copy_if_match)
+
+    assert compactor.compact_day("c1", "i1", DAY) == []
+    assert copied_keys == [hourly_key(0)]
+    assert list_keys(s3_client) == [hourly_key(hour) for hour in range(2)]
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def put_checksum_object(s3_client, hour: int, text: bytes, last_written: int) -> None:
+    """アップローダーが raw とともに保存するチェックサム"""
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=get_checksum_object_key(hourly_key(hour)),
+        Body=json.dumps(
+            {
+                "SourceObjectKey": hourly_key(hour),
+                "LastWritten": last_written,
+                "SourceSize": len(text),
+                "SourceSha256": hashlib.sha256(text).hexdigest(),
+            }
+        ).encode(),
+    )
+
+
+def test_get_checksum_object_key():
+    assert get_checksum_object_key(hourly_key(3)) == (
+        "c1/i1/checksums/2026/10/15/03/postgresql.log.2026-10-15-0300.json"
+    )
+    assert get_checksum_object_key(hourly_key(3, "")) == (
+        "c1/i1/checksums/2026/10/15/03/postgresql.log.2026-10-15-0300.json"
+    )
+    assert get_checksum_object_key("c1/i1/raw/2026/10/15/postgresql.log") is None
+
+
+def test_unchanged_reupload_only_updates_last_written(s3_client):
+    """同じ内容で再アップロードされたログファイルは結合し直さず、LastWritten のみ更新する"""
+    texts = {hour: f"line {hour}\n".encode() for hour in range(2)}
+    for hour, text in texts.items():
+        put_hourly_object(s3_client, hour, text)
+        put_checksum_object(s3_client, hour, text, 1000 + hour)
+    compactor = LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client)
+    first = compactor.compact_day("c1", "i1", DAY)[0]
+    assert [
+        member["SourceSha256"] for member in load_manifest(s3_client)["Members"]
+    ] == [hashlib.sha256(texts[hour]).hexdigest() for hour in range(2)]
+
+    # LastWritten のみ変わったログファイルの再アップロード
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=hourly_key(1),
+        Body=gzip.compress(texts[1], mtime=1),
+        ContentEncoding="gzip",
+        Metadata={"lastwritten": "2000", "sourcesize": str(len(texts[1]))},
+    )
+    put_checksum_object(s3_client, 1, texts[1], 2000)
+
+    assert compactor.compact_day("c1", "i1", DAY) == []
+    manifest = load_manifest(s3_client)
+    assert manifest["Generation"] == 1
+    assert manifest["ObjectKey"] == first["ObjectKey"]
+    assert [member["LastWritten"] for member in manifest["Members"]] == [1000, 2000]
+    assert list_keys(s3_client, "c1/i1/raw/") == [first["ObjectKey"]]
+
+    # 内容が変わった場合は結合し直す
+    put_hourly_object(s3_client, 0, b"changed\n")
+    put_checksum_object(s3_client, 0, b"changed\n", 1000)
+    assert compactor.compact_day("c1", "i1", DAY)[0]["Generation"] == 2
+    body = s3_client.get_object(
+        Bucket=BUCKET, Key=load_manifest(s3_client)["ObjectKey"]
+    )["Body"].read()
+    assert gunzip_members(body) == b"changed\nline 1\n"
+
+
+def test_stale_checksum_is_not_used(s3_client):
+    """LastWritten が一致しないチェックサムは以前のアップロードのものとして使用しない"""
+    put_hourly_object(s3_client, 0, b"line 0\n")
+    put_checksum_object(s3_client, 0, b"previous\n", 999)
+    compactor = LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client)
+
+    compactor.compact_day("c1", "i1", DAY)
+    assert load_manifest(s3_client)["Members"][0]["SourceSha256"] is None
+
+
+def test_duplicate_sources_are_only_deleted(s3_client, monkeypatch):
+    """マニフェストの保存後に削除できなかった結合元は、次回の結合で削除のみ行う"""
+    for hour in range(2):
+        put_hourly_object(s3_client, hour, f"line {hour}\n".encode())
+    compactor = LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client)
+
+    def fail_delete(object_keys):
+        raise RuntimeError("Failed to delete compacted objects")
+
+    monkeypatch.setattr(compactor, "_delete_objects", fail_delete)
+    with pytest.raises(RuntimeError):
+        compactor.compact_day("c1", "i1", DAY)
+    # 削除の前にマニフェストが保存されている
+    manifest = load_manifest(s3_client)
+    assert manifest["Generation"] == 1
+
+    monkeypatch.undo()
+    assert compactor.compact_day("c1", "i1", DAY) == []
+    assert load_manifest(s3_client) == manifest
+    assert list_keys(s3_client) == [MANIFEST_KEY, manifest["ObjectKey"]]
+
+
+def put_indexed_hourly_object(s3_client, hour: int, minutes: int) -> bytes:
+    """1分ごとに1ブロック (GZIPメンバー) とし、アップローダーと同じ形式のインデックスを保存"""
+    blocks, texts, members, offset = [], [], [], 0
+    for minute in range(minutes):
+        time = f"{DAY:%Y-%m-%d} {hour:02d}:{minute:02d}:00"
+        text = f"{time} UTC:10.0.0.1(5432):app@db:[1]:LOG:  minute {minute}\n".encode()
+        member = gzip.compress(text)
+        blocks.append(
+            {
+                "Offset": offset,
+                "Length": len(member),
+                "RawOffset": sum(map(len, texts)),
+                "RawLength": len(text),
+                "FirstTime": time,
+                "LastTime": time,
+                "LineAligned": True,
+            }
+        )
+        texts.append(text)
+        members.append(member)
+        offset += len(member)
+
+    text = b"".join(texts)
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=hourly_key(hour),
+        Body=b"".join(members),
+        ContentEncoding="gzip",
+        Metadata={"lastwritten": str(1000 + hour), "sourcesize": str(len(text))},
+    )
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=hourly_key(hour, ".json").replace("/raw/", "/index/"),
+        Body=json.dumps(
+            {"CompressionCodec": "gzip", "Size": offset, "Blocks": blocks}
+        ).encode(),
+    )
+    return text
+
+
+def test_reader_resolves_offsets_after_compaction(s3_client):
+    texts = {hour: put_indexed_hourly_object(s3_client, hour, 60) for hour in range(3)}
+    object_key = hourly_key(1)
+    before = b"".join(
+        ArchivedLogReader(BUCKET, object_key, s3_client).read(
+            f"{DAY:%Y-%m-%d} 01:10:00", f"{DAY:%Y-%m-%d} 01:11:59"
+        )
+    )
+
+    LogFileCompactor(LogFileCompactorConfig(BUCKET), s3_client).compact_day(
+        "c1", "i1", DAY
+    )
+    assert object_key not in list_keys(s3_client)
+
+    # 時間単位のインデックスのまま、結合済みオブジェクト内の位置から取得する
+    manifest = load_manifest(s3_client)
+    reader = ArchivedLogReader(BUCKET, object_key, s3_client)
+    assert reader.resolve_location() == (
+        manifest["ObjectKey"],
+        manifest["Members"][1]["Offset"],
+    )
+    after = b"".join(
+        reader.read(f"{DAY:%Y-%m-%d} 01:10:00", f"{DAY:%Y-%m-%d} 01:11:59")
+    )
+    assert after == before == b"".join(texts[1].splitlines(keepends=True)[10:12])
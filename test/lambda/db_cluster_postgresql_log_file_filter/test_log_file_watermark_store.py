@@ -0,0 +1,33 @@
+import pytest
+
+from log_file_watermark_store import (
+    LocalLogFileWatermarkStore,
+    LogFileWatermarkStore,
+    S3LogFileWatermarkStore,
+)
+
+BUCKET = "log-archive"
+
+
+def test_s3_store_round_trip(s3_client):
+    store = S3LogFileWatermarkStore(BUCKET, "c1", s3_client)
+    assert store.object_key == "_state/c1/watermarks.json"
+    # 保存前は空とする
+    assert store.load() == {}
+
+    store.save({"i1": 1000, "i2": 2000})
+    assert store.load() == {"i1": 1000, "i2": 2000}
+    assert S3LogFileWatermarkStore(BUCKET, "c2", s3_client).load() == {}
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalLogFileWatermarkStore(str(tmp_path / "watermarks.json"))
+    assert store.load() == {}
+
+    store.save({"i1": 1000})
+    assert store.load() == {"i1": 1000}
+
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        LogFileWatermarkStore()
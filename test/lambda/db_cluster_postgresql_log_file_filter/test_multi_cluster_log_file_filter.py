@@ -0,0 +1,98 @@
+import pytest
+
+from multi_cluster_log_file_filter import (
+    DbClusterSelector,
+    MultiClusterLogFileFilter,
+    MultiClusterLogFileFilterConfig,
+)
+from test_db_cluster_postgresql_log_file_filter import FakeRdsClient, log_file
+
+BUCKET = "log-archive"
+CLUSTERS = {
+    "c1": {"Members": ["c1-i1", "c1-i2"], "Tags": {"env": "prod", "team": "a"}},
+    "c2": {"Members": ["c2-i1"], "Tags": {"env": "prod", "team": "b"}},
+    "c3": {"Members": ["c3-i1"], "Tags": {"env": "dev"}},
+}
+
+
+def create_filter(s3_client, log_files: dict, **kwargs) -> MultiClusterLogFileFilter:
+    multi_cluster_filter = MultiClusterLogFileFilter(
+        MultiClusterLogFileFilterConfig(BUCKET, 24 * 60, **kwargs)
+    )
+    multi_cluster_filter.rds_client = FakeRdsClient(CLUSTERS, log_files)
+    multi_cluster_filter.s3_client = s3_client
+    return multi_cluster_filter
+
+
+@pytest.mark.parametrize(
+    "selector, expected",
+    [
+        (DbClusterSelector(["c3", "c1"]), ["c3", "c1"]),
+        (DbClusterSelector(tags={"env": "prod"}), ["c1", "c2"]),
+        (DbClusterSelector(tags={"env": "prod", "team": "b"}), ["c2"]),
+        # 指定順を保持したまま重複を除外する
+        (DbClusterSelector(["c2"], tags={"env": "prod"}), ["c2", "c1"]),
+        (DbClusterSelector(tags={"env": "staging"}), []),
+    ],
+)
+def test_resolve_db_cluster_identifiers(s3_client, selector, expected):
+    assert (
+        create_filter(s3_client, {}).resolve_db_cluster_identifiers(selector)
+        == expected
+    )
+
+
+def test_selector_validation():
+    with pytest.raises(ValueError):
+        DbClusterSelector()
+
+
+def test_filter_log_files_interleaves_instances(s3_client):
+    log_files = {
+        "c1-i1": [log_file(0, 10), log_file(1, 30), log_file(2, 20), log_file(3)],
+        "c1-i2": [log_file(0, 5), log_file(1)],
+        "c2-i1": [log_file(0, 7), log_file(1, 9), log_file(2)],
+    }
+    multi_cluster_filter = create_filter(s3_client, log_files)
+
+    result = multi_cluster_filter.filter_log_files(DbClusterSelector(["c1", "c2"]))
+    # DBインスタンスごとに交互に並べ、DBインスタンス内ではサイズの大きい順とする
+    assert [(log["DbInstanceIdentifier"], log["Size"]) for log in result] == [
+        ("c1-i1", 30),
+        ("c1-i2", 5),
+        ("c2-i1", 9),
+        ("c1-i1", 20),
+        ("c2-i1", 7),
+        ("c1-i1", 10),
+    ]
+    assert {log["ObjectKey"].split("/")[0] for log in result} == {"c1", "c2"}
+
+
+def test_filter_log_files_shares_rate_limiter(s3_client):
+    multi_cluster_filter = create_filter(s3_client, {})
+    cluster_filters = [
+        multi_cluster_filter._create_cluster_filter(db_cluster_identifier)
+        for db_cluster_identifier in ("c1", "c2")
+    ]
+    assert all(
+        cluster_filter.rds_api_rate_limiter is multi_cluster_filter.rds_api_rate_limiter
+        and cluster_filter.rds_client is multi_cluster_filter.rds_client
+        for cluster_filter in cluster_filters
+    )
+
+
+def test_filter_log_files_packs_batches(s3_client):
+    log_files = {
+        "c1-i1": [log_file(0, 60), log_file(1, 30), log_file(2, 20), log_file(3)],
+        "c1-i2": [log_file(0, 50), log_file(1)],
+    }
+    multi_cluster_filter = create_filter(
+        s3_client, log_files, upload_batch_target_bytes=80
+    )
+
+    batches = multi_cluster_filter.filter_log_files(DbClusterSelector(["c1"]))
+    assert [[log["Size"] for log in batch["LogFiles"]] for batch in batches] == [
+        [60, 20],
+        [50, 30],
+    ]
+    assert [batch["TotalSize"] for batch in batches] == [80, 80]
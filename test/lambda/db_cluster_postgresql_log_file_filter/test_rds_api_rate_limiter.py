@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+from botocore.hooks import HierarchicalEmitter
+
+import rds_api_rate_limiter
+from rds_api_rate_limiter import RdsApiRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rds_api_rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rds_api_rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_acquire_allows_burst_then_waits(clock):
+    limiter = RdsApiRateLimiter(rate=10, capacity=3)
+
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+    # トークンが不足した分は補充されるまで待機する
+    assert limiter.acquire() == pytest.approx(0.1)
+    assert limiter.acquire() == pytest.approx(0.1)
+
+    clock.now += 1
+    assert limiter.acquire() == 0
+    assert clock.sleeps == [pytest.approx(0.1), pytest.approx(0.1)]
+
+
+def test_attach_limits_every_call(clock):
+    limiter = RdsApiRateLimiter(rate=1, capacity=1)
+    # boto3 のクライアントと同じイベントの発行元
+    rds_client = SimpleNamespace(meta=SimpleNamespace(events=HierarchicalEmitter()))
+    # ウォームスタートで再利用されるクライアントに再登録しても1回のみ待機する
+    limiter.attach(rds_client)
+    limiter.attach(rds_client)
+
+    # API呼び出し（ページネーションの各ページを含む）の前に発行されるイベント
+    for operation_name in (
+        "DescribeDBClusters",
+        "DescribeDBLogFiles",
+        "DescribeDBLogFiles",
+    ):
+        rds_client.meta.events.emit(f"before-call.rds.{operation_name}", model=None)
+    assert clock.sleeps == [pytest.approx(1), pytest.approx(1)]
+
+
+@pytest.mark.parametrize("rate, capacity", [(0, 1), (1, 0)])
+def test_validation(rate, capacity):
+    with pytest.raises(ValueError):
+        RdsApiRateLimiter(rate, capacity)
@@ -0,0 +1,207 @@
+import threading
+
+import pytest
+
+import rds_log_file_downloader
+from adaptive_concurrency_limiter import (
+    FAILED,
+    SUCCEEDED,
+    THROTTLED,
+    AdaptiveConcurrencyConfig,
+    AdaptiveConcurrencyLimiter,
+    get_concurrency_limiter,
+    is_throttle_response,
+)
+from rds_log_file_downloader import (
+    RdsLogDownLoaderConfig,
+    RdsLogDownloadThrottledError,
+    RdsLogFileDownloader,
+)
+from test_rds_log_file_downloader import FakeHttpPool, FakeResponse
+
+
+def create_limiter(
+    max_limit: int = 4, min_limit: int = 1
+) -> AdaptiveConcurrencyLimiter:
+    return AdaptiveConcurrencyLimiter(
+        AdaptiveConcurrencyConfig(max_limit, min_limit, 0.5), "i1"
+    )
+
+
+@pytest.mark.parametrize(
+    "status, body, expected",
+    [
+        (429, b"", True),
+        (503, b"", True),
+        (400, b'{"Error": {"Code": "ThrottlingException"}}', True),
+        (400, b"<Code>RequestLimitExceeded</Code>", True),
+        (500, b"InternalFailure", False),
+        (404, b"DBLogFileNotFoundFault", False),
+    ],
+)
+def test_is_throttle_response(status, body, expected):
+    assert is_throttle_response(status, body) is expected
+
+
+def test_additive_increase_up_to_max_limit():
+    limiter = create_limiter()
+    limiter.release(limiter.acquire(), THROTTLED)
+    assert limiter.limit == 2.0
+
+    # 上限数の成功で1増える
+    limiter.release(limiter.acquire(), SUCCEEDED)
+    limiter.release(limiter.acquire(), SUCCEEDED)
+    assert limiter.limit == pytest.approx(2.9)
+
+    for _ in range(20):
+        limiter.release(limiter.acquire(), SUCCEEDED)
+    assert limiter.limit == 4.0
+
+
+def test_multiplicative_decrease_down_to_min_limit():
+    limiter = create_limiter(max_limit=8, min_limit=2)
+    for expected in (4.0, 2.0, 2.0):
+        limiter.release(limiter.acquire(), THROTTLED)
+        assert limiter.limit == expected
+
+    # エラーは上限を変更しない
+    limiter.release(limiter.acquire(), FAILED)
+    assert limiter.snapshot() == {
+        "ConcurrencyLimit": 2.0,
+        "InFlight": 0,
+        "Acquired": 4,
+        "Succeeded": 0,
+        "Throttled": 3,
+        "Decreases": 3,
+        "WaitDuration": limiter.counts["WaitDuration"],
+    }
+
+
+def test_throttles_from_same_generation_decrease_once():
+    limiter = create_limiter()
+    slots = [limiter.acquire() for _ in range(3)]
+    for slot in slots:
+        limiter.release(slot, THROTTLED)
+
+    # 上限を下げる前に開始した処理のスロットリングは同じ混雑によるものとみなす
+    assert limiter.limit == 2.0
+    assert limiter.counts["Throttled"] == 3
+    assert limiter.counts["Decreases"] == 1
+
+    limiter.release(limiter.acquire(), THROTTLED)
+    assert limiter.limit == 1.0
+
+
+def test_acquire_waits_for_release():
+    limiter = create_limiter()
+    slots = [limiter.acquire() for _ in range(2)]
+    limiter.release(slots.pop(), THROTTLED)
+    limiter.release(limiter.acquire(), THROTTLED)
+    assert int(limiter.limit) == 1
+
+    acquired = threading.Event()
+
+    def acquire() -> None:
+        limiter.release(limiter.acquire(), SUCCEEDED)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    limiter.release(slots.pop(), FAILED)
+    assert acquired.wait(5)
+    thread.join()
+    assert limiter.in_flight == 0
+
+
+def test_get_concurrency_limiter_shares_state():
+    config = AdaptiveConcurrencyConfig(4, 1, 0.5)
+    limiter = get_concurrency_limiter("shared", config)
+    limiter.release(limiter.acquire(), THROTTLED)
+
+    # ウォームスタート後の呼び出しで学習した上限を引き継ぐ
+    assert get_concurrency_limiter("shared", config) is limiter
+    assert get_concurrency_limiter("other", config) is not limiter
+    # 設定値が変わった場合は作り直す
+    recreated = get_concurrency_limiter("shared", AdaptiveConcurrencyConfig(8, 1, 0.5))
+    assert recreated is not limiter
+    assert recreated.limit == 8.0
+
+
+@pytest.mark.parametrize(
+    "max_limit, min_limit, decrease_factor",
+    [(4, 0, 0.5), (1, 2, 0.5), (4, 1, 0), (4, 1, 1)],
+)
+def test_config_validation(max_limit, min_limit, decrease_factor):
+    with pytest.raises(ValueError):
+        AdaptiveConcurrencyConfig(max_limit, min_limit, decrease_factor)
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_ADAPTIVE_CONCURRENCY", raising=False)
+    assert AdaptiveConcurrencyConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_ADAPTIVE_CONCURRENCY", "true")
+    monkeypatch.setenv("UPLOAD_BATCH_MAX_WORKERS", "6")
+    monkeypatch.setenv("ADAPTIVE_CONCURRENCY_DECREASE_FACTOR", "0.7")
+    assert AdaptiveConcurrencyConfig.from_environ() == AdaptiveConcurrencyConfig(
+        6, 1, 0.7
+    )
+
+
+def create_downloader(monkeypatch, responses: list, limiter=None):
+    monkeypatch.setattr(rds_log_file_downloader.time, "sleep", lambda seconds: None)
+    downloader = RdsLogFileDownloader(
+        RdsLogDownLoaderConfig("i1", "error/postgresql.log.2026-10-15-0000", 4),
+        region="us-east-1",
+        concurrency_limiter=limiter,
+    )
+    downloader.http_pool = FakeHttpPool(responses)
+    return downloader
+
+
+def test_downloader_reports_throttles_to_limiter(monkeypatch):
+    limiter = create_limiter()
+    downloader = create_downloader(
+        monkeypatch,
+        [
+            FakeResponse(400, b'{"Error": {"Code": "ThrottlingException"}}'),
+            FakeResponse(503, b"Service Unavailable"),
+            FakeResponse(200, b"log data"),
+        ],
+        limiter,
+    )
+
+    assert b"".join(downloader.iter_log_file_chunks(delay=0)) == b"log data"
+    assert downloader.throttle_count == 2
+    assert downloader.retry_count == 2
+    # 2回のスロットリングで 4 -> 2 -> 1 に下げ、成功で 1 + 1/1 に戻す
+    assert limiter.snapshot()["ConcurrencyLimit"] == 2.0
+    assert limiter.counts["Decreases"] == 2
+    assert limiter.in_flight == 0
+
+
+def test_downloader_does_not_count_errors_as_throttles(monkeypatch):
+    limiter = create_limiter()
+    downloader = create_downloader(
+        monkeypatch,
+        [FakeResponse(500, b"InternalFailure"), FakeResponse(200, b"log data")],
+        limiter,
+    )
+
+    assert b"".join(downloader.iter_log_file_chunks(delay=0)) == b"log data"
+    assert downloader.throttle_count == 0
+    assert downloader.retry_count == 1
+    assert limiter.limit == 4.0
+
+
+def test_downloader_gives_up_after_throttle_retries(monkeypatch):
+    downloader = create_downloader(
+        monkeypatch, [FakeResponse(429, b"Too Many Requests") for _ in range(3)]
+    )
+
+    with pytest.raises(IOError) as excinfo:
+        b"".join(downloader.iter_log_file_chunks(delay=0, throttle_retries=3))
+    assert isinstance(excinfo.value.__cause__, RdsLogDownloadThrottledError)
+    assert downloader.throttle_count == 3
@@ -0,0 +1,177 @@
+import os
+import sys
+import gzip
+import json
+import random
+import threading
+
+import pytest
+import zstandard
+
+# 読み込みツールはこのLambda関数がアーカイブしたログファイルを読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "tools"))
+from cluster_log_reader import ClusterLogReader, Prefetcher  # noqa: E402
+
+BUCKET = "log-archive"
+EXTENSIONS = {"i1": ".gz", "i2": ".zst", "i3": ""}
+
+
+def compress(data: bytes, extension: str) -> bytes:
+    # アップローダーと同じく、ブロックごとに独立したメンバー（フレーム）を連結する
+    blocks = [data[offset : offset + 1000] for offset in range(0, len(data), 1000)]
+    if extension == ".gz":
+        return b"".join(gzip.compress(block) for block in blocks)
+    if extension == ".zst":
+        return b"".join(zstandard.ZstdCompressor().compress(block) for block in blocks)
+    return data
+
+
+def generate_entries(db_instance: str, hour: int) -> list:
+    """時刻順のエントリー。同じ時刻のエントリー、継続行を含む"""
+    random.seed(f"{db_instance}-{hour}")
+    entries = []
+    for number in range(300):
+        time = f"2024-01-01 {hour:02d}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}"
+        entries.append(time)
+    entries.sort()
+    return [
+        (
+            time,
+            f"{time} UTC:10.0.0.1(5432):app@db:[{number}]:LOG:  {db_instance}\n".encode()
+            + (b"\tcontinued\n" if number % 5 == 0 else b""),
+        )
+        for number, time in enumerate(entries)
+    ]
+
+
+def hourly_key(db_instance: str, hour: int) -> str:
+    return (
+        f"c1/{db_instance}/raw/2024/01/01/{hour:02d}/"
+        f"postgresql.log.2024-01-01-{hour:02d}00{EXTENSIONS[db_instance]}"
+    )
+
+
+@pytest.fixture
+def archived_entries(s3_client) -> dict:
+    """DBインスタンスごとに 0時から2時のログファイルをアーカイブし、i1 の0時、1時は日単位に結合する"""
+    entries = {}
+    compacted = []
+    for db_instance in EXTENSIONS:
+        entries[db_instance] = []
+        for hour in range(3):
+            hour_entries = generate_entries(db_instance, hour)
+            entries[db_instance] += hour_entries
+            body = compress(
+                b"".join(data for _, data in hour_entries), EXTENSIONS[db_instance]
+            )
+            if db_instance == "i1" and hour < 2:
+                compacted.append((hourly_key(db_instance, hour), body))
+            else:
+                s3_client.put_object(
+                    Bucket=BUCKET, Key=hourly_key(db_instance, hour), Body=body
+                )
+
+    compacted_key = (
+        "c1/i1/compacted/2024/01/01/postgresql.log.2024-01-01.compacted-1.gz"
+    )
+    members, offset = [], 0
+    for source_key, body in compacted:
+        members.append(
+            {"SourceObjectKey": source_key, "Offset": offset, "Length": len(body)}
+        )
+        offset += len(body)
+    s3_client.put_object(
+        Bucket=BUCKET, Key=compacted_key, Body=b"".join(body for _, body in compacted)
+    )
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key="c1/i1/manifest/2024/01/01/postgresql.log.2024-01-01.gz.json",
+        Body=json.dumps({"ObjectKey": compacted_key, "Members": members}).encode(),
+    )
+    return entries
+
+
+@pytest.mark.parametrize("chunk_size, prefetch_chunks", [(256, 1), (1024 * 1024, 4)])
+def test_read_merges_instances_in_time_order(
+    s3_client, archived_entries, chunk_size, prefetch_chunks
+):
+    start, end = "2024-01-01 00:30:00", "2024-01-01 02:29:59"
+    reader = ClusterLogReader(
+        BUCKET,
+        "c1",
+        s3_client,
+        chunk_size=chunk_size,
+        prefetch_chunks=prefetch_chunks,
+    )
+    actual = list(reader.read(start, end))
+
+    # 同じ時刻のエントリーはDBインスタンスの順とする
+    expected = sorted(
+        (
+            (time, db_instance, data)
+            for db_instance, entries in archived_entries.items()
+            for time, data in entries
+            if start <= time <= end
+        ),
+        key=lambda entry: entry[0],
+    )
+    assert [tuple(entry) for entry in actual] == expected
+    assert [entry.log_time for entry in actual] == sorted(
+        entry.log_time for entry in actual
+    )
+    assert {entry.db_instance for entry in actual} == set(EXTENSIONS)
+
+
+def test_read_stops_prefetching_on_early_close(s3_client, archived_entries):
+    threads = set(threading.enumerate())
+    reader = ClusterLogReader(
+        BUCKET, "c1", s3_client, chunk_size=256, prefetch_chunks=1
+    )
+    entries = reader.read("2024-01-01 00:00:00", "2024-01-01 02:59:59")
+    assert next(entries).log_time < "2024-01-01 01:00:00"
+    prefetch_threads = set(threading.enumerate()) - threads
+    assert len(prefetch_threads) == len(EXTENSIONS)
+    entries.close()
+
+    # 先読みのスレッドは読み込みを中断して終了する
+    for thread in prefetch_threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert reader.fetched_size < sum(
+        s3_client.head_object(Bucket=BUCKET, Key=content["Key"])["ContentLength"]
+        for content in s3_client.list_objects_v2(Bucket=BUCKET)["Contents"]
+    )
+
+
+def iter_items(items: list, closed: threading.Event):
+    try:
+        for item in items:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        closed.set()
+
+
+def test_prefetcher_ends_on_error():
+    closed = threading.Event()
+    prefetcher = Prefetcher(iter_items([1, 2, ValueError("failed"), 3], closed), 1)
+
+    assert next(prefetcher) == 1
+    assert next(prefetcher) == 2
+    with pytest.raises(ValueError, match="failed"):
+        next(prefetcher)
+    # 例外の後は終了し、元のイテレーターを閉じる
+    assert list(prefetcher) == []
+    assert closed.wait(5)
+
+
+def test_prefetcher_ends_on_close():
+    closed = threading.Event()
+    prefetcher = Prefetcher(iter_items(range(100), closed), 2)
+
+    assert next(prefetcher) == 0
+    prefetcher.close()
+    # キューが満杯で待機しているスレッドも終了する
+    assert closed.wait(5)
+    assert list(prefetcher) == []
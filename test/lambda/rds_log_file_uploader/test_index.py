@@ -0,0 +1,112 @@
+import pytest
+
+import index
+
+
+def log_files(count: int) -> list:
+    return [
+        {
+            "DbInstanceIdentifier": "i1",
+            "LogDestinationBucket": "log-archive",
+            "LastWritten": 1000 + number,
+            "LogFileName": f"error/postgresql.log.2026-10-15-{number:02d}00",
+            "ObjectKey": f"c1/i1/raw/2026/10/15/{number:02d}/postgresql.log.2026-10-15-{number:02d}00",
+            "Size": 100,
+        }
+        for number in range(count)
+    ]
+
+
+def test_batch_processes_every_log_file(monkeypatch):
+    processed = []
+
+    def process_log_file(log_file, parallel_files=1):
+        processed.append((log_file["LogFileName"], parallel_files))
+        return {"log_file": log_file["LogFileName"]}
+
+    monkeypatch.setattr(index, "_process_log_file", process_log_file)
+    monkeypatch.setenv("UPLOAD_BATCH_MAX_WORKERS", "2")
+
+    results = index._process_log_file_batch(log_files(3))
+    assert sorted(result["log_file"] for result in results) == sorted(
+        log_file["LogFileName"] for log_file in log_files(3)
+    )
+    # 転送用のメモリは並列に処理するログファイル数で等分する
+    assert {parallel_files for _, parallel_files in processed} == {2}
+
+
+def test_batch_fails_after_attempting_every_log_file(monkeypatch):
+    processed = []
+
+    def process_log_file(log_file, parallel_files=1):
+        processed.append(log_file["LogFileName"])
+        if log_file["LogFileName"].endswith("-0000"):
+            raise IOError("Failed to download log file")
+        return {"log_file": log_file["LogFileName"]}
+
+    monkeypatch.setattr(index, "_process_log_file", process_log_file)
+
+    with pytest.raises(Exception, match="Failed to process 1 of 3 log files"):
+        index._process_log_file_batch(log_files(3))
+    assert len(processed) == 3
+
+
+class FakeTailer:
+    """保存済みの状態とパートオブジェクトの削除を記録するテイラー"""
+
+    instances = []
+
+    def __init__(self, config, **kwargs):
+        self.state = FakeTailer.state
+        self.cleaned_up = False
+        FakeTailer.instances.append(self)
+
+    def load_state(self):
+        return self.state
+
+    def archive_increment(self, state=None):
+        return state
+
+    def iter_part_chunks(self, state, chunk_size):
+        yield b"appended"
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+class FakeUploader:
+    def __init__(self, config, stage_metrics, transfer_plan):
+        self.transfer_plan = transfer_plan
+
+    def upload_log_stream(self, chunks):
+        return bool(b"".join(chunks))
+
+
+@pytest.mark.parametrize(
+    "state, used_tail_parts, cleaned_up",
+    [
+        # 追記分を保存していない場合はパートオブジェクトの削除を行わない
+        (None, False, False),
+        ({"Marker": "100", "PartCount": 1, "Size": 100}, True, True),
+        # サイズが一致しない場合はログファイル全体を取得し、保存済みの追記分を削除する
+        ({"Marker": "50", "PartCount": 1, "Size": 50}, False, True),
+    ],
+)
+def test_tail_parts_cleanup(monkeypatch, state, used_tail_parts, cleaned_up):
+    import log_file_tailer
+
+    whole_file_downloads = []
+    FakeTailer.state = state
+    FakeTailer.instances = []
+    monkeypatch.setenv("ENABLE_TAIL_MODE", "true")
+    monkeypatch.setattr(log_file_tailer, "LogFileTailer", FakeTailer)
+    monkeypatch.setattr(index, "RdsFileLogUploader", FakeUploader)
+    monkeypatch.setattr(
+        index,
+        "_process_with_temp_file",
+        lambda downloader, uploader, stage_metrics: whole_file_downloads.append(1),
+    )
+
+    index._process_log_file(log_files(1)[0])
+    assert whole_file_downloads == ([] if used_tail_parts else [1])
+    assert FakeTailer.instances[0].cleaned_up is cleaned_up
@@ -0,0 +1,117 @@
+import gzip
+
+import pytest
+
+from log_entry_router import LogEntryRouterConfig
+from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+
+BUCKET = "log-archive"
+PREFIX = "2024-01-01 00:00:0{second} UTC:10.0.0.1(5432):app@db:[123]:"
+CONNECTION = (
+    PREFIX.format(second=0)
+    + "LOG:  connection authorized: user=app database=db application_name=psql\n"
+)
+SLOW_QUERY = (
+    PREFIX.format(second=1)
+    + "LOG:  duration: 1500.123 ms  statement: SELECT *\n"
+    + "\tFROM t WHERE id = 1\n"
+)
+ERROR = (
+    PREFIX.format(second=2)
+    + 'ERROR:  42P01: relation "x" does not exist\n'
+    + PREFIX.format(second=2)
+    + "STATEMENT:  SELECT * FROM x\n"
+)
+AUDIT = PREFIX.format(second=3) + "LOG:  AUDIT: SESSION,1,1,READ,SELECT,,,SELECT 1\n"
+CHECKPOINT = PREFIX.format(second=4) + "LOG:  checkpoint starting: time\n"
+FATAL = PREFIX.format(second=5) + "FATAL:  terminating connection\n"
+LOG_DATA = (CONNECTION + SLOW_QUERY + ERROR + AUDIT + CHECKPOINT + FATAL).encode()
+
+
+def upload(monkeypatch, tmp_path, object_key: str, streaming: bool) -> None:
+    monkeypatch.setenv("ENABLE_LOG_ROUTING", "true")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    uploader = RdsFileLogUploader(RdsFileLogUploaderConfig("i1", BUCKET, 1, object_key))
+    if streaming:
+        assert uploader.upload_log_stream(iter([LOG_DATA[:100], LOG_DATA[100:]]))
+    else:
+        file_path = tmp_path / "postgresql.log"
+        file_path.write_bytes(LOG_DATA)
+        assert uploader.upload_log_file(str(file_path))
+
+
+def get_object(s3_client, object_key: str) -> dict:
+    return s3_client.get_object(Bucket=BUCKET, Key=object_key)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_entries_are_routed_by_log_type(s3_client, monkeypatch, tmp_path, streaming):
+    upload(
+        monkeypatch,
+        tmp_path,
+        "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000",
+        streaming,
+    )
+
+    expected = {
+        # 継続行と付随する STATEMENT は先頭行と同じ種別とする
+        "error": ERROR + FATAL,
+        "slow_query": SLOW_QUERY,
+        "audit": AUDIT,
+        "connection": CONNECTION,
+    }
+    for log_type, text in expected.items():
+        response = get_object(
+            s3_client, f"c1/i1/{log_type}/2024/01/01/00/postgresql.log.2024-01-01-0000"
+        )
+        assert response["Body"].read() == text.encode()
+        assert response["Metadata"]["logtype"] == log_type
+    assert (
+        get_object(s3_client, "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000")[
+            "Body"
+        ].read()
+        == LOG_DATA
+    )
+
+
+def test_routed_objects_are_compressed(s3_client, monkeypatch, tmp_path):
+    monkeypatch.setenv("ENABLE_COMPRESSION", "true")
+    monkeypatch.setenv("COMPRESSION_CODEC", "gzip")
+    monkeypatch.setenv("LOG_ROUTING_TYPES", "error")
+    upload(
+        monkeypatch,
+        tmp_path,
+        "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz",
+        streaming=True,
+    )
+
+    response = get_object(
+        s3_client, "c1/i1/error/2024/01/01/00/postgresql.log.2024-01-01-0000.gz"
+    )
+    assert gzip.decompress(response["Body"].read()) == (ERROR + FATAL).encode()
+    assert response["ContentEncoding"] == "gzip"
+    # 指定していない種別のオブジェクトは作成しない
+    keys = [
+        content["Key"]
+        for content in s3_client.list_objects_v2(Bucket=BUCKET)["Contents"]
+    ]
+    assert sorted(keys) == [
+        "c1/i1/checksums/2024/01/01/00/postgresql.log.2024-01-01-0000.json",
+        "c1/i1/error/2024/01/01/00/postgresql.log.2024-01-01-0000.gz",
+        "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz",
+    ]
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_LOG_ROUTING", raising=False)
+    assert LogEntryRouterConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_LOG_ROUTING", "true")
+    monkeypatch.delenv("LOG_ROUTING_TYPES", raising=False)
+    assert LogEntryRouterConfig.from_environ() == LogEntryRouterConfig()
+    monkeypatch.setenv("LOG_ROUTING_TYPES", "error, audit")
+    assert LogEntryRouterConfig.from_environ() == LogEntryRouterConfig(
+        ("error", "audit")
+    )
+    with pytest.raises(ValueError):
+        LogEntryRouterConfig(("debug",))
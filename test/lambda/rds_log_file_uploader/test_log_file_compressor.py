@@ -0,0 +1,111 @@
+import io
+import gzip
+
+import pytest
+import zstandard
+
+import log_file_compressor
+from log_file_compressor import LogFileCompressor, LogFileCompressorConfig
+
+LOG_DATA = b"".join(
+    f"2026-10-15 00:00:{number % 60:02d} UTC::@:[{number}]:LOG:  line {number}\n".encode()
+    for number in range(5000)
+)
+
+
+def zstd_decompress(data: bytes) -> bytes:
+    """連結したzstdフレームを全て展開"""
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        io.BytesIO(data), read_across_frames=True
+    )
+    return reader.read()
+
+
+def compress(config: LogFileCompressorConfig, data: bytes, chunk_size: int) -> list:
+    chunks = [
+        data[offset : offset + chunk_size] for offset in range(0, len(data), chunk_size)
+    ]
+    return list(LogFileCompressor(config).compress(chunks))
+
+
+@pytest.mark.parametrize(
+    "codec, decompress",
+    [("gzip", gzip.decompress), ("zstd", zstd_decompress)],
+)
+def test_blocks_concatenate_into_valid_stream(codec, decompress):
+    config = LogFileCompressorConfig(
+        codec=codec, level=3, block_size=16 * 1024, max_workers=4
+    )
+    blocks = compress(config, LOG_DATA, 10000)
+
+    # ブロックごとに独立したGZIPメンバー / zstdフレームとなり、連結すると入力順に展開できる
+    assert len(blocks) == -(-len(LOG_DATA) // config.block_size)
+    assert [decompress(block) for block in blocks] == [
+        LOG_DATA[offset : offset + config.block_size]
+        for offset in range(0, len(LOG_DATA), config.block_size)
+    ]
+    assert decompress(b"".join(blocks)) == LOG_DATA
+
+
+def test_output_does_not_depend_on_workers_or_chunks():
+    single = compress(
+        LogFileCompressorConfig(block_size=4096, max_workers=1), LOG_DATA, 7
+    )
+    parallel = compress(
+        LogFileCompressorConfig(block_size=4096, max_workers=8), LOG_DATA, 65536
+    )
+    assert single == parallel
+
+
+@pytest.mark.parametrize(
+    "codec, decompress",
+    [("gzip", gzip.decompress), ("zstd", zstd_decompress)],
+)
+def test_empty_input_is_valid_compressed_data(codec, decompress):
+    blocks = list(LogFileCompressor(LogFileCompressorConfig(codec=codec)).compress([]))
+    assert len(blocks) == 1
+    assert decompress(blocks[0]) == b""
+
+
+def test_config_properties():
+    gzip_config = LogFileCompressorConfig()
+    assert (
+        gzip_config.extension,
+        gzip_config.content_type,
+        gzip_config.content_encoding,
+    ) == (".gz", "application/gzip", "gzip")
+    assert LogFileCompressorConfig(codec="zstd").extension == ".zst"
+
+
+def test_config_validation():
+    with pytest.raises(ValueError):
+        LogFileCompressorConfig(codec="lz4")
+    with pytest.raises(ValueError):
+        LogFileCompressorConfig(block_size=0)
+
+
+def test_zstd_without_zstandard_module(monkeypatch):
+    find_spec = log_file_compressor.importlib.util.find_spec
+    monkeypatch.setattr(
+        log_file_compressor.importlib.util,
+        "find_spec",
+        lambda name: None if name == "zstandard" else find_spec(name),
+    )
+
+    # レイヤーの追加漏れが分かるエラーとする
+    with pytest.raises(ValueError, match="requires the zstandard module.*layer"):
+        LogFileCompressorConfig(codec="zstd")
+    assert LogFileCompressorConfig(codec="gzip").codec == "gzip"
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.setenv("COMPRESSION_CODEC", "ZSTD")
+    monkeypatch.delenv("COMPRESSION_LEVEL", raising=False)
+    config = LogFileCompressorConfig.from_environ()
+    assert config.codec == "zstd"
+
+    monkeypatch.setenv("COMPRESSION_CODEC", "gzip")
+    monkeypatch.setenv("COMPRESSION_LEVEL", "9")
+    assert LogFileCompressorConfig.from_environ() == LogFileCompressorConfig(
+        codec="gzip", level=9
+    )
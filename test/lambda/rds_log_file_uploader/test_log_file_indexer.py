@@ -0,0 +1,150 @@
+import os
+import sys
+
+import pytest
+
+from log_file_compressor import LogFileCompressor, LogFileCompressorConfig
+from log_file_indexer import LogFileIndexConfig, LogFileIndexer
+from log_stream_processor import LogStreamProcessor
+from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+
+# 読み込みツールはこのLambda関数が出力したインデックスを読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "tools"))
+from archived_log_reader import ArchivedLogReader, select_blocks  # noqa: E402
+
+BUCKET = "log-archive"
+OBJECT_KEY = "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000"
+
+
+def log_line(minute: int, number: int) -> bytes:
+    return (
+        f"2024-01-01 00:{minute:02d}:00 UTC:10.0.0.1(5432):app@db:[{number}]:"
+        f"LOG:  statement: SELECT {number}\n"
+    ).encode()
+
+
+def create_indexer(block_size: int, compression_codec=None) -> LogFileIndexer:
+    return LogFileIndexer(
+        block_size,
+        s3_client=None,
+        bucket=BUCKET,
+        object_key=OBJECT_KEY,
+        metadata={},
+        compression_codec=compression_codec,
+    )
+
+
+def test_indexer_records_block_times():
+    indexer = create_indexer(200)
+    processor = LogStreamProcessor([indexer])
+    # 0分と1分のエントリー、300バイトの継続行、2分のエントリー
+    processor.write(log_line(0, 1) + log_line(1, 2))
+    processor.write(b"\t" + b"x" * 299 + b"\n" + log_line(2, 3))
+    index = indexer.build_index()
+
+    assert indexer.object_key == (
+        "c1/i1/index/2024/01/01/00/postgresql.log.2024-01-01-0000.json"
+    )
+    assert index["CompressionCodec"] is None
+    assert index["RawSize"] == index["Size"]
+    blocks = index["Blocks"]
+    assert [(block["Offset"], block["Length"]) for block in blocks] == [
+        (0, 200),
+        (200, 200),
+        (400, index["RawSize"] - 400),
+    ]
+    assert [(block["FirstTime"], block["LastTime"]) for block in blocks] == [
+        ("2024-01-01 00:00:00", "2024-01-01 00:01:00"),
+        # エントリーの開始を含まないブロックは直前のブロックの最後の時刻
+        ("2024-01-01 00:01:00", "2024-01-01 00:01:00"),
+        ("2024-01-01 00:02:00", "2024-01-01 00:02:00"),
+    ]
+    assert [block["LineAligned"] for block in blocks] == [True, False, False]
+
+
+def test_indexer_uses_compressed_block_lengths():
+    indexer = create_indexer(100, "gzip")
+    for number in range(3):
+        indexer.process_line(b"x" * 99 + b"\n", None)
+    assert list(indexer.observe_stored_blocks([b"a" * 10, b"b" * 20, b"c" * 30]))
+    index = indexer.build_index()
+
+    assert index["CompressionCodec"] == "gzip"
+    assert (index["RawSize"], index["Size"]) == (300, 60)
+    assert [
+        (block["Offset"], block["Length"], block["RawOffset"])
+        for block in index["Blocks"]
+    ] == [(0, 10, 0), (10, 20, 100), (30, 30, 200)]
+
+    # 圧縮ブロックとインデックスのブロックの数が異なる場合
+    list(indexer.observe_stored_blocks([b"d"]))
+    with pytest.raises(ValueError):
+        indexer.build_index()
+
+
+def test_select_blocks_includes_following_block():
+    blocks = [
+        {
+            "FirstTime": f"2024-01-01 00:0{number}:00",
+            "LastTime": f"2024-01-01 00:0{number}:59",
+        }
+        for number in range(5)
+    ]
+    # 継続行が次のブロックにまたがる場合に備えて次のブロックも含める
+    assert select_blocks(blocks, "2024-01-01 00:01:30", "2024-01-01 00:02:30") == (
+        blocks[1:4]
+    )
+    assert select_blocks(blocks, "2024-01-01 00:03:30", "2024-01-01 00:09:00") == (
+        blocks[3:]
+    )
+    assert select_blocks(blocks, "2024-01-01 01:00:00", "2024-01-01 02:00:00") == []
+
+
+@pytest.mark.parametrize("codec", [None, "gzip", "zstd"])
+def test_reader_returns_entries_in_range(s3_client, monkeypatch, codec):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    monkeypatch.setenv("ENABLE_LOG_INDEX", "true")
+    monkeypatch.setenv("LOG_INDEX_BLOCK_SIZE", str(16 * 1024))
+    object_key = OBJECT_KEY
+    if codec:
+        monkeypatch.setenv("ENABLE_COMPRESSION", "true")
+        monkeypatch.setenv("COMPRESSION_CODEC", codec)
+        object_key += ".gz" if codec == "gzip" else ".zst"
+    else:
+        monkeypatch.delenv("ENABLE_COMPRESSION", raising=False)
+
+    lines = []
+    for number in range(6000):
+        lines.append(log_line(number // 100, number))
+        if number % 7 == 0:
+            # ブロックにまたがる継続行
+            lines.append(b"\tWHERE " + b"x" * 500 + b"\n")
+    data = b"".join(lines)
+
+    uploader = RdsFileLogUploader(RdsFileLogUploaderConfig("i1", BUCKET, 1, object_key))
+    if codec:
+        uploader.compressor = LogFileCompressor(
+            LogFileCompressorConfig(codec, block_size=16 * 1024)
+        )
+    assert uploader.upload_log_stream(iter([data]))
+
+    reader = ArchivedLogReader(BUCKET, object_key, s3_client)
+    actual = b"".join(reader.read("2024-01-01 00:20:00", "2024-01-01 00:21:59"))
+
+    start = data.index(log_line(20, 2000))
+    end = data.index(log_line(22, 2200))
+    assert actual == data[start:end]
+    # 時間帯を含むブロックのみ取得する
+    size = s3_client.head_object(Bucket=BUCKET, Key=object_key)["ContentLength"]
+    assert 0 < reader.fetched_size < size / 10
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_LOG_INDEX", raising=False)
+    assert LogFileIndexConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_LOG_INDEX", "true")
+    monkeypatch.setenv("LOG_INDEX_BLOCK_SIZE", "4096")
+    assert LogFileIndexConfig.from_environ() == LogFileIndexConfig(block_size=4096)
+    with pytest.raises(ValueError):
+        LogFileIndexConfig(block_size=0)
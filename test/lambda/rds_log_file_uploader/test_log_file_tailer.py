@@ -0,0 +1,117 @@
+import pytest
+
+from log_file_tailer import LogFileTailConfig, LogFileTailer
+
+BUCKET = "log-archive"
+OBJECT_KEY = "c1/i1/raw/2026/10/15/10/postgresql.log.2026-10-15-1000.gz"
+
+
+class FakeRdsClient:
+    """書き込み中のログファイルを DownloadDBLogFilePortion で返すRDSクライアント
+
+    マーカーは取得済みの文字数とし、1回の呼び出しで portion_size 文字ずつ返す
+    """
+
+    def __init__(self, portion_size: int = 10):
+        self.log_data = ""
+        self.portion_size = portion_size
+        self.markers = []
+
+    def download_db_log_file_portion(self, DBInstanceIdentifier, LogFileName, Marker):
+        self.markers.append(Marker)
+        start = int(Marker)
+        end = min(start + self.portion_size, len(self.log_data))
+        return {
+            "LogFileData": self.log_data[start:end],
+            "Marker": str(end),
+            "AdditionalDataPending": end < len(self.log_data),
+        }
+
+
+def create_tailer(s3_client, rds_client, max_part_size: int = 25) -> LogFileTailer:
+    return LogFileTailer(
+        LogFileTailConfig(max_part_size=max_part_size),
+        "i1",
+        "error/postgresql.log.2026-10-15-1000",
+        BUCKET,
+        OBJECT_KEY,
+        rds_client=rds_client,
+        s3_client=s3_client,
+    )
+
+
+def list_keys(s3_client) -> list:
+    response = s3_client.list_objects_v2(Bucket=BUCKET, Prefix="c1/i1/tail/")
+    return [content["Key"] for content in response.get("Contents", [])]
+
+
+def test_archive_increment_saves_parts_and_state(s3_client):
+    rds_client = FakeRdsClient()
+    rds_client.log_data = "".join(f"line {number:02d}\n" for number in range(8))
+    tailer = create_tailer(s3_client, rds_client)
+
+    assert tailer.load_state() is None
+    state = tailer.archive_increment()
+
+    # max_part_size に達するたびにパートオブジェクトを保存する
+    assert state == {"Marker": "64", "PartCount": 3, "Size": 64}
+    assert tailer.load_state() == state
+    prefix = "c1/i1/tail/2026/10/15/10/postgresql.log.2026-10-15-1000/"
+    assert tailer.prefix == prefix
+    assert list_keys(s3_client) == [
+        f"{prefix}part-000001.log",
+        f"{prefix}part-000002.log",
+        f"{prefix}part-000003.log",
+        f"{prefix}state.json",
+    ]
+    assert b"".join(tailer.iter_part_chunks(state, 7)) == rds_client.log_data.encode()
+
+
+def test_archive_increment_resumes_from_marker(s3_client):
+    rds_client = FakeRdsClient()
+    rds_client.log_data = "first\n"
+    tailer = create_tailer(s3_client, rds_client)
+    tailer.archive_increment()
+
+    rds_client.log_data += "second\nthird\n"
+    rds_client.markers.clear()
+    state = tailer.archive_increment()
+
+    # 前回の続きから追記分のみを取得し、パート番号を引き継ぐ
+    assert rds_client.markers == ["6", "16"]
+    assert state == {"Marker": "19", "PartCount": 2, "Size": 19}
+    assert b"".join(tailer.iter_part_chunks(state)) == b"first\nsecond\nthird\n"
+
+
+def test_archive_increment_without_new_data(s3_client):
+    rds_client = FakeRdsClient()
+    rds_client.log_data = "first\n"
+    tailer = create_tailer(s3_client, rds_client)
+    state = tailer.archive_increment()
+
+    assert tailer.archive_increment(dict(state)) == state
+    assert len(list_keys(s3_client)) == 2
+
+
+def test_cleanup_deletes_parts_and_state(s3_client):
+    rds_client = FakeRdsClient()
+    rds_client.log_data = "x" * 100
+    tailer = create_tailer(s3_client, rds_client)
+    tailer.archive_increment()
+    assert list_keys(s3_client)
+
+    tailer.cleanup()
+    assert list_keys(s3_client) == []
+    assert tailer.load_state() is None
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_TAIL_MODE", raising=False)
+    assert LogFileTailConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_TAIL_MODE", "true")
+    monkeypatch.setenv("TAIL_MAX_PART_SIZE", "1024")
+    assert LogFileTailConfig.from_environ() == LogFileTailConfig(max_part_size=1024)
+
+    with pytest.raises(ValueError):
+        LogFileTailConfig(max_part_size=0)
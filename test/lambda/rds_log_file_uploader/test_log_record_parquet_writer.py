@@ -0,0 +1,79 @@
+import io
+from datetime import datetime
+
+import pyarrow.parquet
+import pytest
+
+from log_record_parquet_writer import ParquetOutputConfig
+from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+from test_log_entry_router import LOG_DATA
+
+BUCKET = "log-archive"
+
+
+@pytest.mark.parametrize("extension", ["", ".gz"])
+def test_records_are_written_as_parquet(s3_client, monkeypatch, extension):
+    monkeypatch.setenv("ENABLE_PARQUET_OUTPUT", "true")
+    monkeypatch.setenv("PARQUET_ROW_GROUP_SIZE", "3")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    if extension:
+        monkeypatch.setenv("ENABLE_COMPRESSION", "true")
+    object_key = f"c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000{extension}"
+
+    assert RdsFileLogUploader(
+        RdsFileLogUploaderConfig("i1", BUCKET, 1, object_key)
+    ).upload_log_stream(iter([LOG_DATA]))
+
+    response = s3_client.get_object(
+        Bucket=BUCKET,
+        Key="c1/i1/parsed/2024/01/01/00/postgresql.log.2024-01-01-0000.parquet",
+    )
+    assert response["Metadata"]["lastwritten"] == "1"
+    parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(response["Body"].read()))
+    # row_group_size 件ごとに行グループとして書き出す
+    assert parquet_file.metadata.num_row_groups == 3
+    records = parquet_file.read().to_pylist()
+
+    # 継続行と付随する STATEMENT もそれぞれ1レコードとする
+    assert [record["severity"] for record in records] == [
+        "LOG",
+        "LOG",
+        "ERROR",
+        "STATEMENT",
+        "LOG",
+        "LOG",
+        "FATAL",
+    ]
+    assert records[0] == {
+        "log_time": datetime(2024, 1, 1, 0, 0, 0),
+        "log_timezone": "UTC",
+        "remote_host": "10.0.0.1(5432)",
+        "user_name": "app",
+        "database_name": "db",
+        # 接続時のログの application_name を同じプロセスの以降のレコードに付与する
+        "application_name": "psql",
+        "process_id": 123,
+        "severity": "LOG",
+        "sql_state": None,
+        "duration_ms": None,
+        "message": "connection authorized: user=app database=db application_name=psql",
+    }
+    assert records[1]["duration_ms"] == 1500.123
+    assert records[1]["message"] == (
+        "duration: 1500.123 ms  statement: SELECT *\n\tFROM t WHERE id = 1"
+    )
+    assert records[2]["sql_state"] == "42P01"
+    assert {record["application_name"] for record in records} == {"psql"}
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_PARQUET_OUTPUT", raising=False)
+    assert ParquetOutputConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_PARQUET_OUTPUT", "true")
+    monkeypatch.setenv("PARQUET_ROW_GROUP_SIZE", "1000")
+    assert ParquetOutputConfig.from_environ() == ParquetOutputConfig(
+        row_group_size=1000
+    )
+    with pytest.raises(ValueError):
+        ParquetOutputConfig(row_group_size=0)
@@ -0,0 +1,109 @@
+import pytest
+
+from log_stream_processor import LogEntryStage, LogLineStage, LogStreamProcessor
+from log_stream_processor import build_derived_object_key
+from test_log_entry_router import ERROR, LOG_DATA, SLOW_QUERY
+
+
+class RecordingLineStage(LogLineStage):
+    name = "lines"
+
+    def __init__(self):
+        self.lines = []
+        self.aborted = False
+
+    def process_line(self, line, match):
+        self.lines.append((line, match.group("severity") if match else None))
+
+    def close(self):
+        return {"line_count": len(self.lines)}
+
+    def abort(self):
+        self.aborted = True
+
+
+class RecordingEntryStage(LogEntryStage):
+    name = "entries"
+
+    def __init__(self):
+        super().__init__()
+        self.entries = []
+
+    def process_entry(self, match, message):
+        self.entries.append((match.group("severity"), message))
+
+
+class FailingAbortStage(RecordingLineStage):
+    name = "failing"
+
+    def abort(self):
+        raise IOError("abort failed")
+
+
+@pytest.mark.parametrize(
+    "object_key, segment, extension, expected",
+    [
+        (
+            "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000",
+            "error",
+            None,
+            "c1/i1/error/2024/01/01/00/postgresql.log.2024-01-01-0000",
+        ),
+        (
+            "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz",
+            "error",
+            None,
+            "c1/i1/error/2024/01/01/00/postgresql.log.2024-01-01-0000.gz",
+        ),
+        # 拡張子を指定した場合は圧縮形式の拡張子を置き換える
+        (
+            "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.zst",
+            "parsed",
+            ".parquet",
+            "c1/i1/parsed/2024/01/01/00/postgresql.log.2024-01-01-0000.parquet",
+        ),
+    ],
+)
+def test_build_derived_object_key(object_key, segment, extension, expected):
+    assert build_derived_object_key(object_key, segment, extension) == expected
+
+
+def test_build_derived_object_key_requires_raw():
+    with pytest.raises(ValueError):
+        build_derived_object_key("c1/i1/postgresql.log.2024-01-01-0000", "error")
+
+
+def test_processor_splits_chunks_into_lines():
+    line_stage = RecordingLineStage()
+    entry_stage = RecordingEntryStage()
+    processor = LogStreamProcessor([line_stage, entry_stage])
+
+    # 行の途中で分割されたチャンクをそのまま返す
+    chunks = [LOG_DATA[offset : offset + 7] for offset in range(0, len(LOG_DATA), 7)]
+    assert list(processor.tap(chunks)) == chunks
+    processor.write(b"2024-01-01 00:00:09 UTC:10.0.0.1(5432):app@db:[1]:LOG:  last")
+
+    assert processor.close() == {"lines": {"line_count": 9}}
+    assert b"".join(line for line, _ in line_stage.lines) == LOG_DATA + (
+        b"2024-01-01 00:00:09 UTC:10.0.0.1(5432):app@db:[1]:LOG:  last"
+    )
+    # 継続行は log_line_prefix に一致しない
+    assert [severity for _, severity in line_stage.lines[1:4]] == [
+        b"LOG",
+        None,
+        b"ERROR",
+    ]
+    assert entry_stage.entries[1] == (
+        b"LOG",
+        SLOW_QUERY.split("LOG:  ", 1)[1].encode(),
+    )
+    assert entry_stage.entries[2] == (
+        b"ERROR",
+        ERROR.split("\n")[0].split("ERROR:  ", 1)[1].encode() + b"\n",
+    )
+
+
+def test_abort_continues_after_failure():
+    stages = [FailingAbortStage(), RecordingLineStage()]
+    LogStreamProcessor(stages).abort()
+    assert stages[1].aborted
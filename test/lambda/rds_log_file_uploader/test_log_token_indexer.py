@@ -0,0 +1,231 @@
+import os
+import json
+import sys
+import random
+
+import pytest
+
+from log_token_indexer import (
+    LogTokenIndexConfig,
+    LogTokenIndexer,
+    build_bloom_filter,
+    tokenize,
+)
+from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+
+# 検索ツールはこのLambda関数が出力したトークンインデックスを読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "tools"))
+from log_token_search import LogTokenSearcher, might_contain  # noqa: E402
+
+BUCKET = "log-archive"
+
+
+def candidates(index: dict, term: bytes) -> list:
+    return [
+        number
+        for number, block in enumerate(index["Blocks"])
+        if might_contain(block, tokenize(term))
+    ]
+
+
+def test_tokenize():
+    assert tokenize(b"ERROR:  40P01: deadlock_detected a " + b"x" * 70) == {
+        b"error",
+        b"40p01",
+        b"deadlock_detected",
+        b"x" * 64,
+    }
+
+
+def test_bloom_filter_has_no_false_negatives():
+    random.seed(0)
+    tokens = {random.randbytes(8).hex().encode() for _ in range(2000)}
+    bloom_filter = build_bloom_filter(tokens, 0.01)
+
+    assert all(might_contain(bloom_filter, {token}) for token in tokens)
+    absent = [random.randbytes(8).hex().encode() for _ in range(10000)]
+    false_positives = sum(might_contain(bloom_filter, {token}) for token in absent)
+    assert false_positives / len(absent) < 0.02
+
+
+def test_empty_bloom_filter():
+    bloom_filter = build_bloom_filter(set(), 0.01)
+    assert bloom_filter["BitCount"] == 0
+    assert not might_contain(bloom_filter, {b"error"})
+    assert might_contain(bloom_filter, set())
+
+
+def test_indexer_assigns_lines_to_starting_block():
+    indexer = LogTokenIndexer(
+        LogTokenIndexConfig(block_size=100),
+        s3_client=None,
+        bucket=BUCKET,
+        object_key="c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000",
+        metadata={},
+    )
+    # 40バイトの行: 0, 40, 80 (ブロック 0 と 1 にまたがる), 120, 160, 200, 240
+    for number in range(7):
+        indexer.process_line(f"line{number:03d}".ljust(39).encode() + b"\n", None)
+    index = indexer.build_index()
+
+    assert (
+        indexer.object_key
+        == "c1/i1/tokens/2024/01/01/00/postgresql.log.2024-01-01-0000.json"
+    )
+    assert [
+        (block["Offset"], block["Length"], block["RawOffset"], block["LineAligned"])
+        for block in index["Blocks"]
+    ] == [(0, 100, 0, True), (100, 100, 100, False), (200, 80, 200, True)]
+    assert index["RawSize"] == index["Size"] == 280
+    assert index["CompressionCodec"] is None
+    assert candidates(index, b"line002") == [0]
+    assert candidates(index, b"line003") == [1]
+    assert candidates(index, b"line005") == [2]
+
+
+def generate_log(hour: int, line_count: int) -> bytes:
+    random.seed(hour)
+    lines = []
+    for number in range(line_count):
+        timestamp = f"2024-01-01 {hour:02d}:{number // 1000 % 60:02d}:{number % 60:02d}"
+        prefix = f"{timestamp} UTC:10.0.0.1(5432):app@db:[{number}]:"
+        if hour == 1 and number == line_count // 2:
+            lines.append(f"{prefix}WARNING:  needle_in_haystack")
+        elif random.random() < 0.001:
+            lines.append(f"{prefix}ERROR:  40P01: deadlock detected")
+            lines.append(f"{prefix}DETAIL:  Process {number} waits for ShareLock")
+        elif random.random() < 0.3:
+            lines.append(
+                f"{prefix}LOG:  duration: {random.random() * 100:.3f} ms  "
+                f"statement: SELECT * FROM t{random.randint(0, 5000)}"
+            )
+            lines.append(f"\tWHERE id = {random.randint(0, 10**6)}")
+        else:
+            lines.append(
+                f"{prefix}LOG:  connection authorized: user=app database=db "
+                f"application_name=app{random.randint(0, 50)}"
+            )
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.mark.parametrize(
+    "environ, line_count, extension",
+    [
+        ({"LOG_INDEX_BLOCK_SIZE": str(64 * 1024)}, 20000, ""),
+        # 圧縮する場合のブロックは圧縮ブロック (4MB) と一致する
+        ({"ENABLE_COMPRESSION": "true", "COMPRESSION_CODEC": "gzip"}, 100000, ".gz"),
+    ],
+)
+def test_search_finds_every_matching_line(
+    tmp_path, monkeypatch, s3_client, environ, line_count, extension
+):
+    monkeypatch.setenv("ENABLE_TOKEN_INDEX", "true")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+
+    expected = []
+    for hour in range(2):
+        data = generate_log(hour, line_count)
+        expected += [line for line in data.split(b"\n") if b"40P01" in line]
+        file_path = tmp_path / f"postgresql.log.{hour}"
+        file_path.write_bytes(data)
+        object_key = (
+            f"c1/i1/raw/2024/01/01/{hour:02d}/"
+            f"postgresql.log.2024-01-01-{hour:02d}00{extension}"
+        )
+        assert RdsFileLogUploader(
+            RdsFileLogUploaderConfig("i1", BUCKET, 1, object_key)
+        ).upload_log_file(str(file_path))
+
+    searcher = LogTokenSearcher(BUCKET, "c1", s3_client, ["i1"])
+    matches = list(
+        searcher.search(["40p01"], "2024-01-01 00:00:00", "2024-01-01 01:59:59")
+    )
+    assert expected
+    assert [match.line for match in matches] == expected
+
+    # 候補のブロックのみ取得する
+    searcher = LogTokenSearcher(BUCKET, "c1", s3_client, ["i1"])
+    matches = list(
+        searcher.search(
+            ["needle_in_haystack"], "2024-01-01 00:00:00", "2024-01-01 01:59:59"
+        )
+    )
+    assert [match.line for match in matches] == [
+        line for line in data.split(b"\n") if b"needle_in_haystack" in line
+    ]
+    assert matches[0].object_key.startswith("c1/i1/tokens/2024/01/01/01/")
+    assert 0 < searcher.candidate_block_count < searcher.block_count
+
+    # 全ての語句を含む行のみ返す
+    searcher = LogTokenSearcher(BUCKET, "c1", s3_client, ["i1"])
+    assert not list(
+        searcher.search(
+            ["deadlock detected", "ShareLock"],
+            "2024-01-01 00:00:00",
+            "2024-01-01 01:59:59",
+        )
+    )
+
+
+def test_bloom_filter_is_sized_per_block_and_capped():
+    random.seed(1)
+    tokens = {random.randbytes(8).hex().encode() for _ in range(2000)}
+    few_tokens = set(list(tokens)[:100])
+
+    # ブロックのトークンの種類数に比例したビット数とする
+    bloom_filter = build_bloom_filter(tokens, 0.01)
+    assert build_bloom_filter(few_tokens, 0.01)["BitCount"] * 20 == pytest.approx(
+        bloom_filter["BitCount"], rel=0.01
+    )
+    assert bloom_filter["FalsePositiveRate"] == pytest.approx(0.01, rel=0.1)
+
+    # 上限に達した場合は偽陽性率が上がるが、偽陰性は発生しない
+    capped = build_bloom_filter(tokens, 0.01, max_bit_count=8000)
+    assert capped["BitCount"] == 8000
+    assert capped["HashCount"] == 3
+    assert capped["FalsePositiveRate"] > 0.1
+    assert all(might_contain(capped, {token}) for token in tokens)
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_TOKEN_INDEX", raising=False)
+    assert LogTokenIndexConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_TOKEN_INDEX", "true")
+    monkeypatch.setenv("TOKEN_INDEX_FALSE_POSITIVE_RATE", "0.05")
+    monkeypatch.setenv("TOKEN_INDEX_MAX_BLOCK_BITS", "65536")
+    config = LogTokenIndexConfig.from_environ()
+    assert config.false_positive_rate == 0.05
+    assert config.max_block_bits == 65536
+
+    with pytest.raises(ValueError, match="MaxBlockBits must be at least 8"):
+        LogTokenIndexConfig(max_block_bits=0)
+
+
+@pytest.mark.parametrize(
+    "false_positive_rate, max_block_bits, max_index_ratio",
+    [(0.01, 1024 * 1024, 0.035), (0.1, 1024 * 1024, 0.02), (0.01, 4096, 0.015)],
+)
+def test_token_index_size(false_positive_rate, max_block_bits, max_index_ratio):
+    indexer = LogTokenIndexer(
+        LogTokenIndexConfig(
+            false_positive_rate=false_positive_rate,
+            max_block_bits=max_block_bits,
+            block_size=64 * 1024,
+        ),
+        s3_client=None,
+        bucket=BUCKET,
+        object_key="c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000",
+        metadata={},
+    )
+    data = generate_log(0, 20000)
+    for line in data.splitlines(keepends=True):
+        indexer.process_line(line, None)
+    index = indexer.build_index()
+    index_size = len(json.dumps(index).encode())
+
+    # トークンインデックスのサイズは偽陽性率とビット数の上限で調整できる
+    assert index_size / len(data) < max_index_ratio
+    assert max(block["BitCount"] for block in index["Blocks"]) <= max_block_bits
@@ -0,0 +1,178 @@
+from http.client import IncompleteRead
+
+import pytest
+
+import rds_log_file_downloader
+from rds_log_file_downloader import RdsLogDownLoaderConfig, RdsLogFileDownloader
+
+LOG_DATA = b"".join(f"line {number:03d}\n".encode() for number in range(100))
+
+
+class FakeResponse:
+    """urllib3 のレスポンスのうち、ダウンローダーが使用する部分
+
+    fail_after を指定した場合は、そのバイト数を返した後の読み込みで接続の切断を模倣する。
+    length_remaining は Content-Length に対して読み込んでいない残りのバイト数
+    """
+
+    def __init__(
+        self,
+        status: int,
+        body: bytes,
+        fail_after: int = None,
+        length_remaining: int = 0,
+    ):
+        self.status = status
+        self.body = body
+        self.fail_after = fail_after
+        self.length_remaining = length_remaining
+
+    def read(self, size: int) -> bytes:
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise IncompleteRead(b"", len(self.body))
+            size = min(size, self.fail_after)
+            self.fail_after -= size
+        data, self.body = self.body[:size], self.body[size:]
+        return data
+
+    def release_conn(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FakeHttpPool:
+    """リクエストのヘッダーを記録し、用意したレスポンスを順に返す"""
+
+    def __init__(self, responses: list):
+        self.responses = responses
+        self.requests = []
+
+    def request(self, method: str, url: str, headers: dict, **kwargs) -> FakeResponse:
+        self.requests.append((url, headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    @property
+    def ranges(self) -> list:
+        return [headers.get("Range") for _, headers in self.requests]
+
+
+def create_downloader(monkeypatch, responses: list) -> RdsLogFileDownloader:
+    monkeypatch.setattr(rds_log_file_downloader.time, "sleep", lambda seconds: None)
+    downloader = RdsLogFileDownloader(
+        RdsLogDownLoaderConfig("i1", "error/postgresql.log.2026-10-15-0000", 64),
+        region="us-east-1",
+    )
+    downloader.http_pool = FakeHttpPool(responses)
+    return downloader
+
+
+def test_iter_log_file_chunks_streams_response(monkeypatch):
+    downloader = create_downloader(monkeypatch, [FakeResponse(200, LOG_DATA)])
+
+    chunks = list(downloader.iter_log_file_chunks(delay=0))
+    assert b"".join(chunks) == LOG_DATA
+    assert len(chunks) > 1
+    url, headers = downloader.http_pool.requests[0]
+    assert url == (
+        "https://rds.us-east-1.amazonaws.com/v13/downloadCompleteLogFile/"
+        "i1/error/postgresql.log.2026-10-15-0000"
+    )
+    assert headers["Authorization"].startswith("AWS4-HMAC-SHA256 ")
+    assert "Range" not in headers
+
+
+def test_resume_with_partial_content(monkeypatch):
+    downloader = create_downloader(
+        monkeypatch,
+        [
+            FakeResponse(200, LOG_DATA, fail_after=300),
+            FakeResponse(206, LOG_DATA[300:]),
+        ],
+    )
+
+    assert b"".join(downloader.iter_log_file_chunks(delay=0)) == LOG_DATA
+    # 取得済みのバイト位置から再開を要求する
+    assert downloader.http_pool.ranges == [None, "bytes=300-"]
+    assert downloader.refetched_size == 0
+    assert downloader.retry_count == 1
+
+
+def test_resume_skips_delivered_bytes_without_range_support(monkeypatch):
+    downloader = create_downloader(
+        monkeypatch,
+        [
+            FakeResponse(200, LOG_DATA, fail_after=300),
+            FakeResponse(200, LOG_DATA, fail_after=500),
+            FakeResponse(200, LOG_DATA),
+        ],
+    )
+
+    # Range を無視して先頭から返された場合は取得済みの分を読み飛ばす
+    assert b"".join(downloader.iter_log_file_chunks(delay=0)) == LOG_DATA
+    assert downloader.http_pool.ranges == [None, "bytes=300-", "bytes=500-"]
+    assert downloader.refetched_size == 800
+
+
+def test_truncated_response_is_resumed(monkeypatch):
+    downloader = create_downloader(
+        monkeypatch,
+        [
+            # Content-Length に満たないまま終了したレスポンス
+            FakeResponse(200, LOG_DATA[:400], length_remaining=len(LOG_DATA) - 400),
+            FakeResponse(206, LOG_DATA[400:]),
+        ],
+    )
+
+    assert b"".join(downloader.iter_log_file_chunks(delay=0)) == LOG_DATA
+    assert downloader.http_pool.ranges == [None, "bytes=400-"]
+
+
+def test_retries_request_errors(monkeypatch):
+    downloader = create_downloader(
+        monkeypatch,
+        [
+            ConnectionError("connection reset"),
+            FakeResponse(500, b"InternalFailure"),
+            FakeResponse(200, LOG_DATA),
+        ],
+    )
+
+    assert b"".join(downloader.iter_log_file_chunks(delay=0)) == LOG_DATA
+    assert downloader.retry_count == 2
+
+
+def test_gives_up_after_retries(monkeypatch):
+    downloader = create_downloader(
+        monkeypatch, [FakeResponse(200, LOG_DATA, fail_after=100) for _ in range(3)]
+    )
+
+    chunks = []
+    with pytest.raises(IOError, match="Failed to download log file") as excinfo:
+        for chunk in downloader.iter_log_file_chunks(retries=3, delay=0):
+            chunks.append(chunk)
+    assert isinstance(excinfo.value.__cause__, IncompleteRead)
+    # 先頭から返すレスポンスは取得済みの 100 バイトを超える前に切断される
+    assert b"".join(chunks) == LOG_DATA[:100]
+    assert downloader.refetched_size == 200
+
+
+def test_download_log_file(monkeypatch, tmp_path):
+    output_path = tmp_path / "postgresql.log"
+    downloader = create_downloader(
+        monkeypatch,
+        [
+            FakeResponse(200, LOG_DATA, fail_after=300),
+            FakeResponse(206, LOG_DATA[300:]),
+        ],
+    )
+    assert downloader.download_log_file(str(output_path), delay=0)
+    assert output_path.read_bytes() == LOG_DATA
+
+    downloader = create_downloader(monkeypatch, [ConnectionError("reset")] * 3)
+    assert not downloader.download_log_file(str(output_path), retries=3, delay=0)
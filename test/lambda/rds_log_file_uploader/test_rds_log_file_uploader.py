@@ -0,0 +1,243 @@
+import io
+import json
+import gzip
+import hashlib
+
+import pytest
+import zstandard
+
+import rds_log_file_uploader
+from log_file_compressor import LogFileCompressor, LogFileCompressorConfig
+from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+from transfer_planner import TransferPlan
+
+BUCKET = "log-archive"
+OBJECT_KEY = "c1/i1/raw/2026/10/15/10/postgresql.log.2026-10-15-1000"
+MB = 1024 * 1024
+LOG_DATA = b"".join(
+    f"2026-10-15 10:00:{number % 60:02d} UTC:10.0.0.1(5432):app@db:[{number}]:"
+    f"LOG:  statement: SELECT {number}\n".encode()
+    for number in range(2000)
+)
+
+
+@pytest.fixture(autouse=True)
+def environ(monkeypatch):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    monkeypatch.delenv("ENABLE_COMPRESSION", raising=False)
+
+
+def zstd_decompress(data: bytes) -> bytes:
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        io.BytesIO(data), read_across_frames=True
+    )
+    return reader.read()
+
+
+def create_uploader(object_key: str = OBJECT_KEY, **kwargs) -> RdsFileLogUploader:
+    return RdsFileLogUploader(
+        RdsFileLogUploaderConfig("i1", BUCKET, 1000, object_key, **kwargs)
+    )
+
+
+def iter_chunks(data: bytes, chunk_size: int = 1000):
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset : offset + chunk_size]
+
+
+def get_object(s3_client, object_key: str = OBJECT_KEY) -> dict:
+    return s3_client.get_object(Bucket=BUCKET, Key=object_key)
+
+
+def test_upload_log_stream(s3_client):
+    assert create_uploader().upload_log_stream(iter_chunks(LOG_DATA))
+
+    response = get_object(s3_client)
+    assert response["Body"].read() == LOG_DATA
+    assert response["ContentType"] == "text/plain"
+    assert response["Metadata"]["lastwritten"] == "1000"
+    assert response["Metadata"]["dbinstanceidentifier"] == "i1"
+
+
+def test_upload_log_file(s3_client, tmp_path, monkeypatch):
+    file_path = tmp_path / "postgresql.log"
+    file_path.write_bytes(LOG_DATA)
+    read_sizes = []
+
+    def counting_open(path, mode="r"):
+        f = open(path, mode)
+        read = f.read
+
+        def counting_read(size=-1):
+            data = read(size)
+            read_sizes.append(len(data))
+            return data
+
+        f.read = counting_read
+        return f
+
+    monkeypatch.setattr(rds_log_file_uploader, "open", counting_open, raising=False)
+    uploader = create_uploader(size=len(LOG_DATA))
+    # 一時ファイルを再度読み込む upload_file は使用しない
+    monkeypatch.setattr(uploader.s3_client, "upload_file", None)
+
+    assert uploader.upload_log_file(str(file_path))
+    # 圧縮しない場合はストリーミングと同じ経路で、ファイルを1回だけ読み込む
+    assert sum(read_sizes) == len(LOG_DATA)
+    response = get_object(s3_client)
+    assert response["Body"].read() == LOG_DATA
+    assert response["Metadata"]["lastwritten"] == "1000"
+    assert load_checksum(s3_client)["SourceSha256"] == (
+        hashlib.sha256(LOG_DATA).hexdigest()
+    )
+
+
+def test_upload_log_stream_failure_leaves_no_object(s3_client):
+    def interrupted_chunks():
+        yield LOG_DATA[:1000]
+        raise IOError("Failed to download log file")
+
+    assert not create_uploader().upload_log_stream(interrupted_chunks())
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET)
+
+
+@pytest.mark.parametrize(
+    "codec, extension, decompress",
+    [
+        ("gzip", ".gz", gzip.decompress),
+        ("zstd", ".zst", zstd_decompress),
+    ],
+)
+@pytest.mark.parametrize("streaming", [False, True])
+def test_compressed_upload_round_trips(
+    s3_client, tmp_path, monkeypatch, codec, extension, decompress, streaming
+):
+    monkeypatch.setenv("ENABLE_COMPRESSION", "true")
+    monkeypatch.setenv("COMPRESSION_CODEC", codec)
+    object_key = OBJECT_KEY + extension
+    uploader = create_uploader(object_key)
+    # 複数のブロックに分けて圧縮する
+    uploader.compressor = LogFileCompressor(
+        LogFileCompressorConfig(codec=codec, block_size=16 * 1024)
+    )
+
+    if streaming:
+        assert uploader.upload_log_stream(iter_chunks(LOG_DATA))
+    else:
+        file_path = tmp_path / "postgresql.log"
+        file_path.write_bytes(LOG_DATA)
+        assert uploader.upload_log_file(str(file_path))
+
+    response = get_object(s3_client, object_key)
+    assert decompress(response["Body"].read()) == LOG_DATA
+    assert response["ContentEncoding"] == codec
+    assert response["Metadata"]["compressed"] == "true"
+
+
+def test_hash_chunks_sets_checksum_after_all_chunks():
+    uploader = create_uploader()
+    chunks = uploader._hash_chunks(iter_chunks(LOG_DATA))
+
+    assert next(chunks) == LOG_DATA[:1000]
+    # 途中までのデータのSHA-256は設定しない
+    assert uploader.source_checksum is None
+    assert b"".join(chunks) == LOG_DATA[1000:]
+    assert uploader.source_checksum == hashlib.sha256(LOG_DATA).hexdigest()
+
+
+def test_hash_file(tmp_path):
+    file_path = tmp_path / "postgresql.log"
+    file_path.write_bytes(LOG_DATA)
+    uploader = create_uploader()
+
+    uploader._hash_file(str(file_path))
+    assert uploader.source_checksum == hashlib.sha256(LOG_DATA).hexdigest()
+
+
+def test_verify_source_size():
+    create_uploader()._verify_source_size(123)
+    create_uploader(size=123)._verify_source_size(123)
+    with pytest.raises(ValueError, match="does not match log file size 123"):
+        create_uploader(size=123)._verify_source_size(122)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_size_mismatch_is_not_uploaded(s3_client, tmp_path, streaming):
+    uploader = create_uploader(size=len(LOG_DATA) + 1)
+
+    if streaming:
+        assert not uploader.upload_log_stream(iter_chunks(LOG_DATA))
+    else:
+        file_path = tmp_path / "postgresql.log"
+        file_path.write_bytes(LOG_DATA)
+        assert not uploader.upload_log_file(str(file_path))
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET)
+
+
+def load_checksum(s3_client) -> dict:
+    response = get_object(
+        s3_client, "c1/i1/checksums/2026/10/15/10/postgresql.log.2026-10-15-1000.json"
+    )
+    return json.loads(response["Body"].read())
+
+
+def get_object_checksum(s3_client) -> str:
+    return s3_client.head_object(Bucket=BUCKET, Key=OBJECT_KEY, ChecksumMode="ENABLED")[
+        "ChecksumSHA256"
+    ]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_checksum_object_records_source_checksum(s3_client, tmp_path, streaming):
+    uploader = create_uploader(size=len(LOG_DATA))
+
+    if streaming:
+        assert uploader.upload_log_stream(iter_chunks(LOG_DATA))
+    else:
+        file_path = tmp_path / "postgresql.log"
+        file_path.write_bytes(LOG_DATA)
+        assert uploader.upload_log_file(str(file_path))
+
+    assert get_object(s3_client)["Metadata"] == {
+        "lastwritten": "1000",
+        "dbinstanceidentifier": "i1",
+        "compressed": "false",
+        "sourcesize": str(len(LOG_DATA)),
+    }
+    # S3が検証したチェックサムと、圧縮前のログファイルのSHA-256を記録する
+    assert load_checksum(s3_client) == {
+        "SourceObjectKey": OBJECT_KEY,
+        "LastWritten": 1000,
+        "SourceSize": len(LOG_DATA),
+        "SourceSha256": hashlib.sha256(LOG_DATA).hexdigest(),
+        "ObjectSize": len(LOG_DATA),
+        "ChecksumSHA256": get_object_checksum(s3_client),
+    }
+
+
+def test_multipart_stream_records_checksum_without_copy(s3_client, monkeypatch):
+    data = LOG_DATA * 60
+    uploader = RdsFileLogUploader(
+        RdsFileLogUploaderConfig("i1", BUCKET, 1000, OBJECT_KEY, size=len(data)),
+        transfer_plan=TransferPlan(MB, 5 * MB, 2),
+    )
+    upload_part = uploader.s3_client.upload_part
+    part_checksum_algorithms = []
+
+    def record_upload_part(**kwargs):
+        part_checksum_algorithms.append(kwargs.get("ChecksumAlgorithm"))
+        return upload_part(**kwargs)
+
+    monkeypatch.setattr(uploader.s3_client, "upload_part", record_upload_part)
+    # 確定後にメタデータを置き換えるためのコピーは行わない
+    monkeypatch.setattr(uploader.s3_client, "copy_object", None)
+
+    assert uploader.upload_log_stream(iter_chunks(data, MB))
+    response = get_object(s3_client)
+    assert response["Body"].read() == data
+    assert response["Metadata"]["sourcesize"] == str(len(data))
+    assert part_checksum_algorithms == ["SHA256", "SHA256"]
+    checksum = load_checksum(s3_client)
+    assert checksum["SourceSha256"] == hashlib.sha256(data).hexdigest()
+    assert checksum["ObjectSize"] == len(data)
+    assert checksum["ChecksumSHA256"] == get_object_checksum(s3_client)
@@ -0,0 +1,165 @@
+import pytest
+
+from s3_stream_uploader import S3StreamUploader
+
+BUCKET = "log-archive"
+OBJECT_KEY = "c1/i1/raw/2026/10/15/10/postgresql.log.2026-10-15-1000"
+MB = 1024 * 1024
+
+
+class RecordingS3Client:
+    """呼び出した操作と送信したパートのサイズを記録するS3クライアント"""
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+        self.operations = []
+        self.part_sizes = []
+
+    def __getattr__(self, name):
+        operation = getattr(self.s3_client, name)
+
+        def call(**kwargs):
+            self.operations.append(name)
+            if name == "upload_part":
+                self.part_sizes.append(len(kwargs["Body"]))
+            return operation(**kwargs)
+
+        return call
+
+
+def create_uploader(s3_client, part_size: int = 5 * MB) -> S3StreamUploader:
+    return S3StreamUploader(
+        s3_client,
+        BUCKET,
+        OBJECT_KEY,
+        {"Metadata": {"lastwritten": "1000"}, "ContentType": "text/plain"},
+        part_size=part_size,
+        max_inflight_parts=2,
+    )
+
+
+def get_object(s3_client) -> dict:
+    return s3_client.get_object(Bucket=BUCKET, Key=OBJECT_KEY)
+
+
+def test_small_data_is_uploaded_with_put_object(s3_client):
+    client = RecordingS3Client(s3_client)
+    uploader = create_uploader(client)
+    uploader.write(b"first\n")
+    uploader.write(b"")
+    uploader.write(b"second\n")
+
+    assert uploader.complete() == 13
+    # パートサイズに満たない場合はマルチパートアップロードを開始しない
+    assert uploader.part_count == 0
+    assert client.operations == ["put_object"]
+    response = get_object(s3_client)
+    assert response["Body"].read() == b"first\nsecond\n"
+    assert response["Metadata"] == {"lastwritten": "1000"}
+    assert response["ContentType"] == "text/plain"
+
+
+def test_empty_data_is_uploaded_as_empty_object(s3_client):
+    uploader = create_uploader(s3_client)
+    assert uploader.complete() == 0
+    assert get_object(s3_client)["ContentLength"] == 0
+
+
+def test_large_data_is_split_into_parts(s3_client):
+    client = RecordingS3Client(s3_client)
+    uploader = create_uploader(client)
+    data = bytes(range(256)) * (12 * MB // 256)
+    for offset in range(0, len(data), 3 * MB):
+        uploader.write(data[offset : offset + 3 * MB])
+
+    assert uploader.complete() == len(data)
+    # part_size ごとに送信し、残りを最後のパートとする
+    assert uploader.part_count == 3
+    assert client.part_sizes == [5 * MB, 5 * MB, 2 * MB]
+    assert client.operations[0] == "create_multipart_upload"
+    assert client.operations[-1] == "complete_multipart_upload"
+    response = get_object(s3_client)
+    assert response["Body"].read() == data
+    assert response["Metadata"] == {"lastwritten": "1000"}
+
+
+def test_abort_discards_uploaded_parts(s3_client):
+    uploader = create_uploader(s3_client)
+    uploader.write(b"x" * (6 * MB))
+    assert uploader.part_count == 1
+
+    uploader.abort()
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET)
+
+
+def test_abort_before_first_part_does_nothing(s3_client):
+    client = RecordingS3Client(s3_client)
+    uploader = create_uploader(client)
+    uploader.write(b"data")
+
+    uploader.abort()
+    assert client.operations == []
+
+
+def test_failed_part_is_raised_on_complete(s3_client):
+    class FailingS3Client(RecordingS3Client):
+        def upload_part(self, **kwargs):
+            raise IOError("upload failed")
+
+    uploader = create_uploader(FailingS3Client(s3_client))
+    uploader.write(b"x" * (6 * MB))
+
+    with pytest.raises(IOError, match="upload failed"):
+        uploader.complete()
+    uploader.abort()
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+@pytest.mark.parametrize("size", [1 * MB, 7 * MB])
+def test_checksum_algorithm_is_sent_with_every_request(s3_client, size):
+    class ChecksumRecordingS3Client(RecordingS3Client):
+        def __init__(self, s3_client):
+            super().__init__(s3_client)
+            self.checksum_algorithms = []
+            self.completed_parts = []
+
+        def __getattr__(self, name):
+            operation = super().__getattr__(name)
+
+            def call(**kwargs):
+                if "ChecksumAlgorithm" in kwargs:
+                    self.checksum_algorithms.append((name, kwargs["ChecksumAlgorithm"]))
+                if name == "complete_multipart_upload":
+                    self.completed_parts = kwargs["MultipartUpload"]["Parts"]
+                return operation(**kwargs)
+
+            return call
+
+    client = ChecksumRecordingS3Client(s3_client)
+    uploader = S3StreamUploader(
+        client,
+        BUCKET,
+        OBJECT_KEY,
+        {},
+        part_size=5 * MB,
+        max_inflight_parts=2,
+        checksum_algorithm="SHA256",
+    )
+    uploader.write(b"x" * size)
+    uploader.complete()
+
+    checksum = s3_client.head_object(
+        Bucket=BUCKET, Key=OBJECT_KEY, ChecksumMode="ENABLED"
+    )["ChecksumSHA256"]
+    if uploader.part_count:
+        # パートごとのチェックサムを CompleteMultipartUpload に指定する
+        assert client.checksum_algorithms == [
+            ("create_multipart_upload", "SHA256"),
+            ("upload_part", "SHA256"),
+            ("upload_part", "SHA256"),
+        ]
+        assert all("ChecksumSHA256" in part for part in client.completed_parts)
+    else:
+        assert client.checksum_algorithms == [("put_object", "SHA256")]
+        assert uploader.checksum == checksum
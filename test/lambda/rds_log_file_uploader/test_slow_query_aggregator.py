@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from log_stream_processor import LogStreamProcessor
+from rds_log_file_uploader import RdsFileLogUploader, RdsFileLogUploaderConfig
+from slow_query_aggregator import (
+    SlowQueryAggregator,
+    SlowQueryAggregatorConfig,
+    normalize_statement,
+)
+
+BUCKET = "log-archive"
+OBJECT_KEY = "c1/i1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000"
+SUMMARY_KEY = (
+    "c1/i1/slow_query_summary/2024/01/01/00/postgresql.log.2024-01-01-0000.json"
+)
+
+
+def slow_query(duration_ms: float, statement: str, pid: int = 1) -> bytes:
+    return (
+        f"2024-01-01 00:00:00 UTC:10.0.0.1(5432):app@db:[{pid}]:"
+        f"LOG:  duration: {duration_ms:.3f} ms  {statement}\n"
+    ).encode()
+
+
+def aggregate(data: bytes, **kwargs) -> dict:
+    aggregator = SlowQueryAggregator(
+        SlowQueryAggregatorConfig(**kwargs),
+        s3_client=None,
+        bucket=BUCKET,
+        object_key=OBJECT_KEY,
+        metadata={"DbInstanceIdentifier": "i1", "LastWritten": "1"},
+    )
+    processor = LogStreamProcessor([aggregator])
+    processor.write(data)
+    # close() はS3に出力するため、エントリーの確定のみ行う
+    aggregator._flush_entry()
+    return aggregator.summarize()
+
+
+@pytest.mark.parametrize(
+    "statement, expected",
+    [
+        (
+            "SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'foo'",
+            "select * from t where id in (?) and name = ?",
+        ),
+        (
+            "select *\n  from t -- comment\n where id = $1;",
+            "select * from t where id = ?",
+        ),
+        (
+            "/* app */ UPDATE t SET v = 1.5e3 WHERE s = 'it''s'",
+            "update t set v = ? where s = ?",
+        ),
+    ],
+)
+def test_normalize_statement(statement, expected):
+    assert normalize_statement(statement) == expected
+
+
+def test_summarize_groups_by_fingerprint():
+    data = b"".join(
+        [
+            slow_query(ms, f"statement: SELECT * FROM a WHERE id = {ms:.0f}")
+            for ms in range(1, 101)
+        ]
+        + [slow_query(500, "execute S_1: SELECT * FROM b WHERE id = $1")] * 2
+        # 継続行を含むSQL文は1つのSQL文として正規化する
+        + [slow_query(10, "statement: SELECT *") + b"\tFROM a WHERE id = 7\n"]
+        + [slow_query(9999, "statement: SELECT 1").replace(b"LOG:", b"ERROR:")]
+    )
+    summary = aggregate(data)
+
+    assert summary["TotalCount"] == 103
+    assert summary["FingerprintCount"] == 2
+    assert summary["OverflowCount"] == 0
+    # 合計実行時間の降順
+    a, b = summary["Fingerprints"]
+    assert (a["Query"], a["Count"], a["TotalMs"], a["MaxMs"]) == (
+        "select * from a where id = ?",
+        101,
+        5060.0,
+        100.0,
+    )
+    # パーセンタイルはヒストグラムのバケット幅 (5%) の誤差を含む
+    assert a["P50Ms"] == pytest.approx(50, rel=0.05)
+    assert a["P95Ms"] == pytest.approx(95, rel=0.05)
+    assert (b["Query"], b["Count"], b["P50Ms"]) == (
+        "select * from b where id = ?",
+        2,
+        500.0,
+    )
+
+
+def test_summary_limits_fingerprints():
+    data = b"".join(
+        slow_query(number, f"statement: SELECT * FROM t{number}")
+        for number in range(1, 6)
+    )
+    summary = aggregate(data, top_n=2, max_fingerprints=3)
+
+    # 上限を超えたフィンガープリントは other にまとめる
+    assert summary["FingerprintCount"] == 4
+    assert summary["OverflowCount"] == 2
+    other, top = summary["Fingerprints"]
+    assert (other["Fingerprint"], other["Query"], other["Count"], other["TotalMs"]) == (
+        "other",
+        "",
+        2,
+        9.0,
+    )
+    assert (top["Query"], top["TotalMs"]) == ("select * from t3", 3.0)
+
+
+def test_summary_is_uploaded(s3_client, monkeypatch):
+    monkeypatch.setenv("ENABLE_SLOW_QUERY_SUMMARY", "true")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    data = slow_query(12.5, "statement: SELECT 1") + slow_query(
+        7.5, "statement: SELECT 2"
+    )
+
+    assert RdsFileLogUploader(
+        RdsFileLogUploaderConfig("i1", BUCKET, 1, OBJECT_KEY)
+    ).upload_log_stream(iter([data]))
+    summary = json.loads(
+        s3_client.get_object(Bucket=BUCKET, Key=SUMMARY_KEY)["Body"].read()
+    )
+    assert summary["DbInstanceIdentifier"] == "i1"
+    assert summary["LastWritten"] == "1"
+    assert summary["SourceObjectKey"] == OBJECT_KEY
+    assert (summary["TotalCount"], summary["TotalMs"]) == (2, 20.0)
+    assert [f["Query"] for f in summary["Fingerprints"]] == ["select ?"]
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_SLOW_QUERY_SUMMARY", raising=False)
+    assert SlowQueryAggregatorConfig.from_environ() is None
+
+    monkeypatch.setenv("ENABLE_SLOW_QUERY_SUMMARY", "true")
+    monkeypatch.setenv("SLOW_QUERY_SUMMARY_TOP_N", "5")
+    assert SlowQueryAggregatorConfig.from_environ() == SlowQueryAggregatorConfig(
+        top_n=5
+    )
+    with pytest.raises(ValueError):
+        SlowQueryAggregatorConfig(top_n=0)
@@ -0,0 +1,92 @@
+import pytest
+
+from transfer_planner import TransferPlan, TransferPlanner, TransferPlannerConfig
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+def plan(memory_mb: int, cpu_count: int, **kwargs) -> TransferPlan:
+    return TransferPlanner(TransferPlannerConfig(memory_mb * MB, cpu_count)).plan(
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize(
+    "memory_mb, cpu_count, expected",
+    [
+        # バッファ 256MB を並列数 8 (2 vCPU x 4) で等分する
+        (1024, 2, TransferPlan(32 * MB, 32 * MB, 8)),
+        # 並列数は MAX_CONCURRENCY、チャンクサイズは TRANSFER_MAX_CHUNK_SIZE が上限
+        (10240, 6, TransferPlan(64 * MB, 160 * MB, 16)),
+        # パートサイズは TRANSFER_MAX_PART_SIZE が上限
+        (40960, 8, TransferPlan(64 * MB, 256 * MB, 16)),
+    ],
+)
+def test_plan_without_size(memory_mb, cpu_count, expected):
+    assert plan(memory_mb, cpu_count) == expected
+
+
+def test_plan_spreads_small_file_over_concurrency():
+    # 10MB を並列数 8 で分けると 5MB (S3の最小パートサイズ) 未満のため、5MB とする
+    assert plan(1024, 2, size=10 * MB) == TransferPlan(5 * MB, 5 * MB, 8)
+    assert plan(1024, 2, size=100 * MB) == TransferPlan(12 * MB, 12 * MB, 8)
+
+
+def test_plan_divides_budget_by_parallel_files():
+    assert plan(1024, 2, parallel_files=4) == TransferPlan(8 * MB, 8 * MB, 8)
+    # バッファが最小パートサイズを下回る場合も、1パート分は確保する
+    assert plan(128, 2, parallel_files=10) == TransferPlan(1 * MB, 5 * MB, 1)
+
+
+@pytest.mark.parametrize(
+    "memory_mb, size",
+    [(128, 200 * GB), (1024, 200 * GB), (1024, 1 * GB), (3008, 50 * GB)],
+)
+def test_plan_respects_part_count_limit(memory_mb, size):
+    result = plan(memory_mb, 2, size=size)
+    budget = max(memory_mb * MB // 4, 5 * MB)
+
+    assert result.part_size * 10_000 >= size
+    assert result.part_size % MB == 0
+    assert result.chunk_size <= result.part_size
+    assert result.max_concurrency >= 1
+    # 下限のパートサイズがバッファに収まらない場合は並列数を減らす
+    assert result.part_size * result.max_concurrency <= max(budget, result.part_size)
+
+
+def test_plan_reduces_concurrency_for_part_count_limit():
+    # 200GB は 21MB 以上のパートが必要で、バッファ 32MB には1パートのみ収まる
+    assert plan(128, 2, size=200 * GB) == TransferPlan(4 * MB, 21 * MB, 1)
+
+
+def test_plan_caps_part_size_at_s3_maximum():
+    assert plan(1024, 2, size=100_000 * GB).part_size == 5 * GB
+
+
+def test_transfer_plan_properties():
+    result = TransferPlan(chunk_size=8 * MB, part_size=16 * MB, max_concurrency=4)
+    assert result.multipart_threshold == 16 * MB
+    assert result.max_inflight_parts == 3
+    assert TransferPlan(MB, 5 * MB, 1).max_inflight_parts == 1
+
+    transfer_config = result.to_transfer_config()
+    assert transfer_config.multipart_threshold == 16 * MB
+    assert transfer_config.multipart_chunksize == 16 * MB
+    assert transfer_config.max_concurrency == 4
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "512")
+    config = TransferPlannerConfig.from_environ()
+    assert config.memory_size == 512 * MB
+    assert config.cpu_count >= 1
+
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+    assert TransferPlannerConfig.from_environ().memory_size == 1024 * MB
+
+
+@pytest.mark.parametrize("memory_size, cpu_count", [(0, 1), (MB, 0)])
+def test_config_validation(memory_size, cpu_count):
+    with pytest.raises(ValueError):
+        TransferPlannerConfig(memory_size, cpu_count)
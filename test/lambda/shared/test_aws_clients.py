@@ -0,0 +1,85 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import urllib3
+
+import aws_clients
+from aws_clients_constants import (
+    DEFAULT_MAX_POOL_CONNECTIONS,
+    HTTP_MAX_POOL_CONNECTIONS,
+    HTTP_MAX_REDIRECTS,
+)
+
+
+def test_clients_are_reused_per_pool_size():
+    rds_client = aws_clients.get_client("rds")
+
+    # ウォームスタート後の呼び出しでも同じセッション、クライアントを使用する
+    assert aws_clients.get_client("rds") is rds_client
+    assert aws_clients.get_client("s3") is not rds_client
+    assert aws_clients.get_session() is aws_clients.get_session()
+    assert rds_client.meta.config.max_pool_connections == DEFAULT_MAX_POOL_CONNECTIONS
+    assert rds_client.meta.config.retries["mode"] == "standard"
+
+    # コネクション数の異なるクライアントは別に保持する
+    large_client = aws_clients.get_client("rds", HTTP_MAX_POOL_CONNECTIONS)
+    assert large_client is not rds_client
+    assert large_client.meta.config.max_pool_connections == HTTP_MAX_POOL_CONNECTIONS
+    assert aws_clients.get_client("rds", HTTP_MAX_POOL_CONNECTIONS) is large_client
+
+
+def test_http_pool_is_reused():
+    http_pool = aws_clients.get_http_pool()
+
+    assert aws_clients.get_http_pool() is http_pool
+    assert http_pool.connection_pool_kw["maxsize"] == HTTP_MAX_POOL_CONNECTIONS
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    """/redirect/<n> は n 回リダイレクトした後、リクエストのヘッダーを返す"""
+
+    def do_GET(self):
+        remaining = int(self.path.rsplit("/", 1)[-1])
+        if remaining:
+            self.send_response(302)
+            self.send_header("Location", f"/redirect/{remaining - 1}")
+            self.end_headers()
+            return
+        body = f"{self.headers.get('Range')} {self.headers.get('Authorization')}"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def redirect_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RedirectHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_pool_follows_redirects_only(redirect_server):
+    http_pool = aws_clients.get_http_pool()
+    headers = {"Range": "bytes=100-", "Authorization": "AWS4-HMAC-SHA256 test"}
+
+    # 同じホストへのリダイレクトはヘッダーを引き継いで追従する
+    response = http_pool.request(
+        "GET", f"{redirect_server}/redirect/{HTTP_MAX_REDIRECTS}", headers=headers
+    )
+    assert response.status == 200
+    assert response.data == b"bytes=100- AWS4-HMAC-SHA256 test"
+
+    with pytest.raises(urllib3.exceptions.MaxRetryError):
+        http_pool.request("GET", f"{redirect_server}/redirect/{HTTP_MAX_REDIRECTS + 1}")
+
+    # 接続エラーは urllib3 で再試行せず、呼び出し元に返す
+    retries = http_pool.connection_pool_kw["retries"]
+    assert (retries.connect, retries.read, retries.status) == (0, 0, 0)
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+import stage_metrics
+from stage_metrics import StageMetrics
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    """time.perf_counter の代わりに、テストで進めた時間を返す"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(stage_metrics.time, "perf_counter", clock)
+    return clock
+
+
+def download(clock: FakeClock, chunk_count: int):
+    for _ in range(chunk_count):
+        clock.advance(0.5)
+        yield b"x" * MB
+
+
+def read_emf(capsys) -> dict:
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+def test_nested_stages_exclude_inner_duration(clock):
+    metrics = StageMetrics({"DbInstanceIdentifier": "i1"}, enabled=False)
+
+    with metrics.measure("Upload"):
+        clock.advance(1.0)
+        for _ in metrics.measure_iterator("Download", download(clock, 4)):
+            clock.advance(0.25)
+
+    # Upload の処理時間は Download の要素の取得を待った時間を含まない
+    assert metrics.durations == {"Download": 2.0, "Upload": 2.0}
+    assert metrics.sizes == {"Download": 4 * MB}
+
+
+def test_flush_emits_emf(clock, capsys):
+    metrics = StageMetrics({"DbInstanceIdentifier": "i1"}, namespace="LogArchive")
+    with metrics.measure("Upload"):
+        for _ in metrics.measure_iterator("Download", download(clock, 2)):
+            clock.advance(0.5)
+    metrics.add_bytes("Upload", 2 * MB)
+    metrics.add_count("RetryCount", 2)
+    metrics.set_value("CompressionRatio", 0.25)
+
+    assert metrics.flush() == {
+        "DownloadDuration": 1.0,
+        "DownloadBytes": 2 * MB,
+        "DownloadThroughput": 2.0,
+        "UploadDuration": 1.0,
+        "UploadBytes": 2 * MB,
+        "UploadThroughput": 2.0,
+        "RetryCount": 2,
+        "CompressionRatio": 0.25,
+    }
+    emf = read_emf(capsys)
+    (directive,) = emf["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == "LogArchive"
+    assert directive["Dimensions"] == [["DbInstanceIdentifier"]]
+    assert emf["DbInstanceIdentifier"] == "i1"
+    assert {metric["Name"]: metric["Unit"] for metric in directive["Metrics"]} == {
+        "DownloadDuration": "Seconds",
+        "DownloadBytes": "Bytes",
+        "DownloadThroughput": "Megabytes/Second",
+        "UploadDuration": "Seconds",
+        "UploadBytes": "Bytes",
+        "UploadThroughput": "Megabytes/Second",
+        "RetryCount": "Count",
+        "CompressionRatio": "None",
+    }
+    # メトリクスの値は配列で出力される
+    assert emf["DownloadBytes"] == [2 * MB]
+    assert emf["UploadThroughput"] == [2.0]
+
+
+def test_merge_adds_values_of_parallel_files(clock, capsys):
+    total = StageMetrics({"DbClusterIdentifier": "c1"}, namespace="LogArchive")
+    for _ in range(2):
+        metrics = StageMetrics({"DbInstanceIdentifier": "i1"}, enabled=False)
+        with metrics.measure("Upload"):
+            clock.advance(1.5)
+        metrics.add_bytes("Upload", MB)
+        metrics.add_count("UploadedLogFiles")
+        total.merge(metrics)
+
+    total.flush()
+    emf = read_emf(capsys)
+    assert emf["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [
+        ["DbClusterIdentifier"]
+    ]
+    assert emf["UploadDuration"] == [3.0]
+    assert emf["UploadBytes"] == [2 * MB]
+    assert emf["UploadedLogFiles"] == [2]
+
+
+def test_disabled_metrics_are_not_emitted(clock, capsys):
+    metrics = StageMetrics({"DbInstanceIdentifier": "i1"}, enabled=False)
+    metrics.add_bytes("Upload", MB)
+
+    assert metrics.flush() == {}
+    metrics.add_count("UploadedLogFiles")
+    assert metrics.flush() == {"UploadedLogFiles": 1}
+    assert capsys.readouterr().out == ""
+
+
+def test_from_environ(monkeypatch):
+    monkeypatch.delenv("ENABLE_STAGE_METRICS", raising=False)
+    assert not StageMetrics.from_environ({}).enabled
+    monkeypatch.setenv("ENABLE_STAGE_METRICS", "true")
+    assert StageMetrics.from_environ({}).enabled
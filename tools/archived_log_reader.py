@@ -0,0 +1,251 @@
+"""アーカイブしたログファイルから指定した時間帯のエントリーを読み込むツール
+
+アップローダーが出力したインデックス (<cluster>/<instance>/index/...) を使用し、
+指定した時間帯を含むブロックのみを Range 指定のGETで取得する。
+日単位に結合済みのログファイルは、マニフェスト (<cluster>/<instance>/manifest/...) に記録された
+結合済みオブジェクト内の位置からブロックを取得する。
+
+Example:
+    $ uv run tools/archived_log_reader.py \\
+        --bucket my-log-bucket \\
+        --object-key my-cluster/my-instance-1/raw/2024/01/01/00/postgresql.log.2024-01-01-0000.gz \\
+        --start "2024-01-01 00:10:00" --end "2024-01-01 00:15:00"
+"""
+
+import re
+import sys
+import gzip
+import json
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import boto3
+from botocore.exceptions import ClientError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+RAW_OBJECT_KEY_SEGMENT = "/raw/"
+LOG_INDEX_OBJECT_KEY_SEGMENT = "/index/"
+LOG_INDEX_EXTENSION = ".json"
+MANIFEST_OBJECT_KEY_SEGMENT = "/manifest/"
+# <cluster>/<instance>/raw/YYYY/MM/DD/HH/postgresql.log.YYYY-MM-DD-HHMM[.gz|.zst]
+HOURLY_OBJECT_KEY_PATTERN = re.compile(
+    r"^(?P<instance_prefix>.+)/raw/(?P<day_path>\d{4}/\d{2}/\d{2})/\d{2}/"
+    r"postgresql\.log\.(?P<day>\d{4}-\d{2}-\d{2})-\d{4}(?P<extension>\.gz|\.zst)?$"
+)
+COMPRESSION_EXTENSIONS = (".gz", ".zst")
+LOG_ENTRY_TIME_PATTERN = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.\d+)? [^:]*:.*?:\[\d+\]:[A-Z0-9]+:"
+)
+
+
+def get_index_object_key(object_key: str) -> str:
+    """raw のオブジェクトキーからインデックスのオブジェクトキーを生成"""
+    if RAW_OBJECT_KEY_SEGMENT not in object_key:
+        raise ValueError(
+            f"ObjectKey must contain {RAW_OBJECT_KEY_SEGMENT}: {object_key}"
+        )
+
+    index_key = object_key.replace(
+        RAW_OBJECT_KEY_SEGMENT, LOG_INDEX_OBJECT_KEY_SEGMENT, 1
+    )
+    for extension in COMPRESSION_EXTENSIONS:
+        if index_key.endswith(extension):
+            index_key = index_key[: -len(extension)]
+            break
+    return f"{index_key}{LOG_INDEX_EXTENSION}"
+
+
+def get_manifest_object_key(object_key: str) -> str:
+    """raw の時間単位のオブジェクトキーから、日単位に結合したマニフェストのオブジェクトキーを生成"""
+    match = HOURLY_OBJECT_KEY_PATTERN.match(object_key)
+    if not match:
+        raise ValueError(f"ObjectKey is not an hourly log file: {object_key}")
+    return (
+        f"{match.group('instance_prefix')}{MANIFEST_OBJECT_KEY_SEGMENT}"
+        f"{match.group('day_path')}/postgresql.log.{match.group('day')}"
+        f"{match.group('extension') or ''}.json"
+    )
+
+
+def select_blocks(
+    blocks: List[Dict[str, Any]], start: str, end: str
+) -> List[Dict[str, Any]]:
+    """時間帯に該当するエントリーを含む可能性のあるブロックの選択
+
+    最後のエントリーの継続行が次のブロックにまたがる場合があるため、
+    該当する最後のブロックの次のブロックも含める
+    """
+    selected = [
+        index
+        for index, block in enumerate(blocks)
+        if (block["FirstTime"] is None or block["FirstTime"] <= end)
+        and (block["LastTime"] is None or block["LastTime"] >= start)
+    ]
+    if not selected:
+        return []
+
+    first, last = selected[0], min(selected[-1] + 1, len(blocks) - 1)
+    return blocks[first : last + 1]
+
+
+def merge_ranges(blocks: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+    """連続するブロックを1回のGETで取得する範囲にまとめる
+
+    Returns:
+        List[Tuple[int, int]]: (開始位置, 終了位置) のリスト（終了位置を含む）
+    """
+    ranges: List[Tuple[int, int]] = []
+    for block in blocks:
+        start, end = block["Offset"], block["Offset"] + block["Length"] - 1
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def decompress_block(data: bytes, compression_codec: Optional[str]) -> bytes:
+    """1ブロック（GZIPメンバー / zstdフレーム）の展開"""
+    if compression_codec == "gzip":
+        return gzip.decompress(data)
+    if compression_codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard module is required for zstd objects")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class ArchivedLogReader:
+    """インデックスを使用してアーカイブしたログファイルの一部を読み込むクラス"""
+
+    def __init__(self, bucket: str, object_key: str, s3_client=None):
+        self.bucket = bucket
+        self.object_key = object_key
+        self.s3_client = s3_client or boto3.client("s3")
+        self.fetched_size = 0
+
+    def load_index(self) -> Dict[str, Any]:
+        """インデックスの読み込み"""
+        response = self.s3_client.get_object(
+            Bucket=self.bucket, Key=get_index_object_key(self.object_key)
+        )
+        return json.loads(response["Body"].read())
+
+    def resolve_location(self) -> Tuple[str, int]:
+        """ログファイルのデータを取得するオブジェクトキーと開始位置
+
+        日単位に結合され、時間単位のオブジェクトが削除されている場合は
+        マニフェストに記録された結合済みオブジェクトとその中の位置とする
+        """
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=self.object_key)
+            return self.object_key, 0
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
+
+        response = self.s3_client.get_object(
+            Bucket=self.bucket, Key=get_manifest_object_key(self.object_key)
+        )
+        manifest = json.loads(response["Body"].read())
+        for member in manifest["Members"]:
+            if member["SourceObjectKey"] == self.object_key:
+                return manifest["ObjectKey"], member["Offset"]
+        raise ValueError(f"Log file is not archived: {self.object_key}")
+
+    def _iter_block_data(
+        self, index: Dict[str, Any], blocks: List[Dict[str, Any]]
+    ) -> Iterator[Tuple[Dict[str, Any], bytes]]:
+        """ブロックを Range 指定で取得し、展開したデータを返す"""
+        offsets = {block["Offset"]: block for block in blocks}
+        object_key, base_offset = self.resolve_location()
+
+        for start, end in merge_ranges(blocks):
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=object_key,
+                Range=f"bytes={base_offset + start}-{base_offset + end}",
+            )
+            data = response["Body"].read()
+            self.fetched_size += len(data)
+
+            position = 0
+            while position < len(data):
+                block = offsets[start + position]
+                yield block, decompress_block(
+                    data[position : position + block["Length"]],
+                    index["CompressionCodec"],
+                )
+                position += block["Length"]
+
+    def read(self, start: str, end: str) -> Iterator[bytes]:
+        """時間帯に開始したエントリーを継続行を含めて返す
+
+        Args:
+            start: 開始時刻 (YYYY-MM-DD HH:MM:SS)
+            end: 終了時刻 (YYYY-MM-DD HH:MM:SS)
+
+        Yields:
+            bytes: 改行を含む1行のデータ
+        """
+        index = self.load_index()
+        blocks = select_blocks(index["Blocks"], start, end)
+        if not blocks:
+            return
+
+        pending = b""
+        in_range = False
+        # 先頭のブロックが行の途中から始まる場合は、最初の改行までを読み飛ばす
+        skip_partial_line = not blocks[0]["LineAligned"]
+
+        for _, data in self._iter_block_data(index, blocks):
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+
+            for line in lines:
+                if skip_partial_line:
+                    skip_partial_line = False
+                    continue
+
+                match = LOG_ENTRY_TIME_PATTERN.match(line)
+                if match:
+                    log_time = match.group(1).decode()
+                    if log_time > end:
+                        return
+                    in_range = log_time >= start
+                if in_range:
+                    yield line + b"\n"
+
+        if pending and in_range and not skip_partial_line:
+            match = LOG_ENTRY_TIME_PATTERN.match(pending)
+            if not match or start <= match.group(1).decode() <= end:
+                yield pending
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Read log entries in a time range from an archived log file"
+    )
+    parser.add_argument("--bucket", required=True, help="S3 bucket name")
+    parser.add_argument(
+        "--object-key", required=True, help="Object key of the archived raw log file"
+    )
+    parser.add_argument(
+        "--start", required=True, help="Start time (YYYY-MM-DD HH:MM:SS)"
+    )
+    parser.add_argument("--end", required=True, help="End time (YYYY-MM-DD HH:MM:SS)")
+    args = parser.parse_args()
+
+    reader = ArchivedLogReader(args.bucket, args.object_key)
+    for line in reader.read(args.start, args.end):
+        sys.stdout.buffer.write(line)
+
+    print(f"Fetched {reader.fetched_size} bytes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
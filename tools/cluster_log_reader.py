@@ -0,0 +1,447 @@
+"""DBクラスターの全DBインスタンスのアーカイブしたログを時刻順にマージして読み込むツール
+
+フェイルオーバー前後の状況の確認など、ライターとリーダーのログを1つの時系列で確認するために使用する。
+フィルター処理が生成するオブジェクトキー (<cluster>/<instance>/raw/YYYY/MM/DD/HH/postgresql.log.*)
+から時間帯に該当する時間単位のプレフィックスのみを一覧し、DBインスタンスごとにオブジェクトを
+並列に取得、ストリーミングで展開する。日単位に結合済みのログファイルは、その日のマニフェスト
+(<cluster>/<instance>/manifest/YYYY/MM/DD/*.json) に記録された結合済みオブジェクト内の範囲を
+取得する。エントリー（継続行を含む）は DBインスタンスごとに時刻順となるため、
+ヒープによる k-way マージで1つの時系列にまとめる。
+
+メモリ使用量は DBインスタンス数 x (先読みするチャンク数 x チャンクサイズ) 程度に制限される。
+テイルモードで未確定のログファイル (<cluster>/<instance>/tail/...) は対象としない。
+
+Example:
+    $ uv run tools/cluster_log_reader.py \\
+        --bucket my-log-bucket --db-cluster-identifier my-cluster \\
+        --start "2024-01-01 00:10:00" --end "2024-01-01 00:15:00"
+"""
+
+import re
+import sys
+import json
+import zlib
+import heapq
+import queue
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+import boto3
+
+from archived_log_reader import MANIFEST_OBJECT_KEY_SEGMENT, RAW_OBJECT_KEY_SEGMENT
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+HOUR_PREFIX_FORMAT = "%Y/%m/%d/%H/"
+LOG_OBJECT_NAME_PATTERN = re.compile(
+    r"postgresql\.log\.\d{4}-\d{2}-\d{2}-\d{4}(?P<extension>\.gz|\.zst)?$"
+)
+COMPRESSION_CODECS = {".gz": "gzip", ".zst": "zstd"}
+# ミリ秒を含むログの時刻 (%m) でも順序を比較できるよう、小数部を含めて取得する
+LOG_ENTRY_TIME_PATTERN = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?) [^:]*:.*?:\[\d+\]:[A-Z0-9]+:"
+)
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PREFETCH_CHUNKS = 4
+_PUT_TIMEOUT = 0.1
+_END_OF_STREAM = object()
+
+
+class LogObject(NamedTuple):
+    """読み込むログファイル。日単位に結合済みの場合は結合済みオブジェクト内の範囲"""
+
+    log_object_key: str
+    object_key: str
+    byte_range: Optional[str] = None
+
+
+class LogEntry(NamedTuple):
+    """継続行を含む1つのログエントリー"""
+
+    log_time: str
+    db_instance: str
+    data: bytes
+
+
+def get_hour_prefixes(start: str, end: str, lookback_hours: int = 0) -> List[str]:
+    """時間帯に該当するログファイルの時間単位のプレフィックス (YYYY/MM/DD/HH/) の一覧
+
+    オブジェクトキーの時間はログファイルの開始時刻のため、ローテーション間隔が1時間より長い場合は
+    lookback_hours で開始時刻より前に開始したログファイルを含める
+    """
+    hour = datetime.strptime(start[:19], TIME_FORMAT).replace(
+        minute=0, second=0
+    ) - timedelta(hours=lookback_hours)
+    last_hour = datetime.strptime(end[:19], TIME_FORMAT)
+
+    prefixes = []
+    while hour <= last_hour:
+        prefixes.append(hour.strftime(HOUR_PREFIX_FORMAT))
+        hour += timedelta(hours=1)
+    return prefixes
+
+
+def iter_decompressed(
+    chunks: Iterable[bytes], compression_codec: Optional[str]
+) -> Iterator[bytes]:
+    """連結されたGZIPメンバー / zstdフレームのストリーミング展開
+
+    圧縮はブロックごとに独立したメンバー（フレーム）として出力されるため、
+    1つの終端に達したら残りのデータから次の展開を開始する
+    """
+    if compression_codec is None:
+        yield from chunks
+        return
+    if compression_codec == "zstd" and zstandard is None:
+        raise RuntimeError("zstandard module is required for zstd objects")
+
+    decompressor = None
+    for chunk in chunks:
+        while chunk:
+            if decompressor is None:
+                decompressor = (
+                    zstandard.ZstdDecompressor().decompressobj()
+                    if compression_codec == "zstd"
+                    else zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+                )
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = None
+
+    if decompressor is not None:
+        raise ValueError("Compressed stream ended before the end of a member")
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """展開したデータを改行を除く行に分割"""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_entries(db_instance: str, chunks: Iterable[bytes]) -> Iterator[LogEntry]:
+    """展開したデータを継続行を含むエントリーに分割
+
+    先頭のエントリーより前の行（時間帯より前に開始したエントリーの継続行）は読み飛ばす
+    """
+    entry_time: Optional[str] = None
+    entry_lines: List[bytes] = []
+
+    for line in iter_lines(chunks):
+        match = LOG_ENTRY_TIME_PATTERN.match(line)
+        if match:
+            if entry_time is not None:
+                yield LogEntry(entry_time, db_instance, b"".join(entry_lines))
+            entry_time, entry_lines = match.group(1).decode(), []
+        if entry_time is not None:
+            entry_lines.append(line + b"\n")
+
+    if entry_time is not None:
+        yield LogEntry(entry_time, db_instance, b"".join(entry_lines))
+
+
+def select_entries(
+    entries: Iterable[LogEntry], start: str, end: str
+) -> Iterator[LogEntry]:
+    """時間帯に開始したエントリーの選択。エントリーは時刻順のため、終了時刻を過ぎたら終了する"""
+    for entry in entries:
+        log_time = entry.log_time[:19]
+        if log_time > end:
+            return
+        if log_time >= start:
+            yield entry
+
+
+class Prefetcher:
+    """別スレッドでイテレーターを先読みし、最大 size 件をキューに保持するイテレーター
+
+    生成時に先読みを開始する。close() を呼び出すと先読みのスレッドも終了する
+    """
+
+    def __init__(self, iterator: Iterator[Any], size: int):
+        self._items: queue.Queue = queue.Queue(maxsize=size)
+        self._closed = threading.Event()
+        threading.Thread(target=self._produce, args=(iterator,), daemon=True).start()
+
+    def _put(self, item: Any) -> bool:
+        while not self._closed.is_set():
+            try:
+                self._items.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterator: Iterator[Any]) -> None:
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    return
+            self._put(_END_OF_STREAM)
+        except Exception as e:
+            self._put(e)
+        finally:
+            iterator.close()
+
+    def __iter__(self) -> "Prefetcher":
+        return self
+
+    def __next__(self) -> Any:
+        if self._closed.is_set():
+            raise StopIteration
+        item = self._items.get()
+        if item is _END_OF_STREAM:
+            self.close()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        return item
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class ClusterLogReader:
+    """DBクラスターの全DBインスタンスのログを時刻順にマージして読み込むクラス"""
+
+    def __init__(
+        self,
+        bucket: str,
+        db_cluster_identifier: str,
+        s3_client=None,
+        db_instance_identifiers: Optional[List[str]] = None,
+        lookback_hours: int = 0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        prefetch_chunks: int = DEFAULT_PREFETCH_CHUNKS,
+    ):
+        """
+        Args:
+            bucket: アーカイブ先のS3バケット
+            db_cluster_identifier: DBクラスター識別子
+            s3_client: S3クライアント
+            db_instance_identifiers: 対象のDBインスタンス。未指定の場合はアーカイブされている全てのDBインスタンス
+            lookback_hours: 開始時刻より前に開始したログファイルを含める時間数
+            chunk_size: 1回に読み込む圧縮後のサイズ
+            prefetch_chunks: DBインスタンスごとに先読みする展開後のチャンク数
+        """
+        self.bucket = bucket
+        self.db_cluster_identifier = db_cluster_identifier
+        self.s3_client = s3_client or boto3.client("s3")
+        self.db_instance_identifiers = db_instance_identifiers
+        self.lookback_hours = lookback_hours
+        self.chunk_size = chunk_size
+        self.prefetch_chunks = prefetch_chunks
+        self.fetched_size = 0
+        self._lock = threading.Lock()
+
+    def list_db_instances(self) -> List[str]:
+        """アーカイブされているDBインスタンスの一覧"""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        prefix = f"{self.db_cluster_identifier}/"
+        return [
+            common_prefix["Prefix"][len(prefix) :].rstrip("/")
+            for page in paginator.paginate(
+                Bucket=self.bucket, Prefix=prefix, Delimiter="/"
+            )
+            for common_prefix in page.get("CommonPrefixes", [])
+        ]
+
+    def _list_compacted_members(
+        self, db_instance: str, hour_prefixes: List[str]
+    ) -> Dict[str, LogObject]:
+        """日単位に結合済みのログファイルのうち、時間単位のプレフィックスに該当するもの"""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        hour_prefix_set = set(hour_prefixes)
+        members = {}
+        for day_prefix in sorted({hour_prefix[:-3] for hour_prefix in hour_prefixes}):
+            prefix = (
+                f"{self.db_cluster_identifier}/{db_instance}"
+                f"{MANIFEST_OBJECT_KEY_SEGMENT}{day_prefix}"
+            )
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for content in page.get("Contents", []):
+                    manifest = json.loads(
+                        self.s3_client.get_object(
+                            Bucket=self.bucket, Key=content["Key"]
+                        )["Body"].read()
+                    )
+                    for member in manifest["Members"]:
+                        source_key = member["SourceObjectKey"]
+                        # .../raw/YYYY/MM/DD/HH/postgresql.log.* の YYYY/MM/DD/HH/
+                        hour_prefix = source_key.split(RAW_OBJECT_KEY_SEGMENT, 1)[1][
+                            : len("YYYY/MM/DD/HH/")
+                        ]
+                        if hour_prefix not in hour_prefix_set or not member["Length"]:
+                            continue
+                        members[source_key] = LogObject(
+                            source_key,
+                            manifest["ObjectKey"],
+                            f"bytes={member['Offset']}-"
+                            f"{member['Offset'] + member['Length'] - 1}",
+                        )
+        return members
+
+    def list_log_objects(
+        self, db_instance: str, start: str, end: str
+    ) -> List[LogObject]:
+        """時間帯に該当するDBインスタンスのログファイルを開始時刻順に取得
+
+        結合後に同じログファイルが再アップロードされている場合は、時間単位のオブジェクトを優先する
+        """
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        hour_prefixes = get_hour_prefixes(start, end, self.lookback_hours)
+        log_objects = self._list_compacted_members(db_instance, hour_prefixes)
+        for hour_prefix in hour_prefixes:
+            prefix = (
+                f"{self.db_cluster_identifier}/{db_instance}"
+                f"{RAW_OBJECT_KEY_SEGMENT}{hour_prefix}"
+            )
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                log_objects.update(
+                    (content["Key"], LogObject(content["Key"], content["Key"]))
+                    for content in page.get("Contents", [])
+                    if LOG_OBJECT_NAME_PATTERN.fullmatch(content["Key"][len(prefix) :])
+                )
+        # ファイル名の日時の順とする。拡張子のみ異なる場合は非圧縮を先とする
+        return sorted(
+            log_objects.values(),
+            key=lambda log_object: log_object.log_object_key.rsplit("/", 1)[1],
+        )
+
+    def _iter_object_chunks(self, log_object: LogObject) -> Iterator[bytes]:
+        """オブジェクト（の範囲）を chunk_size ごとに取得し、展開したデータを返す"""
+        extension = LOG_OBJECT_NAME_PATTERN.search(log_object.log_object_key).group(
+            "extension"
+        )
+        body = self.s3_client.get_object(
+            Bucket=self.bucket,
+            Key=log_object.object_key,
+            **({"Range": log_object.byte_range} if log_object.byte_range else {}),
+        )["Body"]
+
+        def read_chunks() -> Iterator[bytes]:
+            for chunk in body.iter_chunks(self.chunk_size):
+                with self._lock:
+                    self.fetched_size += len(chunk)
+                yield chunk
+
+        try:
+            last = b""
+            for data in iter_decompressed(
+                read_chunks(), COMPRESSION_CODECS.get(extension)
+            ):
+                last = data
+                yield data
+            # 改行で終わらないログファイルの最終行を次のログファイルの先頭と連結しない
+            if last and not last.endswith(b"\n"):
+                yield b"\n"
+        finally:
+            body.close()
+
+    def _iter_instance_chunks(
+        self, db_instance: str, start: str, end: str
+    ) -> Iterator[bytes]:
+        """DBインスタンスの時間帯のログファイルを開始時刻順に展開したデータ"""
+        for log_object in self.list_log_objects(db_instance, start, end):
+            yield from self._iter_object_chunks(log_object)
+
+    def read(self, start: str, end: str) -> Iterator[LogEntry]:
+        """全DBインスタンスの時間帯に開始したエントリーを時刻順に返す
+
+        時刻が同じエントリーはDBインスタンスの一覧の順とする
+
+        Args:
+            start: 開始時刻 (YYYY-MM-DD HH:MM:SS)
+            end: 終了時刻 (YYYY-MM-DD HH:MM:SS)
+
+        Yields:
+            LogEntry: 継続行を含む1つのログエントリー
+        """
+        db_instances = self.db_instance_identifiers or self.list_db_instances()
+        # 全DBインスタンスのオブジェクトの一覧、取得、展開を同時に開始する
+        prefetchers = [
+            Prefetcher(
+                self._iter_instance_chunks(db_instance, start, end),
+                self.prefetch_chunks,
+            )
+            for db_instance in db_instances
+        ]
+        try:
+            yield from heapq.merge(
+                *(
+                    select_entries(iter_entries(db_instance, chunks), start, end)
+                    for db_instance, chunks in zip(db_instances, prefetchers)
+                ),
+                key=lambda entry: entry.log_time,
+            )
+        finally:
+            for prefetcher in prefetchers:
+                prefetcher.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Read log entries of every DB instance in a cluster in time order"
+    )
+    parser.add_argument("--bucket", required=True, help="S3 bucket name")
+    parser.add_argument(
+        "--db-cluster-identifier", required=True, help="Aurora DB cluster identifier"
+    )
+    parser.add_argument(
+        "--db-instance-identifiers",
+        type=lambda value: value.split(","),
+        help="Comma separated DB instances (default: every archived instance)",
+    )
+    parser.add_argument(
+        "--start", required=True, help="Start time (YYYY-MM-DD HH:MM:SS)"
+    )
+    parser.add_argument("--end", required=True, help="End time (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument(
+        "--lookback-hours",
+        type=int,
+        default=0,
+        help="Also read log files started this many hours before --start",
+    )
+    parser.add_argument(
+        "--no-instance-prefix",
+        action="store_true",
+        help="Do not prefix each entry with its DB instance identifier",
+    )
+    args = parser.parse_args()
+
+    reader = ClusterLogReader(
+        args.bucket,
+        args.db_cluster_identifier,
+        db_instance_identifiers=args.db_instance_identifiers,
+        lookback_hours=args.lookback_hours,
+    )
+    entry_count = 0
+    for entry in reader.read(args.start, args.end):
+        if not args.no_instance_prefix:
+            sys.stdout.buffer.write(f"[{entry.db_instance}] ".encode())
+        sys.stdout.buffer.write(entry.data)
+        entry_count += 1
+
+    print(
+        f"Merged {entry_count} entries, fetched {reader.fetched_size} bytes",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
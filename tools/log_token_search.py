@@ -0,0 +1,335 @@
+"""アーカイブしたログから語句を含む行を検索するツール
+
+アップローダーが出力したトークンインデックス (<cluster>/<instance>/tokens/...) のブロックごとの
+Bloom filter で語句の全てのトークンを含む可能性のあるブロックを選び、候補のブロックのみを
+Range 指定のGETで取得して行を照合する。ログファイル本体の取得量は一致件数に比例し、
+アーカイブ全体の大きさにはトークンインデックスの取得のみが比例する。
+
+語句は大文字小文字を区別せず、英数字とアンダースコアの区切りで一致する行を返す
+(例: SQLSTATE "40P01"、"application_name=psql"、"deadlock detected")。
+複数の --term を指定した場合は全てを含む行とする。
+log_line_prefix のうちユーザー名、データベース名以外（時刻、ホスト、プロセスID）は索引の対象外のため検索できない。
+日単位に結合済みのログファイルはマニフェストに記録された結合済みオブジェクト内の位置から取得する。
+
+Example:
+    $ uv run tools/log_token_search.py \\
+        --bucket my-log-bucket --db-cluster-identifier my-cluster \\
+        --start "2024-01-01 00:00:00" --end "2024-01-31 23:59:59" --term 40P01
+"""
+
+import re
+import sys
+import json
+import base64
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+import boto3
+
+from archived_log_reader import ArchivedLogReader, decompress_block
+from cluster_log_reader import ClusterLogReader, get_hour_prefixes
+
+TOKEN_INDEX_OBJECT_KEY_SEGMENT = "/tokens/"
+TOKEN_INDEX_VERSION = 1
+TOKEN_INDEX_HASH_FUNCTION = "blake2b-128"
+TOKEN_PATTERN = re.compile(rb"[0-9a-z_]+")
+TOKEN_MIN_LENGTH = 2
+TOKEN_MAX_LENGTH = 64
+DEFAULT_MAX_WORKERS = 16
+
+
+class SearchMatch(NamedTuple):
+    """語句に一致した1行"""
+
+    db_instance: str
+    object_key: str
+    line: bytes
+
+
+def tokenize(data: bytes) -> Set[bytes]:
+    """アップローダーと同じ規則で小文字のトークンを抽出"""
+    return {
+        token[:TOKEN_MAX_LENGTH]
+        for token in set(TOKEN_PATTERN.findall(data.lower()))
+        if len(token) >= TOKEN_MIN_LENGTH
+    }
+
+
+def compile_term(term: bytes) -> re.Pattern:
+    """語句を大文字小文字を区別せず、トークンの区切りで照合する正規表現に変換
+
+    語句の先頭、末尾がトークンの文字の場合は、前後がトークンの文字でないことを条件とする
+    """
+    lowered = term.lower()
+    return re.compile(
+        (rb"(?<![0-9a-z_])" if TOKEN_PATTERN.match(lowered[:1]) else b"")
+        + re.escape(lowered)
+        + (rb"(?![0-9a-z_])" if TOKEN_PATTERN.match(lowered[-1:]) else b"")
+    )
+
+
+def might_contain(block: Dict[str, Any], tokens: Set[bytes]) -> bool:
+    """ブロックの Bloom filter が全てのトークンを含む可能性があるかの判定"""
+    if not tokens:
+        return True
+    if not block["BitCount"]:
+        return False
+
+    bits = base64.b64decode(block["Bits"])
+    bit_count, hash_count = block["BitCount"], block["HashCount"]
+    for token in tokens:
+        digest = hashlib.blake2b(token, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(hash_count):
+            position = (h1 + i * h2) % bit_count
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+    return True
+
+
+class LogTokenSearcher:
+    """トークンインデックスを使用してアーカイブしたログから語句を含む行を検索するクラス"""
+
+    def __init__(
+        self,
+        bucket: str,
+        db_cluster_identifier: str,
+        s3_client=None,
+        db_instance_identifiers: Optional[List[str]] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        """
+        Args:
+            bucket: アーカイブ先のS3バケット
+            db_cluster_identifier: DBクラスター識別子
+            s3_client: S3クライアント
+            db_instance_identifiers: 対象のDBインスタンス。未指定の場合はアーカイブされている全てのDBインスタンス
+            max_workers: トークンインデックス、候補のブロックを並列に取得する数
+        """
+        self.bucket = bucket
+        self.db_cluster_identifier = db_cluster_identifier
+        self.s3_client = s3_client or boto3.client("s3")
+        self.db_instance_identifiers = db_instance_identifiers
+        self.max_workers = max_workers
+        self.index_count = 0
+        self.block_count = 0
+        self.candidate_block_count = 0
+        self.fetched_size = 0
+        self._lock = threading.Lock()
+
+    def list_token_indexes(self, db_instance: str, start: str, end: str) -> List[str]:
+        """時間帯に該当するDBインスタンスのトークンインデックスのオブジェクトキーを開始時刻順に取得
+
+        1日分をまとめて一覧し、時間単位のプレフィックスで絞り込む
+        """
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        instance_prefix = f"{self.db_cluster_identifier}/{db_instance}{TOKEN_INDEX_OBJECT_KEY_SEGMENT}"
+        hour_prefixes = get_hour_prefixes(start, end)
+        hour_prefix_set = set(hour_prefixes)
+
+        object_keys = []
+        for day_prefix in sorted({hour_prefix[:-3] for hour_prefix in hour_prefixes}):
+            for page in paginator.paginate(
+                Bucket=self.bucket, Prefix=f"{instance_prefix}{day_prefix}"
+            ):
+                object_keys.extend(
+                    content["Key"]
+                    for content in page.get("Contents", [])
+                    if content["Key"][len(instance_prefix) :][: len("YYYY/MM/DD/HH/")]
+                    in hour_prefix_set
+                )
+        return sorted(object_keys, key=lambda key: key.rsplit("/", 1)[1])
+
+    def _load_token_index(self, object_key: str) -> Dict[str, Any]:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=object_key)
+        data = response["Body"].read()
+        with self._lock:
+            self.fetched_size += len(data)
+
+        token_index = json.loads(data)
+        if (
+            token_index["Version"] != TOKEN_INDEX_VERSION
+            or token_index["HashFunction"] != TOKEN_INDEX_HASH_FUNCTION
+            or token_index["TokenMinLength"] != TOKEN_MIN_LENGTH
+            or token_index["TokenMaxLength"] != TOKEN_MAX_LENGTH
+        ):
+            raise ValueError(f"Unsupported token index: {object_key}")
+        return token_index
+
+    def _select_candidates(
+        self, token_index: Dict[str, Any], tokens: Set[bytes]
+    ) -> List[int]:
+        """全てのトークンを含む可能性のあるブロックの番号"""
+        blocks = token_index["Blocks"]
+        candidates = [
+            index for index, block in enumerate(blocks) if might_contain(block, tokens)
+        ]
+        with self._lock:
+            self.index_count += 1
+            self.block_count += len(blocks)
+            self.candidate_block_count += len(candidates)
+        return candidates
+
+    def _read_candidate_lines(
+        self, token_index: Dict[str, Any], candidates: List[int]
+    ) -> Iterator[bytes]:
+        """候補のブロックで開始する行（改行を除く）
+
+        ブロックをまたぐ行を完結させるため、候補の次のブロックもあわせて取得する
+        """
+        blocks = token_index["Blocks"]
+        object_key, base_offset = ArchivedLogReader(
+            self.bucket, token_index["SourceObjectKey"], self.s3_client
+        ).resolve_location()
+
+        # 連続する候補（と次のブロック）を1回のGETで取得する範囲にまとめる
+        ranges: List[Tuple[int, int, Set[int]]] = []
+        for index in candidates:
+            last = min(index + 1, len(blocks) - 1)
+            if ranges and ranges[-1][1] >= index - 1:
+                ranges[-1] = (ranges[-1][0], last, ranges[-1][2] | {index})
+            else:
+                ranges.append((index, last, {index}))
+
+        for first, last, selected in ranges:
+            start = base_offset + blocks[first]["Offset"]
+            end = base_offset + blocks[last]["Offset"] + blocks[last]["Length"] - 1
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=object_key, Range=f"bytes={start}-{end}"
+            )
+            data = response["Body"].read()
+            with self._lock:
+                self.fetched_size += len(data)
+
+            position = 0
+            raw = bytearray()
+            for block in blocks[first : last + 1]:
+                raw += decompress_block(
+                    data[position : position + block["Length"]],
+                    token_index["CompressionCodec"],
+                )
+                position += block["Length"]
+
+            raw_base = blocks[first]["RawOffset"]
+            line_start = 0
+            # 先頭のブロックが行の途中から始まる場合は、最初の改行までを読み飛ばす
+            if not blocks[first]["LineAligned"]:
+                line_start = raw.find(b"\n") + 1 or len(raw)
+            while line_start < len(raw):
+                line_end = raw.find(b"\n", line_start)
+                if line_end < 0:
+                    line_end = len(raw)
+                block_index = (raw_base + line_start) // token_index["BlockSize"]
+                if block_index in selected:
+                    yield bytes(raw[line_start:line_end])
+                line_start = line_end + 1
+
+    def _search_index(
+        self,
+        object_key: str,
+        tokens: Set[bytes],
+        patterns: List[re.Pattern],
+    ) -> List[bytes]:
+        token_index = self._load_token_index(object_key)
+        candidates = self._select_candidates(token_index, tokens)
+        if not candidates:
+            return []
+        return [
+            line
+            for line in self._read_candidate_lines(token_index, candidates)
+            if all(pattern.search(line.lower()) for pattern in patterns)
+        ]
+
+    def search(self, terms: List[str], start: str, end: str) -> Iterator[SearchMatch]:
+        """時間帯のログファイルから全ての語句を含む行を返す
+
+        Args:
+            terms: 語句のリスト
+            start: 開始時刻 (YYYY-MM-DD HH:MM:SS)。該当する時間単位のログファイルを対象とする
+            end: 終了時刻 (YYYY-MM-DD HH:MM:SS)
+
+        Yields:
+            SearchMatch: DBインスタンス、ログファイルごとに開始時刻順の一致した行
+        """
+        encoded_terms = [term.encode() for term in terms]
+        tokens = set().union(*(tokenize(term) for term in encoded_terms))
+        if not tokens:
+            print(
+                "Terms have no indexed tokens, every block will be fetched",
+                file=sys.stderr,
+            )
+        patterns = [compile_term(term) for term in encoded_terms]
+
+        db_instances = (
+            self.db_instance_identifiers
+            or ClusterLogReader(
+                self.bucket, self.db_cluster_identifier, self.s3_client
+            ).list_db_instances()
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for db_instance in db_instances:
+                object_keys = self.list_token_indexes(db_instance, start, end)
+                results = executor.map(
+                    lambda object_key: self._search_index(object_key, tokens, patterns),
+                    object_keys,
+                )
+                for object_key, lines in zip(object_keys, results):
+                    for line in lines:
+                        yield SearchMatch(db_instance, object_key, line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Search archived log lines containing terms using token indexes"
+    )
+    parser.add_argument("--bucket", required=True, help="S3 bucket name")
+    parser.add_argument(
+        "--db-cluster-identifier", required=True, help="Aurora DB cluster identifier"
+    )
+    parser.add_argument(
+        "--db-instance-identifiers",
+        type=lambda value: value.split(","),
+        help="Comma separated DB instances (default: every archived instance)",
+    )
+    parser.add_argument(
+        "--start", required=True, help="Start time (YYYY-MM-DD HH:MM:SS)"
+    )
+    parser.add_argument("--end", required=True, help="End time (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument(
+        "--term",
+        action="append",
+        required=True,
+        help="Term to search (case insensitive, repeat to require every term)",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="Concurrent token index and block fetches",
+    )
+    args = parser.parse_args()
+
+    searcher = LogTokenSearcher(
+        args.bucket,
+        args.db_cluster_identifier,
+        db_instance_identifiers=args.db_instance_identifiers,
+        max_workers=args.max_workers,
+    )
+    match_count = 0
+    for match in searcher.search(args.term, args.start, args.end):
+        sys.stdout.buffer.write(f"[{match.db_instance}] ".encode() + match.line + b"\n")
+        match_count += 1
+
+    print(
+        f"Matched {match_count} lines, {searcher.candidate_block_count} of "
+        f"{searcher.block_count} blocks in {searcher.index_count} token indexes, "
+        f"fetched {searcher.fetched_size} bytes",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()